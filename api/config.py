@@ -28,6 +28,9 @@ class Settings(BaseSettings):
     # RBAC (Role-Based Access Control) v4.6
     RBAC_ENABLED: bool = True  # Activado por defecto en v4.6
     RBAC_DEFAULT_ROLE: str = "viewer"  # Rol más restrictivo por defecto
+    RBAC_TOKEN_CACHE_SIZE: int = 1024  # Claims de JWT ya validados (LRU)
+    RBAC_TOKEN_CACHE_TTL: int = 60  # Segundos; nunca más allá del exp del token
+    RATE_LIMIT_BACKEND: str = "auto"  # auto (Redis si REDIS_ENABLED), memory, redis
 
     # HexStrike AI (Red Team v4.6)
     HEXSTRIKE_ENABLED: bool = False
@@ -134,6 +137,9 @@ class Settings(BaseSettings):
     MINIO_BUCKET: str = "forensics-evidence"
     MINIO_SECURE: bool = False
     MINIO_CONSOLE_URL: str = "http://10.10.10.5:9001"
+    MINIO_PART_SIZE: int = 16 * 1024 * 1024  # Multipart upload (mínimo S3: 5 MB)
+    MINIO_STREAM_CHUNK_SIZE: int = 1024 * 1024  # Lectura de descargas en streaming
+    STORAGE_STATS_RECONCILE_SECONDS: int = 6 * 3600  # Re-listado del bucket si el índice es más viejo
     
     # Paths (Native Kali/WSL - sin Docker)
     # Usa ./tools dentro del proyecto (no /opt) para evitar problemas de permisos
@@ -141,6 +147,9 @@ class Settings(BaseSettings):
     TOOLS_DIR: Path = PROJECT_ROOT / "tools"
     EVIDENCE_DIR: Path = PROJECT_ROOT / "evidence"  # ./evidence en el proyecto
     LOGS_DIR: Path = PROJECT_ROOT / "logs"
+    # Evidence upload (streaming a disco, v4.7)
+    EVIDENCE_UPLOAD_CHUNK_SIZE: int = 4 * 1024 * 1024  # 1-8 MB por lectura
+    EVIDENCE_MAX_UPLOAD_BYTES: Optional[int] = None  # None = sin límite
     # Audit logging configuration
     AUDIT_LOG_TO_DB: bool = False  # If False, audit events are written to rotating files only
     AUDIT_LOG_FILE_NAME: str = "audit.log"
@@ -205,6 +214,64 @@ class Settings(BaseSettings):
     OLLAMA_MODEL: str = "llama3.2"  # Modelo por defecto
     OLLAMA_TIMEOUT: int = 180  # 3 minutos para generación
     
+    # ============================================================================
+    # RAG / EMBEDDINGS (v4.7)
+    # ============================================================================
+    RAG_EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    RAG_EMBED_BATCH_SIZE: int = 64  # Textos por llamada a encode()
+    RAG_NORMALIZE_EMBEDDINGS: bool = True
+    RAG_CHUNK_SIZE: int = 1000  # Caracteres por chunk de evidencia
+    RAG_CHUNK_OVERLAP: int = 200  # Solape entre chunks consecutivos
+    
+    # ============================================================================
+    # SOAR ENGINE (v4.7)
+    # ============================================================================
+    SOAR_MAX_PARALLEL_STEPS: int = 4  # Pasos independientes concurrentes por ejecución
+    SOAR_MAP_MAX_CONCURRENCY: int = 5  # Elementos concurrentes en pasos MAP
+    SOAR_PROGRESS_FLUSH_SECONDS: float = 2.0  # Intervalo mínimo entre escrituras de progreso
+    SOAR_CHECKPOINT_HEARTBEAT_SECONDS: int = 30  # Latido de ejecuciones en curso
+    SOAR_RESUME_STALE_SECONDS: int = 120  # Sin latido durante este tiempo = ejecución huérfana
+    AGENT_QUEUE_DURABLE: bool = False  # Persistir las tareas de AgentQueue en BD (recuperación tras reinicio)
+    AGENT_QUEUE_LEASE_SECONDS: int = 60  # Lease de una tarea en ejecución; el latido lo renueva
+    AGENT_QUEUE_RETRY_BACKOFF_SECONDS: float = 2.0  # Espera antes del primer reintento (se duplica en cada uno)
+    AGENT_QUEUE_RETRY_BACKOFF_MAX_SECONDS: float = 300.0  # Espera máxima entre reintentos
+    
+    # ============================================================================
+    # TIMELINE (v4.7)
+    # ============================================================================
+    TIMELINE_STORE_BACKEND: str = "sql"  # sql, memory
+    TIMELINE_BULK_INSERT_BATCH: int = 1000  # Filas por INSERT en importaciones masivas
+    TIMELINE_CORRELATION_WINDOW_MINUTES: int = 10  # Separación máxima entre eventos de una misma cadena
+    TIMELINE_HISTOGRAM_MAX_BUCKETS: int = 500  # Buckets máximos con intervalo automático
+    
+    # ============================================================================
+    # IOC STORE (v4.7)
+    # ============================================================================
+    IOC_SEARCH_COUNT_CAP: int = 10000  # Tope del conteo aproximado cuando no hay estimación del planner
+    IOC_STATS_CACHE_TTL: int = 5  # Segundos que se reutiliza el snapshot de /api/iocs/stats
+    IOC_STATS_RESYNC_SECONDS: int = 300  # Reagregación completa de los contadores incrementales
+    IOC_HIT_FLUSH_SECONDS: int = 5  # Cada cuánto se vuelcan los hits de lecturas/lookups
+    IOC_HIT_FLUSH_BATCH: int = 500  # IOCs por UPDATE ... CASE al volcar hits
+    IOC_EXPORT_YIELD_PER: int = 1000  # Filas por lote leídas del cursor al exportar
+    IOC_EXPORT_CHUNK_BYTES: int = 65536  # Tamaño de los bloques enviados en exportaciones
+    IOC_ENRICH_SOURCE_TIMEOUT: float = 10.0  # Timeout por fuente de enriquecimiento (segundos)
+    IOC_ENRICH_DEADLINE: float = 20.0  # Plazo total del enriquecimiento; después se devuelve lo obtenido
+    IOC_MATCHER_RELOAD_SECONDS: float = 2.0  # Intervalo mínimo entre recargas del índice de IOCs en memoria
+    IOC_MATCHER_CACHE_SIZE: int = 65536  # Valores observados con su resultado en caché por índice
+    IOC_SCAN_CHUNK_BYTES: int = 1048576  # Bloque de lectura al barrer archivos de evidencia
+    IOC_SCAN_MAX_LINE_BYTES: int = 65536  # Líneas más largas se recorren por ventanas solapadas
+    IOC_SCAN_SIGHTING_BATCH: int = 500  # Avistamientos por INSERT durante un barrido
+    IOC_SCAN_MAX_SIGHTINGS_PER_IOC: int = 100  # Avistamientos guardados por IOC y barrido (el recuento es completo)
+    IOC_SCAN_MAX_REPORTED_MATCHES: int = 1000  # Coincidencias detalladas en la respuesta
+    
+    # ============================================================================
+    # THREAT HUNTING (v4.7)
+    # ============================================================================
+    HUNTING_BATCH_CONCURRENCY: int = 4  # Hunts simultáneos en un batch
+    HUNTING_HUNT_TIMEOUT_SECONDS: float = 120.0  # Timeout por hunt dentro de un batch (0 = sin límite)
+    HUNTING_RESULT_CACHE_SIZE: int = 256  # Resultados en cache (LRU)
+    HUNTING_RESULT_CACHE_TTL: int = 900  # Segundos que un resultado se reutiliza
+    
     # ============================================================================
     # STRIPE BILLING (v4.6)
     # ============================================================================
@@ -213,6 +280,14 @@ class Settings(BaseSettings):
     STRIPE_PUBLISHABLE_KEY: Optional[str] = None
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
     STRIPE_ENVIRONMENT: str = "test"  # test, live
+    SUBSCRIPTION_CACHE_TTL: int = 30  # Segundos de cache de suscripción/plan por tenant
+    
+    # ============================================================================
+    # USAGE TRACKING (v4.7)
+    # ============================================================================
+    USAGE_TRACKING_QUEUE_SIZE: int = 10000  # Registros pendientes; los que no caben se descartan
+    USAGE_TRACKING_BATCH_SIZE: int = 500  # Filas por INSERT
+    USAGE_TRACKING_FLUSH_MS: int = 1000  # Espera máxima antes de escribir un lote incompleto
     
     # ============================================================================
     # SMTP EMAIL (v4.6.1)
@@ -134,6 +134,10 @@ def init_db():
     from api.models import tools, redteam, user, tenant  # noqa: F401
     Base.metadata.create_all(bind=engine)
 
+    # Tablas ya existentes: create_all no dispara after_create
+    from api.services.ioc_search import ensure_search_index
+    ensure_search_index(engine)
+
 
 def drop_all_tables():
     """
@@ -98,11 +98,59 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"⚠️ LLM Manager no disponible: {e}")
     
+    # Reanudar ejecuciones de playbooks interrumpidas (v4.7)
+    try:
+        from api.services.soar_engine import soar_engine
+        resumed = await soar_engine.resume_interrupted_executions()
+        if resumed:
+            logger.info(f"♻️ {len(resumed)} ejecuciones de playbooks reanudadas")
+    except Exception as e:
+        logger.warning(f"⚠️ Reanudación de playbooks no disponible: {e}")
+    
+    # AgentQueue persistente: recupera tareas de leases vencidos (v4.7)
+    if settings.AGENT_QUEUE_DURABLE:
+        try:
+            from api.services.agent_queue import agent_queue
+            import api.services.soar_intelligence  # noqa: F401  (registra sus handlers)
+            await agent_queue.start()
+        except Exception as e:
+            logger.warning(f"⚠️ AgentQueue persistente no disponible: {e}")
+    
     yield
     
     # Shutdown
     logger.info("🛑 Deteniendo MCP Kali Forensics")
     
+    try:
+        from api.services.soar_engine import soar_engine
+        await soar_engine.stop_heartbeat()
+    except Exception:
+        pass
+    
+    try:
+        from api.services.soar_ml import shutdown_training_pool
+        shutdown_training_pool()
+    except Exception:
+        pass
+    
+    try:
+        from api.services.agent_queue import agent_queue
+        await agent_queue.stop()
+    except Exception:
+        pass
+    
+    try:
+        from api.middleware.usage_tracking import usage_record_buffer
+        await usage_record_buffer.stop()
+    except Exception:
+        pass
+    
+    try:
+        from api.services.ioc_hits import ioc_hits
+        await ioc_hits.stop()
+    except Exception:
+        pass
+    
     # Limpiar recursos del LLM Manager
     try:
         await cleanup_llm_manager()
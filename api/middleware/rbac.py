@@ -6,9 +6,10 @@ Implementa verificación de permisos granular por ruta y método HTTP.
 """
 
 import time
+import hashlib
 import logging
 from typing import Optional, Set, Dict, Any
-from collections import defaultdict
+from collections import OrderedDict
 
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
@@ -20,65 +21,67 @@ from core.rbac_config import (
     get_route_permissions, 
     check_permission,
     get_user_permissions,
-    PUBLIC_ROUTES
 )
 from api.config import settings
+from api.services.rate_limiter import create_rate_limiter
 
 logger = logging.getLogger(__name__)
 
 
-class RateLimiter:
-    """Rate limiter simple en memoria"""
+# Rate limiter global (Redis compartido entre workers si está habilitado)
+rate_limiter = create_rate_limiter()
+
+
+class TokenClaimsCache:
+    """
+    Cache LRU con TTL de tokens ya validados (clave: SHA256 del token).
+
+    Una entrada nunca sobrevive al ``exp`` del JWT, así que un token expirado
+    vuelve a decodificarse y se rechaza como antes.
+    """
     
-    def __init__(self):
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.cleanup_interval = 60  # segundos
-        self.last_cleanup = time.time()
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
     
-    def is_allowed(self, key: str, limit: int, window: int = 60) -> bool:
-        """
-        Verificar si la request está permitida
-        
-        Args:
-            key: Identificador único (IP + path)
-            limit: Número máximo de requests
-            window: Ventana de tiempo en segundos
-        
-        Returns:
-            True si está permitido
-        """
-        now = time.time()
-        
-        # Limpiar requests antiguas periódicamente
-        if now - self.last_cleanup > self.cleanup_interval:
-            self._cleanup(now, window)
-        
-        # Filtrar requests dentro de la ventana
-        self.requests[key] = [
-            t for t in self.requests[key] 
-            if now - t < window
-        ]
-        
-        if len(self.requests[key]) >= limit:
-            return False
-        
-        self.requests[key].append(now)
-        return True
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user_info = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user_info
+    
+    def put(self, key: str, user_info: Dict[str, Any], token_exp: Optional[float] = None):
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+        self._entries[key] = (expires_at, user_info)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
     
-    def _cleanup(self, now: float, window: int):
-        """Limpiar entradas antiguas"""
-        for key in list(self.requests.keys()):
-            self.requests[key] = [
-                t for t in self.requests[key] 
-                if now - t < window
-            ]
-            if not self.requests[key]:
-                del self.requests[key]
-        self.last_cleanup = now
+    def clear(self):
+        self._entries.clear()
 
 
-# Instancia global del rate limiter
-rate_limiter = RateLimiter()
+# Instancia global de la cache de tokens
+token_cache = TokenClaimsCache(settings.RBAC_TOKEN_CACHE_SIZE, settings.RBAC_TOKEN_CACHE_TTL)
 
 
 class RBACMiddleware(BaseHTTPMiddleware):
@@ -111,14 +114,11 @@ class RBACMiddleware(BaseHTTPMiddleware):
             logger.info(f"🔓 RBAC Bypass for remote agent: {path}")
             return await call_next(request)
         
-        # Permitir rutas públicas
-        for public_path in PUBLIC_ROUTES:
-            if path.startswith(public_path):
-                logger.info(f"🔓 RBAC Public route: {path} (matched {public_path})")
-                return await call_next(request)
-        
-        # Obtener configuración de permisos para la ruta
+        # Obtener configuración de permisos para la ruta (rutas públicas primero)
         route_config = get_route_permissions(path, method)
+        if route_config is not None and route_config.public:
+            logger.info(f"🔓 RBAC Public route: {path} (matched {route_config.path_prefix})")
+            return await call_next(request)
         
         # Si no hay configuración, aplicar política por defecto
         if route_config is None:
@@ -146,17 +146,20 @@ class RBACMiddleware(BaseHTTPMiddleware):
         
         # Rate limiting
         rate_key = f"{request.client.host}:{path}:{method}"
-        if not rate_limiter.is_allowed(rate_key, route_config.rate_limit):
+        rate_result = await rate_limiter.hit(rate_key, route_config.rate_limit)
+        if not rate_result.allowed:
             logger.warning(
                 f"⚠️ Rate limit exceeded: {rate_key} "
                 f"(limit: {route_config.rate_limit}/min)"
             )
+            rate_headers = rate_result.headers()
             return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
                     "detail": "Rate limit exceeded",
-                    "retry_after": 60
-                }
+                    "retry_after": int(rate_headers["Retry-After"])
+                },
+                headers=rate_headers
             )
         
         # Verificar permisos
@@ -185,7 +188,9 @@ class RBACMiddleware(BaseHTTPMiddleware):
         request.state.user_id = user_id
         request.state.user_permissions = user_permissions
         
-        return await call_next(request)
+        response = await call_next(request)
+        response.headers.update(rate_result.headers())
+        return response
     
     async def _get_user_info(self, request: Request) -> Dict[str, Any]:
         """
@@ -254,6 +259,11 @@ class RBACMiddleware(BaseHTTPMiddleware):
         import jwt
         from api.config import settings
         
+        cache_key = token_cache.key(token)
+        cached = token_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             # Decodificar JWT (usando PyJWT que es compatible con Python 3.13)
             payload = jwt.decode(
@@ -277,13 +287,15 @@ class RBACMiddleware(BaseHTTPMiddleware):
             # Si es Global Admin, tiene TODOS los permisos
             if is_global_admin:
                 logger.info(f"👑 Global Admin access: {username}")
-                return {
+                user_info = {
                     "user_id": user_id,
                     "username": username,
                     "role": Role.GLOBAL_ADMIN,
                     "permissions": get_user_permissions(Role.GLOBAL_ADMIN),
                     "is_global_admin": True
                 }
+                token_cache.put(cache_key, user_info, payload.get("exp"))
+                return user_info
             
             # Construir permisos desde roles
             user_permissions = set()
@@ -314,13 +326,15 @@ class RBACMiddleware(BaseHTTPMiddleware):
                 except ValueError:
                     pass
             
-            return {
+            user_info = {
                 "user_id": user_id,
                 "username": username,
                 "role": primary_role,
                 "permissions": user_permissions,
                 "is_global_admin": False
             }
+            token_cache.put(cache_key, user_info, payload.get("exp"))
+            return user_info
             
         except jwt.PyJWTError as e:
             logger.warning(f"⚠️ JWT validation failed: {e}")
@@ -3,11 +3,15 @@ Subscription Middleware - Verifies active subscription and handles read-only mod
 """
 
 import logging
+import threading
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 from fastapi import Request, HTTPException
 from sqlalchemy.orm import Session
 
+from api.config import settings
 from api.database import SessionLocal
 from api.models.subscription import Subscription, SubscriptionPlan
 
@@ -74,6 +78,220 @@ def get_subscription_for_tenant(
         return None, None
 
 
+@dataclass(frozen=True)
+class EntitlementSnapshot:
+    """
+    Immutable view of a tenant's subscription and plan.
+
+    Built from one DB read and cached by EntitlementCache; every access
+    decision is computed from it without touching the database.
+    """
+    tenant_id: str
+    has_subscription: bool
+    status: str = SubscriptionStatus.NONE
+    is_trial: bool = False
+    trial_end: Optional[datetime] = None
+    trial_expired_notified: bool = False
+    current_period_end: Optional[datetime] = None
+    cancel_at_period_end: bool = False
+    read_only_flag: bool = False
+    plan: Optional[Dict[str, Any]] = None
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def from_models(
+        cls,
+        tenant_id: str,
+        subscription: Optional[Subscription],
+        plan: Optional[SubscriptionPlan]
+    ) -> "EntitlementSnapshot":
+        if subscription is None:
+            return cls(tenant_id=tenant_id, has_subscription=False)
+        return cls(
+            tenant_id=tenant_id,
+            has_subscription=True,
+            status=subscription.status,
+            is_trial=bool(subscription.is_trial),
+            trial_end=subscription.trial_end,
+            trial_expired_notified=bool(subscription.trial_expired_notified),
+            current_period_end=subscription.current_period_end,
+            cancel_at_period_end=bool(subscription.cancel_at_period_end),
+            read_only_flag=bool(subscription.is_read_only),
+            plan=plan.to_dict() if plan else None,
+        )
+
+    @property
+    def features(self) -> list:
+        return (self.plan or {}).get("features") or []
+
+    @property
+    def limits(self) -> Dict[str, Any]:
+        plan = self.plan or {}
+        return {
+            key: plan.get(key)
+            for key in ("max_users", "max_cases", "max_storage_gb",
+                        "max_analyses_per_month", "max_agents")
+        }
+
+    def trial_expired(self, now: datetime) -> bool:
+        return bool(self.is_trial and self.trial_end and now > self.trial_end)
+
+    def is_read_only(self, now: datetime) -> bool:
+        """Same rule as Subscription.is_read_only or Subscription.should_be_read_only"""
+        if self.read_only_flag:
+            return True
+        if self.status in ("canceled", "expired", "past_due"):
+            return True
+        return self.trial_expired(now)
+
+
+def _load_entitlements(tenant_id: str) -> EntitlementSnapshot:
+    """Read subscription + plan in a single query"""
+    db = SessionLocal()
+    try:
+        row = db.query(Subscription, SubscriptionPlan).outerjoin(
+            SubscriptionPlan, SubscriptionPlan.id == Subscription.plan_id
+        ).filter(
+            Subscription.tenant_id == tenant_id
+        ).first()
+        subscription, plan = row if row else (None, None)
+        return EntitlementSnapshot.from_models(tenant_id, subscription, plan)
+    finally:
+        db.close()
+
+
+class EntitlementCache:
+    """
+    In-process TTL cache of EntitlementSnapshot per tenant.
+
+    Routes that change a subscription call invalidate_entitlements() so the
+    next request sees the change immediately; the TTL bounds staleness for
+    changes made elsewhere (other workers, direct SQL).
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        loader: Callable[[str], EntitlementSnapshot] = None
+    ):
+        self.ttl = ttl if ttl is not None else settings.SUBSCRIPTION_CACHE_TTL
+        self.loader = loader or _load_entitlements
+        self._entries: Dict[str, Tuple[float, EntitlementSnapshot]] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tenant_id: str) -> EntitlementSnapshot:
+        key = str(tenant_id)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        generation = self._generation
+        try:
+            snapshot = self.loader(key)
+        except Exception as e:
+            # Malformed tenant id, DB outage, missing table: deny (as before
+            # the cache) and don't cache, so the next request retries the load
+            logger.error(f"❌ Error getting subscription: {e}")
+            return EntitlementSnapshot(tenant_id=key, has_subscription=False)
+        with self._lock:
+            # An invalidation during the load means the snapshot may be stale
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, snapshot)
+        return snapshot
+
+    def invalidate(self, tenant_id: Optional[str] = None):
+        """Drop one tenant's snapshot, or all of them when tenant_id is None"""
+        with self._lock:
+            self._generation += 1
+            if tenant_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(tenant_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits,
+                "misses": self.misses, "ttl": self.ttl}
+
+
+entitlement_cache = EntitlementCache()
+
+
+def invalidate_entitlements(tenant_id: Optional[str] = None):
+    """Call after changing a tenant's subscription or plan (None = all tenants)"""
+    entitlement_cache.invalidate(tenant_id)
+
+
+def _mark_trial_expired(tenant_id: str):
+    """Persist trial expiration once per tenant"""
+    db = SessionLocal()
+    try:
+        subscription = db.query(Subscription).filter(
+            Subscription.tenant_id == tenant_id
+        ).first()
+        if subscription and not subscription.trial_expired_notified:
+            subscription.trial_expired_notified = True
+            subscription.status = SubscriptionStatus.EXPIRED
+            subscription.is_read_only = True
+            db.commit()
+    finally:
+        db.close()
+    invalidate_entitlements(tenant_id)
+
+
+def evaluate_access(
+    snapshot: EntitlementSnapshot,
+    method: str,
+    now: Optional[datetime] = None
+) -> Tuple[bool, bool, str]:
+    """
+    Access decision for a request from an entitlement snapshot
+
+    Returns:
+        Tuple of (allowed, is_read_only, message)
+    """
+    if not snapshot.has_subscription:
+        # No subscription - only allow registration/billing routes
+        return False, True, "No active subscription. Please subscribe to continue."
+    
+    now = now or datetime.utcnow()
+    
+    # Check trial expiration
+    if snapshot.trial_expired(now):
+        if method == "GET":
+            return True, True, "Trial expired. Read-only mode. Please upgrade."
+        return False, True, "Trial expired. Please upgrade to continue."
+    
+    # Check subscription status
+    if snapshot.status == SubscriptionStatus.EXPIRED:
+        if method == "GET":
+            return True, True, "Subscription expired. Read-only mode."
+        return False, True, "Subscription expired. Please renew."
+    
+    if snapshot.status == SubscriptionStatus.PAST_DUE:
+        # Grace period - allow read access
+        if method == "GET":
+            return True, True, "Payment overdue. Read-only mode."
+        return False, True, "Payment overdue. Please update payment method."
+    
+    if snapshot.status == SubscriptionStatus.CANCELED:
+        # Check if still in paid period
+        if snapshot.current_period_end and now < snapshot.current_period_end:
+            return True, False, "Subscription active until period end."
+        if method == "GET":
+            return True, True, "Subscription canceled. Read-only mode."
+        return False, True, "Subscription canceled."
+    
+    if snapshot.status in [SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIALING]:
+        return True, False, "OK"
+    
+    return False, True, "Invalid subscription status."
+
+
 def check_subscription_access(
     tenant_id: str,
     route_path: str,
@@ -82,6 +300,8 @@ def check_subscription_access(
     """
     Check if tenant has valid subscription access
     
+    Uses the cached entitlement snapshot; only a cache miss reads the DB.
+    
     Args:
         tenant_id: Tenant UUID
         route_path: Request path
@@ -90,61 +310,18 @@ def check_subscription_access(
     Returns:
         Tuple of (allowed, is_read_only, message)
     """
-    db = SessionLocal()
     try:
-        subscription, plan = get_subscription_for_tenant(db, tenant_id)
-        
-        if not subscription:
-            # No subscription - only allow registration/billing routes
-            return False, True, "No active subscription. Please subscribe to continue."
-        
-        now = datetime.utcnow()
-        
-        # Check trial expiration
-        if subscription.is_trial and subscription.trial_end:
-            if now > subscription.trial_end:
-                # Trial expired
-                if not subscription.trial_expired_notified:
-                    subscription.trial_expired_notified = True
-                    subscription.status = SubscriptionStatus.EXPIRED
-                    subscription.is_read_only = True
-                    db.commit()
-                
-                if method == "GET":
-                    return True, True, "Trial expired. Read-only mode. Please upgrade."
-                return False, True, "Trial expired. Please upgrade to continue."
+        snapshot = entitlement_cache.get(tenant_id)
         
-        # Check subscription status
-        if subscription.status == SubscriptionStatus.EXPIRED:
-            if method == "GET":
-                return True, True, "Subscription expired. Read-only mode."
-            return False, True, "Subscription expired. Please renew."
+        if snapshot.trial_expired(datetime.utcnow()) and not snapshot.trial_expired_notified:
+            _mark_trial_expired(tenant_id)
         
-        if subscription.status == SubscriptionStatus.PAST_DUE:
-            # Grace period - allow read access
-            if method == "GET":
-                return True, True, "Payment overdue. Read-only mode."
-            return False, True, "Payment overdue. Please update payment method."
-        
-        if subscription.status == SubscriptionStatus.CANCELED:
-            # Check if still in paid period
-            if subscription.current_period_end and now < subscription.current_period_end:
-                return True, False, "Subscription active until period end."
-            if method == "GET":
-                return True, True, "Subscription canceled. Read-only mode."
-            return False, True, "Subscription canceled."
-        
-        if subscription.status in [SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIALING]:
-            return True, False, "OK"
-        
-        return False, True, "Invalid subscription status."
+        return evaluate_access(snapshot, method)
         
     except Exception as e:
         logger.error(f"❌ Subscription check error: {e}")
         # Fail open for now - don't block on errors
         return True, False, "OK"
-    finally:
-        db.close()
 
 
 def is_route_allowed_without_subscription(path: str) -> bool:
@@ -234,11 +411,10 @@ def get_subscription_info(tenant_id: str) -> dict:
     
     Returns dict with subscription status, plan, and limits
     """
-    db = SessionLocal()
     try:
-        subscription, plan = get_subscription_for_tenant(db, tenant_id)
+        snapshot = entitlement_cache.get(tenant_id)
         
-        if not subscription:
+        if not snapshot.has_subscription:
             return {
                 "has_subscription": False,
                 "status": SubscriptionStatus.NONE,
@@ -246,21 +422,24 @@ def get_subscription_info(tenant_id: str) -> dict:
                 "message": "No subscription",
             }
         
+        now = datetime.utcnow()
         trial_days_remaining = 0
-        if subscription.is_trial and subscription.trial_end:
-            delta = subscription.trial_end - datetime.utcnow()
+        if snapshot.is_trial and snapshot.trial_end:
+            delta = snapshot.trial_end - now
             trial_days_remaining = max(0, delta.days)
         
         return {
             "has_subscription": True,
-            "status": subscription.status,
-            "is_trial": subscription.is_trial,
+            "status": snapshot.status,
+            "is_trial": snapshot.is_trial,
             "trial_days_remaining": trial_days_remaining,
-            "trial_end": subscription.trial_end.isoformat() if subscription.trial_end else None,
-            "is_read_only": subscription.is_read_only or subscription.should_be_read_only,
-            "plan": plan.to_dict() if plan else None,
-            "current_period_end": subscription.current_period_end.isoformat() if subscription.current_period_end else None,
-            "cancel_at_period_end": subscription.cancel_at_period_end,
+            "trial_end": snapshot.trial_end.isoformat() if snapshot.trial_end else None,
+            "is_read_only": snapshot.is_read_only(now),
+            "plan": snapshot.plan,
+            "features": snapshot.features,
+            "limits": snapshot.limits,
+            "current_period_end": snapshot.current_period_end.isoformat() if snapshot.current_period_end else None,
+            "cancel_at_period_end": snapshot.cancel_at_period_end,
         }
         
     except Exception as e:
@@ -271,8 +450,6 @@ def get_subscription_info(tenant_id: str) -> dict:
             "is_read_only": True,
             "message": str(e),
         }
-    finally:
-        db.close()
 
 
 async def verify_subscription_active(request: Request):
@@ -3,19 +3,21 @@ Usage Tracking Middleware & Analytics
 Combines Stripe billing tracking with detailed usage metrics.
 """
 
+import asyncio
 import hashlib
 import logging
 import time
 from collections import defaultdict
 from datetime import datetime
-from typing import Callable, Optional, List
+from typing import Any, Callable, Dict, Optional, List
 
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
-from sqlalchemy import Column, String, Integer, DateTime, Float, JSON, BigInteger
+from sqlalchemy import Column, String, Integer, DateTime, Float, JSON, BigInteger, insert
 from sqlalchemy.orm import Session
 
+from api.config import settings
 from api.database import Base, get_db_context
 from api.models.billing import UsageType
 from api.services.billing_service import get_billing_service
@@ -82,6 +84,132 @@ class ApiUsage(Base):
         }
 
 
+class UsageRecordBuffer:
+    """
+    Bounded in-process queue of ApiUsage rows written in batches.
+
+    Requests only enqueue a dict; a background task bulk-inserts up to
+    ``batch_size`` rows per transaction, or whatever arrived within
+    ``flush_ms`` of the first pending row. When the queue is full the
+    record is dropped and counted instead of blocking the request.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_ms: Optional[int] = None,
+    ):
+        self.max_size = max_size or settings.USAGE_TRACKING_QUEUE_SIZE
+        self.batch_size = batch_size or settings.USAGE_TRACKING_BATCH_SIZE
+        self.flush_interval = (flush_ms or settings.USAGE_TRACKING_FLUSH_MS) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[Dict[str, Any]] = []  # Collected but not yet written
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def enqueue(self, record: Dict[str, Any]) -> bool:
+        """Queue a row without waiting; False if it was dropped (queue full)."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"⚠️ Usage tracking queue full: {self.dropped} records dropped")
+            return False
+        self.enqueued += 1
+        return True
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        # First use, or the previous loop is gone: keep whatever was pending
+        pending = self._drain_nowait()
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        for record in pending[: self.max_size]:
+            self._queue.put_nowait(record)
+        self.dropped += max(len(pending) - self.max_size, 0)
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+
+    def _drain_nowait(self) -> List[Dict[str, Any]]:
+        pending, self._batch = self._batch, []
+        while self._queue is not None:
+            try:
+                pending.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return pending
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                try:
+                    self._batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            batch, self._batch = self._batch, []
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        try:
+            with get_db_context() as db:
+                db.execute(insert(ApiUsage), batch)
+            self.written += len(batch)
+            self.flushes += 1
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"❌ Error writing {len(batch)} usage records: {e}")
+
+    async def stop(self):
+        """Stop the background writer and flush everything still queued."""
+        task, self._task = self._task, None
+        if task is not None and not task.done() and self._loop is asyncio.get_running_loop():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        pending = self._drain_nowait()
+        for start in range(0, len(pending), self.batch_size):
+            await asyncio.to_thread(self._write, pending[start:start + self.batch_size])
+        if pending:
+            logger.info(f"📊 Usage tracking flushed {len(pending)} records on shutdown")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "pending": (self._queue.qsize() if self._queue is not None else 0) + len(self._batch),
+        }
+
+
+# Shared by every middleware instance; flushed from the app lifespan on shutdown
+usage_record_buffer = UsageRecordBuffer()
+
+
 class UsageTrackingMiddleware(BaseHTTPMiddleware):
     """
     Middleware to track API usage for billing and analytics.
@@ -111,11 +239,13 @@ class UsageTrackingMiddleware(BaseHTTPMiddleware):
         enabled: bool = True,
         exclude_paths: Optional[List[str]] = None,
         batch_size: int = 100,
+        buffer: Optional[UsageRecordBuffer] = None,
     ):
         super().__init__(app)
         self.enabled = enabled
         self.exclude_paths = exclude_paths or self.EXEMPT_ENDPOINTS
         self.batch_size = batch_size
+        self.buffer = buffer or usage_record_buffer
         self._call_count = defaultdict(int)
         self.billing_service = get_billing_service() if enabled else None
 
@@ -147,29 +277,27 @@ class UsageTrackingMiddleware(BaseHTTPMiddleware):
             )
             normalized_path = self._normalize_path(request.url.path)
 
-            # Record detailed usage for analytics
+            # Record detailed usage for analytics (written in batches)
             try:
-                with get_db_context() as db:
-                    usage = ApiUsage(
-                        tenant_id=tenant_id,
-                        user_id=user_id,
-                        api_key_hash=self._hash_api_key(api_key) if api_key else None,
-                        method=request.method,
-                        path=request.url.path,
-                        endpoint=normalized_path,
-                        status_code=response.status_code,
-                        response_time_ms=duration_ms,
-                        request_size_bytes=request_size,
-                        response_size_bytes=response_size,
-                        usage_category=usage_category,
-                        billable_units=billable_units,
-                        client_ip=request.client.host if request.client else None,
-                        user_agent=request.headers.get("user-agent"),
-                        timestamp=datetime.utcnow(),
-                    )
-                    db.add(usage)
-            except Exception as db_error:
-                logger.error(f"❌ Error tracking usage: {db_error}", exc_info=True)
+                self.buffer.enqueue({
+                    "tenant_id": tenant_id,
+                    "user_id": user_id,
+                    "api_key_hash": self._hash_api_key(api_key) if api_key else None,
+                    "method": request.method,
+                    "path": request.url.path,
+                    "endpoint": normalized_path,
+                    "status_code": response.status_code,
+                    "response_time_ms": duration_ms,
+                    "request_size_bytes": request_size,
+                    "response_size_bytes": response_size,
+                    "usage_category": usage_category,
+                    "billable_units": billable_units,
+                    "client_ip": request.client.host if request.client else None,
+                    "user_agent": request.headers.get("user-agent"),
+                    "timestamp": datetime.utcnow(),
+                })
+            except Exception as queue_error:
+                logger.error(f"❌ Error tracking usage: {queue_error}", exc_info=True)
 
             # Record usage for Stripe billing (batched)
             if self.billing_service and tenant_id:
@@ -51,7 +51,14 @@ from api.models.evidence_management import (
     EvidenceSource,
     ExternalEvidence,
     EvidenceAssociation,
-    CommandLog
+    CommandLog,
+    StorageUsageStat
+)
+
+# v4.7 - Timeline Event Store
+from api.models.timeline import (
+    TimelineEvent,
+    TimelineCorrelation
 )
 
 # v4.6 - API Usage Tracking
@@ -72,7 +79,10 @@ from api.models.tools import (
     Agent,
     AgentTask,
     Playbook,
+    PlaybookStep,
     PlaybookExecution,
+    PlaybookStepExecution,
+    SecurityPolicy,
     CorrelationRule,
     CorrelationEvent,
     GraphNode,
@@ -118,7 +128,10 @@ __all__ = [
     
     # v4.1 - SOAR/Playbooks
     "Playbook",
+    "PlaybookStep",
     "PlaybookExecution",
+    "PlaybookStepExecution",
+    "SecurityPolicy",
     
     # v4.1 - Correlation
     "CorrelationRule",
@@ -156,6 +169,11 @@ __all__ = [
     "ExternalEvidence",
     "EvidenceAssociation",
     "CommandLog",
+    "StorageUsageStat",
+
+    # v4.7 - Timeline Event Store
+    "TimelineEvent",
+    "TimelineCorrelation",
 
     # v4.6 - API Usage Tracking
     "ApiUsage",
@@ -13,6 +13,7 @@ from sqlalchemy import (
     JSON,
     Boolean,
     BigInteger,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -347,3 +348,54 @@ class CommandLog(Base):
             "execution_host": self.execution_host,
             "working_directory": self.working_directory,
         }
+
+
+class StorageUsageStat(Base):
+    """
+    Incremental storage usage counters for the MinIO evidence bucket.
+
+    One row per scope, identified by (bucket, tenant_id, category, group_key);
+    empty strings mean "all". E.g. ("", "", "") is the whole bucket,
+    (tenant, "", "") a tenant and (tenant, "cases", case_id) a single case.
+    Rows are adjusted on every upload/delete and rebuilt by reconciliation.
+    """
+
+    __tablename__ = "storage_usage_stats"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bucket = Column(String(255), nullable=False)
+    tenant_id = Column(String(100), nullable=False, default="")
+    category = Column(String(100), nullable=False, default="")  # cases, scans, m365_graph...
+    group_key = Column(String(255), nullable=False, default="")  # case_id, scan_type...
+
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    object_count = Column(BigInteger, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_reconciled_at = Column(DateTime, nullable=True)  # Only set on the bucket row
+
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket", "tenant_id", "category", "group_key", name="uq_storage_usage_scope"
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"<StorageUsageStat(bucket={self.bucket}, tenant={self.tenant_id}, "
+            f"category={self.category}, group={self.group_key}, bytes={self.total_bytes})>"
+        )
+
+    def to_dict(self):
+        return {
+            "bucket": self.bucket,
+            "tenant_id": self.tenant_id or None,
+            "category": self.category or None,
+            "group_key": self.group_key or None,
+            "total_bytes": self.total_bytes,
+            "object_count": self.object_count,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "last_reconciled_at": (
+                self.last_reconciled_at.isoformat() if self.last_reconciled_at else None
+            ),
+        }
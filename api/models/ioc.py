@@ -3,7 +3,7 @@ MCP Kali Forensics - IOC Models
 Modelos SQLAlchemy para IOC Store
 """
 
-from sqlalchemy import Column, String, Integer, Float, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Float, DateTime, Text, ForeignKey, JSON, Index, DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -26,6 +26,21 @@ class IocItem(Base):
     cve, mutex, user_agent
     """
     __tablename__ = "ioc_items"
+    __table_args__ = (
+        # Orden de listados + desempate para paginación keyset
+        Index("ix_ioc_items_created", "created_at", "id"),
+        Index("ix_ioc_items_confidence", "confidence_score", "id"),
+        # Búsqueda por subcadena (ILIKE '%term%') en PostgreSQL vía pg_trgm;
+        # en SQLite la sirve la tabla FTS5 ioc_items_fts (api.services.ioc_search)
+        Index("ix_ioc_items_value_trgm", "value", postgresql_using="gin",
+              postgresql_ops={"value": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_ioc_items_description_trgm", "description", postgresql_using="gin",
+              postgresql_ops={"description": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_ioc_items_context_trgm", "context", postgresql_using="gin",
+              postgresql_ops={"context": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_ioc_items_source_trgm", "source", postgresql_using="gin",
+              postgresql_ops={"source": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(String(50), primary_key=True, default=generate_ioc_id)
     value = Column(String(1024), nullable=False, index=True)
@@ -95,6 +110,19 @@ class IocItem(Base):
         }
 
 
+event.listen(
+    IocItem.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
+@event.listens_for(IocItem.__table__, "after_create")
+def _create_ioc_search_index(target, connection, **kw):
+    """Índice FTS5 de búsqueda en SQLite al crear la tabla"""
+    from api.services.ioc_search import ensure_search_index
+    ensure_search_index(connection)
+
+
 class IocTag(Base):
     """
     Tags para categorizar IOCs.
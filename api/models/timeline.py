@@ -4,7 +4,7 @@ Modelos de datos para Timeline de Incidentes
 Eventos ordenados cronológicamente con correlación
 """
 
-from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, JSON, Float
+from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, JSON, Float, Index
 from datetime import datetime
 
 from api.database import Base
@@ -13,6 +13,12 @@ from api.database import Base
 class TimelineEvent(Base):
     """Evento individual en la línea de tiempo"""
     __tablename__ = 'timeline_events'
+    __table_args__ = (
+        # v4.7: Rangos por caso ordenados por tiempo (paginación keyset)
+        Index('ix_timeline_events_case_time', 'case_id', 'event_time', 'event_id'),
+        Index('ix_timeline_events_source', 'data_source'),
+        Index('ix_timeline_events_type', 'event_type'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     event_id = Column(String(50), unique=True, nullable=False, index=True)
@@ -70,6 +76,7 @@ class TimelineEvent(Base):
     
     # Correlación
     correlation_id = Column(String(50), nullable=True, index=True)
+    correlation_ids = Column(JSON, default=list)  # Correlaciones manuales
     parent_event_id = Column(String(50), nullable=True)
     related_events = Column(JSON, default=list)
     
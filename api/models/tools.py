@@ -5,7 +5,7 @@ Modelos para ejecución de herramientas Kali con soporte híbrido MCP + Agents
 
 from sqlalchemy import (
     Column, String, Integer, Float, Boolean, DateTime, Text, JSON, 
-    ForeignKey, Index
+    ForeignKey, Index, LargeBinary
 )
 from datetime import datetime
 from enum import Enum
@@ -309,6 +309,39 @@ class AgentTask(Base):
         return f"TASK-{uuid.uuid4().hex[:8].upper()}"
 
 
+class AgentQueueTaskRecord(Base):
+    """
+    Tarea persistida de AgentQueue (modo durable).
+    Estados: queued, running (con lease), done, failed (reintento pendiente),
+    dead_letter (reintentos agotados) y cancelled.
+    """
+    __tablename__ = "agent_queue_tasks"
+    
+    id = Column(String(50), primary_key=True)  # task_xxxxxxxxxxxx
+    handler = Column(String(200), nullable=False)  # nombre registrado de la función
+    kwargs = Column(JSON, default={})
+    priority = Column(Integer, nullable=False)
+    agent_type = Column(String(20), nullable=False)
+    case_id = Column(String(50), index=True)
+    investigation_id = Column(String(50))
+    
+    # Estado y lease
+    state = Column(String(20), default="queued", nullable=False, index=True)
+    attempts = Column(Integer, default=0)
+    max_retries = Column(Integer, default=3)
+    available_at = Column(DateTime, default=datetime.utcnow)  # no antes de (backoff)
+    lease_owner = Column(String(100))  # host:pid:nonce del worker
+    lease_expires_at = Column(DateTime, index=True)
+    
+    # Resultado
+    result = Column(JSON)
+    last_error = Column(Text)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime)
+
+
 class AgentCapability(Base):
     """
     Capacidad/herramienta instalada en un agente.
@@ -426,6 +459,7 @@ class StepActionType(str, Enum):
     RUN_CORRELATION = "run_correlation"
     APPROVAL_GATE = "approval_gate"
     WAIT = "wait"
+    MAP = "map"  # Fan-out: aplica una acción sobre cada elemento de una lista del contexto
 
 
 class Playbook(Base):
@@ -494,6 +528,44 @@ class Playbook(Base):
         }
 
 
+class PlaybookStep(Base):
+    """
+    Paso de un playbook (tabla ``playbook_steps`` del esquema v4.1).
+    ``order``, ``parameters`` y ``timeout_seconds`` usan las columnas
+    existentes ``step_number``, ``action_config`` y ``timeout``.
+    """
+    __tablename__ = "playbook_steps"
+    
+    id = Column(String(50), primary_key=True)  # {playbook_id}-SNN
+    playbook_id = Column(String(50), ForeignKey("playbooks.id"), nullable=False, index=True)
+    order = Column("step_number", Integer, nullable=False)
+    name = Column(String(200))
+    description = Column(Text)
+    
+    # Acción
+    action_type = Column(String(30), nullable=False)
+    tool_id = Column(String(100))
+    api_endpoint = Column(String(500))
+    api_method = Column(String(10))
+    parameters = Column("action_config", JSON, default={})
+    target_from = Column(String(200))  # Ruta en el contexto de la que sale el target
+    
+    # Control de flujo
+    condition = Column(Text)  # Expresión (api.services.soar_conditions)
+    wait_for_completion = Column(Boolean, default=True)
+    timeout_seconds = Column("timeout", Integer, default=300)
+    continue_on_error = Column(Boolean, default=False)
+    requires_approval = Column(Boolean, default=False)
+    
+    # Grafo de pasos y fan-out (v4.7)
+    depends_on = Column(JSON)  # [orders] de los que depende; None = secuencial
+    map_over = Column(String(200))  # Lista del contexto sobre la que iterar (pasos MAP)
+    map_action = Column(JSON)  # Plantilla de acción aplicada a cada elemento
+    max_concurrency = Column(Integer)  # Elementos simultáneos en pasos MAP
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class PlaybookExecution(Base):
     """Registro de ejecución de playbook"""
     __tablename__ = "playbook_executions"
@@ -528,6 +600,76 @@ class PlaybookExecution(Base):
         return f"PEXE-{uuid.uuid4().hex[:8].upper()}"
 
 
+class PlaybookStepExecution(Base):
+    """Registro de ejecución de un paso (una fila por ejecución y ``order``)"""
+    __tablename__ = "playbook_step_executions"
+    
+    id = Column(String(60), primary_key=True)  # {execution_id}-{order:02d}
+    playbook_execution_id = Column(String(50), ForeignKey("playbook_executions.id"), nullable=False, index=True)
+    step_id = Column(String(50))
+    step_order = Column(Integer, nullable=False)
+    
+    status = Column(String(20), default="running")
+    output = Column(JSON, default={})
+    tool_execution_id = Column(String(50))  # ToolExecution lanzada por el paso
+    
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+
+class PlaybookExecutionCheckpoint(Base):
+    """
+    Checkpoint reanudable de una ejecución de playbook.
+    Guarda el contexto comprimido (sin resultados de pasos) y el worker dueño.
+    """
+    __tablename__ = "playbook_execution_checkpoints"
+    
+    execution_id = Column(String(50), ForeignKey("playbook_executions.id"), primary_key=True)
+    context_blob = Column(LargeBinary)  # JSON compacto comprimido (zstd/zlib)
+    codec = Column(String(10), default="zlib")
+    owner = Column(String(100), index=True)  # host:pid:nonce del worker
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, index=True)
+    resume_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PlaybookStepResult(Base):
+    """Resultado de un paso, con clave de idempotencia para no repetirlo al reanudar"""
+    __tablename__ = "playbook_step_results"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    execution_id = Column(String(50), ForeignKey("playbook_executions.id"), nullable=False, index=True)
+    step_order = Column(Integer, nullable=False)
+    idempotency_key = Column(String(64), nullable=False, unique=True)
+    status = Column(String(20), nullable=False)
+    result = Column(JSON, default={})
+    completed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SecurityPolicy(Base):
+    """
+    Política de seguridad (tabla ``security_policies`` del esquema v4.1).
+    ``is_active`` usa la columna existente ``is_enabled``; ``tenant_id`` y
+    ``redteam_enabled`` habilitan playbooks Red por tenant.
+    """
+    __tablename__ = "security_policies"
+    
+    id = Column(String(50), primary_key=True)
+    name = Column(String(200), nullable=False)
+    description = Column(Text)
+    policy_type = Column(String(50), nullable=False)
+    rules = Column(JSON, default={})
+    is_active = Column("is_enabled", Boolean, default=True)
+    priority = Column(Integer, default=0)
+    
+    tenant_id = Column(String(50), index=True)
+    redteam_enabled = Column(Boolean, default=False)
+    
+    created_by = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 # =============================================================================
 # CORRELATION MODELS
 # =============================================================================
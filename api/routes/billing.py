@@ -30,6 +30,7 @@ from api.middleware.usage_tracking import usage_metrics_service, ApiUsage
 from api.services.stripe_service import get_stripe_service
 from api.services.billing_service import get_billing_service
 from api.middleware.auth import verify_api_key
+from api.middleware.subscription import invalidate_entitlements
 
 logger = logging.getLogger(__name__)
 
@@ -128,6 +129,7 @@ async def create_subscription(request: CreateSubscriptionRequest):
 
         # Save to local database
         await billing_service.save_subscription(subscription.id, request.tenant_id)
+        invalidate_entitlements(request.tenant_id)
 
         return subscription
 
@@ -169,6 +171,8 @@ async def cancel_subscription(subscription_id: str, at_period_end: bool = True):
             subscription_id=subscription_id,
             at_period_end=at_period_end,
         )
+        # The tenant is not known here: drop every cached entitlement
+        invalidate_entitlements()
         return subscription
 
     except Exception as e:
@@ -543,6 +547,7 @@ async def process_webhook_event(event: dict):
             tenant_id = event_data["metadata"].get("tenant_id")
             if tenant_id:
                 await billing_service.save_subscription(subscription_id, tenant_id)
+                invalidate_entitlements(tenant_id)
 
         elif event_type == "customer.subscription.updated":
             # Update subscription
@@ -550,10 +555,12 @@ async def process_webhook_event(event: dict):
             tenant_id = event_data["metadata"].get("tenant_id")
             if tenant_id:
                 await billing_service.save_subscription(subscription_id, tenant_id)
+                invalidate_entitlements(tenant_id)
 
         elif event_type == "customer.subscription.deleted":
             # Handle subscription cancellation
             subscription_id = event_data["id"]
+            invalidate_entitlements(event_data.get("metadata", {}).get("tenant_id"))
             logger.info(f"📌 Subscription canceled: {subscription_id}")
 
         logger.info(f"✅ Webhook processed: {event_type}")
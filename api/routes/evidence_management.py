@@ -12,7 +12,7 @@ import logging
 from pathlib import Path
 
 from api.database import get_db
-from api.services.evidence_service import evidence_service
+from api.services.evidence_service import evidence_service, EvidenceTooLargeError
 from api.services.command_logger import command_logger
 from api.models.evidence_management import ExternalEvidence, CommandLog
 
@@ -126,6 +126,8 @@ async def upload_evidence(
             "message": "Evidence uploaded successfully",
         }
 
+    except EvidenceTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error uploading evidence: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
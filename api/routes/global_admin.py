@@ -15,6 +15,7 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel, Field
 
 from api.middleware.auth import get_current_user, require_global_admin
+from api.middleware.subscription import invalidate_entitlements
 from api.services import roles_service
 from api.config import get_settings
 
@@ -402,6 +403,7 @@ async def update_tenant_status(
             conn.commit()
         
         conn.close()
+        invalidate_entitlements(tenant_id)
         
         logger.info(f"✅ Estado de tenant {tenant['name']} cambiado a {status}")
         
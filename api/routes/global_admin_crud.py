@@ -25,6 +25,7 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 
 from api.middleware.auth import get_current_user, require_global_admin
+from api.middleware.subscription import invalidate_entitlements
 
 logger = logging.getLogger(__name__)
 
@@ -597,6 +598,7 @@ async def create_tenant(
             conn.commit()
         
         conn.close()
+        invalidate_entitlements(tenant_uuid)
         
         logger.info(f"✅ Tenant creado: {tenant_data.name}")
         
@@ -361,6 +361,15 @@ async def get_mitre_coverage():
     }
 
 
+@router.get("/cache/stats")
+async def get_hunt_cache_stats():
+    """
+    Estadísticas de la cache de resultados de hunting (v4.7):
+    aciertos, fallos, desalojos por tamaño y caducados por TTL
+    """
+    return hunting_service.results_cache.stats()
+
+
 @router.delete("/results/{case_id}/{hunt_id}")
 async def delete_hunt_result(case_id: str, hunt_id: str):
     """Eliminar resultado de un hunt"""
@@ -394,14 +403,14 @@ async def execute_batch_hunts(
     if not valid_hunts:
         raise HTTPException(status_code=400, detail="Ningún hunt válido especificado")
     
-    # Ejecutar cada hunt válido
-    for hunt_id in valid_hunts:
-        background_tasks.add_task(
-            hunting_service.execute_hunt,
-            query_id=hunt_id,
-            tenant_id=tenant_id,
-            time_range="7d"
-        )
+    # v4.7: Un solo batch concurrente (límite y timeout por hunt)
+    background_tasks.add_task(
+        hunting_service.batch_execute,
+        query_ids=valid_hunts,
+        case_id=case_id,
+        tenant_id=tenant_id,
+        time_range="7d"
+    )
     
     return {
         "batch_id": f"batch-{datetime.now().strftime('%Y%m%d%H%M%S')}",
@@ -4,19 +4,27 @@ Con persistencia real en BD SQLAlchemy y notificaciones WebSocket
 """
 
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from enum import Enum
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func
+from sqlalchemy import and_, or_
+import asyncio
 import json
-import csv
-import io
 import logging
 
+from api.config import settings
 from api.database import get_db
 from api.models.ioc import IocItem, IocTag, IocItemTag, IocEnrichment, IocSighting
+from api.services.ioc_search import IocSearchFilter, search_iocs
+from api.services.ioc_export import EXPORT_FORMATS, export_filename, stream_export
+from api.services.ioc_enrichment import apply_confidence, enrich_concurrently
+from api.services.ioc_hits import ioc_hits
+from api.services.ioc_matcher import ioc_matcher
+from api.services.ioc_scan import SightingBatcher, iter_file, scan_chunks
+from api.services.ioc_stats import ioc_stats
 from api.services.websocket_manager import (
     notify_ioc_created,
     notify_ioc_updated,
@@ -128,10 +136,12 @@ class IOCResponse(BaseModel):
 
 class IOCListResponse(BaseModel):
     items: List[IOCResponse]
-    total: int
+    total: Optional[int]
     page: int
     limit: int
-    pages: int
+    pages: Optional[int]
+    next_cursor: Optional[str] = None
+    total_approximate: bool = False
 
 
 class IOCBulkCreate(BaseModel):
@@ -166,6 +176,19 @@ class LinkToCaseRequest(BaseModel):
     reason: Optional[str] = None
 
 
+class IOCScanRequest(BaseModel):
+    """Evidencia a barrer: ruta local (``path``) o objeto MinIO (``tenant_id`` + ``file_name``)"""
+    case_id: str
+    path: Optional[str] = None  # relativa a EVIDENCE_DIR/<case_id>
+    tenant_id: Optional[str] = None
+    file_name: Optional[str] = None
+    evidence_type: str = "evidence"
+    record_sightings: bool = True
+    source_system: str = "evidence_scan"
+    source_host: Optional[str] = None
+    max_matches: Optional[int] = Field(None, ge=0, le=10000)
+
+
 # ============================================================================
 # HELPERS
 # ============================================================================
@@ -202,6 +225,47 @@ def ioc_to_response(ioc: IocItem) -> Dict:
     }
 
 
+def ioc_hit_response(ioc: IocItem) -> Dict:
+    """ioc_to_response con los hits aún no volcados a BD"""
+    response = ioc_to_response(ioc)
+    pending = ioc_hits.pending(ioc.id)
+    if pending:
+        count, last_hit = pending
+        response["hit_count"] += count
+        response["last_seen"] = last_hit.isoformat()
+    return response
+
+
+def _search_response(
+    db: Session,
+    flt: IocSearchFilter,
+    sort: str,
+    page: int,
+    limit: int,
+    cursor: Optional[str],
+    count: str,
+) -> Dict:
+    """Ejecuta la búsqueda y arma la respuesta paginada de listados"""
+    try:
+        result = search_iocs(
+            db, flt, sort=sort, cursor=cursor, limit=limit,
+            offset=(page - 1) * limit, count=count,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    total = result.total
+    return {
+        "items": [ioc_to_response(ioc) for ioc in result.items],
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "pages": (total + limit - 1) // limit if total is not None else None,
+        "next_cursor": result.next_cursor,
+        "total_approximate": result.total_approximate,
+    }
+
+
 # ============================================================================
 # CRUD ENDPOINTS
 # ============================================================================
@@ -217,57 +281,27 @@ async def list_iocs(
     source: Optional[str] = None,
     case_id: Optional[str] = None,
     tags: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|approximate|none)$"),
     db: Session = Depends(get_db)
 ):
     """
     Lista IOCs con paginación y filtros.
-    """
-    query = db.query(IocItem)
     
-    # Aplicar filtros
-    if search:
-        query = query.filter(
-            or_(
-                IocItem.value.ilike(f"%{search}%"),
-                IocItem.description.ilike(f"%{search}%")
-            )
-        )
-    
-    if ioc_type:
-        query = query.filter(IocItem.ioc_type == ioc_type)
-    
-    if threat_level:
-        query = query.filter(IocItem.threat_level == threat_level)
-    
-    if status:
-        query = query.filter(IocItem.status == status)
-    
-    if source:
-        query = query.filter(IocItem.source == source)
-    
-    if case_id:
-        query = query.filter(IocItem.case_id == case_id)
-    
-    if tags:
-        # Filtrar por tags (IOC debe tener al menos uno de los tags)
-        query = query.join(IocItemTag).join(IocTag).filter(IocTag.name.in_(tags))
-    
-    # Contar total
-    total = query.count()
-    
-    # Paginación
-    offset = (page - 1) * limit
-    iocs = query.order_by(IocItem.created_at.desc()).offset(offset).limit(limit).all()
-    
-    pages = (total + limit - 1) // limit
-    
-    return {
-        "items": [ioc_to_response(ioc) for ioc in iocs],
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "pages": pages
-    }
+    Para páginas profundas usar ``cursor`` (el ``next_cursor`` de la respuesta
+    anterior) en lugar de ``page``; ``count=approximate|none`` evita el conteo
+    exacto sobre tablas grandes.
+    """
+    flt = IocSearchFilter(
+        text=search,
+        ioc_types=[ioc_type] if ioc_type else None,
+        threat_levels=[threat_level] if threat_level else None,
+        statuses=[status] if status else None,
+        sources=[source] if source else None,
+        case_id=case_id,
+        tags=tags,
+    )
+    return _search_response(db, flt, "recent", page, limit, cursor, count)
 
 
 @router.post("/", response_model=IOCResponse, status_code=201)
@@ -335,69 +369,126 @@ async def create_ioc(
 async def get_ioc_stats(db: Session = Depends(get_db)):
     """
     Obtiene estadísticas del IOC Store.
+    
+    Servidas desde los contadores incrementales de ``ioc_stats``; la BD sólo
+    se consulta (una vez) al reagregar.
+    """
+    return ioc_stats.snapshot(db)
+
+
+@router.get("/lookup")
+async def lookup_ioc(
+    value: str = Query(..., min_length=1),
+    db: Session = Depends(get_db)
+):
     """
-    total = db.query(IocItem).count()
-    
-    # Por tipo
-    by_type = {}
-    type_counts = db.query(
-        IocItem.ioc_type, func.count(IocItem.id)
-    ).group_by(IocItem.ioc_type).all()
-    for ioc_type, count in type_counts:
-        by_type[ioc_type] = count
-    
-    # Por nivel de amenaza
-    by_threat_level = {}
-    threat_counts = db.query(
-        IocItem.threat_level, func.count(IocItem.id)
-    ).group_by(IocItem.threat_level).all()
-    for level, count in threat_counts:
-        by_threat_level[level] = count
-    
-    # Por fuente
-    by_source = {}
-    source_counts = db.query(
-        IocItem.source, func.count(IocItem.id)
-    ).group_by(IocItem.source).all()
-    for source, count in source_counts:
-        by_source[source] = count
-    
-    # Por estado
-    by_status = {}
-    status_counts = db.query(
-        IocItem.status, func.count(IocItem.id)
-    ).group_by(IocItem.status).all()
-    for status, count in status_counts:
-        by_status[status] = count
-    
-    # Promedio de confianza
-    avg_confidence = db.query(func.avg(IocItem.confidence_score)).scalar() or 0
-    
-    # Top tags
-    top_tags = {}
-    tag_counts = db.query(
-        IocTag.name, func.count(IocItemTag.id)
-    ).join(IocItemTag).group_by(IocTag.name).order_by(func.count(IocItemTag.id).desc()).limit(10).all()
-    for tag_name, count in tag_counts:
-        top_tags[tag_name] = count
-    
-    # IOCs recientes (últimas 24h)
-    yesterday = datetime.utcnow() - timedelta(days=1)
-    recent_count = db.query(IocItem).filter(IocItem.created_at >= yesterday).count()
+    Busca un IOC específico por valor exacto.
+    """
+    iocs = db.query(IocItem).filter(IocItem.value == value).all()
+    
+    if not iocs:
+        return {"found": False, "value": value, "matches": []}
+    
+    # Hit diferido: se vuelca en lote, la lectura no escribe
+    ioc_hits.record(ioc.id for ioc in iocs)
     
     return {
-        "total": total,
-        "by_type": by_type,
-        "by_threat_level": by_threat_level,
-        "by_source": by_source,
-        "by_status": by_status,
-        "average_confidence": round(avg_confidence, 2),
-        "top_tags": top_tags,
-        "recent_24h": recent_count,
-        "generated_at": datetime.utcnow().isoformat()
+        "found": True,
+        "value": value,
+        "matches": [ioc_hit_response(ioc) for ioc in iocs]
     }
 
 
+@router.get("/export")
+async def export_iocs(
+    format: str = Query("json", enum=list(EXPORT_FORMATS)),
+    ioc_type: Optional[str] = None,
+    threat_level: Optional[str] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    case_id: Optional[str] = None,
+    search: Optional[str] = None,
+    gzip: bool = False,
+):
+    """
+    Exporta IOCs en diferentes formatos (csv, ndjson, json, stix, misp).
+    
+    La respuesta es un flujo (descarga como adjunto) con memoria constante;
+    ``gzip=true`` comprime al vuelo.
+    """
+    flt = IocSearchFilter(
+        text=search,
+        ioc_types=[ioc_type] if ioc_type else None,
+        threat_levels=[threat_level] if threat_level else None,
+        statuses=[status] if status else None,
+        sources=[source] if source else None,
+        case_id=case_id,
+    )
+    media_type = "application/gzip" if gzip else EXPORT_FORMATS[format][0]
+    filename = export_filename(format, compress=gzip)
+    
+    # La sesión la abre el propio flujo: la de get_db se cierra antes de enviar el cuerpo
+    return StreamingResponse(
+        stream_export(format, flt, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/scan")
+async def scan_evidence(request: IOCScanRequest):
+    """
+    Barre un archivo de evidencia contra los IOCs activos.
+    
+    El archivo (local bajo EVIDENCE_DIR/<case_id> o en MinIO; ``.gz`` se
+    descomprime al vuelo) se lee por bloques y se compara línea a línea, con
+    memoria acotada aunque ocupe varios GB. Devuelve las coincidencias con su
+    desplazamiento en bytes y número de línea, el recuento por IOC y el
+    throughput en MB/s. Los avistamientos se insertan por lotes.
+    """
+    if request.path:
+        case_dir = (settings.EVIDENCE_DIR / request.case_id).resolve()
+        path = (case_dir / request.path).resolve()
+        if not case_dir.is_relative_to(settings.EVIDENCE_DIR.resolve()) or not path.is_relative_to(case_dir):
+            raise HTTPException(status_code=400, detail="Ruta fuera del directorio de evidencias del caso")
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail="Archivo de evidencia no encontrado")
+        source = str(path.relative_to(case_dir))
+        chunks = iter_file(path)
+    elif request.tenant_id and request.file_name:
+        from api.services.minio_storage import MINIO_AVAILABLE, get_minio_service
+        if not MINIO_AVAILABLE:
+            raise HTTPException(status_code=503, detail="MinIO no disponible")
+        source = f"{request.evidence_type}/{request.file_name}"
+        chunks = get_minio_service().stream_evidence(
+            request.tenant_id, request.case_id, request.file_name,
+            evidence_type=request.evidence_type, chunk_size=settings.IOC_SCAN_CHUNK_BYTES,
+        )
+    else:
+        raise HTTPException(status_code=400, detail="Indica path o tenant_id + file_name")
+    
+    await ioc_matcher.ensure_fresh()
+    sightings = SightingBatcher(
+        source_system=request.source_system,
+        source_host=request.source_host,
+        case_id=request.case_id,
+    ) if request.record_sightings else None
+    
+    # Lectura y comparación fuera del event loop
+    report = await asyncio.to_thread(
+        scan_chunks, chunks, ioc_matcher.index, source,
+        sightings=sightings, max_matches=request.max_matches,
+    )
+    if report.per_ioc:
+        ioc_hits.record_counts(report.per_ioc)
+    
+    logger.info(
+        f"🔎 Barrido {source} ({request.case_id}): {report.match_count} coincidencias, "
+        f"{report.bytes_scanned} bytes, {report.throughput_mb_s} MB/s"
+    )
+    return {"case_id": request.case_id, **report.as_dict()}
+
+
 # ==================== RUTAS CON PARÁMETROS DINÁMICOS ====================
 
 @router.get("/{ioc_id}", response_model=IOCResponse)
@@ -410,12 +501,10 @@ async def get_ioc(ioc_id: str, db: Session = Depends(get_db)):
     if not ioc:
         raise HTTPException(status_code=404, detail="IOC no encontrado")
     
-    # Incrementar hit count
-    ioc.hit_count = (ioc.hit_count or 0) + 1
-    ioc.last_seen = datetime.utcnow()
-    db.commit()
+    # Hit diferido: se vuelca en lote, la lectura no escribe
+    ioc_hits.record([ioc.id])
     
-    return ioc_to_response(ioc)
+    return ioc_hit_response(ioc)
 
 
 @router.put("/{ioc_id}", response_model=IOCResponse)
@@ -614,93 +703,29 @@ async def advanced_search(
     search_query: IOCSearchQuery,
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|approximate|none)$"),
     db: Session = Depends(get_db)
 ):
     """
     Búsqueda avanzada de IOCs.
     """
-    query = db.query(IocItem)
-    
-    if search_query.query:
-        query = query.filter(
-            or_(
-                IocItem.value.ilike(f"%{search_query.query}%"),
-                IocItem.description.ilike(f"%{search_query.query}%"),
-                IocItem.context.ilike(f"%{search_query.query}%")
-            )
-        )
-    
-    if search_query.ioc_types:
-        types = [t.value for t in search_query.ioc_types]
-        query = query.filter(IocItem.ioc_type.in_(types))
-    
-    if search_query.threat_levels:
-        levels = [l.value for l in search_query.threat_levels]
-        query = query.filter(IocItem.threat_level.in_(levels))
-    
-    if search_query.sources:
-        sources = [s.value for s in search_query.sources]
-        query = query.filter(IocItem.source.in_(sources))
-    
-    if search_query.statuses:
-        statuses = [s.value for s in search_query.statuses]
-        query = query.filter(IocItem.status.in_(statuses))
-    
-    if search_query.case_id:
-        query = query.filter(IocItem.case_id == search_query.case_id)
-    
-    if search_query.date_from:
-        query = query.filter(IocItem.created_at >= search_query.date_from)
-    
-    if search_query.date_to:
-        query = query.filter(IocItem.created_at <= search_query.date_to)
-    
-    if search_query.min_confidence:
-        query = query.filter(IocItem.confidence_score >= search_query.min_confidence)
-    
-    if search_query.tags:
-        query = query.join(IocItemTag).join(IocTag).filter(IocTag.name.in_(search_query.tags))
-    
-    total = query.count()
-    offset = (page - 1) * limit
-    iocs = query.order_by(IocItem.confidence_score.desc()).offset(offset).limit(limit).all()
-    
-    return {
-        "items": [ioc_to_response(ioc) for ioc in iocs],
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "pages": (total + limit - 1) // limit
-    }
+    flt = IocSearchFilter(
+        text=search_query.query,
+        ioc_types=[t.value for t in search_query.ioc_types] if search_query.ioc_types else None,
+        threat_levels=[l.value for l in search_query.threat_levels] if search_query.threat_levels else None,
+        sources=[s.value for s in search_query.sources] if search_query.sources else None,
+        statuses=[s.value for s in search_query.statuses] if search_query.statuses else None,
+        tags=search_query.tags,
+        case_id=search_query.case_id,
+        date_from=search_query.date_from,
+        date_to=search_query.date_to,
+        min_confidence=search_query.min_confidence,
+    )
+    return _search_response(db, flt, "confidence", page, limit, cursor, count)
 
 
-# NOTA: El endpoint /stats fue movido antes de /{ioc_id} para evitar conflictos de rutas
-
-
-@router.get("/lookup")
-async def lookup_ioc(
-    value: str = Query(..., min_length=1),
-    db: Session = Depends(get_db)
-):
-    """
-    Busca un IOC específico por valor exacto.
-    """
-    iocs = db.query(IocItem).filter(IocItem.value == value).all()
-    
-    if not iocs:
-        return {"found": False, "value": value, "matches": []}
-    
-    # Incrementar hit count
-    for ioc in iocs:
-        ioc.hit_count = (ioc.hit_count or 0) + 1
-        ioc.last_seen = datetime.utcnow()
-    db.commit()
-    
-    return {
-        "found": True,
-        "value": value,
-        "matches": [ioc_to_response(ioc) for ioc in iocs]
-    }
+# NOTA: /stats, /lookup y /export van antes de /{ioc_id} para evitar conflictos de rutas
 
 
 # ============================================================================
@@ -889,117 +914,6 @@ async def import_from_stix(
     }
 
 
-@router.get("/export")
-async def export_iocs(
-    format: str = Query("json", enum=["json", "csv", "stix", "misp"]),
-    ioc_type: Optional[str] = None,
-    threat_level: Optional[str] = None,
-    status: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    """
-    Exporta IOCs en diferentes formatos.
-    """
-    query = db.query(IocItem)
-    
-    if ioc_type:
-        query = query.filter(IocItem.ioc_type == ioc_type)
-    if threat_level:
-        query = query.filter(IocItem.threat_level == threat_level)
-    if status:
-        query = query.filter(IocItem.status == status)
-    
-    iocs = query.all()
-    
-    if format == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["id", "value", "type", "threat_level", "confidence", "status", "source", "description", "created_at"])
-        
-        for ioc in iocs:
-            writer.writerow([
-                ioc.id,
-                ioc.value,
-                ioc.ioc_type,
-                ioc.threat_level,
-                ioc.confidence_score,
-                ioc.status,
-                ioc.source,
-                ioc.description or "",
-                ioc.created_at.isoformat() if ioc.created_at else ""
-            ])
-        
-        return {
-            "format": "csv",
-            "count": len(iocs),
-            "content": output.getvalue()
-        }
-    
-    elif format == "stix":
-        stix_objects = []
-        for ioc in iocs:
-            stix_objects.append({
-                "type": "indicator",
-                "id": f"indicator--{ioc.id}",
-                "created": ioc.created_at.isoformat() if ioc.created_at else datetime.utcnow().isoformat(),
-                "name": f"{ioc.ioc_type}: {ioc.value[:50]}",
-                "pattern": f"[{ioc.ioc_type}:value = '{ioc.value}']",
-                "pattern_type": "stix",
-                "valid_from": ioc.first_seen.isoformat() if ioc.first_seen else datetime.utcnow().isoformat()
-            })
-        
-        return {
-            "format": "stix",
-            "count": len(iocs),
-            "stix": {
-                "type": "bundle",
-                "id": f"bundle--export-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
-                "objects": stix_objects
-            }
-        }
-    
-    elif format == "misp":
-        attributes = []
-        type_mapping = {
-            "ip": "ip-dst",
-            "domain": "domain",
-            "url": "url",
-            "email": "email-dst",
-            "hash_md5": "md5",
-            "hash_sha1": "sha1",
-            "hash_sha256": "sha256",
-            "file_name": "filename"
-        }
-        
-        for ioc in iocs:
-            misp_type = type_mapping.get(ioc.ioc_type, "text")
-            attributes.append({
-                "type": misp_type,
-                "value": ioc.value,
-                "comment": ioc.description or "",
-                "uuid": ioc.id,
-                "timestamp": str(int(ioc.created_at.timestamp())) if ioc.created_at else ""
-            })
-        
-        return {
-            "format": "misp",
-            "count": len(iocs),
-            "misp": {
-                "Event": {
-                    "info": f"IOC Export - {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}",
-                    "Attribute": attributes
-                }
-            }
-        }
-    
-    else:  # json
-        return {
-            "format": "json",
-            "count": len(iocs),
-            "items": [ioc_to_response(ioc) for ioc in iocs]
-        }
-
-
 # ============================================================================
 # ENRICHMENT
 # ============================================================================
@@ -1020,159 +934,37 @@ async def enrich_ioc(
     - fullcontact_person: Enriquecimiento de emails (nombre, cargo, empresa, redes sociales)
     - fullcontact_company: Enriquecimiento de dominios (empresa, empleados, industria)
     - shodan: Inteligencia de IPs/puertos
+    
+    Las fuentes se consultan en paralelo con timeout por fuente
+    (IOC_ENRICH_SOURCE_TIMEOUT) y plazo global (IOC_ENRICH_DEADLINE); si
+    vence el plazo se devuelven los resultados parciales con ``partial``.
     """
     ioc = db.query(IocItem).filter(IocItem.id == ioc_id).first()
     
     if not ioc:
         raise HTTPException(status_code=404, detail="IOC no encontrado")
     
-    enrichment_results = {}
-    new_confidence = ioc.confidence_score or 50.0
-    
-    for source in sources:
-        try:
-            if source == "virustotal":
-                # TODO: Integrar con API real de VirusTotal
-                enrichment_results["virustotal"] = {
-                    "malicious": 15,
-                    "suspicious": 3,
-                    "harmless": 42,
-                    "undetected": 10,
-                    "last_analysis_date": datetime.utcnow().isoformat()
-                }
-                if enrichment_results["virustotal"]["malicious"] > 10:
-                    new_confidence = min(95, new_confidence + 20)
-            
-            elif source == "abuseipdb":
-                # TODO: Integrar con API real de AbuseIPDB
-                enrichment_results["abuseipdb"] = {
-                    "abuse_confidence_score": 85,
-                    "total_reports": 45,
-                    "country_code": "RU",
-                    "isp": "Unknown ISP"
-                }
-                if enrichment_results["abuseipdb"]["abuse_confidence_score"] > 50:
-                    new_confidence = min(95, new_confidence + 15)
-            
-            elif source == "fullcontact_person" or source == "fullcontact":
-                # Enriquecimiento de persona con FullContact (para emails)
-                if ioc.type == "email":
-                    from api.services.fullcontact_service import enrich_person_by_email
-                    fc_result = await enrich_person_by_email(ioc.value)
-                    
-                    if fc_result.get("success"):
-                        enrichment_results["fullcontact_person"] = {
-                            "fullName": fc_result.get("fullName"),
-                            "title": fc_result.get("title"),
-                            "organization": fc_result.get("organization"),
-                            "location": fc_result.get("location"),
-                            "twitter": fc_result.get("twitter"),
-                            "linkedin": fc_result.get("linkedin"),
-                            "avatar": fc_result.get("avatar"),
-                            "bio": fc_result.get("bio"),
-                            "ageRange": fc_result.get("ageRange"),
-                            "gender": fc_result.get("gender"),
-                            "enriched_at": fc_result.get("enriched_at")
-                        }
-                        # Si encontramos info de persona, podría indicar cuenta legítima comprometida
-                        if fc_result.get("fullName"):
-                            new_confidence = max(30, new_confidence - 10)  # Reducir si parece legítimo
-                    else:
-                        enrichment_results["fullcontact_person"] = {
-                            "error": fc_result.get("error", "Unknown error"),
-                            "found": False
-                        }
-                else:
-                    enrichment_results["fullcontact_person"] = {
-                        "skipped": True,
-                        "reason": f"FullContact person only applies to email IOCs, got {ioc.type}"
-                    }
-            
-            elif source == "fullcontact_company":
-                # Enriquecimiento de empresa con FullContact (para dominios)
-                if ioc.type == "domain":
-                    from api.services.fullcontact_service import enrich_company_by_domain
-                    fc_result = await enrich_company_by_domain(ioc.value)
-                    
-                    if fc_result.get("success"):
-                        enrichment_results["fullcontact_company"] = {
-                            "name": fc_result.get("name"),
-                            "description": fc_result.get("description"),
-                            "founded": fc_result.get("founded"),
-                            "employees": fc_result.get("employees"),
-                            "employeesRange": fc_result.get("employeesRange"),
-                            "industry": fc_result.get("industry"),
-                            "website": fc_result.get("website"),
-                            "social": fc_result.get("social"),
-                            "logo": fc_result.get("logo"),
-                            "location": fc_result.get("location"),
-                            "enriched_at": fc_result.get("enriched_at")
-                        }
-                        # Si es empresa conocida, podría ser dominio legítimo comprometido
-                        if fc_result.get("name") and fc_result.get("employees"):
-                            new_confidence = max(25, new_confidence - 15)  # Reducir si parece legítimo
-                    else:
-                        enrichment_results["fullcontact_company"] = {
-                            "error": fc_result.get("error", "Unknown error"),
-                            "found": False
-                        }
-                else:
-                    enrichment_results["fullcontact_company"] = {
-                        "skipped": True,
-                        "reason": f"FullContact company only applies to domain IOCs, got {ioc.type}"
-                    }
-            
-            elif source == "shodan":
-                # Enriquecimiento con Shodan (para IPs)
-                if ioc.type == "ip":
-                    from api.services.threat_intel import shodan_ip_lookup
-                    shodan_result = await shodan_ip_lookup(ioc.value)
-                    
-                    if shodan_result.get("success"):
-                        enrichment_results["shodan"] = {
-                            "organization": shodan_result.get("organization"),
-                            "isp": shodan_result.get("isp"),
-                            "country": shodan_result.get("country"),
-                            "city": shodan_result.get("city"),
-                            "ports": shodan_result.get("ports", []),
-                            "hostnames": shodan_result.get("hostnames", []),
-                            "vulns": shodan_result.get("vulns", []),
-                            "tags": shodan_result.get("tags", [])
-                        }
-                        # Más puertos abiertos = más sospechoso
-                        if len(shodan_result.get("ports", [])) > 10:
-                            new_confidence = min(90, new_confidence + 10)
-                        # Vulnerabilidades conocidas = muy sospechoso
-                        if shodan_result.get("vulns"):
-                            new_confidence = min(95, new_confidence + 20)
-                    else:
-                        enrichment_results["shodan"] = {
-                            "error": shodan_result.get("error", "Unknown error")
-                        }
-                else:
-                    enrichment_results["shodan"] = {
-                        "skipped": True,
-                        "reason": f"Shodan only applies to IP IOCs, got {ioc.type}"
-                    }
-            
-            # Guardar enrichment en BD
-            enrichment = IocEnrichment(
-                ioc_id=ioc.id,
-                source=source,
-                reputation_score=new_confidence,
-                raw_response=enrichment_results.get(source, enrichment_results.get(f"{source}_person", enrichment_results.get(f"{source}_company", {}))),
-                status="success" if not enrichment_results.get(source, {}).get("error") else "error"
-            )
-            db.add(enrichment)
-            
-        except Exception as e:
-            logger.error(f"❌ Error enriching with {source}: {e}")
-            enrichment_results[source] = {
-                "error": str(e),
-                "status": "failed"
-            }
-    
-    # Actualizar IOC
+    # Todas las fuentes a la vez; las que no respondan a tiempo quedan como timeout
+    results = await enrich_concurrently(ioc.ioc_type, ioc.value, sources)
+    scores = apply_confidence(ioc.confidence_score or 50.0, results)
+    new_confidence = next(reversed(scores.values()), ioc.confidence_score or 50.0)
+    enrichment_results = {source: result.as_response() for source, result in results.items()}
+    
+    # Un único commit para todas las filas de enriquecimiento y el IOC
+    db.add_all([
+        IocEnrichment(
+            ioc_id=ioc.id,
+            source=source,
+            reputation_score=scores[source],
+            malicious_count=result.data.get("malicious") if source == "virustotal" else None,
+            suspicious_count=result.data.get("suspicious") if source == "virustotal" else None,
+            harmless_count=result.data.get("harmless") if source == "virustotal" else None,
+            raw_response=enrichment_results[source],
+            status=result.status,
+            error_message=result.error if result.status in ("error", "timeout") else None
+        )
+        for source, result in results.items()
+    ])
     ioc.enrichment_data = {**ioc.enrichment_data, **enrichment_results} if ioc.enrichment_data else enrichment_results
     ioc.confidence_score = new_confidence
     
@@ -1193,7 +985,9 @@ async def enrich_ioc(
         "ioc_id": ioc_id,
         "enrichment": enrichment_results,
         "new_confidence_score": new_confidence,
-        "sources_queried": sources
+        "sources_queried": list(results),
+        "sources_status": {source: result.status for source, result in results.items()},
+        "partial": any(result.status == "timeout" for result in results.values())
     }
 
 
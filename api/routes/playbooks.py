@@ -12,9 +12,10 @@ import logging
 from api.middleware.auth import verify_api_key
 from api.database import get_db_context
 from api.models.tools import (
-    Playbook, PlaybookExecution, PlaybookStatus
+    Playbook, PlaybookExecution, PlaybookStatus, PlaybookStep
 )
 from api.services.soar_engine import soar_engine
+from api.services.soar_conditions import validate_condition
 
 logger = logging.getLogger(__name__)
 
@@ -242,7 +243,10 @@ async def get_playbook(
                 "condition": s.condition,
                 "timeout_seconds": s.timeout_seconds,
                 "continue_on_error": s.continue_on_error,
-                "requires_approval": s.requires_approval
+                "requires_approval": s.requires_approval,
+                "depends_on": s.depends_on,
+                "map_over": s.map_over,
+                "map_action": s.map_action
             }
             for s in steps
         ]
@@ -261,6 +265,18 @@ async def create_playbook(
     
     playbook_id = f"PB-CUSTOM-{uuid.uuid4().hex[:6].upper()}"
     
+    # Validar dependencias (sin ciclos) y sintaxis de condiciones
+    try:
+        soar_engine._build_step_dependencies([
+            {"order": i, "depends_on": step_data.get("depends_on")}
+            for i, step_data in enumerate(request.steps, 1)
+        ])
+        for step_data in request.steps:
+            if step_data.get("condition"):
+                validate_condition(step_data["condition"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     with get_db_context() as db:
         playbook = Playbook(
             id=playbook_id,
@@ -299,7 +315,11 @@ async def create_playbook(
                 wait_for_completion=step_data.get("wait_for_completion", True),
                 timeout_seconds=step_data.get("timeout_seconds", 300),
                 continue_on_error=step_data.get("continue_on_error", False),
-                requires_approval=step_data.get("requires_approval", False)
+                requires_approval=step_data.get("requires_approval", False),
+                depends_on=step_data.get("depends_on"),
+                map_over=step_data.get("map_over"),
+                map_action=step_data.get("map_action"),
+                max_concurrency=step_data.get("max_concurrency")
             )
             db.add(step)
         
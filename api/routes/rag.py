@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import List, Optional
 from api.services.rag_service import rag_service
 from api.middleware.auth import verify_api_key
+import io
 import logging
 
 router = APIRouter(prefix="/api/rag", tags=["RAG Forensics"])
@@ -24,7 +25,7 @@ async def query_rag(request: RAGQuery, _=Depends(verify_api_key)):
     Query the RAG system for a specific case
     """
     try:
-        results = rag_service.query(request.case_id, request.query, request.n_results)
+        results = await rag_service.query_async(request.case_id, request.query, request.n_results)
         if not results or not results['documents']:
             return {"documents": [], "metadatas": [], "distances": []}
         
@@ -37,6 +38,12 @@ async def query_rag(request: RAGQuery, _=Depends(verify_api_key)):
         logger.error(f"Error querying RAG: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class RAGBatchIngest(BaseModel):
+    case_id: str
+    texts: List[str]
+    source: str
+    batch_size: Optional[int] = None
+
 @router.post("/ingest")
 async def ingest_text(
     case_id: str = Form(...),
@@ -45,13 +52,58 @@ async def ingest_text(
     _=Depends(verify_api_key)
 ):
     """
-    Ingest text evidence into the RAG system
+    Ingest text evidence into the RAG system (long texts are chunked)
     """
+    if not rag_service._initialized:
+        raise HTTPException(status_code=503, detail="RAG service not available")
     try:
-        success = rag_service.add_document(case_id, text, {"source": source})
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to ingest document")
-        return {"status": "success", "message": "Document ingested"}
+        stats = await rag_service.ingest_text_async(case_id, text, {"source": source})
+        return {"status": "success", "message": "Document ingested", **stats}
     except Exception as e:
         logger.error(f"Error ingesting text: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/ingest/batch")
+async def ingest_batch(request: RAGBatchIngest, _=Depends(verify_api_key)):
+    """
+    Ingest many texts with batched embedding; already indexed texts are skipped
+    """
+    if not rag_service._initialized:
+        raise HTTPException(status_code=503, detail="RAG service not available")
+    try:
+        stats = await rag_service.add_documents_async(
+            request.case_id,
+            request.texts,
+            [{"source": request.source}] * len(request.texts),
+            batch_size=request.batch_size
+        )
+        return {"status": "success", **stats}
+    except Exception as e:
+        logger.error(f"Error ingesting batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/ingest/file")
+async def ingest_file(
+    case_id: str = Form(...),
+    file: UploadFile = File(...),
+    chunk_size: Optional[int] = Form(None),
+    overlap: Optional[int] = Form(None),
+    _=Depends(verify_api_key)
+):
+    """
+    Ingest an evidence file (logs, reports) as overlapping chunks
+    """
+    if not rag_service._initialized:
+        raise HTTPException(status_code=503, detail="RAG service not available")
+    try:
+        stream = io.TextIOWrapper(file.file, encoding="utf-8", errors="replace")
+        stats = await rag_service.ingest_stream_async(
+            case_id, stream, {"source": file.filename},
+            chunk_size=chunk_size, overlap=overlap
+        )
+        return {"status": "success", "filename": file.filename, **stats}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error ingesting file: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
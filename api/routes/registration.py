@@ -20,6 +20,7 @@ from api.models.subscription import (
 from api.models.user import User, user_tenants
 from api.models.tenant import Tenant
 from api.services.stripe_service import get_stripe_service
+from api.middleware.subscription import invalidate_entitlements
 from api.config import settings
 
 logger = logging.getLogger(__name__)
@@ -390,6 +391,7 @@ async def create_account(
         session.completed_at = datetime.utcnow()
         
         db.commit()
+        invalidate_entitlements(tenant.id)
         
         logger.info(f"✅ Account created: {request.username} ({session.email}) - {plan.name}")
         
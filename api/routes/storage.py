@@ -3,11 +3,15 @@ MCP Kali Forensics - Storage API Routes
 Endpoints para gestión de almacenamiento MinIO multi-tenant
 """
 
+import asyncio
 import logging
-from typing import Optional, List
+import mimetypes
+import re
+from typing import Optional, List, Tuple
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Depends, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from api.services.minio_storage import get_minio_service, MinIOStorageService, MINIO_AVAILABLE
@@ -54,6 +58,8 @@ class StorageStats(BaseModel):
     total_objects: int
     by_type: dict
     tenant_id: Optional[str] = None
+    case_id: Optional[str] = None
+    last_reconciled_at: Optional[str] = None
 
 
 class HealthStatus(BaseModel):
@@ -73,6 +79,40 @@ def get_storage() -> MinIOStorageService:
     return get_minio_service()
 
 
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un header Range de un solo rango.
+
+    Returns:
+        (inicio, fin inclusivo) o None si el header no es un rango simple
+
+    Raises:
+        ValueError: si el rango no es satisfacible (HTTP 416)
+    """
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    
+    if not start:
+        # Sufijo: últimos N bytes
+        suffix = int(end)
+        if suffix == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - suffix, 0), size - 1
+    
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size or first > last:
+        raise ValueError("Unsatisfiable range")
+    return first, last
+
+
 # =========================================================================
 # ENDPOINTS - HEALTH & STATS
 # =========================================================================
@@ -86,10 +126,17 @@ async def storage_health(storage: MinIOStorageService = Depends(get_storage)):
 @router.get("/stats", response_model=StorageStats)
 async def storage_stats(
     tenant_id: Optional[str] = Query(None, description="Filtrar por tenant"),
+    case_id: Optional[str] = Query(None, description="Filtrar por caso (requiere tenant_id)"),
     storage: MinIOStorageService = Depends(get_storage)
 ):
-    """Obtiene estadísticas de almacenamiento."""
-    return storage.get_storage_stats(tenant_id)
+    """Obtiene estadísticas de almacenamiento (índice incremental, sin listar el bucket)."""
+    if case_id and not tenant_id:
+        raise HTTPException(status_code=400, detail="case_id requires tenant_id")
+    # Sólo la primera consulta (índice vacío) lista el bucket: fuera del event loop
+    stats = await asyncio.to_thread(storage.get_storage_stats, tenant_id, case_id)
+    if "error" in stats:
+        raise HTTPException(status_code=502, detail=stats["error"])
+    return stats
 
 
 # =========================================================================
@@ -129,15 +176,18 @@ async def upload_evidence(
     evidence_type: str = Query("evidence", description="Tipo: evidence, reports, artifacts, timeline"),
     storage: MinIOStorageService = Depends(get_storage)
 ):
-    """Sube un archivo de evidencia para un caso."""
+    """Sube un archivo de evidencia para un caso (multipart en streaming)."""
     try:
-        content = await file.read()
-        result = storage.upload_evidence(
+        content_type = file.content_type or mimetypes.guess_type(file.filename)[0]
+        result = await asyncio.to_thread(
+            storage.upload_evidence_stream,
             tenant_id=tenant_id,
             case_id=case_id,
-            file_data=content,
+            stream=file.file,
             file_name=file.filename,
+            length=file.size if file.size is not None else -1,
             evidence_type=evidence_type,
+            content_type=content_type or "application/octet-stream",
         )
         
         return EvidenceUploadResponse(**result)
@@ -170,29 +220,64 @@ async def download_evidence(
     case_id: str,
     file_name: str,
     evidence_type: str = Query("evidence"),
+    range_header: Optional[str] = Header(None, alias="Range"),
     storage: MinIOStorageService = Depends(get_storage)
 ):
-    """Descarga un archivo de evidencia."""
-    from fastapi.responses import Response
-    
-    content = storage.download_evidence(
+    """Descarga un archivo de evidencia en streaming (soporta HTTP Range)."""
+    info = await asyncio.to_thread(
+        storage.stat_evidence,
         tenant_id=tenant_id,
         case_id=case_id,
         file_name=file_name,
         evidence_type=evidence_type,
     )
     
-    if content is None:
+    if info is None:
         raise HTTPException(status_code=404, detail="Evidence not found")
     
-    # Determinar content-type
-    import mimetypes
-    content_type, _ = mimetypes.guess_type(file_name)
+    size = info["size"]
+    content_type = info.get("content_type")
+    if not content_type or content_type == "application/octet-stream":
+        content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    
+    headers = {
+        "Content-Disposition": f"attachment; filename={file_name}",
+        "Accept-Ranges": "bytes",
+    }
+    if info.get("etag"):
+        headers["ETag"] = f'"{info["etag"]}"'
+    
+    status_code = 200
+    offset, length = 0, size
+    if range_header:
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except ValueError:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"},
+            )
+        if byte_range:
+            offset, last = byte_range
+            length = last - offset + 1
+            status_code = 206
+            headers["Content-Range"] = f"bytes {offset}-{last}/{size}"
     
-    return Response(
-        content=content,
-        media_type=content_type or "application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={file_name}"}
+    headers["Content-Length"] = str(length)
+    
+    return StreamingResponse(
+        storage.stream_evidence(
+            tenant_id=tenant_id,
+            case_id=case_id,
+            file_name=file_name,
+            evidence_type=evidence_type,
+            offset=offset,
+            length=length if status_code == 206 else None,
+        ),
+        status_code=status_code,
+        media_type=content_type,
+        headers=headers,
     )
 
 
@@ -15,6 +15,7 @@ from api.models.subscription import (
     PaymentMethod, RegistrationSession
 )
 from api.models.tenant import Tenant
+from api.middleware.subscription import invalidate_entitlements
 
 logger = logging.getLogger(__name__)
 
@@ -140,6 +141,7 @@ async def handle_checkout_completed(data: dict, db: Session):
                 existing_sub.stripe_customer_id = customer_id
                 existing_sub.updated_at = datetime.utcnow()
                 db.commit()
+                invalidate_entitlements(existing_sub.tenant_id)
                 
                 logger.info(f"✅ Subscription activated: {subscription_id}")
         
@@ -172,6 +174,7 @@ async def handle_subscription_created(data: dict, db: Session):
             )
             subscription.updated_at = datetime.utcnow()
             db.commit()
+            invalidate_entitlements(subscription.tenant_id)
             
             logger.info(f"✅ Subscription created: {stripe_sub_id}")
         
@@ -225,6 +228,7 @@ async def handle_subscription_updated(data: dict, db: Session):
             
             subscription.updated_at = datetime.utcnow()
             db.commit()
+            invalidate_entitlements(subscription.tenant_id)
             
             logger.info(f"📝 Subscription updated: {stripe_sub_id} -> {status}")
         
@@ -258,6 +262,7 @@ async def handle_subscription_deleted(data: dict, db: Session):
                     tenant.is_read_only = True
             
             db.commit()
+            invalidate_entitlements(subscription.tenant_id)
             logger.info(f"❌ Subscription canceled: {stripe_sub_id}")
         
     except Exception as e:
@@ -305,6 +310,7 @@ async def handle_invoice_paid(data: dict, db: Session):
             subscription.updated_at = datetime.utcnow()
             
             db.commit()
+            invalidate_entitlements(subscription.tenant_id)
             logger.info(f"💰 Invoice paid: {stripe_invoice_id}")
         
     except Exception as e:
@@ -344,6 +350,7 @@ async def handle_payment_failed(data: dict, db: Session):
                 subscription.grace_period_end = datetime.utcnow() + timedelta(days=7)
             
             db.commit()
+            invalidate_entitlements(subscription.tenant_id)
             logger.warning(f"⚠️ Payment failed for invoice: {stripe_invoice_id}")
         
     except Exception as e:
@@ -434,6 +441,8 @@ async def check_expired_trials(db: Session):
         
         if expired:
             db.commit()
+            for sub in expired:
+                invalidate_entitlements(sub.tenant_id)
             logger.info(f"✅ Processed {len(expired)} expired trials")
         
     except Exception as e:
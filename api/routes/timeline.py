@@ -137,7 +137,8 @@ async def get_case_timeline(
     severity: Optional[Severity] = None,
     key_events_only: bool = False,
     limit: int = Query(500, ge=1, le=5000),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior")
 ):
     """
     Obtener timeline completo de un caso
@@ -148,6 +149,9 @@ async def get_case_timeline(
     - Fuente del evento
     - Severidad
     - Solo eventos clave
+    
+    Paginación: usar ``cursor`` (keyset, estable en timelines grandes) en
+    lugar de ``offset``.
     """
     filters = {
         "start_time": start_time,
@@ -158,18 +162,23 @@ async def get_case_timeline(
         "key_events_only": key_events_only
     }
     
-    timeline = await timeline_service.get_timeline(
-        case_id=case_id,
-        filters=filters,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        timeline = await timeline_service.get_timeline(
+            case_id=case_id,
+            filters=filters,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "case_id": case_id,
         "total_events": timeline["total"],
         "returned_events": len(timeline["events"]),
-        "has_more": timeline["total"] > offset + len(timeline["events"]),
+        "has_more": timeline["next_cursor"] is not None,
+        "next_cursor": timeline["next_cursor"],
         "filters_applied": {k: v for k, v in filters.items() if v is not None},
         "events": timeline["events"]
     }
@@ -376,6 +385,40 @@ async def get_timeline_graph(
     }
 
 
+@router.get("/{case_id}/histogram")
+async def get_timeline_histogram(
+    case_id: str,
+    interval: str = Query("auto", pattern="^(auto|minute|hour|day)$"),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    event_types: Optional[List[EventType]] = Query(None),
+    sources: Optional[List[EventSource]] = Query(None),
+    severity: Optional[Severity] = None,
+    max_buckets: Optional[int] = Query(None, ge=1, le=5000)
+):
+    """
+    Histograma de eventos agregado en servidor
+    
+    Devuelve conteos por bucket desglosados por fuente y severidad. Con
+    interval=auto se elige el intervalo más fino que no supera max_buckets
+    en el rango pedido: para hacer zoom, volver a pedir con el nuevo
+    start_time/end_time.
+    """
+    try:
+        return await timeline_service.get_histogram(
+            case_id=case_id,
+            interval=interval,
+            start_time=start_time,
+            end_time=end_time,
+            event_types=[e.value for e in event_types] if event_types else None,
+            sources=[s.value for s in sources] if sources else None,
+            severity=severity.value if severity else None,
+            max_buckets=max_buckets
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/{case_id}/import/{source}")
 async def import_from_source(
     case_id: str,
@@ -5,22 +5,39 @@ Seguridad: No ejecuta nada ofensivo, solo orquesta tareas definidas.
 Esta cola permite:
 - Procesamiento concurrente con límite configurable
 - Prioridades dinámicas (critical > high > normal > low)
-- Reintentos automáticos en caso de fallo
-- Persistencia de estado en memoria (extensible a Redis/DB)
+- Planificador por eventos: un heap (prioridad, orden de llegada) y una
+  ``asyncio.Condition``; sin sondeo, el worker sólo despierta al llegar
+  una tarea o liberarse un hueco. FIFO estricto dentro de cada prioridad
+- Semáforos global y por tipo de agente; las tareas de un tipo sin huecos
+  quedan aparcadas (conservando su orden) en vez de volver a la cola
+- Reintentos automáticos en caso de fallo, con backoff exponencial
+- Estado en memoria; con un ``AgentQueueStore`` (``AGENT_QUEUE_DURABLE``)
+  las tareas de funciones registradas se persisten con lease y latido y
+  se recuperan al arrancar tras una caída y en cada latido (leases
+  vencidos de otros workers). El acceso al store va en un hilo
+  (``asyncio.to_thread``) para no bloquear el event loop
 - Logging detallado para auditoría
 """
 
 import asyncio
-from typing import Callable, Any, Dict, Optional, List
-from datetime import datetime
+import heapq
+import itertools
+import json
+from typing import Callable, Any, Dict, Optional, List, Set, Tuple
+from datetime import datetime, timedelta
 from enum import Enum
 import logging
 import uuid
 from dataclasses import dataclass, field
 from collections import defaultdict
 
+from api.config import settings
+
 logger = logging.getLogger(__name__)
 
+# Entrada del planificador: (prioridad, secuencia de llegada, task_id)
+HeapEntry = Tuple[int, int, str]
+
 
 class TaskPriority(Enum):
     CRITICAL = 0
@@ -57,6 +74,7 @@ class QueuedTask:
     max_retries: int = 3
     case_id: Optional[str] = None
     investigation_id: Optional[str] = None
+    handler: Optional[str] = None  # nombre registrado; sólo estas tareas se persisten
     
     def __lt__(self, other):
         # Para ordenar por prioridad en la cola
@@ -72,12 +90,20 @@ class AgentQueue:
     def __init__(
         self,
         max_concurrent_total: int = 10,
-        max_concurrent_per_type: Dict[str, int] = None
+        max_concurrent_per_type: Dict[str, int] = None,
+        store=None,
+        lease_seconds: Optional[float] = None,
+        retry_backoff: Optional[float] = None,
+        retry_backoff_max: Optional[float] = None
     ):
         """
         Args:
             max_concurrent_total: Límite global de tareas concurrentes
             max_concurrent_per_type: Límites por tipo de agente
+            store: AgentQueueStore para persistir tareas (None = sólo memoria)
+            lease_seconds: Duración del lease de tareas persistidas
+            retry_backoff: Espera antes del primer reintento (se duplica)
+            retry_backoff_max: Espera máxima entre reintentos
         """
         self.max_concurrent_total = max_concurrent_total
         self.max_concurrent_per_type = max_concurrent_per_type or {
@@ -87,24 +113,39 @@ class AgentQueue:
             "generic": 3
         }
         
-        # Colas separadas por prioridad
-        self.queues: Dict[TaskPriority, asyncio.PriorityQueue] = {
-            priority: asyncio.PriorityQueue()
-            for priority in TaskPriority
-        }
+        # Heap único (prioridad, llegada): FIFO estricto dentro de cada prioridad
+        self._heap: List[HeapEntry] = []
+        self._sequence = itertools.count()
+        # Tareas cuyo tipo no tenía huecos, por tipo y en su orden original
+        self._parked: Dict[str, List[HeapEntry]] = defaultdict(list)
+        
+        # Huecos de ejecución: global y por tipo de agente
+        self._slots = asyncio.Semaphore(max_concurrent_total)
+        self._type_slots: Dict[str, asyncio.Semaphore] = {}
         
         # Tracking de tareas
         self.tasks: Dict[str, QueuedTask] = {}
         self.running_tasks: Dict[str, asyncio.Task] = {}
         self.running_count_per_type: Dict[str, int] = defaultdict(int)
         
-        # Lock para operaciones thread-safe
+        # Lock para operaciones thread-safe; la condición despierta al worker
         self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Condition(self._lock)
+        self.dispatch_rounds = 0  # vueltas del worker (no crece con la cola ociosa)
         
         # Worker task
         self._worker_task: Optional[asyncio.Task] = None
         self._running = False
         
+        # Persistencia opcional y reintentos
+        self.store = store
+        self.handlers: Dict[str, Callable] = {}
+        self.lease_seconds = lease_seconds or settings.AGENT_QUEUE_LEASE_SECONDS
+        self.retry_backoff = retry_backoff if retry_backoff is not None else settings.AGENT_QUEUE_RETRY_BACKOFF_SECONDS
+        self.retry_backoff_max = retry_backoff_max or settings.AGENT_QUEUE_RETRY_BACKOFF_MAX_SECONDS
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._retry_timers: Set[asyncio.Task] = set()
+        
         # Callbacks
         self._on_task_complete: List[Callable] = []
         self._on_task_failed: List[Callable] = []
@@ -117,12 +158,20 @@ class AgentQueue:
             return
         
         self._running = True
+        if self.store is not None:
+            await self.recover()
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
         self._worker_task = asyncio.create_task(self._worker())
         logger.info("✅ AgentQueue worker iniciado")
     
     async def stop(self):
         """Detener el worker de la cola"""
         self._running = False
+        async with self._wakeup:
+            self._wakeup.notify_all()
+        for timer in [self._heartbeat_task, *self._retry_timers]:
+            if timer:
+                timer.cancel()
         if self._worker_task:
             self._worker_task.cancel()
             try:
@@ -166,78 +215,234 @@ class AgentQueue:
             agent_type=agent_type,
             status=TaskStatus.QUEUED,
             case_id=case_id,
-            investigation_id=investigation_id
+            investigation_id=investigation_id,
+            handler=self._durable_handler(task_func, kwargs)
         )
         
-        async with self._lock:
+        # Registrada antes de persistir: el barrido del latido no la duplica
+        async with self._wakeup:
             self.tasks[task_id] = task
-            await self.queues[priority_enum].put((priority_enum.value, task_id, task))
         
-        logger.info(f"📥 Tarea {task_id} añadida [{agent_type}] [{priority}]")
+        if task.handler:
+            try:
+                await asyncio.to_thread(self.store.enqueue, task)
+            except Exception:
+                self.tasks.pop(task_id, None)
+                raise
         
-        # Trigger processing
-        if self._running:
-            asyncio.create_task(self._process_queue())
+        async with self._wakeup:
+            if task.status != TaskStatus.CANCELLED:
+                self._enqueue(task)
+        
+        logger.info(f"📥 Tarea {task_id} añadida [{agent_type}] [{priority}]")
         
         return task_id
     
-    async def _worker(self):
-        """Worker principal que procesa la cola"""
+    def _enqueue(self, task: QueuedTask):
+        """Mete la tarea en el heap y despierta al worker (con el lock tomado)"""
+        heapq.heappush(self._heap, (task.priority.value, next(self._sequence), task.id))
+        self._wakeup.notify()
+    
+    # ==================== PERSISTENCIA ====================
+    
+    def register_handler(self, name: str, func: Callable):
+        """
+        Registra una función por nombre. Con store, las tareas de funciones
+        registradas se persisten y se pueden recuperar en otro proceso.
+        """
+        self.handlers[name] = func
+    
+    def _durable_handler(self, func: Callable, kwargs: Dict[str, Any]) -> Optional[str]:
+        if self.store is None:
+            return None
+        name = next((name for name, handler in self.handlers.items() if handler == func), None)
+        if name is None:
+            return None
+        try:
+            json.dumps(kwargs)
+        except (TypeError, ValueError):
+            logger.warning(f"⚠️ Argumentos de {name} no serializables: la tarea no se persiste")
+            return None
+        return name
+    
+    async def recover(self) -> List[str]:
+        """
+        Reencola las tareas pendientes del store (incluidas las de leases
+        vencidos). Las de funciones no registradas aquí se dejan para otro
+        proceso.
+        """
+        recovered = []
+        records = await asyncio.to_thread(self.store.recover)
+        now = datetime.utcnow()
+        async with self._wakeup:
+            for record in records:
+                func = self.handlers.get(record["handler"])
+                if func is None or record["id"] in self.tasks:
+                    continue
+                task = QueuedTask(
+                    id=record["id"],
+                    func=func,
+                    kwargs=record["kwargs"],
+                    priority=TaskPriority(record["priority"]),
+                    agent_type=record["agent_type"],
+                    status=TaskStatus.RETRYING if record["state"] == "failed" else TaskStatus.QUEUED,
+                    created_at=record["created_at"] or now,
+                    error=record["last_error"],
+                    retries=record["attempts"],
+                    max_retries=record["max_retries"],
+                    case_id=record["case_id"],
+                    investigation_id=record["investigation_id"],
+                    handler=record["handler"]
+                )
+                self.tasks[task.id] = task
+                delay = (record["available_at"] - now).total_seconds() if record["available_at"] else 0
+                if delay > 0:
+                    self._schedule_retry(task, delay)
+                else:
+                    self._enqueue(task)
+                recovered.append(task.id)
+        if recovered:
+            logger.info(f"♻️ AgentQueue: {len(recovered)} tareas recuperadas del store")
+        return recovered
+    
+    async def _heartbeat(self):
+        """
+        Renueva los leases de las tareas persistidas en ejecución y barre el
+        store: las tareas de un worker caído se recuperan en cuanto vence su
+        lease, sin esperar a reiniciar este proceso.
+        """
         while self._running:
+            await asyncio.sleep(self.lease_seconds / 3)
+            task_ids = [task_id for task_id in self.running_tasks if self.tasks[task_id].handler]
             try:
-                await self._process_queue()
-                await asyncio.sleep(0.1)  # Small delay to prevent busy loop
-            except asyncio.CancelledError:
-                break
+                await asyncio.to_thread(self.store.heartbeat, task_ids, self.lease_seconds)
             except Exception as e:
-                logger.error(f"Error en worker: {e}")
-                await asyncio.sleep(1)
+                logger.error(f"Error renovando leases de AgentQueue: {e}")
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.error(f"Error recuperando tareas de AgentQueue: {e}")
     
-    async def _process_queue(self):
-        """Procesa tareas de la cola respetando límites de concurrencia"""
-        # Verificar límite global
-        if len(self.running_tasks) >= self.max_concurrent_total:
-            return
+    async def _store_call(self, method: str, *args) -> bool:
+        try:
+            return await asyncio.to_thread(getattr(self.store, method), *args)
+        except Exception as e:
+            logger.error(f"Error persistiendo tarea de AgentQueue ({method}): {e}")
+            return False
+    
+    def retry_delay(self, retries: int) -> float:
+        """Backoff exponencial: retry_backoff * 2^(reintento - 1), con tope"""
+        return min(self.retry_backoff_max, self.retry_backoff * 2 ** (retries - 1))
+    
+    def _schedule_retry(self, task: QueuedTask, delay: float):
+        async def requeue():
+            await asyncio.sleep(delay)
+            async with self._wakeup:
+                if task.status == TaskStatus.RETRYING:
+                    self._enqueue(task)
         
-        # Procesar por prioridad (crítico primero)
-        for priority in TaskPriority:
-            queue = self.queues[priority]
-            
-            while not queue.empty():
-                # Verificar límite global nuevamente
-                if len(self.running_tasks) >= self.max_concurrent_total:
-                    return
-                
+        timer = asyncio.create_task(requeue())
+        self._retry_timers.add(timer)
+        timer.add_done_callback(self._retry_timers.discard)
+    
+    def _type_slot(self, agent_type: str) -> asyncio.Semaphore:
+        if agent_type not in self._type_slots:
+            self._type_slots[agent_type] = asyncio.Semaphore(self.max_concurrent_per_type.get(agent_type, 3))
+        return self._type_slots[agent_type]
+    
+    async def _worker(self):
+        """Worker principal: duerme en la condición hasta que hay algo que lanzar"""
+        async with self._wakeup:
+            while self._running:
+                self.dispatch_rounds += 1
                 try:
-                    _, task_id, task = queue.get_nowait()
-                except asyncio.QueueEmpty:
+                    await self._dispatch()
+                except Exception as e:
+                    logger.error(f"Error en worker: {e}")
+                await self._wakeup.wait()
+    
+    def _next_runnable(self) -> Optional[QueuedTask]:
+        """
+        Siguiente tarea ejecutable en orden (prioridad, llegada). Las cabezas
+        del heap cuyo tipo está lleno pasan a ``_parked`` y sólo vuelven a
+        competir cuando ese tipo libera un hueco.
+        """
+        if self._slots.locked():
+            return None
+        
+        while True:
+            best: Optional[HeapEntry] = None
+            source: Optional[List[HeapEntry]] = None
+            while self._heap:
+                task = self.tasks.get(self._heap[0][2])
+                if task is None or task.status == TaskStatus.CANCELLED:
+                    heapq.heappop(self._heap)
+                elif self._type_slot(task.agent_type).locked():
+                    heapq.heappush(self._parked[task.agent_type], heapq.heappop(self._heap))
+                else:
+                    best, source = self._heap[0], self._heap
                     break
-                
-                # Verificar límite por tipo
-                agent_type = task.agent_type
-                type_limit = self.max_concurrent_per_type.get(agent_type, 3)
-                
-                if self.running_count_per_type[agent_type] >= type_limit:
-                    # Devolver a la cola
-                    await queue.put((task.priority.value, task_id, task))
+            
+            for agent_type, parked in self._parked.items():
+                if parked and not self._type_slot(agent_type).locked() and (best is None or parked[0] < best):
+                    best, source = parked[0], parked
+            
+            if source is None:
+                return None
+            heapq.heappop(source)
+            task = self.tasks.get(best[2])
+            if task is not None and task.status != TaskStatus.CANCELLED:
+                return task
+    
+    async def _dispatch(self):
+        """Lanza tareas mientras haya huecos (con el lock tomado)"""
+        while True:
+            task = self._next_runnable()
+            if task is None:
+                return
+            
+            # Tarea persistida: otro worker puede haberla tomado ya
+            if task.handler:
+                try:
+                    leased = await self._lease(task)
+                except Exception as e:
+                    logger.error(f"Error tomando lease de {task.id}, se ejecuta sin persistir: {e}")
+                    task.handler, leased = None, True
+                if not leased:
+                    logger.info(f"⏭️ Tarea {task.id} tomada por otro worker")
+                    self.tasks.pop(task.id, None)
                     continue
-                
-                # Ejecutar tarea
-                async with self._lock:
-                    self.running_count_per_type[agent_type] += 1
-                    task.status = TaskStatus.RUNNING
-                    task.started_at = datetime.utcnow()
-                
-                asyncio_task = asyncio.create_task(self._run_task(task))
-                self.running_tasks[task_id] = asyncio_task
-                
-                logger.info(f"▶️ Ejecutando tarea {task_id}")
+                if task.status == TaskStatus.CANCELLED:
+                    continue  # cancelada mientras se tomaba el lease
+            
+            # Hay hueco seguro: acquire no espera
+            await self._slots.acquire()
+            await self._type_slot(task.agent_type).acquire()
+            self.running_count_per_type[task.agent_type] += 1
+            task.status = TaskStatus.RUNNING
+            task.started_at = datetime.utcnow()
+            
+            self.running_tasks[task.id] = asyncio.create_task(self._run_task(task))
+            
+            logger.info(f"▶️ Ejecutando tarea {task.id}")
+    
+    async def _lease(self, task: QueuedTask) -> bool:
+        """Toma el lease en un hilo, soltando el lock mientras tanto"""
+        self._lock.release()
+        try:
+            return await asyncio.to_thread(self.store.lease, task.id, self.lease_seconds)
+        finally:
+            await self._lock.acquire()
     
     async def _run_task(self, task: QueuedTask):
         """Ejecuta una tarea individual con manejo de errores"""
         try:
             result = await task.func(**task.kwargs)
             
+            # Se persiste antes de publicar el estado en memoria
+            if task.handler:
+                await self._store_call("complete", task.id, result)
+            
             async with self._lock:
                 task.status = TaskStatus.COMPLETED
                 task.completed_at = datetime.utcnow()
@@ -256,34 +461,48 @@ class AgentQueue:
             error_msg = str(e)
             logger.error(f"❌ Tarea {task.id} falló: {error_msg}")
             
+            retries = task.retries + 1
+            retry = retries < task.max_retries
+            delay = self.retry_delay(retries) if retry else None
+            
+            # El store se actualiza primero: el reintento necesita la fila en
+            # ``failed`` para volver a tomar el lease
+            if task.handler:
+                retry_at = datetime.utcnow() + timedelta(seconds=delay) if retry else None
+                await self._store_call("fail", task.id, error_msg, retry_at)
+            
             async with self._lock:
                 task.error = error_msg
-                task.retries += 1
-                
-                if task.retries < task.max_retries:
-                    # Reintentar
+                task.retries = retries
+                if retry:
                     task.status = TaskStatus.RETRYING
-                    await self.queues[task.priority].put(
-                        (task.priority.value, task.id, task)
-                    )
-                    logger.info(f"🔄 Reintentando tarea {task.id} ({task.retries}/{task.max_retries})")
                 else:
                     task.status = TaskStatus.FAILED
                     task.completed_at = datetime.utcnow()
-                    
-                    # Callbacks de fallo
-                    for callback in self._on_task_failed:
-                        try:
-                            await callback(task)
-                        except Exception as cb_e:
-                            logger.error(f"Error en callback de tarea fallida: {cb_e}")
+            
+            if retry:
+                # Reintentar tras el backoff (al final de su prioridad)
+                self._schedule_retry(task, delay)
+                logger.info(
+                    f"🔄 Reintentando tarea {task.id} en {delay:.1f}s ({task.retries}/{task.max_retries})"
+                )
+            else:
+                # Dead letter: no se reintenta más; callbacks de fallo
+                for callback in self._on_task_failed:
+                    try:
+                        await callback(task)
+                    except Exception as cb_e:
+                        logger.error(f"Error en callback de tarea fallida: {cb_e}")
         
         finally:
-            # Limpiar tracking
-            async with self._lock:
+            # Limpiar tracking y despertar al worker: hay un hueco libre
+            async with self._wakeup:
                 self.running_count_per_type[task.agent_type] -= 1
                 if task.id in self.running_tasks:
                     del self.running_tasks[task.id]
+                self._slots.release()
+                self._type_slot(task.agent_type).release()
+                self._wakeup.notify()
     
     async def cancel_task(self, task_id: str) -> bool:
         """Cancela una tarea"""
@@ -300,6 +519,8 @@ class AgentQueue:
             task.status = TaskStatus.CANCELLED
             task.completed_at = datetime.utcnow()
             
+        if task.handler:
+            await self._store_call("cancel", task_id)
         logger.info(f"🚫 Tarea {task_id} cancelada")
         return True
     
@@ -326,9 +547,13 @@ class AgentQueue:
     
     def get_queue_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas de la cola"""
-        pending_by_priority = {
-            p.name: self.queues[p].qsize() for p in TaskPriority
-        }
+        pending_by_priority = {p.name: 0 for p in TaskPriority}
+        parked_by_type = {agent_type: len(parked) for agent_type, parked in self._parked.items() if parked}
+        for entries in [self._heap, *self._parked.values()]:
+            for priority_value, _, task_id in entries:
+                task = self.tasks.get(task_id)
+                if task is not None and task.status != TaskStatus.CANCELLED:
+                    pending_by_priority[TaskPriority(priority_value).name] += 1
         
         running_by_type = dict(self.running_count_per_type)
         
@@ -340,6 +565,7 @@ class AgentQueue:
             "total_tasks": len(self.tasks),
             "running": len(self.running_tasks),
             "pending_by_priority": pending_by_priority,
+            "parked_by_type": parked_by_type,
             "running_by_type": running_by_type,
             "status_counts": dict(status_counts),
             "limits": {
@@ -357,6 +583,13 @@ class AgentQueue:
         self._on_task_failed.append(callback)
 
 
+def _default_store():
+    if not settings.AGENT_QUEUE_DURABLE:
+        return None
+    from api.services.agent_queue_store import AgentQueueStore
+    return AgentQueueStore()
+
+
 # Instancia singleton
 agent_queue = AgentQueue(
     max_concurrent_total=10,
@@ -365,5 +598,6 @@ agent_queue = AgentQueue(
         "red": 2,  # Más restrictivo
         "purple": 3,
         "generic": 4
-    }
+    },
+    store=_default_store()
 )
@@ -0,0 +1,167 @@
+"""
+MCP v4.7 - AgentQueue Store
+Persistencia opcional de las tareas de AgentQueue (``AGENT_QUEUE_DURABLE``).
+
+- Una fila por tarea (``agent_queue_tasks``) con su estado: queued,
+  running, done, failed (reintento pendiente tras el backoff), dead_letter
+  (reintentos agotados) y cancelled
+- La función se guarda por nombre (``AgentQueue.register_handler``) y los
+  argumentos como JSON
+- Las tareas en ejecución tienen un lease (dueño + vencimiento) que el
+  worker renueva con un latido; tomar el lease es un UPDATE condicional,
+  así cada intento lo ejecuta un solo worker
+- Al arrancar, ``recover`` devuelve a la cola los leases vencidos (worker
+  caído a mitad de tarea, cuenta como intento fallido) y entrega las
+  tareas pendientes para volver a encolarlas
+"""
+
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from api.database import get_db_context
+from api.models.tools import AgentQueueTaskRecord
+
+logger = logging.getLogger(__name__)
+
+# Identidad de este proceso como dueño de leases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+PENDING_STATES = ("queued", "failed")
+LEASE_EXPIRED_ERROR = "Lease expired: worker stopped while running the task"
+
+
+def _as_json(value: Any) -> Any:
+    """Valor apto para una columna JSON (lo no serializable pasa a texto)"""
+    return json.loads(json.dumps(value, default=str))
+
+
+class AgentQueueStore:
+    """Acceso a las tareas persistidas de AgentQueue"""
+
+    def __init__(self, owner: str = WORKER_ID, session_factory=None):
+        self.owner = owner
+        self.session_factory = session_factory or get_db_context
+
+    def enqueue(self, task) -> None:
+        """Guarda una tarea nueva (``QueuedTask`` con ``handler``)"""
+        with self.session_factory() as db:
+            db.add(AgentQueueTaskRecord(
+                id=task.id,
+                handler=task.handler,
+                kwargs=task.kwargs,
+                priority=task.priority.value,
+                agent_type=task.agent_type,
+                case_id=task.case_id,
+                investigation_id=task.investigation_id,
+                state="queued",
+                max_retries=task.max_retries,
+                available_at=task.created_at,
+                created_at=task.created_at,
+            ))
+
+    def _update(self, task_id: str, values: Dict[str, Any], *conditions) -> bool:
+        with self.session_factory() as db:
+            updated = db.query(AgentQueueTaskRecord).filter(
+                AgentQueueTaskRecord.id == task_id, *conditions
+            ).update({**values, "updated_at": datetime.utcnow()}, synchronize_session=False)
+        return updated == 1
+
+    def lease(self, task_id: str, lease_seconds: float) -> bool:
+        """Toma la tarea para ejecutarla; False si otro worker ya la tiene"""
+        now = datetime.utcnow()
+        return self._update(task_id, {
+            "state": "running",
+            "lease_owner": self.owner,
+            "lease_expires_at": now + timedelta(seconds=lease_seconds),
+            "attempts": AgentQueueTaskRecord.attempts + 1,
+        }, AgentQueueTaskRecord.state.in_(PENDING_STATES))
+
+    def heartbeat(self, task_ids: Iterable[str], lease_seconds: float) -> int:
+        """Renueva los leases propios; devuelve cuántos siguen vigentes"""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return 0
+        with self.session_factory() as db:
+            return db.query(AgentQueueTaskRecord).filter(
+                AgentQueueTaskRecord.id.in_(task_ids),
+                AgentQueueTaskRecord.state == "running",
+                AgentQueueTaskRecord.lease_owner == self.owner,
+            ).update({
+                "lease_expires_at": datetime.utcnow() + timedelta(seconds=lease_seconds)
+            }, synchronize_session=False)
+
+    def _release(self, task_id: str, values: Dict[str, Any]) -> bool:
+        """Cierra el intento en curso (sólo si el lease sigue siendo nuestro)"""
+        return self._update(
+            task_id, {**values, "lease_owner": None, "lease_expires_at": None},
+            AgentQueueTaskRecord.state == "running",
+            AgentQueueTaskRecord.lease_owner == self.owner,
+        )
+
+    def complete(self, task_id: str, result: Any) -> bool:
+        now = datetime.utcnow()
+        return self._release(task_id, {"state": "done", "result": _as_json(result), "completed_at": now})
+
+    def fail(self, task_id: str, error: str, retry_at: Optional[datetime] = None) -> bool:
+        """Intento fallido: ``failed`` hasta ``retry_at`` o ``dead_letter`` si no hay más reintentos"""
+        if retry_at is not None:
+            return self._release(task_id, {"state": "failed", "last_error": error, "available_at": retry_at})
+        return self._release(task_id, {
+            "state": "dead_letter", "last_error": error, "completed_at": datetime.utcnow()
+        })
+
+    def cancel(self, task_id: str) -> bool:
+        return self._update(task_id, {
+            "state": "cancelled", "lease_owner": None, "lease_expires_at": None,
+            "completed_at": datetime.utcnow(),
+        }, AgentQueueTaskRecord.state.in_((*PENDING_STATES, "running")))
+
+    def recover(self) -> List[Dict[str, Any]]:
+        """
+        Devuelve a la cola las tareas con el lease vencido y entrega las
+        pendientes (queued/failed) en orden de prioridad y llegada.
+        """
+        now = datetime.utcnow()
+        expired = (
+            AgentQueueTaskRecord.state == "running",
+            AgentQueueTaskRecord.lease_expires_at < now,
+        )
+        released = {"lease_owner": None, "lease_expires_at": None, "last_error": LEASE_EXPIRED_ERROR,
+                    "updated_at": now}
+        with self.session_factory() as db:
+            # UPDATE condicionales: si otro worker recupera a la vez, cada fila cambia una sola vez
+            retried = db.query(AgentQueueTaskRecord).filter(
+                *expired, AgentQueueTaskRecord.attempts < AgentQueueTaskRecord.max_retries
+            ).update({**released, "state": "failed", "available_at": now}, synchronize_session=False)
+            dead = db.query(AgentQueueTaskRecord).filter(*expired).update(
+                {**released, "state": "dead_letter", "completed_at": now}, synchronize_session=False
+            )
+            rows = db.query(AgentQueueTaskRecord).filter(
+                AgentQueueTaskRecord.state.in_(PENDING_STATES)
+            ).order_by(AgentQueueTaskRecord.priority, AgentQueueTaskRecord.created_at).all()
+            pending = [
+                {
+                    "id": row.id,
+                    "handler": row.handler,
+                    "kwargs": row.kwargs or {},
+                    "priority": row.priority,
+                    "agent_type": row.agent_type,
+                    "case_id": row.case_id,
+                    "investigation_id": row.investigation_id,
+                    "state": row.state,
+                    "attempts": row.attempts or 0,
+                    "max_retries": row.max_retries,
+                    "available_at": row.available_at,
+                    "created_at": row.created_at,
+                    "last_error": row.last_error,
+                }
+                for row in rows
+            ]
+        if retried or dead:
+            logger.warning(f"♻️ AgentQueue: {retried} tareas con lease vencido reencoladas, {dead} a dead letter")
+        return pending
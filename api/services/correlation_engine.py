@@ -15,6 +15,7 @@ from api.database import get_db_context
 from api.models.tools import (
     CorrelationRule, CorrelationEvent, CorrelationSeverity, CorrelationRuleType
 )
+from api.services.ioc_matcher import ioc_matcher, record_sightings
 
 logger = logging.getLogger(__name__)
 
@@ -271,6 +272,29 @@ HEURISTIC_PATTERNS = [
 ]
 
 
+# =============================================================================
+# IOC STORE MATCHING
+# =============================================================================
+
+IOC_MATCH_RULE = {
+    "id": "IOC-001",
+    "name": "Known IOC Observed",
+    "description": "Event contains an active indicator from the IOC Store",
+    "mitre_tactics": [],
+    "mitre_techniques": []
+}
+
+# threat_level del IOC -> severidad de la alerta
+IOC_THREAT_SEVERITY = {
+    "critical": CorrelationSeverity.CRITICAL.value,
+    "high": CorrelationSeverity.HIGH.value,
+    "medium": CorrelationSeverity.MEDIUM.value,
+    "low": CorrelationSeverity.LOW.value,
+    "info": CorrelationSeverity.LOW.value
+}
+_SEVERITY_ORDER = ["low", "medium", "high", "critical"]
+
+
 # =============================================================================
 # CORRELATION ENGINE
 # =============================================================================
@@ -281,6 +305,7 @@ class CorrelationEngine:
     - Sigma rules (pattern matching)
     - ML heuristics (anomaly detection)
     - Threshold-based alerts
+    - IOCs activos del IOC Store (matcher en memoria)
     """
     
     def __init__(self):
@@ -416,13 +441,22 @@ class CorrelationEngine:
         if len(self.event_buffer) > self.buffer_max_size:
             self.event_buffer = self.event_buffer[-self.buffer_max_size:]
         
-        # Persistir evento
-        event_id = await self._persist_event(normalized, case_id)
+        # Persistir evento (si falla, la correlación sigue con el id en memoria)
+        try:
+            event_id = await self._persist_event(normalized, case_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Evento {normalized['id']} no persistido: {e}")
+            event_id = normalized["id"]
         
         # Ejecutar correlación
         alerts = []
         
-        # 1. Sigma rules
+        # 1. IOCs conocidos del IOC Store (no dependen de reglas ni de la BD de correlación)
+        ioc_matches = await self._match_iocs(normalized, case_id)
+        if ioc_matches:
+            alerts.append(self._ioc_alert(ioc_matches, event_id))
+        
+        # 2. Sigma rules
         sigma_matches = await self._evaluate_sigma_rules(normalized)
         for match in sigma_matches:
             alert = await self._create_alert(
@@ -433,7 +467,7 @@ class CorrelationEngine:
             )
             alerts.append(alert)
         
-        # 2. Heuristics (requieren múltiples eventos)
+        # 3. Heuristics (requieren múltiples eventos)
         heur_matches = await self._evaluate_heuristics(normalized)
         for match in heur_matches:
             alert = await self._create_alert(
@@ -534,6 +568,50 @@ class CorrelationEngine:
             
             return event["id"]
     
+    # -------------------------------------------------------------------------
+    # IOC MATCHING
+    # -------------------------------------------------------------------------
+    
+    async def _match_iocs(self, event: Dict, case_id: Optional[str]) -> List:
+        """Busca IOCs activos en el evento original y registra los avistamientos"""
+        await ioc_matcher.ensure_fresh()
+        matches = ioc_matcher.match_event(event["raw"])
+        if not matches:
+            return []
+        
+        with get_db_context() as db:
+            record_sightings(
+                db,
+                matches,
+                source_system=event["source"],
+                source_host=event["host"]["name"],
+                source_ip=event["network"]["source_ip"] or event["host"]["ip"],
+                case_id=case_id,
+                raw_event=event["raw"]
+            )
+        
+        logger.info(f"🎯 IOC match: {len(matches)} indicadores en evento {event['id']}")
+        return matches
+    
+    def _ioc_alert(self, matches: List, event_id: str) -> Dict:
+        """Alerta con la severidad del IOC más grave encontrado"""
+        severities = [
+            IOC_THREAT_SEVERITY.get(match.ioc.threat_level, CorrelationSeverity.MEDIUM.value)
+            for match in matches
+        ]
+        severity = max(severities, key=_SEVERITY_ORDER.index)
+        
+        return {
+            "alert_id": f"ALERT-{uuid.uuid4().hex[:8].upper()}",
+            "rule_id": IOC_MATCH_RULE["id"],
+            "event_id": event_id,
+            "severity": severity,
+            "title": f"[{severity.upper()}] {IOC_MATCH_RULE['name']}",
+            "mitre_tactics": IOC_MATCH_RULE["mitre_tactics"],
+            "mitre_techniques": IOC_MATCH_RULE["mitre_techniques"],
+            "ioc_matches": [match.as_dict() for match in matches]
+        }
+    
     # -------------------------------------------------------------------------
     # SIGMA RULE EVALUATION
     # -------------------------------------------------------------------------
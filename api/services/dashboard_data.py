@@ -14,6 +14,7 @@ import httpx
 import logging
 from dotenv import load_dotenv
 from api.config import settings
+from api.services.ioc_extractor import ioc_extractor
 
 # Cargar variables de entorno
 load_dotenv()
@@ -866,7 +867,33 @@ class DashboardDataService:
             except Exception as e:
                 print(f"Error processing investigation_summary.json: {e}")
         
-        return iocs
+        # Barrido genérico del resto de archivos con el extractor compartido
+        structured_files = {oauth_file.name, rules_file.name, risky_signins_file.name, summary_file.name}
+        for evidence_file in sorted(evidence_dir.iterdir()):
+            if not evidence_file.is_file() or evidence_file.name in structured_files:
+                continue
+            try:
+                for ioc in ioc_extractor.extract_file(evidence_file):
+                    iocs.append({
+                        'type': 'ip_address' if ioc['type'] == 'ip' else ioc['type'],
+                        'value': ioc['value'],
+                        'severity': 'low',
+                        'source': evidence_file.name,
+                        'details': f"Occurrences: {ioc['count']}"
+                    })
+            except Exception as e:
+                print(f"Error processing {evidence_file.name}: {e}")
+        
+        # Deduplicar por (tipo, valor); prevalecen los hallazgos estructurados
+        seen = set()
+        unique_iocs = []
+        for ioc in iocs:
+            key = (ioc['type'], ioc['value'])
+            if key not in seen:
+                seen.add(key)
+                unique_iocs.append(ioc)
+        
+        return unique_iocs
 
 
 # Instancia global del servicio
@@ -3,13 +3,15 @@ MCP Kali Forensics - Evidence Management Service
 Handles external evidence upload, import, and management
 """
 
+import asyncio
 import hashlib
 import logging
 import os
 import shutil
+import tempfile
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import mimetypes
 
 from sqlalchemy.orm import Session
@@ -28,6 +30,35 @@ logger = logging.getLogger(__name__)
 EVIDENCE_STORAGE = settings.EVIDENCE_DIR / "external"
 EVIDENCE_STORAGE.mkdir(parents=True, exist_ok=True)
 
+# Hash read size for files already on disk
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class EvidenceTooLargeError(ValueError):
+    """Upload exceeded the configured maximum size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"Evidence exceeds maximum upload size of {max_bytes} bytes")
+
+
+class MultiHasher:
+    """MD5, SHA1 and SHA256 fed in a single pass"""
+
+    def __init__(self):
+        self._hashers = {
+            "md5": hashlib.md5(),
+            "sha1": hashlib.sha1(),
+            "sha256": hashlib.sha256(),
+        }
+
+    def update(self, chunk: bytes):
+        for hasher in self._hashers.values():
+            hasher.update(chunk)
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {name: hasher.hexdigest() for name, hasher in self._hashers.items()}
+
 
 class EvidenceService:
     """Service for managing external evidence"""
@@ -38,21 +69,64 @@ class EvidenceService:
         Calculate MD5, SHA1, and SHA256 hashes for a file.
         Uses chunked reading for large files.
         """
-        md5 = hashlib.md5()
-        sha1 = hashlib.sha1()
-        sha256 = hashlib.sha256()
+        hasher = MultiHasher()
 
         with open(file_path, "rb") as f:
-            while chunk := f.read(8192):
-                md5.update(chunk)
-                sha1.update(chunk)
-                sha256.update(chunk)
-
-        return {
-            "md5": md5.hexdigest(),
-            "sha1": sha1.hexdigest(),
-            "sha256": sha256.hexdigest(),
-        }
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                hasher.update(chunk)
+
+        return hasher.hexdigests()
+
+    @staticmethod
+    async def stream_to_file(
+        file: UploadFile,
+        destination: Path,
+        chunk_size: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Tuple[int, Dict[str, str]]:
+        """
+        Stream an upload to disk while hashing it in the same pass.
+
+        Data goes to a temp file next to ``destination`` and is renamed into
+        place only when complete, so a partial upload is never visible.
+
+        Returns:
+            (size in bytes, {"md5", "sha1", "sha256"})
+
+        Raises:
+            EvidenceTooLargeError: if more than ``max_bytes`` are received
+        """
+        chunk_size = chunk_size or settings.EVIDENCE_UPLOAD_CHUNK_SIZE
+        hasher = MultiHasher()
+        size = 0
+
+        fd, tmp_name = tempfile.mkstemp(dir=destination.parent, prefix=".upload-", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+
+                def consume(chunk: bytes):
+                    # hashlib releases the GIL on large buffers
+                    hasher.update(chunk)
+                    out.write(chunk)
+
+                while chunk := await file.read(chunk_size):
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise EvidenceTooLargeError(max_bytes)
+                    await asyncio.to_thread(consume, chunk)
+
+                out.flush()
+                await asyncio.to_thread(os.fsync, out.fileno())
+
+            os.replace(tmp_name, destination)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+
+        return size, hasher.hexdigests()
 
     @staticmethod
     async def upload_evidence(
@@ -89,16 +163,15 @@ class EvidenceService:
             storage_dir = EVIDENCE_STORAGE / evidence_id
             storage_dir.mkdir(parents=True, exist_ok=True)
 
-            # Save file
-            file_path = storage_dir / file.filename
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-
-            logger.info(f"📦 Evidence file saved: {file_path}")
+            # Stream file to disk, hashing in the same pass
+            file_path = storage_dir / Path(file.filename).name
+            file_size, hashes = await EvidenceService.stream_to_file(
+                file,
+                file_path,
+                max_bytes=settings.EVIDENCE_MAX_UPLOAD_BYTES,
+            )
 
-            # Calculate hashes
-            hashes = EvidenceService.calculate_file_hashes(file_path)
+            logger.info(f"📦 Evidence file saved: {file_path} ({file_size} bytes)")
             logger.info(f"🔐 Hashes calculated - SHA256: {hashes['sha256'][:16]}...")
 
             # Get MIME type
@@ -134,7 +207,7 @@ class EvidenceService:
                 source_tool_id=source_tool_id,
                 file_path=str(file_path),
                 file_name=file.filename,
-                file_size=os.path.getsize(file_path),
+                file_size=file_size,
                 file_hash_md5=hashes["md5"],
                 file_hash_sha1=hashes["sha1"],
                 file_hash_sha256=hashes["sha256"],
@@ -167,6 +240,13 @@ class EvidenceService:
 
             return evidence
 
+        except EvidenceTooLargeError as e:
+            logger.warning(f"⚠️ Evidence upload rejected: {e}")
+            db.rollback()
+            if "storage_dir" in locals() and storage_dir.exists():
+                shutil.rmtree(storage_dir)
+            raise
+
         except Exception as e:
             logger.error(f"❌ Error uploading evidence: {e}", exc_info=True)
             db.rollback()
@@ -20,6 +20,7 @@ from api.models.tools import (
     Agent, AgentTask, AuditLog
 )
 from api.services.audit import record_audit_event
+from api.services.ioc_extractor import ioc_extractor
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +68,9 @@ TOOLS_BY_RISK_LEVEL = {
     ]
 }
 
+# Máximo de IOCs únicos persistidos por ejecución (el extractor avisa si trunca)
+MAX_IOCS_PER_EXECUTION = 1000
+
 # Directorio base para outputs
 EVIDENCE_BASE = settings.EVIDENCE_DIR / "tool_outputs"
 EVIDENCE_BASE.mkdir(parents=True, exist_ok=True)
@@ -667,46 +671,8 @@ class ExecutionService:
                 db.commit()
     
     def _extract_iocs_from_output(self, output: str) -> List[Dict]:
-        """Extrae IOCs del output de la herramienta"""
-        iocs = []
-        
-        # IPs
-        ip_pattern = r'\b(?:\d{1,3}\.){3}\d{1,3}\b'
-        for match in re.finditer(ip_pattern, output):
-            ip = match.group()
-            if not ip.startswith(('10.', '172.16.', '192.168.', '127.')):
-                iocs.append({"type": "ip", "value": ip})
-        
-        # Dominios
-        domain_pattern = r'\b[a-zA-Z0-9][-a-zA-Z0-9]*\.[a-zA-Z]{2,}\b'
-        for match in re.finditer(domain_pattern, output):
-            iocs.append({"type": "domain", "value": match.group()})
-        
-        # Hashes MD5
-        md5_pattern = r'\b[a-fA-F0-9]{32}\b'
-        for match in re.finditer(md5_pattern, output):
-            iocs.append({"type": "hash_md5", "value": match.group()})
-        
-        # Hashes SHA256
-        sha256_pattern = r'\b[a-fA-F0-9]{64}\b'
-        for match in re.finditer(sha256_pattern, output):
-            iocs.append({"type": "hash_sha256", "value": match.group()})
-        
-        # URLs
-        url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-        for match in re.finditer(url_pattern, output):
-            iocs.append({"type": "url", "value": match.group()})
-        
-        # Deduplicar
-        seen = set()
-        unique_iocs = []
-        for ioc in iocs:
-            key = f"{ioc['type']}:{ioc['value']}"
-            if key not in seen:
-                seen.add(key)
-                unique_iocs.append(ioc)
-        
-        return unique_iocs[:100]  # Limitar a 100
+        """Extrae IOCs del output de la herramienta (una pasada, deduplicados por tipo)"""
+        return ioc_extractor.extract(output, limit=MAX_IOCS_PER_EXECUTION)
     
     async def _create_timeline_event(
         self,
@@ -3,15 +3,22 @@ Threat Hunting Service v4.4
 ============================
 Ejecuta queries de hunting contra múltiples fuentes de datos
 Completamente orientado a casos con persistencia y tracking
+
+v4.7: batches concurrentes (límite y timeout por hunt) y resultados en una
+cache LRU con TTL, clave (hash de la query, caso, rango de tiempo)
 """
 
 import asyncio
+import hashlib
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import uuid
 import json
 
+from api.config import settings
 from api.services.llm_provider import get_llm_manager
 from core import process_manager, ProcessType
 
@@ -130,14 +137,123 @@ detection:
 }
 
 
+# (hash de la query, case_id, time_range)
+CacheKey = Tuple[str, str, str]
+
+
+class HuntResultCache:
+    """
+    Cache LRU con TTL de resultados de hunting.
+
+    La clave es (hash de la query, caso, rango de tiempo); los resultados
+    también se consultan por ``result_id``. Lo desalojado (tamaño) o
+    caducado (TTL) desaparece de ambos índices.
+    """
+    
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_size = max_size if max_size is not None else settings.HUNTING_RESULT_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.HUNTING_RESULT_CACHE_TTL
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict]]" = OrderedDict()
+        self._by_id: Dict[str, CacheKey] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @staticmethod
+    def key(
+        query: Dict,
+        case_id: str,
+        time_range: str,
+        tenant_id: Optional[str] = None,
+        parameters: Optional[Dict] = None
+    ) -> CacheKey:
+        material = json.dumps({
+            "query_type": query.get("query_type"),
+            "query": query.get("query"),
+            "tenant_id": tenant_id,
+            "parameters": parameters or {},
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode()).hexdigest(), case_id, time_range
+    
+    def _drop(self, key: CacheKey):
+        _, result = self._entries.pop(key)
+        self._by_id.pop(result["result_id"], None)
+    
+    def _live(self, key: Optional[CacheKey]) -> Optional[Dict]:
+        entry = self._entries.get(key) if key is not None else None
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[0]:
+            self._drop(key)
+            self.expirations += 1
+            return None
+        return entry[1]
+    
+    def get(self, key: CacheKey) -> Optional[Dict]:
+        result = self._live(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+    
+    def put(self, key: CacheKey, result: Dict):
+        if self.max_size <= 0:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._by_id[result["result_id"]] = key
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+    
+    def get_by_id(self, result_id: str) -> Optional[Dict]:
+        return self._live(self._by_id.get(result_id))
+    
+    def remove(self, result_id: str) -> bool:
+        key = self._by_id.get(result_id)
+        if key is None:
+            return False
+        self._drop(key)
+        return True
+    
+    def values(self) -> List[Dict]:
+        """Resultados vigentes (purga los caducados)"""
+        for key in list(self._entries):
+            self._live(key)
+        return [result for _, result in self._entries.values()]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def clear(self):
+        self._entries.clear()
+        self._by_id.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
 class ThreatHuntingService:
     """Servicio de Threat Hunting v4.4 - Orientado a casos"""
     
-    def __init__(self):
+    def __init__(self, results_cache: Optional[HuntResultCache] = None):
         self.queries = HUNTING_QUERIES.copy()
-        self.results_cache: Dict[str, Any] = {}
-        # v4.4: Cache por caso
-        self.case_results: Dict[str, List[str]] = {}  # case_id -> [result_ids]
+        # v4.7: Cache acotada (tamaño + TTL); también sirve de índice por caso
+        self.results_cache = results_cache if results_cache is not None else HuntResultCache()
         
     async def get_queries(self, category: Optional[str] = None) -> List[Dict]:
         """Obtiene queries disponibles"""
@@ -192,6 +308,13 @@ class ThreatHuntingService:
                 "error": f"Query not found: {query_id}"
             }
         
+        # v4.7: Misma query, caso y rango recientes -> resultado en cache
+        cache_key = self.results_cache.key(query, case_id, time_range, tenant_id, parameters)
+        cached = self.results_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"♻️ Hunt {query_id} servido desde cache para caso {case_id}")
+            return {**cached, "cached": True}
+        
         # v4.4: Crear proceso trackeable
         process = process_manager.create_process(
             case_id=case_id,
@@ -254,12 +377,7 @@ class ThreatHuntingService:
             }
             
             # Cache result
-            self.results_cache[result_id] = result
-            
-            # v4.4: Registrar en índice por caso
-            if case_id not in self.case_results:
-                self.case_results[case_id] = []
-            self.case_results[case_id].append(result_id)
+            self.results_cache.put(cache_key, result)
             
             # v4.4: Marcar proceso completado
             process.complete({"result_id": result_id, "hits": len(results)})
@@ -268,6 +386,10 @@ class ThreatHuntingService:
             
             return result
             
+        except asyncio.CancelledError:
+            # Timeout del batch o petición cancelada: el proceso no queda "running"
+            process.fail("Hunt cancelado")
+            raise
         except Exception as e:
             logger.error(f"❌ Error ejecutando hunt {query_id}: {e}")
             process.fail(str(e))
@@ -453,10 +575,10 @@ Responde en formato JSON estructurado."""
         assignee: Optional[str] = None
     ) -> Dict:
         """Crea un caso a partir de resultados de hunting"""
-        if result_id not in self.results_cache:
+        result = self.results_cache.get_by_id(result_id)
+        if result is None:
             return {"error": "Result not found"}
         
-        result = self.results_cache[result_id]
         case_id = f"HUNT-{datetime.utcnow().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
         
         case = {
@@ -480,7 +602,7 @@ Responde en formato JSON estructurado."""
     
     async def get_result(self, result_id: str) -> Optional[Dict]:
         """Obtiene resultado de hunt por ID"""
-        return self.results_cache.get(result_id)
+        return self.results_cache.get_by_id(result_id)
     
     async def get_categories(self) -> List[Dict]:
         """Obtiene categorías de hunting disponibles"""
@@ -505,7 +627,7 @@ Responde en formato JSON estructurado."""
     ) -> List[Dict]:
         """Obtiene resultados de hunting para un caso"""
         results = []
-        for result_id, result in self.results_cache.items():
+        for result in self.results_cache.values():
             if result.get("case_id") == case_id:
                 if severity_filter and result.get("severity") != severity_filter:
                     continue
@@ -517,7 +639,7 @@ Responde en formato JSON estructurado."""
 
     async def get_hunt_result(self, case_id: str, hunt_id: str) -> Optional[Dict]:
         """Obtiene resultado específico de un hunt"""
-        result = self.results_cache.get(hunt_id)
+        result = self.results_cache.get_by_id(hunt_id)
         if result and result.get("case_id") == case_id:
             return result
         return None
@@ -552,14 +674,9 @@ Responde en formato JSON estructurado."""
 
     async def delete_hunt_result(self, case_id: str, hunt_id: str) -> bool:
         """Elimina resultado de un hunt"""
-        if hunt_id in self.results_cache:
-            if self.results_cache[hunt_id].get("case_id") == case_id:
-                del self.results_cache[hunt_id]
-                # v4.4: Actualizar índice de caso
-                if case_id in self.case_results:
-                    if hunt_id in self.case_results[case_id]:
-                        self.case_results[case_id].remove(hunt_id)
-                return True
+        result = self.results_cache.get_by_id(hunt_id)
+        if result and result.get("case_id") == case_id:
+            return self.results_cache.remove(hunt_id)
         return False
 
     async def get_stats(self, case_id: Optional[str] = None) -> Dict:
@@ -567,11 +684,9 @@ Responde en formato JSON estructurado."""
         Obtiene estadísticas de hunting
         v4.4: Soporta filtro por caso
         """
+        results = self.results_cache.values()
         if case_id:
-            result_ids = self.case_results.get(case_id, [])
-            results = [self.results_cache[rid] for rid in result_ids if rid in self.results_cache]
-        else:
-            results = list(self.results_cache.values())
+            results = [r for r in results if r.get("case_id") == case_id]
         
         # Calcular estadísticas
         total_hunts = len(results)
@@ -611,33 +726,49 @@ Responde en formato JSON estructurado."""
         case_id: str,
         tenant_id: Optional[str] = None,
         time_range: str = "7d",
-        executed_by: Optional[str] = None
+        executed_by: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        hunt_timeout: Optional[float] = None
     ) -> Dict:
         """
         Ejecuta múltiples queries de hunting en batch
         v4.4: Tracking completo por caso
+        v4.7: Hunts concurrentes (máx. ``HUNTING_BATCH_CONCURRENCY``) con
+        timeout por hunt; los resultados conservan el orden de ``query_ids``
         """
         batch_id = f"batch_{uuid.uuid4().hex[:8]}"
-        results = []
-        errors = []
+        limit = max(1, max_concurrency or settings.HUNTING_BATCH_CONCURRENCY)
+        timeout = hunt_timeout if hunt_timeout is not None else settings.HUNTING_HUNT_TIMEOUT_SECONDS
+        semaphore = asyncio.Semaphore(limit)
+        started = time.perf_counter()
+        
+        logger.info(
+            f"🎯 Iniciando batch hunt: {len(query_ids)} queries para caso {case_id} (concurrencia {limit})"
+        )
         
-        logger.info(f"🎯 Iniciando batch hunt: {len(query_ids)} queries para caso {case_id}")
+        async def run(query_id: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+            async with semaphore:
+                try:
+                    result = await asyncio.wait_for(
+                        self.execute_hunt(
+                            query_id=query_id,
+                            case_id=case_id,
+                            tenant_id=tenant_id,
+                            time_range=time_range,
+                            executed_by=executed_by
+                        ),
+                        timeout=timeout or None
+                    )
+                    return result, None
+                except asyncio.TimeoutError:
+                    logger.warning(f"⏱️ Hunt {query_id} superó el timeout de {timeout}s")
+                    return None, {"query_id": query_id, "error": f"Timeout after {timeout}s"}
+                except Exception as e:
+                    return None, {"query_id": query_id, "error": str(e)}
         
-        for query_id in query_ids:
-            try:
-                result = await self.execute_hunt(
-                    query_id=query_id,
-                    case_id=case_id,
-                    tenant_id=tenant_id,
-                    time_range=time_range,
-                    executed_by=executed_by
-                )
-                results.append(result)
-            except Exception as e:
-                errors.append({
-                    "query_id": query_id,
-                    "error": str(e)
-                })
+        outcomes = await asyncio.gather(*(run(query_id) for query_id in query_ids))
+        results = [result for result, _ in outcomes if result is not None]
+        errors = [error for _, error in outcomes if error is not None]
         
         return {
             "batch_id": batch_id,
@@ -645,7 +776,10 @@ Responde en formato JSON estructurado."""
             "total_queries": len(query_ids),
             "successful": len(results),
             "failed": len(errors),
+            "cached": sum(1 for r in results if r.get("cached")),
             "total_hits": sum(r.get("total_hits", 0) for r in results),
+            "max_concurrency": limit,
+            "duration_ms": int((time.perf_counter() - started) * 1000),
             "results": results,
             "errors": errors
         }
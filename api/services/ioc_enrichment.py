@@ -0,0 +1,260 @@
+"""
+MCP v4.7 - Concurrent IOC Enrichment
+Enriquecimiento de IOCs consultando todas las fuentes a la vez.
+
+- Un proveedor por fuente (``EnrichmentProvider``) con los tipos de IOC a
+  los que aplica y su ajuste de confianza
+- ``enrich_concurrently`` lanza las fuentes con ``asyncio.gather``; cada
+  una tiene su timeout (``IOC_ENRICH_SOURCE_TIMEOUT``) y el conjunto un
+  plazo global (``IOC_ENRICH_DEADLINE``). Al vencer el plazo se devuelven
+  los resultados ya obtenidos y el resto queda como ``timeout``
+- El ajuste de confianza se aplica en el orden de ``sources`` pedido, así
+  el resultado no depende de qué fuente respondió antes
+"""
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from api.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EnrichmentResult:
+    """Resultado de una fuente: success / error / skipped / timeout"""
+    source: str
+    status: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+    def as_response(self) -> Dict[str, Any]:
+        """Forma de ``enrichment[source]`` en la respuesta de la API"""
+        if self.status == "success":
+            return self.data
+        if self.status == "skipped":
+            return {"skipped": True, "reason": self.error}
+        return {"error": self.error, "status": self.status, **self.data}
+
+
+class EnrichmentProvider(ABC):
+    """Fuente de enriquecimiento"""
+
+    name: str = ""
+    ioc_types: Optional[Set[str]] = None  # None = todos los tipos
+
+    def applies_to(self, ioc_type: str) -> bool:
+        return self.ioc_types is None or ioc_type in self.ioc_types
+
+    @abstractmethod
+    async def fetch(self, ioc_type: str, value: str) -> Dict[str, Any]:
+        """Datos de la fuente; lanza excepción o devuelve {"error": ...} si falla"""
+
+    def adjust_confidence(self, confidence: float, data: Dict[str, Any]) -> float:
+        return confidence
+
+
+class VirusTotalProvider(EnrichmentProvider):
+    name = "virustotal"
+
+    async def fetch(self, ioc_type: str, value: str) -> Dict[str, Any]:
+        # TODO: Integrar con API real de VirusTotal
+        return {
+            "malicious": 15,
+            "suspicious": 3,
+            "harmless": 42,
+            "undetected": 10,
+            "last_analysis_date": datetime.utcnow().isoformat()
+        }
+
+    def adjust_confidence(self, confidence: float, data: Dict[str, Any]) -> float:
+        if data.get("malicious", 0) > 10:
+            return min(95, confidence + 20)
+        return confidence
+
+
+class AbuseIPDBProvider(EnrichmentProvider):
+    name = "abuseipdb"
+
+    async def fetch(self, ioc_type: str, value: str) -> Dict[str, Any]:
+        # TODO: Integrar con API real de AbuseIPDB
+        return {
+            "abuse_confidence_score": 85,
+            "total_reports": 45,
+            "country_code": "RU",
+            "isp": "Unknown ISP"
+        }
+
+    def adjust_confidence(self, confidence: float, data: Dict[str, Any]) -> float:
+        if data.get("abuse_confidence_score", 0) > 50:
+            return min(95, confidence + 15)
+        return confidence
+
+
+class FullContactPersonProvider(EnrichmentProvider):
+    name = "fullcontact_person"
+    ioc_types = {"email"}
+    fields = ["fullName", "title", "organization", "location", "twitter", "linkedin",
+              "avatar", "bio", "ageRange", "gender", "enriched_at"]
+
+    async def fetch(self, ioc_type: str, value: str) -> Dict[str, Any]:
+        from api.services.fullcontact_service import enrich_person_by_email
+        result = await enrich_person_by_email(value)
+        if not result.get("success"):
+            return {"error": result.get("error", "Unknown error"), "found": False}
+        return {key: result.get(key) for key in self.fields}
+
+    def adjust_confidence(self, confidence: float, data: Dict[str, Any]) -> float:
+        # Persona real detrás del email: probable cuenta legítima comprometida
+        if data.get("fullName"):
+            return max(30, confidence - 10)
+        return confidence
+
+
+class FullContactCompanyProvider(EnrichmentProvider):
+    name = "fullcontact_company"
+    ioc_types = {"domain"}
+    fields = ["name", "description", "founded", "employees", "employeesRange", "industry",
+              "website", "social", "logo", "location", "enriched_at"]
+
+    async def fetch(self, ioc_type: str, value: str) -> Dict[str, Any]:
+        from api.services.fullcontact_service import enrich_company_by_domain
+        result = await enrich_company_by_domain(value)
+        if not result.get("success"):
+            return {"error": result.get("error", "Unknown error"), "found": False}
+        return {key: result.get(key) for key in self.fields}
+
+    def adjust_confidence(self, confidence: float, data: Dict[str, Any]) -> float:
+        # Empresa conocida: probable dominio legítimo comprometido
+        if data.get("name") and data.get("employees"):
+            return max(25, confidence - 15)
+        return confidence
+
+
+class ShodanProvider(EnrichmentProvider):
+    name = "shodan"
+    ioc_types = {"ip"}
+    fields = ["organization", "isp", "country", "city", "ports", "hostnames", "vulns", "tags"]
+
+    async def fetch(self, ioc_type: str, value: str) -> Dict[str, Any]:
+        from api.services.threat_intel import shodan_ip_lookup
+        result = await shodan_ip_lookup(value)
+        if not result.get("success"):
+            return {"error": result.get("error", "Unknown error")}
+        data = {key: result.get(key) for key in self.fields}
+        for key in ("ports", "hostnames", "vulns", "tags"):
+            data[key] = data[key] or []
+        return data
+
+    def adjust_confidence(self, confidence: float, data: Dict[str, Any]) -> float:
+        if len(data.get("ports", [])) > 10:
+            confidence = min(90, confidence + 10)
+        if data.get("vulns"):
+            confidence = min(95, confidence + 20)
+        return confidence
+
+
+def default_providers() -> Dict[str, EnrichmentProvider]:
+    providers = [
+        VirusTotalProvider(), AbuseIPDBProvider(), FullContactPersonProvider(),
+        FullContactCompanyProvider(), ShodanProvider(),
+    ]
+    return {provider.name: provider for provider in providers}
+
+
+ENRICHMENT_PROVIDERS = default_providers()
+
+# Nombres históricos de fuentes
+SOURCE_ALIASES = {"fullcontact": "fullcontact_person"}
+
+
+async def _run_source(
+    source: str,
+    provider: Optional[EnrichmentProvider],
+    ioc_type: str,
+    value: str,
+    timeout: float,
+    results: Dict[str, EnrichmentResult],
+):
+    started = time.perf_counter()
+
+    def done(status: str, data: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        results[source] = EnrichmentResult(
+            source=source, status=status, data=data or {}, error=error,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+
+    if provider is None:
+        return done("error", error=f"Unsupported enrichment source: {source}")
+    if not provider.applies_to(ioc_type):
+        return done("skipped", error=f"{source} does not apply to {ioc_type} IOCs")
+    try:
+        data = await asyncio.wait_for(provider.fetch(ioc_type, value), timeout)
+    except asyncio.TimeoutError:
+        return done("timeout", error=f"No response within {timeout}s")
+    except Exception as e:
+        logger.error(f"❌ Error enriching with {source}: {e}")
+        return done("error", error=str(e))
+    if data.get("error"):
+        error = data.pop("error")
+        return done("error", data=data, error=error)
+    done("success", data=data)
+
+
+async def enrich_concurrently(
+    ioc_type: str,
+    value: str,
+    sources: List[str],
+    providers: Optional[Dict[str, EnrichmentProvider]] = None,
+    source_timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, EnrichmentResult]:
+    """
+    Consulta ``sources`` en paralelo. Devuelve un resultado por fuente, en
+    el orden pedido; las que no terminan antes de ``deadline`` quedan como
+    ``timeout`` sin bloquear al resto.
+    """
+    providers = providers if providers is not None else ENRICHMENT_PROVIDERS
+    source_timeout = source_timeout or settings.IOC_ENRICH_SOURCE_TIMEOUT
+    deadline = deadline or settings.IOC_ENRICH_DEADLINE
+    # Sin duplicados ni alias, conservando el orden pedido
+    sources = list(dict.fromkeys(SOURCE_ALIASES.get(source, source) for source in sources))
+
+    results: Dict[str, EnrichmentResult] = {}
+    tasks = [
+        asyncio.ensure_future(_run_source(source, providers.get(source), ioc_type, value, source_timeout, results))
+        for source in sources
+    ]
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks), deadline)
+    except asyncio.TimeoutError:
+        logger.warning(f"⏱️ Enriquecimiento de {value[:50]} cortado a los {deadline}s")
+
+    return {
+        source: results.get(source) or EnrichmentResult(
+            source=source, status="timeout", error=f"Enrichment deadline of {deadline}s exceeded",
+            elapsed_ms=deadline * 1000,
+        )
+        for source in sources
+    }
+
+
+def apply_confidence(
+    confidence: float,
+    results: Dict[str, EnrichmentResult],
+    providers: Optional[Dict[str, EnrichmentProvider]] = None,
+) -> Dict[str, float]:
+    """Confianza tras cada fuente con éxito, aplicada en el orden de ``results``"""
+    providers = providers if providers is not None else ENRICHMENT_PROVIDERS
+    scores = {}
+    for source, result in results.items():
+        if result.status == "success":
+            confidence = providers[source].adjust_confidence(confidence, result.data)
+        scores[source] = confidence
+    return scores
@@ -0,0 +1,294 @@
+"""
+MCP v4.7 - IOC Streaming Export
+Exportación de IOCs como flujo de bytes con memoria constante.
+
+- Las filas se leen con ``yield_per`` (cursor de servidor en PostgreSQL)
+  y sólo las columnas exportadas, sin objetos ORM
+- Formatos: CSV, NDJSON, JSON, bundle STIX 2.1 y evento MISP; cada uno se
+  emite incrementalmente (cabecera, un fragmento por IOC, cierre)
+- Compresión gzip opcional al vuelo con ``zlib.compressobj``
+- Los fragmentos se agrupan hasta ``IOC_EXPORT_CHUNK_BYTES`` antes de
+  entregarlos a la respuesta
+"""
+
+import csv
+import io
+import json
+import uuid
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from api.config import settings
+from api.database import get_db_context
+from api.models.ioc import IocItem
+from api.services.ioc_search import IocSearchFilter, build_search_query
+
+# Formato -> (media type, extensión)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "json": ("application/json", "json"),
+    "stix": ("application/stix+json;version=2.1", "stix.json"),
+    "misp": ("application/json", "misp.json"),
+}
+
+EXPORT_COLUMNS = [
+    "id", "value", "ioc_type", "threat_level", "confidence_score", "status", "source",
+    "description", "case_id", "first_seen", "last_seen", "created_at", "updated_at",
+]
+
+CSV_HEADER = ["id", "value", "type", "threat_level", "confidence", "status", "source", "description", "created_at"]
+
+# UUIDs deterministas para objetos STIX/MISP derivados del ID del IOC
+EXPORT_NAMESPACE = uuid.UUID("5e9d1c4a-7b1f-4f0e-9c55-3b8f1a6d2e10")
+
+# Tipo de IOC -> expresión de observable STIX 2.1
+STIX_PATTERN_PATHS = {
+    "domain": "domain-name:value",
+    "url": "url:value",
+    "email": "email-addr:value",
+    "hash_md5": "file:hashes.MD5",
+    "hash_sha1": "file:hashes.'SHA-1'",
+    "hash_sha256": "file:hashes.'SHA-256'",
+    "file_name": "file:name",
+    "process_name": "process:name",
+    "registry_key": "windows-registry-key:key",
+    "mutex": "mutex:name",
+    "user_account": "user-account:account_login",
+}
+
+# Tipo de IOC -> (tipo de atributo MISP, categoría)
+MISP_ATTRIBUTE_TYPES = {
+    "ip": ("ip-dst", "Network activity"),
+    "domain": ("domain", "Network activity"),
+    "url": ("url", "Network activity"),
+    "email": ("email-dst", "Network activity"),
+    "hash_md5": ("md5", "Payload delivery"),
+    "hash_sha1": ("sha1", "Payload delivery"),
+    "hash_sha256": ("sha256", "Payload delivery"),
+    "file_name": ("filename", "Payload delivery"),
+    "file_path": ("filename", "Artifacts dropped"),
+    "registry_key": ("regkey", "Persistence mechanism"),
+    "mutex": ("mutex", "Artifacts dropped"),
+    "user_agent": ("user-agent", "Network activity"),
+    "yara_rule": ("yara", "Payload installation"),
+    "cve": ("vulnerability", "External analysis"),
+}
+
+MISP_THREAT_LEVELS = {"critical": "1", "high": "1", "medium": "2", "low": "3", "info": "4"}
+
+Row = Dict[str, Any]
+
+
+def export_uuid(ioc_id: str) -> str:
+    return str(uuid.uuid5(EXPORT_NAMESPACE, ioc_id))
+
+
+def _stix_time(value: Optional[datetime]) -> str:
+    value = value or datetime.utcnow()
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def iter_export_rows(
+    flt: IocSearchFilter,
+    session_factory: Callable = None,
+    yield_per: Optional[int] = None,
+) -> Iterator[Row]:
+    """IOCs filtrados como dicts, leídos por lotes de ``yield_per`` filas"""
+    session_factory = session_factory or get_db_context
+    yield_per = yield_per or settings.IOC_EXPORT_YIELD_PER
+    columns = [getattr(IocItem, name) for name in EXPORT_COLUMNS]
+
+    with session_factory() as db:
+        query = (
+            build_search_query(db, flt)
+            .with_entities(*columns)
+            .order_by(IocItem.created_at, IocItem.id)
+            .yield_per(yield_per)
+        )
+        for row in query:
+            yield dict(zip(EXPORT_COLUMNS, row))
+
+
+# ----------------------------------------------------------------------
+# Serializadores: iterables de filas -> fragmentos de texto
+# ----------------------------------------------------------------------
+
+def serialize_csv(rows: Iterable[Row]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for row in rows:
+        writer.writerow([
+            row["id"], row["value"], row["ioc_type"], row["threat_level"], row["confidence_score"],
+            row["status"], row["source"], row["description"] or "", _iso(row["created_at"]) or "",
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _json_item(row: Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "value": row["value"],
+        "ioc_type": row["ioc_type"],
+        "threat_level": row["threat_level"],
+        "confidence_score": row["confidence_score"] if row["confidence_score"] is not None else 50.0,
+        "status": row["status"],
+        "source": row["source"],
+        "description": row["description"],
+        "case_id": row["case_id"],
+        "first_seen": _iso(row["first_seen"]),
+        "last_seen": _iso(row["last_seen"]),
+        "created_at": _iso(row["created_at"]),
+        "updated_at": _iso(row["updated_at"]),
+    }
+
+
+def serialize_ndjson(rows: Iterable[Row]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(_json_item(row), ensure_ascii=False) + "\n"
+
+
+def serialize_json(rows: Iterable[Row]) -> Iterator[str]:
+    """``{"format": "json", "items": [...], "count": N}`` (count al final)"""
+    yield '{"format": "json", "items": ['
+    count = 0
+    for row in rows:
+        yield ("," if count else "") + json.dumps(_json_item(row), ensure_ascii=False)
+        count += 1
+    yield f'], "count": {count}}}'
+
+
+def stix_pattern(ioc_type: str, value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+    if ioc_type == "ip":
+        path = "ipv6-addr:value" if ":" in value else "ipv4-addr:value"
+    else:
+        path = STIX_PATTERN_PATHS.get(ioc_type, f"x-mcp-{ioc_type.replace('_', '-')}:value")
+    return f"[{path} = '{escaped}']"
+
+
+def stix_indicator(row: Row) -> Dict[str, Any]:
+    indicator = {
+        "type": "indicator",
+        "spec_version": "2.1",
+        "id": f"indicator--{export_uuid(row['id'])}",
+        "created": _stix_time(row["created_at"]),
+        "modified": _stix_time(row["updated_at"] or row["created_at"]),
+        "name": f"{row['ioc_type']}: {row['value'][:50]}",
+        "indicator_types": ["malicious-activity"],
+        "pattern": stix_pattern(row["ioc_type"], row["value"]),
+        "pattern_type": "stix",
+        "valid_from": _stix_time(row["first_seen"] or row["created_at"]),
+        "labels": [label for label in (row["threat_level"], row["source"]) if label],
+        "external_references": [{"source_name": "mcp-ioc-store", "external_id": row["id"]}],
+    }
+    if row["description"]:
+        indicator["description"] = row["description"]
+    if row["confidence_score"] is not None:
+        indicator["confidence"] = max(0, min(100, int(round(row["confidence_score"]))))
+    return indicator
+
+
+def serialize_stix(rows: Iterable[Row]) -> Iterator[str]:
+    bundle_id = f"bundle--{uuid.uuid4()}"
+    yield f'{{"type": "bundle", "id": "{bundle_id}", "objects": ['
+    first = True
+    for row in rows:
+        yield ("" if first else ",") + json.dumps(stix_indicator(row), ensure_ascii=False)
+        first = False
+    yield "]}"
+
+
+def misp_attribute(row: Row) -> Dict[str, Any]:
+    misp_type, category = MISP_ATTRIBUTE_TYPES.get(row["ioc_type"], ("text", "Other"))
+    created_at = row["created_at"]
+    return {
+        "type": misp_type,
+        "category": category,
+        "value": row["value"],
+        "comment": row["description"] or "",
+        "uuid": export_uuid(row["id"]),
+        "timestamp": str(int(created_at.timestamp())) if created_at else "",
+        "to_ids": row["status"] == "active",
+    }
+
+
+def serialize_misp(rows: Iterable[Row]) -> Iterator[str]:
+    now = datetime.utcnow()
+    header = {
+        "info": f"IOC Export - {now.strftime('%Y-%m-%d %H:%M')}",
+        "date": now.strftime("%Y-%m-%d"),
+        "uuid": str(uuid.uuid4()),
+        "threat_level_id": "2",
+        "analysis": "2",
+        "distribution": "0",
+    }
+    yield '{"Event": ' + json.dumps(header)[:-1] + ', "Attribute": ['
+    first = True
+    for row in rows:
+        yield ("" if first else ",") + json.dumps(misp_attribute(row), ensure_ascii=False)
+        first = False
+    yield "]}}"
+
+
+SERIALIZERS = {
+    "csv": serialize_csv,
+    "ndjson": serialize_ndjson,
+    "json": serialize_json,
+    "stix": serialize_stix,
+    "misp": serialize_misp,
+}
+
+
+def encode_chunks(
+    chunks: Iterable[str],
+    compress: bool = False,
+    chunk_bytes: Optional[int] = None,
+) -> Iterator[bytes]:
+    """Texto -> bytes UTF-8 agrupados en bloques, opcionalmente en gzip"""
+    chunk_bytes = chunk_bytes or settings.IOC_EXPORT_CHUNK_BYTES
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31 = gzip
+    pending = bytearray()
+
+    for chunk in chunks:
+        data = chunk.encode("utf-8")
+        if compressor is not None:
+            data = compressor.compress(data)
+        pending += data
+        if len(pending) >= chunk_bytes:
+            yield bytes(pending)
+            pending.clear()
+
+    if compressor is not None:
+        pending += compressor.flush()
+    if pending:
+        yield bytes(pending)
+
+
+def stream_export(
+    fmt: str,
+    flt: IocSearchFilter,
+    compress: bool = False,
+    session_factory: Callable = None,
+    yield_per: Optional[int] = None,
+) -> Iterator[bytes]:
+    """Exportación completa como iterador de bytes para StreamingResponse"""
+    if fmt not in SERIALIZERS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+    rows = iter_export_rows(flt, session_factory=session_factory, yield_per=yield_per)
+    return encode_chunks(SERIALIZERS[fmt](rows), compress=compress)
+
+
+def export_filename(fmt: str, compress: bool = False, now: Optional[datetime] = None) -> str:
+    extension = EXPORT_FORMATS[fmt][1]
+    name = f"iocs_export_{(now or datetime.utcnow()).strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return name + ".gz" if compress else name
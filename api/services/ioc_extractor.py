@@ -0,0 +1,326 @@
+"""
+MCP v4.6 - IOC Extractor
+Extractor de IOCs compartido por el executor, el dashboard y la importación
+de investigaciones.
+
+Características:
+- Un solo patrón precompilado (alternación con grupos nombrados): una pasada
+- Streaming por chunks con arrastre de frontera (los tokens no se cortan)
+- Filtrado de rangos privados/reservados vía ``ipaddress``
+- Refang de indicadores defangueados (hxxp, [.], [@], ...) y defang para salida
+- Validación de TLD y deduplicación tipada (tipo, valor normalizado)
+"""
+
+import ipaddress
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# TLDs
+# =============================================================================
+
+_GENERIC_TLDS = (
+    "com net org edu gov mil int info biz name pro mobi aero asia cat coop jobs "
+    "museum tel travel xxx app dev xyz online site top club shop store tech cloud "
+    "live icu vip work space website fun link click download zip mov today world "
+    "life news email page blog host press network services support digital agency "
+    "company solutions systems group global center media social finance bank money "
+    "loan win bid trade date review party stream racing science cricket gdn men "
+    "buzz rest bar kim red blue pink black moe ooo best one run fit lol wtf onion"
+)
+
+_COUNTRY_TLDS = (
+    "ac ad ae af ag ai al am ao aq ar as at au aw ax az ba bb bd be bf bg bh bi bj "
+    "bm bn bo br bs bt bw by bz ca cc cd cf cg ch ci ck cl cm cn co cr cu cv cw cx "
+    "cy cz de dj dk dm do dz ec ee eg er es et eu fi fj fk fm fo fr ga gd ge gf gg "
+    "gh gi gl gm gn gp gq gr gs gt gu gw gy hk hm hn hr ht hu id ie il im in io iq "
+    "ir is it je jm jo jp ke kg kh ki km kn kp kr kw ky kz la lb lc li lk lr ls lt "
+    "lu lv ly ma mc md me mg mh mk ml mm mn mo mp mq mr ms mt mu mv mw mx my mz na "
+    "nc ne nf ng ni nl no np nr nu nz om pa pe pf pg ph pk pl pm pn pr ps pt pw py "
+    "qa re ro rs ru rw sa sb sc sd se sg sh si sk sl sm sn so sr ss st su sv sx sy "
+    "sz tc td tf tg th tj tk tl tm tn to tr tt tv tw tz ua ug uk us uy uz va vc ve "
+    "vg vi vn vu wf ws ye yt za zm zw"
+)
+
+VALID_TLDS = frozenset(_GENERIC_TLDS.split()) | frozenset(_COUNTRY_TLDS.split())
+
+# TLDs que colisionan con extensiones de archivo habituales en outputs de
+# herramientas (script.py, run.sh, README.md...). Se descartan por defecto.
+AMBIGUOUS_TLDS = frozenset({"py", "sh", "md", "ps", "rs", "so", "pm", "pl", "zip", "mov"})
+
+# Dominios que aparecen constantemente en outputs y no aportan valor
+DOMAIN_ALLOWLIST = frozenset({"localhost", "example.com", "example.org", "example.net", "test.com"})
+
+
+# =============================================================================
+# PATRÓN COMBINADO
+# =============================================================================
+
+# Separadores defangueados aceptados en la misma pasada
+_DOT = r"(?:\.|\[\.\]|\(\.\)|\{\.\}|\[dot\]|\(dot\))"
+_AT = r"(?:@|\[@\]|\(@\)|\[at\]|\(at\))"
+_SCHEME = r"(?:https?|hxxps?|h\[tt\]ps?|ftp|fxp)(?::|\[:\])//"
+
+# Cuantificadores posesivos (Python 3.11+): sin backtracking en tokens que no son IOC
+_LABEL = r"[a-z0-9][a-z0-9-]*+"
+
+# Un único \b al inicio: las posiciones dentro de una palabra se descartan con
+# una sola comprobación. El email comparte rama con el dominio (parte local opcional).
+_IOC_PATTERN = re.compile(
+    r"\b(?:(?P<url>" + _SCHEME + r"[^\s<>\"'{}|\\^`]++)"
+    r"|(?P<hash>[a-f0-9]{32}(?:[a-f0-9]{8}(?:[a-f0-9]{24})?)?\b)"
+    r"|(?P<ip>(?:25[0-5]|2[0-4]\d|1?\d?\d)(?:" + _DOT + r"(?:25[0-5]|2[0-4]\d|1?\d?\d)){3}\b)"
+    r"|(?P<cve>CVE-\d{4}-\d{4,7}\b)"
+    r"|(?P<domain>(?:[a-z0-9._%+-]++" + _AT + r")?(?:" + _LABEL + _DOT + r")+[a-z]{2,24}\b))",
+    re.IGNORECASE,
+)
+
+_REFANG_PATTERN = re.compile(
+    r"\[\.\]|\(\.\)|\{\.\}|\[dot\]|\(dot\)|\[@\]|\(@\)|\[at\]|\(at\)|\[:\]|^hxxp|^h\[tt\]p|^fxp",
+    re.IGNORECASE,
+)
+
+_REFANG_MAP = {
+    "[.]": ".", "(.)": ".", "{.}": ".", "[dot]": ".", "(dot)": ".",
+    "[@]": "@", "(@)": "@", "[at]": "@", "(at)": "@",
+    "[:]": ":", "hxxp": "http", "h[tt]p": "http", "fxp": "ftp",
+}
+
+_DEFANG_SCHEME = re.compile(r"^(?:http|ftp)", re.IGNORECASE)
+_DEFANG_SCHEMES = {"http": "hxxp", "ftp": "fxp"}
+
+_HASH_TYPES = {32: "hash_md5", 40: "hash_sha1", 64: "hash_sha256"}
+
+# Delimitadores en los que es seguro cortar un chunk: ningún patrón los cruza
+_CHUNK_DELIMITERS = ("\n", " ", "\t", "\r", '"', "'", "<", ">")
+
+# Arrastre máximo entre chunks cuando no aparece ningún delimitador
+MAX_CARRY_CHARS = 64 * 1024
+
+
+def _is_candidate(token: str) -> bool:
+    """Prefiltro barato: descarta tokens que no pueden contener ningún IOC"""
+    return (
+        "." in token
+        or len(token) >= 32
+        or "[" in token
+        or "(" in token
+        or ("-" in token and "cve-" in token.lower())
+    )
+
+
+def refang(value: str) -> str:
+    """Convierte un indicador defangueado (hxxp://evil[.]com) a su forma real"""
+    return _REFANG_PATTERN.sub(lambda m: _REFANG_MAP[m.group().lower()], value)
+
+
+def defang(value: str, ioc_type: Optional[str] = None) -> str:
+    """Defanguea un indicador (http://evil.com -> hxxp[:]//evil[.]com) para reportes"""
+    if ioc_type in ("hash_md5", "hash_sha1", "hash_sha256", "cve"):
+        return value
+    result = _DEFANG_SCHEME.sub(lambda m: _DEFANG_SCHEMES[m.group().lower()], value, count=1)
+    return result.replace("://", "[:]//", 1).replace("@", "[@]").replace(".", "[.]")
+
+
+def is_public_ip(value: str) -> bool:
+    """True si la IP es enrutable públicamente (excluye privadas, loopback, reservadas...)"""
+    try:
+        ip = ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return ip.is_global and not (ip.is_multicast or ip.is_unspecified or ip.is_reserved)
+
+
+# =============================================================================
+# EXTRACTOR
+# =============================================================================
+
+class IOCExtractor:
+    """
+    Extractor de IOCs de una sola pasada.
+
+    Los resultados son dicts ``{"type", "value"}`` con los tipos del IOC Store
+    (ip, domain, url, email, hash_md5, hash_sha1, hash_sha256, cve).
+    """
+
+    def __init__(
+        self,
+        include_private_ips: bool = False,
+        allow_ambiguous_tlds: bool = False,
+        hosts_from_urls: bool = True,
+    ):
+        self.include_private_ips = include_private_ips
+        self.allow_ambiguous_tlds = allow_ambiguous_tlds
+        self.hosts_from_urls = hosts_from_urls
+
+    # ------------------------------------------------------------------
+    # Normalización / validación
+    # ------------------------------------------------------------------
+
+    def _valid_domain(self, domain: str) -> bool:
+        if domain in DOMAIN_ALLOWLIST:
+            return False
+        tld = domain.rsplit(".", 1)[-1]
+        if tld not in VALID_TLDS:
+            return False
+        return self.allow_ambiguous_tlds or tld not in AMBIGUOUS_TLDS
+
+    def _valid_ip(self, ip: str) -> bool:
+        if self.include_private_ips:
+            try:
+                ipaddress.ip_address(ip)
+                return True
+            except ValueError:
+                return False
+        return is_public_ip(ip)
+
+    def _classify(self, match: "re.Match") -> List[Tuple[str, str]]:
+        """Normaliza un match del patrón combinado a pares (tipo, valor)"""
+        kind = match.lastgroup
+        raw = match.group()
+
+        if kind == "hash":
+            return [(_HASH_TYPES[len(raw)], raw.lower())]
+
+        if kind == "cve":
+            return [("cve", raw.upper())]
+
+        value = refang(raw)
+
+        if kind == "ip":
+            return [("ip", value)] if self._valid_ip(value) else []
+
+        if kind == "domain":
+            lowered = value.lower()
+            if "@" in lowered:
+                ok = self._valid_domain(lowered.rsplit("@", 1)[-1])
+                return [("email", lowered)] if ok else []
+            return [("domain", lowered)] if self._valid_domain(lowered) else []
+
+        # url: quitar puntuación final que suele venir pegada del texto
+        url = value.rstrip(".,;:)]}")
+        results = [("url", url)]
+        if self.hosts_from_urls:
+            try:
+                host = (urlsplit(url).hostname or "").lower()
+            except ValueError:
+                host = ""
+            if host:
+                try:
+                    ipaddress.ip_address(host)
+                    if self._valid_ip(host):
+                        results.append(("ip", host))
+                except ValueError:
+                    if self._valid_domain(host):
+                        results.append(("domain", host))
+        return results
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[str, str, int]]:
+        """Itera (tipo, valor, offset) para cada indicador en el texto, sin deduplicar"""
+        for match in _IOC_PATTERN.finditer(text):
+            offset = match.start()
+            for ioc_type, value in self._classify(match):
+                yield ioc_type, value, offset
+
+    def extract(self, text: str, limit: Optional[int] = None) -> List[Dict]:
+        """Extrae IOCs únicos de un texto completo"""
+        return self.extract_stream((text,), limit=limit)
+
+    def extract_stream(
+        self,
+        chunks: Iterable[str],
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Extrae IOCs únicos de una secuencia de chunks de texto.
+
+        Cada chunk se corta en el último delimitador seguro; el resto se
+        arrastra al siguiente chunk para no partir indicadores en la frontera.
+        Los resultados llevan ``count`` con el número de apariciones.
+        """
+        seen: Dict[Tuple[str, str], Dict] = {}
+        classified: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        finditer = _IOC_PATTERN.finditer
+
+        for segment in self._segments(chunks):
+            # Ningún patrón cruza espacios: se prefiltran tokens con str.split()
+            # (C puro) y la regex sólo corre sobre los candidatos
+            for token in segment.split():
+                if not _is_candidate(token):
+                    continue
+                for match in finditer(token):
+                    raw_key = (match.lastgroup, match.group())
+                    pairs = classified.get(raw_key)
+                    if pairs is None:
+                        pairs = classified[raw_key] = self._classify(match)
+                    for key in pairs:
+                        entry = seen.get(key)
+                        if entry is None:
+                            seen[key] = {"type": key[0], "value": key[1], "count": 1}
+                        else:
+                            entry["count"] += 1
+
+        iocs = list(seen.values())
+        if limit is not None and len(iocs) > limit:
+            logger.warning(f"⚠️ IOC extraction truncated: {len(iocs)} unique IOCs, keeping {limit}")
+            iocs = iocs[:limit]
+        return iocs
+
+    def extract_file(
+        self,
+        path: Union[str, Path],
+        chunk_size: int = 1024 * 1024,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """Extrae IOCs de un archivo leyéndolo por chunks (memoria acotada)"""
+        return self.extract_stream(iter_text_chunks(path, chunk_size), limit=limit)
+
+    @staticmethod
+    def _segments(chunks: Iterable[str]) -> Iterator[str]:
+        carry = ""
+        for chunk in chunks:
+            if not chunk:
+                continue
+            buffer = carry + chunk if carry else chunk
+            cut = max(buffer.rfind(d) for d in _CHUNK_DELIMITERS)
+            if cut < 0:
+                if len(buffer) <= MAX_CARRY_CHARS:
+                    carry = buffer
+                    continue
+                cut = len(buffer) - 1
+            yield buffer[:cut + 1]
+            carry = buffer[cut + 1:]
+        if carry:
+            yield carry
+
+
+def iter_text_chunks(path: Union[str, Path], chunk_size: int = 1024 * 1024) -> Iterator[str]:
+    """Lee un archivo de texto en chunks, tolerando bytes no UTF-8"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+# =============================================================================
+# SINGLETON
+# =============================================================================
+
+ioc_extractor = IOCExtractor()
+
+
+def extract_iocs(text: str, limit: Optional[int] = None) -> List[Dict]:
+    """Atajo sobre el extractor global"""
+    return ioc_extractor.extract(text, limit=limit)
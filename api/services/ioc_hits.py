@@ -0,0 +1,181 @@
+"""
+MCP v4.7 - IOC Hit Accounting
+Contabilidad diferida de ``hit_count`` / ``last_seen`` de los IOCs.
+
+- Las lecturas (GET /api/iocs/{id}, /lookup) sólo registran el hit en
+  memoria, agregado por IOC; la petición no escribe ni hace commit
+- Una tarea de fondo vuelca los hits cada ``IOC_HIT_FLUSH_SECONDS`` con un
+  único ``UPDATE ... SET hit_count = hit_count + CASE id ... END`` por lote
+- Si el volcado falla, los hits vuelven al buffer y se reintentan
+- Las respuestas suman los hits pendientes para que el contador no retroceda
+"""
+
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import case, func, update
+
+from api.config import settings
+from api.database import get_db_context
+from api.models.ioc import IocItem
+
+logger = logging.getLogger(__name__)
+
+PendingHit = Tuple[int, datetime]  # (hits, último hit)
+
+
+def build_hit_update(hits: List[Tuple[str, int, datetime]]):
+    """UPDATE único para un lote de (ioc_id, hits, último hit)"""
+    table = IocItem.__table__
+    return (
+        update(table)
+        .where(table.c.id.in_([ioc_id for ioc_id, _, _ in hits]))
+        .values(
+            hit_count=func.coalesce(table.c.hit_count, 0) + case(
+                {ioc_id: count for ioc_id, count, _ in hits}, value=table.c.id, else_=0
+            ),
+            last_seen=case(
+                {ioc_id: seen for ioc_id, _, seen in hits}, value=table.c.id, else_=table.c.last_seen
+            ),
+            # Un hit no es una edición del IOC: sin onupdate de updated_at
+            updated_at=table.c.updated_at,
+        )
+    )
+
+
+class IocHitBuffer:
+    """
+    Hits de IOCs agregados en memoria por ID y volcados periódicamente.
+
+    ``record`` es seguro entre hilos; ``flush`` intercambia el buffer bajo
+    el lock, así que los hits que lleguen durante el volcado van al
+    siguiente.
+    """
+
+    def __init__(
+        self,
+        flush_seconds: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        session_factory=None,
+    ):
+        self.flush_interval = flush_seconds or settings.IOC_HIT_FLUSH_SECONDS
+        self.batch_size = batch_size or settings.IOC_HIT_FLUSH_BATCH
+        self.session_factory = session_factory or get_db_context
+        self._pending: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def record(self, ioc_ids: Iterable[str], when: Optional[datetime] = None):
+        """Registra un hit para cada IOC (sin tocar la BD)"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            for ioc_id in ioc_ids:
+                self._add(ioc_id, 1, when)
+        self._ensure_started()
+
+    def record_counts(self, counts: Mapping[str, int], when: Optional[datetime] = None):
+        """Registra ``count`` hits por IOC de una vez (p. ej. el recuento de un barrido)"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            for ioc_id, count in counts.items():
+                if count > 0:
+                    self._add(ioc_id, count, when)
+        self._ensure_started()
+
+    def _add(self, ioc_id: str, count: int, when: datetime):
+        """Suma hits pendientes (con el lock tomado)"""
+        entry = self._pending.get(ioc_id)
+        if entry is None:
+            self._pending[ioc_id] = [count, when]
+        else:
+            entry[0] += count
+            if when > entry[1]:
+                entry[1] = when
+        self.recorded += count
+
+    def pending(self, ioc_id: str) -> Optional[PendingHit]:
+        with self._lock:
+            entry = self._pending.get(ioc_id)
+            return (entry[0], entry[1]) if entry is not None else None
+
+    def _ensure_started(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # fuera de un event loop (scripts, tests): volcado manual con flush()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def _merge_back(self, hits: List[Tuple[str, int, datetime]]):
+        with self._lock:
+            for ioc_id, count, seen in hits:
+                entry = self._pending.get(ioc_id)
+                if entry is None:
+                    self._pending[ioc_id] = [count, seen]
+                else:
+                    entry[0] += count
+                    entry[1] = max(entry[1], seen)
+
+    def flush(self) -> int:
+        """Escribe los hits pendientes; devuelve cuántos se volcaron"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        hits = [(ioc_id, count, seen) for ioc_id, (count, seen) in pending.items()]
+
+        written = 0
+        for start in range(0, len(hits), self.batch_size):
+            batch = hits[start:start + self.batch_size]
+            try:
+                with self.session_factory() as db:
+                    # Core sobre la conexión: sin eventos ORM ni carga de objetos
+                    db.connection().execute(build_hit_update(batch))
+            except Exception as e:
+                self._merge_back(batch)
+                self.failed += 1
+                logger.error(f"❌ Error volcando hits de {len(batch)} IOCs: {e}")
+                continue
+            written += sum(count for _, count, _ in batch)
+            self.flushes += 1
+        self.written += written
+        return written
+
+    async def stop(self):
+        """Detiene la tarea de fondo y vuelca lo pendiente"""
+        task, self._task = self._task, None
+        if task is not None and not task.done() and self._loop is asyncio.get_running_loop():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        written = await asyncio.to_thread(self.flush)
+        if written:
+            logger.info(f"🎯 {written} hits de IOCs volcados al detener")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending_iocs = len(self._pending)
+            pending_hits = sum(entry[0] for entry in self._pending.values())
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "pending_iocs": pending_iocs,
+            "pending_hits": pending_hits,
+        }
+
+
+ioc_hits = IocHitBuffer()
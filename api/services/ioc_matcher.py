@@ -0,0 +1,711 @@
+"""
+MCP v4.7 - IOC Matcher
+Comparación en memoria de eventos contra los IOCs activos del IOC Store.
+
+- Índice compilado a partir de las filas ``IocItem`` activas, con una
+  estructura por tipo de indicador:
+  * conjunto hash (dict) para hashes, IPs, emails, cuentas, mutex y CVEs
+  * árbol radix binario para rangos CIDR (IPv4 e IPv6)
+  * trie de sufijos de dominio: ``evil.com`` cubre ``a.b.evil.com``
+  * autómata Aho-Corasick para URLs, user agents, rutas, claves de
+    registro y nombres de archivo/proceso (subcadena, sin mayúsculas)
+- Cada autómata sólo recorre los valores que contienen el carácter más raro
+  de sus patrones, y los resultados por valor observado se cachean (los
+  logs repiten user agents, aplicaciones, países...)
+- ``match_bytes`` compara bloques de texto libre (archivos de evidencia):
+  tokens separados en C y resueltos una sola vez por índice
+- El índice es inmutable; la recarga construye uno nuevo y sustituye la
+  referencia, así las búsquedas nunca ven un índice a medias
+- Recarga en caliente: los commits que tocan ``IocItem`` marcan el índice
+  como obsoleto y la siguiente ``ensure_fresh`` lo reconstruye (como
+  mucho una vez cada ``IOC_MATCHER_RELOAD_SECONDS``)
+- ``record_sightings`` persiste un ``IocSighting`` por coincidencia y
+  suma el hit vía ``ioc_hits``
+"""
+
+import asyncio
+import ipaddress
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import Delete, Insert, Update, event, or_
+from sqlalchemy.orm import Session
+
+from api.config import settings
+from api.database import SessionLocal
+from api.models.ioc import IocItem, IocSighting
+
+logger = logging.getLogger(__name__)
+
+# Tipo de IOC -> estructura del índice (ip y domain aparte; el resto, valor exacto)
+STRING_TYPES = frozenset({"url", "user_agent", "file_path", "file_name", "process_name", "registry_key"})
+# Tipos de subcadena que deben empezar en un límite (``a.exe`` no casa con ``data.exe``)
+BOUNDED_TYPES = frozenset({"file_name", "process_name"})
+# Sin representación observable en un evento
+UNMATCHED_TYPES = frozenset({"yara_rule"})
+
+# Campos de evento que nunca contienen indicadores
+SKIP_FIELDS = frozenset({
+    "timestamp", "@timestamp", "time", "event_time", "created_at", "createdDateTime",
+    "severity", "level", "event_id", "id", "correlation_id", "pid",
+})
+
+MAX_EVENT_DEPTH = 8
+MAX_VALUE_CHARS = 8192
+
+_IPV4_RE = re.compile(r"(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])")
+_IPV6_RE = re.compile(r"(?<![0-9a-f:])[0-9a-f]{0,4}(?::[0-9a-f]{0,4}){2,7}(?![0-9a-f:])")
+_HOST_RE = re.compile(r"(?:[a-z0-9_](?:[a-z0-9_-]*[a-z0-9])?\.)+[a-z][a-z0-9-]*[a-z0-9]")
+# Tokens de texto libre para ``bytes.translate``: los separadores pasan a
+# espacio y las mayúsculas ASCII a minúsculas (hashes, emails, IPs, dominios, CVEs)
+_TOKEN_BYTES = frozenset(b"0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_@$\\-.")
+_TOKEN_TABLE = bytes(
+    (ch | 0x20 if 65 <= ch <= 90 else ch) if ch in _TOKEN_BYTES or ch >= 128 else 32
+    for ch in range(256)
+)
+
+
+class IocRef(NamedTuple):
+    """Datos del IOC que viajan con cada coincidencia"""
+    id: str
+    ioc_type: str
+    value: str
+    threat_level: Optional[str]
+    case_id: Optional[str]
+
+
+@dataclass
+class IocMatch:
+    """Coincidencia de un IOC en un valor observado"""
+    ioc: IocRef
+    field: str  # ruta del campo en el evento (``raw.user.ip``) o nombre de la fuente
+    observed: str  # valor observado completo (recortado a MAX_VALUE_CHARS)
+    offset: Optional[int] = None  # inicio de la coincidencia dentro de ``observed``
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ioc_id": self.ioc.id,
+            "ioc_type": self.ioc.ioc_type,
+            "ioc_value": self.ioc.value,
+            "threat_level": self.ioc.threat_level,
+            "field": self.field,
+            "observed": self.observed[:256],
+            "offset": self.offset,
+        }
+
+
+# ============================================================================
+# ESTRUCTURAS
+# ============================================================================
+
+class AhoCorasick:
+    """
+    Autómata Aho-Corasick sobre caracteres. ``add`` todos los patrones,
+    ``build`` una vez y después ``iter`` devuelve (inicio, payload) de cada
+    aparición, incluidas las solapadas.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Tuple[int, Any], ...]] = [()]
+        self.min_length = 0
+        self.max_length = 0
+        self.patterns = 0
+
+    def add(self, pattern: str, payload: Any):
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._out[state] += ((len(pattern), payload),)
+        self.min_length = min(self.min_length, len(pattern)) if self.patterns else len(pattern)
+        self.max_length = max(self.max_length, len(pattern))
+        self.patterns += 1
+
+    def build(self):
+        """Enlaces de fallo por BFS; la salida de cada estado incluye la de su fallo"""
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                back = fail[state]
+                while back and ch not in goto[back]:
+                    back = fail[back]
+                target = goto[back].get(ch, 0)
+                fail[nxt] = target if target != nxt else 0
+                out[nxt] += out[fail[nxt]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, Any]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, ch in enumerate(text, 1):
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if out[state]:
+                for length, payload in out[state]:
+                    yield end - length, payload
+
+    def iter_gated(self, text: str, gate: str) -> Iterator[Tuple[int, Any]]:
+        """
+        ``iter`` restringido a ventanas alrededor de cada aparición de
+        ``gate``, presente en todos los patrones: en textos largos con la
+        puerta poco frecuente se recorre una fracción del texto.
+        """
+        span = self.max_length
+        if len(text) <= 4 * span:
+            yield from self.iter(text)
+            return
+        windows: List[List[int]] = []
+        position = text.find(gate)
+        while position != -1:
+            start, end = max(0, position - span + 1), position + span
+            if windows and start <= windows[-1][1]:
+                windows[-1][1] = end
+            else:
+                windows.append([start, end])
+            position = text.find(gate, end - span + 1)
+        for start, end in windows:
+            for offset, payload in self.iter(text[start:end]):
+                yield start + offset, payload
+
+    def __bool__(self) -> bool:
+        return self.patterns > 0
+
+
+class CidrTree:
+    """Árbol radix binario (un bit por nivel) para prefijos IPv4/IPv6"""
+
+    def __init__(self):
+        # nodo = [hijo 0, hijo 1, payloads]
+        self._roots = {4: [None, None, ()], 6: [None, None, ()]}
+        self._depth = {4: 0, 6: 0}
+        self.networks = 0
+
+    def add(self, network, payload: Any):
+        version, bits = network.version, network.max_prefixlen
+        address = int(network.network_address)
+        node = self._roots[version]
+        for position in range(network.prefixlen):
+            bit = (address >> (bits - 1 - position)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, ()]
+            node = node[bit]
+        node[2] += (payload,)
+        self._depth[version] = max(self._depth[version], network.prefixlen)
+        self.networks += 1
+
+    def lookup(self, address) -> List[Any]:
+        """Payloads de todos los prefijos que contienen ``address``"""
+        return self.lookup_int(address.version, int(address))
+
+    def lookup_int(self, version: int, value: int) -> List[Any]:
+        bits = 32 if version == 4 else 128
+        node = self._roots[version]
+        found = list(node[2])
+        for position in range(self._depth[version]):
+            node = node[(value >> (bits - 1 - position)) & 1]
+            if node is None:
+                break
+            found.extend(node[2])
+        return found
+
+    def __bool__(self) -> bool:
+        return self.networks > 0
+
+
+class DomainTrie:
+    """Trie de etiquetas de dominio invertidas (com -> evil -> a)"""
+
+    def __init__(self):
+        self._root: Dict[str, list] = {}  # etiqueta -> [hijos, payloads]
+        self.domains = 0
+
+    def add(self, domain: str, payload: Any):
+        children = self._root
+        node = None
+        for label in reversed(domain.strip(".").split(".")):
+            node = children.get(label)
+            if node is None:
+                node = children[label] = [{}, ()]
+            children = node[0]
+        if node is not None:
+            node[1] += (payload,)
+            self.domains += 1
+
+    def lookup(self, host: str) -> List[Any]:
+        """Payloads del host y de todos sus dominios padre"""
+        found = []
+        children = self._root
+        for label in reversed(host.split(".")):
+            node = children.get(label)
+            if node is None:
+                break
+            found.extend(node[1])
+            children = node[0]
+        return found
+
+    def __bool__(self) -> bool:
+        return self.domains > 0
+
+
+# ============================================================================
+# ÍNDICE
+# ============================================================================
+
+def _is_boundary(text: str, start: int) -> bool:
+    return start == 0 or not text[start - 1].isalnum()
+
+
+# Caracteres de logs de más a menos frecuente; los ausentes cuentan como los más raros
+_LOG_CHAR_FREQUENCY = " e.t0a1o2in-s:r/h5l34d67c8u9mfpgwybv_kxjqz"
+_GATE_RANK = {ch: len(_LOG_CHAR_FREQUENCY) - rank for rank, ch in enumerate(_LOG_CHAR_FREQUENCY)}
+
+
+def _gate(pattern: str) -> str:
+    """Carácter más raro del patrón; el autómata sólo recorre textos que lo contienen"""
+    return min(pattern, key=lambda ch: _GATE_RANK.get(ch, 0))
+
+
+class IocIndex:
+    """Índice inmutable de IOCs; construir con ``IocIndex(refs)``"""
+
+    def __init__(self, iocs: Iterable[IocRef] = (), cache_size: Optional[int] = None):
+        self.exact: Dict[str, Tuple[IocRef, ...]] = {}
+        self.cidrs = CidrTree()
+        self.domains = DomainTrie()
+        # Un autómata por carácter "puerta": ``gate in text`` (en C) evita
+        # recorrer carácter a carácter los valores que no pueden contener ningún patrón
+        self.strings: Dict[str, AhoCorasick] = {}
+        self.ip_versions = set()  # versiones con IPs/CIDRs indexados
+        self.size = 0
+        self.skipped = 0
+        for ref in iocs:
+            if self._add(ref):
+                self.size += 1
+            else:
+                self.skipped += 1
+        for automaton in self.strings.values():
+            automaton.build()
+        self._gated = tuple(self.strings.items())
+        # Valor observado -> coincidencias: los logs repiten mucho (user agents, apps, países)
+        self._cache: Dict[str, Tuple[Tuple[IocRef, Optional[int]], ...]] = {}
+        self.cache_size = cache_size if cache_size is not None else settings.IOC_MATCHER_CACHE_SIZE
+        # Tokens de ``match_bytes`` ya resueltos: con coincidencias (y su desplazamiento) y sin ellas
+        self._token_hits: Dict[bytes, Tuple[Tuple[IocRef, int], ...]] = {}
+        self._token_misses: Set[bytes] = set()
+        self.loaded_at = datetime.utcnow()
+
+    def _add(self, ref: IocRef) -> bool:
+        value = (ref.value or "").strip().lower()
+        if not value or ref.ioc_type in UNMATCHED_TYPES:
+            return False
+        if ref.ioc_type == "ip":
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+            except ValueError:
+                return False
+            self.ip_versions.add(network.version)
+            if network.prefixlen < network.max_prefixlen:
+                self.cidrs.add(network, ref)
+                return True
+            value = str(network.network_address)
+        elif ref.ioc_type == "domain":
+            self.domains.add(value.rstrip("."), ref)
+            return True
+        elif ref.ioc_type in STRING_TYPES:
+            gate = _gate(value)
+            if gate not in self.strings:
+                self.strings[gate] = AhoCorasick()
+            self.strings[gate].add(value, ref)
+            return True
+        self.exact[value] = self.exact.get(value, ()) + (ref,)
+        return True
+
+    def match_value(self, value: str) -> Tuple[Tuple[IocRef, Optional[int]], ...]:
+        """IOCs presentes en un valor, con el inicio de la coincidencia (None si es el valor entero)"""
+        found = self._cache.get(value)
+        if found is None:
+            found = self.match_text(value[:MAX_VALUE_CHARS])
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[value] = found
+        return found
+
+    def match_text(self, value: str) -> Tuple[Tuple[IocRef, Optional[int]], ...]:
+        """Como ``match_value`` pero sin recorte ni caché"""
+        text = value.lower()
+        found: List[Tuple[IocRef, Optional[int]]] = []
+
+        # Camino rápido: el valor es sólo una IPv4 (campos source_ip, client_ip...)
+        if text[:1].isdigit() and 4 in self.ip_versions:
+            candidate = _IPV4_RE.fullmatch(text)
+            if candidate is not None:
+                self._match_ipv4(text, 0, found)
+                return tuple(found)
+
+        refs = self.exact.get(text.strip())
+        if refs:
+            found.extend((ref, None) for ref in refs)
+
+        if "." in text:
+            if self.domains:
+                for host in _HOST_RE.finditer(text):
+                    for ref in self.domains.lookup(host.group()):
+                        found.append((ref, host.start()))
+            if 4 in self.ip_versions:
+                for candidate in _IPV4_RE.finditer(text):
+                    self._match_ipv4(candidate.group(), candidate.start(), found)
+        if ":" in text and 6 in self.ip_versions:
+            for candidate in _IPV6_RE.finditer(text):
+                self._match_ipv6(candidate, found)
+
+        for gate, automaton in self._gated:
+            if gate in text and len(text) >= automaton.min_length:
+                for start, ref in automaton.iter_gated(text, gate):
+                    if ref.ioc_type not in BOUNDED_TYPES or _is_boundary(text, start):
+                        found.append((ref, start))
+        return tuple(found)
+
+    def match_bytes(self, data: bytes) -> List[Tuple[IocRef, int]]:
+        """
+        IOCs presentes en un bloque de texto libre (archivos de evidencia),
+        con el desplazamiento en bytes dentro de ``data``.
+
+        Valores exactos, IPv4 y dominios se buscan por tokens (separados con
+        ``bytes.translate`` + ``split``, en C); IPv6 y los autómatas de
+        subcadena recorren el texto decodificado. A diferencia de
+        ``match_text``, un valor exacto sólo casa como token completo.
+        """
+        found: List[Tuple[IocRef, int]] = []
+        if self.exact or self.domains or self.ip_versions:
+            self._match_tokens(data.translate(_TOKEN_TABLE), found)
+
+        ipv6 = 6 in self.ip_versions and b":" in data
+        if not ipv6 and not self._gated:
+            return found
+        text = data.decode("utf-8", "surrogateescape").lower()
+        in_text: List[Tuple[IocRef, int]] = []
+        if ipv6:
+            for candidate in _IPV6_RE.finditer(text):
+                self._match_ipv6(candidate, in_text)
+        for gate, automaton in self._gated:
+            if gate in text and len(text) >= automaton.min_length:
+                for start, ref in automaton.iter_gated(text, gate):
+                    if ref.ioc_type not in BOUNDED_TYPES or _is_boundary(text, start):
+                        in_text.append((ref, start))
+        if in_text and not data.isascii():
+            in_text = [(ref, len(text[:start].encode("utf-8", "surrogateescape"))) for ref, start in in_text]
+        found.extend(in_text)
+        return found
+
+    def _match_tokens(self, buffer: bytes, found: list):
+        # Conjuntos en C: en Python sólo se resuelven los tokens nuevos y sólo
+        # se buscan posiciones de los tokens con coincidencias
+        hits, misses = self._token_hits, self._token_misses
+        tokens = set(buffer.split())
+        unknown = tokens - misses
+        unknown.difference_update(hits)
+        if len(misses) + len(unknown) > 4 * self.cache_size:
+            misses.clear()
+        for token in unknown:
+            resolved = self._resolve_token(token)
+            if resolved:
+                hits[token] = resolved
+            else:
+                misses.add(token)
+
+        size = len(buffer)
+        for token in tokens.intersection(hits):
+            resolved = hits[token]
+            position = buffer.find(token)
+            while position != -1:
+                end = position + len(token)
+                if (position == 0 or buffer[position - 1] == 32) and (end == size or buffer[end] == 32):
+                    found.extend((ref, position + delta) for ref, delta in resolved)
+                position = buffer.find(token, end)
+
+    def _resolve_token(self, token: bytes) -> Tuple[Tuple[IocRef, int], ...]:
+        raw = token.decode("utf-8", "surrogateescape")
+        value = raw.strip(".")
+        lead = len(raw) - len(raw.lstrip("."))
+        found: List[Tuple[IocRef, int]] = []
+        # IPv4 sola o pegada a otro texto (``ip-10.0.0.1``); si no, dominio o valor exacto
+        candidates = (
+            list(_IPV4_RE.finditer(value)) if 4 in self.ip_versions and value[-1:].isdigit() else ()
+        )
+        for candidate in candidates:
+            self._match_ipv4(candidate.group(), candidate.start(), found)
+        if not candidates:
+            if self.domains and "." in value:
+                host_start = value.rfind("@") + 1
+                found.extend((ref, host_start) for ref in self.domains.lookup(value[host_start:]))
+            found.extend((ref, 0) for ref in self.exact.get(value, ()))
+        if raw.isascii():
+            return tuple((ref, lead + start) for ref, start in found)
+        return tuple((ref, len(raw[:lead + start].encode("utf-8", "surrogateescape"))) for ref, start in found)
+
+    def _match_ipv4(self, raw: str, start: int, found: list):
+        # Sin ipaddress: el regex ya garantiza cuatro grupos de 1-3 dígitos
+        octets = [int(part) for part in raw.split(".")]
+        if max(octets) > 255:
+            return
+        refs = self.exact.get(raw, ())
+        if self.cidrs:
+            value = (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+            refs += tuple(self.cidrs.lookup_int(4, value))
+        found.extend((ref, start) for ref in refs)
+
+    def _match_ipv6(self, candidate: "re.Match", found: list):
+        try:
+            address = ipaddress.IPv6Address(candidate.group())
+        except ValueError:
+            return
+        refs = self.exact.get(str(address), ())
+        if self.cidrs:
+            refs += tuple(self.cidrs.lookup(address))
+        found.extend((ref, candidate.start()) for ref in refs)
+
+    def match_event(self, event: Any, prefix: str = "") -> List[IocMatch]:
+        """Recorre los valores de texto de un evento (dicts/listas anidados)"""
+        matches: List[IocMatch] = []
+        if isinstance(event, str):
+            for ref, offset in self.match_value(event):
+                matches.append(IocMatch(ref, prefix, event[:MAX_VALUE_CHARS], offset))
+        else:
+            self._walk(event, prefix, 0, matches)
+        return _dedupe(matches) if len(matches) > 1 else matches
+
+    def _walk(self, container: Any, path: str, depth: int, matches: List[IocMatch]):
+        if isinstance(container, dict):
+            items = container.items()
+            skip = SKIP_FIELDS
+        elif isinstance(container, (list, tuple)):
+            items = enumerate(container)
+            skip = ()
+        else:
+            return
+        cache = self._cache
+        for key, item in items:
+            if isinstance(item, str):
+                if not item or key in skip:
+                    continue
+                found = cache.get(item)
+                if found is None:
+                    found = self.match_value(item)
+                if found:
+                    field = _field_path(path, key)
+                    matches.extend(IocMatch(ref, field, item[:MAX_VALUE_CHARS], offset) for ref, offset in found)
+            elif depth < MAX_EVENT_DEPTH and isinstance(item, (dict, list, tuple)):
+                self._walk(item, _field_path(path, key), depth + 1, matches)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "iocs": self.size,
+            "skipped": self.skipped,
+            "exact_values": len(self.exact),
+            "cidrs": self.cidrs.networks,
+            "domains": self.domains.domains,
+            "string_patterns": sum(automaton.patterns for automaton in self.strings.values()),
+            "cached_values": len(self._cache),
+            "loaded_at": self.loaded_at.isoformat(),
+        }
+
+
+def _field_path(path: str, key: Any) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    return f"{path}.{key}" if path else str(key)
+
+
+def _dedupe(matches: List[IocMatch]) -> List[IocMatch]:
+    """Una coincidencia por (IOC, campo)"""
+    seen = set()
+    unique = []
+    for match in matches:
+        key = (match.ioc.id, match.field)
+        if key not in seen:
+            seen.add(key)
+            unique.append(match)
+    return unique
+
+
+# ============================================================================
+# MATCHER CON RECARGA EN CALIENTE
+# ============================================================================
+
+def load_active_iocs(db: Session) -> List[IocRef]:
+    now = datetime.utcnow()
+    rows = (
+        db.query(IocItem)
+        .with_entities(IocItem.id, IocItem.ioc_type, IocItem.value, IocItem.threat_level, IocItem.case_id)
+        .filter(IocItem.status == "active")
+        .filter(or_(IocItem.expires_at.is_(None), IocItem.expires_at > now))
+    )
+    return [IocRef(*row) for row in rows]
+
+
+class IocMatcher:
+    """
+    Índice de IOCs activos con recarga en caliente.
+
+    ``match_event`` nunca toca la BD; ``ensure_fresh`` reconstruye el
+    índice en un hilo cuando algún commit modificó ``IocItem``.
+    """
+
+    def __init__(self, session_factory=None, reload_interval: Optional[float] = None):
+        self.session_factory = session_factory or SessionLocal
+        self.reload_interval = (
+            reload_interval if reload_interval is not None else settings.IOC_MATCHER_RELOAD_SECONDS
+        )
+        self._index = IocIndex()
+        self._lock = threading.Lock()
+        self._generation = 1  # > _loaded_generation: obsoleto hasta la primera carga
+        self._loaded_generation = 0
+        self._loaded_at = 0.0
+        self._pending_key = f"ioc_matcher_dirty_{id(self)}"
+        self.reloads = 0
+        self.events = 0
+        self.matches = 0
+
+        event.listen(self.session_factory, "after_flush", self._after_flush)
+        event.listen(self.session_factory, "do_orm_execute", self._on_orm_execute)
+        event.listen(self.session_factory, "after_commit", self._after_commit)
+        event.listen(self.session_factory, "after_rollback", self._after_rollback)
+
+    # Eventos de sesión ---------------------------------------------------
+
+    def _after_flush(self, session: Session, flush_context):
+        for objects in (session.new, session.dirty, session.deleted):
+            if any(isinstance(obj, IocItem) for obj in objects):
+                session.info[self._pending_key] = True
+                return
+
+    def _on_orm_execute(self, orm_execute_state):
+        if not isinstance(orm_execute_state.statement, (Delete, Insert, Update)):
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is IocItem:
+            orm_execute_state.session.info[self._pending_key] = True
+
+    def _after_commit(self, session: Session):
+        if session.info.pop(self._pending_key, None):
+            self.invalidate()
+
+    def _after_rollback(self, session: Session):
+        session.info.pop(self._pending_key, None)
+
+    # Carga -----------------------------------------------------------------
+
+    @property
+    def index(self) -> IocIndex:
+        return self._index
+
+    @property
+    def stale(self) -> bool:
+        return self._generation != self._loaded_generation
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def reload(self) -> IocIndex:
+        """Reconstruye el índice desde la BD y lo publica"""
+        with self._lock:
+            generation = self._generation
+        started = time.perf_counter()
+        with self.session_factory() as db:
+            index = IocIndex(load_active_iocs(db))
+        with self._lock:
+            self._index = index
+            self._loaded_generation = generation
+            self._loaded_at = time.monotonic()
+        self.reloads += 1
+        logger.info(
+            f"🎯 IOC matcher: {index.size} IOCs indexados en {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return index
+
+    def refresh_if_stale(self) -> bool:
+        if not self.stale:
+            return False
+        if self._loaded_generation and time.monotonic() - self._loaded_at < self.reload_interval:
+            return False  # recarga reciente: se agrupan los cambios
+        self.reload()
+        return True
+
+    async def ensure_fresh(self) -> bool:
+        if not self.stale:
+            return False
+        return await asyncio.to_thread(self.refresh_if_stale)
+
+    # Búsqueda -------------------------------------------------------------
+
+    def match_event(self, event_data: Any, prefix: str = "") -> List[IocMatch]:
+        matches = self._index.match_event(event_data, prefix)
+        self.events += 1
+        self.matches += len(matches)
+        return matches
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._index.stats(),
+            "stale": self.stale,
+            "reloads": self.reloads,
+            "events": self.events,
+            "matches": self.matches,
+        }
+
+
+def record_sightings(
+    db: Session,
+    matches: List[IocMatch],
+    source_system: Optional[str] = None,
+    source_host: Optional[str] = None,
+    source_ip: Optional[str] = None,
+    case_id: Optional[str] = None,
+    raw_event: Optional[Dict[str, Any]] = None,
+    reported_by: str = "ioc_matcher",
+    sighted_at: Optional[datetime] = None,
+) -> List[IocSighting]:
+    """Un ``IocSighting`` por coincidencia (sin commit) y hit en ``ioc_hits``"""
+    from api.services.ioc_hits import ioc_hits
+
+    sighted_at = sighted_at or datetime.utcnow()
+    sightings = [
+        IocSighting(
+            ioc_id=match.ioc.id,
+            source_system=source_system,
+            source_host=source_host,
+            source_ip=source_ip,
+            context=f"{match.field}: {match.observed[:200]}",
+            raw_event=raw_event,
+            case_id=case_id or match.ioc.case_id,
+            sighted_at=sighted_at,
+            reported_by=reported_by,
+        )
+        for match in matches
+    ]
+    db.add_all(sightings)
+    ioc_hits.record([match.ioc.id for match in matches], when=sighted_at)
+    return sightings
+
+
+ioc_matcher = IocMatcher()
@@ -0,0 +1,295 @@
+"""
+MCP v4.7 - Bulk IOC Scan
+Barrido de archivos de evidencia (locales o en MinIO) contra el índice de IOCs.
+
+- El archivo se lee por bloques (``IOC_SCAN_CHUNK_BYTES``) y se parte en
+  líneas con su desplazamiento absoluto en bytes: la memoria no depende del
+  tamaño del archivo, sólo del bloque y de la línea más larga
+- Las líneas de más de ``IOC_SCAN_MAX_LINE_BYTES`` se recorren por ventanas
+  solapadas; cada coincidencia se informa una sola vez
+- Los ``.gz`` se descomprimen al vuelo (desplazamientos del contenido
+  descomprimido)
+- Cada bloque de líneas pasa por ``IocIndex.match_bytes``: tokens
+  (hashes, emails, IPs, dominios) resueltos una vez y cacheados, y
+  autómatas de subcadena sobre el texto
+- Los avistamientos se insertan por lotes (``IOC_SCAN_SIGHTING_BATCH``) con
+  un máximo por IOC (``IOC_SCAN_MAX_SIGHTINGS_PER_IOC``); el recuento por
+  IOC del informe es siempre completo
+- El informe incluye bytes, líneas, tiempo y throughput en MB/s
+"""
+
+import logging
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import insert
+
+from api.config import settings
+from api.database import get_db_context
+from api.models.ioc import IocSighting
+from api.services.ioc_matcher import IocIndex, IocRef
+
+logger = logging.getLogger(__name__)
+
+# Solape entre ventanas de una línea larga; mayor que cualquier indicador
+WINDOW_OVERLAP = 1024
+EXCERPT_CHARS = 160
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class Segment(NamedTuple):
+    """Trozo de texto a comparar; sólo cuentan las coincidencias que empiezan en [lo, hi)"""
+    offset: int  # desplazamiento absoluto (bytes) de ``data``
+    data: bytes
+    lo: int
+    hi: int
+    lines: int  # líneas que terminan en este trozo
+
+
+@dataclass
+class ScanReport:
+    """Resultado de un barrido"""
+    source: str
+    bytes_read: int = 0  # bytes leídos (comprimidos si el archivo es .gz)
+    bytes_scanned: int = 0
+    lines: int = 0
+    match_count: int = 0
+    per_ioc: Counter = field(default_factory=Counter)
+    matches: List[Dict[str, Any]] = field(default_factory=list)
+    truncated: bool = False
+    sightings_recorded: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def throughput_mb_s(self) -> float:
+        return round(self.bytes_scanned / 1048576 / self.elapsed_s, 2) if self.elapsed_s else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "bytes_read": self.bytes_read,
+            "bytes_scanned": self.bytes_scanned,
+            "lines": self.lines,
+            "match_count": self.match_count,
+            "iocs_matched": len(self.per_ioc),
+            "per_ioc": dict(self.per_ioc.most_common()),
+            "matches": self.matches,
+            "truncated": self.truncated,
+            "sightings_recorded": self.sightings_recorded,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "throughput_mb_s": self.throughput_mb_s,
+        }
+
+
+# ============================================================================
+# LECTURA
+# ============================================================================
+
+def iter_file(path: Path, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """Bloques de un archivo local"""
+    chunk_size = chunk_size or settings.IOC_SCAN_CHUNK_BYTES
+    with open(path, "rb") as handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def maybe_gunzip(chunks: Iterable[bytes], chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Descomprime al vuelo si el flujo empieza por la firma gzip (varios
+    miembros incluidos); cada salida está acotada a ``chunk_size`` bytes.
+    """
+    chunk_size = chunk_size or settings.IOC_SCAN_CHUNK_BYTES
+    chunks = iter(chunks)
+    first = next(chunks, b"")
+    if not first.startswith(GZIP_MAGIC):
+        if first:
+            yield first
+        yield from chunks
+        return
+
+    decompressor = zlib.decompressobj(wbits=47)
+    for chunk in _prepend(first, chunks):
+        data = chunk
+        while data:
+            output = decompressor.decompress(data, chunk_size)
+            if output:
+                yield output
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=47)
+            else:
+                data = decompressor.unconsumed_tail
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def _prepend(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    yield first
+    yield from rest
+
+
+def iter_segments(chunks: Iterable[bytes], max_line: Optional[int] = None) -> Iterator[Segment]:
+    """
+    Parte un flujo de bytes en bloques de líneas completas con su
+    desplazamiento absoluto (un bloque por bloque leído, sin partir líneas).
+
+    Una línea más larga que ``max_line`` sale en ventanas de ``max_line``
+    bytes solapadas ``2 * WINDOW_OVERLAP``: cada ventana sólo informa las
+    coincidencias que empiezan en su zona central, así una coincidencia
+    partida entre dos ventanas aparece entera en una de ellas y nunca dos
+    veces.
+    """
+    max_line = max(max_line or settings.IOC_SCAN_MAX_LINE_BYTES, 8 * WINDOW_OVERLAP)
+    step = max_line - 2 * WINDOW_OVERLAP
+    buffer = bytearray()
+    base = 0  # desplazamiento absoluto de buffer[0]
+    lo = 0  # inicio de la zona a informar en la línea en curso
+
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        newline = buffer.rfind(b"\n")
+        if newline != -1:
+            data = bytes(buffer[:newline + 1])
+            yield Segment(base, data, lo, len(data), data.count(b"\n"))
+            start, lo = newline + 1, 0
+        while len(buffer) - start > max_line:
+            yield Segment(base + start, bytes(buffer[start:start + max_line]), lo,
+                          max_line - WINDOW_OVERLAP, 0)
+            start, lo = start + step, WINDOW_OVERLAP
+        del buffer[:start]
+        base += start
+
+    if buffer:
+        yield Segment(base, bytes(buffer), lo, len(buffer), 1)
+
+
+# ============================================================================
+# AVISTAMIENTOS
+# ============================================================================
+
+class SightingBatcher:
+    """``IocSighting`` acumulados e insertados con un INSERT por lote"""
+
+    def __init__(
+        self,
+        session_factory=None,
+        batch_size: Optional[int] = None,
+        per_ioc_limit: Optional[int] = None,
+        **common: Any,
+    ):
+        self.session_factory = session_factory or get_db_context
+        self.batch_size = batch_size or settings.IOC_SCAN_SIGHTING_BATCH
+        self.per_ioc_limit = (
+            per_ioc_limit if per_ioc_limit is not None else settings.IOC_SCAN_MAX_SIGHTINGS_PER_IOC
+        )
+        self.common = common  # columnas iguales en todo el barrido
+        self.common.setdefault("sighted_at", datetime.utcnow())
+        self.common.setdefault("reported_by", "ioc_scan")
+        self.per_ioc: Counter = Counter()
+        self.pending: List[Dict[str, Any]] = []
+        self.written = 0
+
+    def add(self, ref: IocRef, context: str, raw_event: Dict[str, Any]):
+        if self.per_ioc[ref.id] >= self.per_ioc_limit:
+            return
+        self.per_ioc[ref.id] += 1
+        row = dict(self.common, ioc_id=ref.id, context=context, raw_event=raw_event)
+        if not row.get("case_id"):
+            row["case_id"] = ref.case_id
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.session_factory() as db:
+            db.execute(insert(IocSighting), self.pending)
+        self.written += len(self.pending)
+        self.pending = []
+
+
+# ============================================================================
+# BARRIDO
+# ============================================================================
+
+def _excerpt(data: bytes, offset: int) -> str:
+    """Texto alrededor de la coincidencia, sin salir de su línea"""
+    line_start = data.rfind(b"\n", 0, offset) + 1
+    line_end = data.find(b"\n", offset)
+    start = max(line_start, offset - EXCERPT_CHARS // 4)
+    end = min(line_end if line_end != -1 else len(data), start + EXCERPT_CHARS)
+    return data[start:end].rstrip(b"\r").decode("utf-8", "replace")
+
+
+def scan_chunks(
+    chunks: Iterable[bytes],
+    index: IocIndex,
+    source: str,
+    sightings: Optional[SightingBatcher] = None,
+    max_matches: Optional[int] = None,
+    max_line: Optional[int] = None,
+) -> ScanReport:
+    """
+    Compara un flujo de bytes con ``index`` bloque a bloque. Las
+    coincidencias llevan desplazamiento absoluto en bytes y número de línea.
+    """
+    max_matches = max_matches if max_matches is not None else settings.IOC_SCAN_MAX_REPORTED_MATCHES
+    report = ScanReport(source=source)
+    started = time.perf_counter()
+
+    def counted(stream: Iterable[bytes], attribute: str) -> Iterator[bytes]:
+        for chunk in stream:
+            setattr(report, attribute, getattr(report, attribute) + len(chunk))
+            yield chunk
+
+    content = counted(maybe_gunzip(counted(chunks, "bytes_read")), "bytes_scanned")
+    line_number = 1  # línea en la que empieza el bloque en curso
+    for segment in iter_segments(content, max_line=max_line):
+        found = index.match_bytes(segment.data)
+        if found:
+            seen = set()
+            line, counted_to = line_number, 0
+            for ref, relative in sorted(found, key=lambda item: item[1]):
+                if not segment.lo <= relative < segment.hi or (ref.id, relative) in seen:
+                    continue
+                seen.add((ref.id, relative))
+                report.match_count += 1
+                report.per_ioc[ref.id] += 1
+                offset = segment.offset + relative
+                line += segment.data.count(b"\n", counted_to, relative)
+                counted_to = relative
+                excerpt = _excerpt(segment.data, relative)
+                if len(report.matches) < max_matches:
+                    report.matches.append({
+                        "ioc_id": ref.id,
+                        "ioc_type": ref.ioc_type,
+                        "ioc_value": ref.value,
+                        "threat_level": ref.threat_level,
+                        "offset": offset,
+                        "line": line,
+                        "excerpt": excerpt,
+                    })
+                else:
+                    report.truncated = True
+                if sightings is not None:
+                    sightings.add(ref, f"{source}:{line} @ {offset}: {excerpt}",
+                                  {"file": source, "offset": offset, "line": line})
+        report.lines += segment.lines
+        line_number += segment.lines
+
+    if sightings is not None:
+        sightings.flush()
+        report.sightings_recorded = sightings.written
+    report.elapsed_s = time.perf_counter() - started
+    return report
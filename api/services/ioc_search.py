@@ -0,0 +1,346 @@
+"""
+MCP v4.7 - IOC Search
+Búsqueda por subcadena sobre ``ioc_items`` servida por índice, con un único
+constructor de consultas para todos los endpoints de listado.
+
+- PostgreSQL: ``ILIKE '%term%'`` sobre value, description, context y source,
+  resuelto con índices GIN ``gin_trgm_ops`` (extensión pg_trgm)
+- SQLite: tabla virtual FTS5 ``ioc_items_fts`` con tokenizer trigram,
+  sincronizada por triggers y con clave entera estable
+  (``ioc_items_fts_keys``); términos de menos de 3 caracteres (que el
+  trigram no indexa) caen a LIKE
+- Paginación keyset por ``(clave de orden, id)`` con cursor opaco en lugar
+  de OFFSET; OFFSET se mantiene sólo para la paginación por ``page``
+- Conteo ``exact``, ``approximate`` (estimación del planner en PostgreSQL,
+  conteo acotado en SQLite) o ``none``
+"""
+
+import base64
+import json
+import logging
+import weakref
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, exists, func, or_, text, tuple_
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Query, Session
+
+from api.config import settings
+from api.models.ioc import IocItem, IocItemTag, IocTag
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ("value", "description", "context", "source")
+
+# Orden de los listados -> columna (siempre descendente, desempate por id)
+SORT_KEYS = {
+    "recent": IocItem.created_at,
+    "confidence": IocItem.confidence_score,
+}
+
+COUNT_MODES = ("exact", "approximate", "none")
+
+# El tokenizer trigram de FTS5 llega en SQLite 3.34
+_TRIGRAM_MIN_SQLITE = (3, 34, 0)
+_TRIGRAM_MIN_TERM = 3
+
+# ``ioc_items`` tiene clave String, así que su rowid implícito no es estable
+# (VACUUM o un dump/restore pueden renumerarlo). El índice se apoya en
+# ``ioc_items_fts_keys``, cuyo INTEGER PRIMARY KEY sí lo es, y lee el
+# contenido a través de la vista ``ioc_items_fts_source``.
+SQLITE_FTS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS ioc_items_fts_keys (
+        key INTEGER PRIMARY KEY,
+        ioc_id VARCHAR NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS ioc_items_fts_source AS
+    SELECT k.key AS key, i.value AS value, i.description AS description,
+           i.context AS context, i.source AS source
+    FROM ioc_items_fts_keys k JOIN ioc_items i ON i.id = k.ioc_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS ioc_items_fts USING fts5(
+        value, description, context, source,
+        content='ioc_items_fts_source', content_rowid='key', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ioc_items_fts_ai AFTER INSERT ON ioc_items BEGIN
+        INSERT INTO ioc_items_fts_keys(ioc_id) VALUES (new.id);
+        INSERT INTO ioc_items_fts(rowid, value, description, context, source)
+        VALUES ((SELECT key FROM ioc_items_fts_keys WHERE ioc_id = new.id),
+                new.value, new.description, new.context, new.source);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ioc_items_fts_ad AFTER DELETE ON ioc_items BEGIN
+        INSERT INTO ioc_items_fts(ioc_items_fts, rowid, value, description, context, source)
+        VALUES ('delete', (SELECT key FROM ioc_items_fts_keys WHERE ioc_id = old.id),
+                old.value, old.description, old.context, old.source);
+        DELETE FROM ioc_items_fts_keys WHERE ioc_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ioc_items_fts_au
+    AFTER UPDATE OF id, value, description, context, source ON ioc_items BEGIN
+        INSERT INTO ioc_items_fts(ioc_items_fts, rowid, value, description, context, source)
+        VALUES ('delete', (SELECT key FROM ioc_items_fts_keys WHERE ioc_id = old.id),
+                old.value, old.description, old.context, old.source);
+        UPDATE ioc_items_fts_keys SET ioc_id = new.id WHERE ioc_id = old.id;
+        INSERT INTO ioc_items_fts(rowid, value, description, context, source)
+        VALUES ((SELECT key FROM ioc_items_fts_keys WHERE ioc_id = new.id),
+                new.value, new.description, new.context, new.source);
+    END
+    """,
+]
+
+# Índice incompleto (p. ej. ioc_items recreada sin sus triggers) o anterior,
+# indexado por el rowid implícito de ioc_items: se borra y se reconstruye
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS ioc_items_fts_ai",
+    "DROP TRIGGER IF EXISTS ioc_items_fts_ad",
+    "DROP TRIGGER IF EXISTS ioc_items_fts_au",
+    "DROP TABLE IF EXISTS ioc_items_fts",
+    "DROP VIEW IF EXISTS ioc_items_fts_source",
+    "DROP TABLE IF EXISTS ioc_items_fts_keys",
+]
+
+# Engine -> hay índice FTS5 en esa BD SQLite
+_fts_ready: "weakref.WeakKeyDictionary[Engine, bool]" = weakref.WeakKeyDictionary()
+
+
+@dataclass
+class IocSearchFilter:
+    """Filtros comunes de listado y búsqueda avanzada"""
+    text: Optional[str] = None
+    ioc_types: Optional[List[str]] = None
+    threat_levels: Optional[List[str]] = None
+    statuses: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    case_id: Optional[str] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    min_confidence: Optional[float] = None
+
+
+@dataclass
+class IocSearchPage:
+    """Página de resultados; ``total`` es None con ``count="none"``"""
+    items: List[IocItem]
+    next_cursor: Optional[str]
+    total: Optional[int]
+    total_approximate: bool = False
+
+
+def _sqlite_trigram_supported(connection: Connection) -> bool:
+    version = getattr(connection.dialect.dbapi, "sqlite_version_info", (0, 0, 0))
+    return tuple(version) >= _TRIGRAM_MIN_SQLITE
+
+
+def ensure_search_index(bind) -> bool:
+    """
+    Crea (si falta) el índice FTS5 de SQLite y lo puebla con las filas
+    existentes. Devuelve si la BD tiene búsqueda indexada.
+
+    El índice se referencia por ``ioc_items_fts_keys.key`` (estable), no por
+    el rowid de ``ioc_items``, así que sigue siendo válido tras un VACUUM.
+
+    En PostgreSQL los índices trigram los crean ``create_all`` (ver
+    ``IocItem.__table_args__``) y la migración ``add_ioc_search_indexes.sql``.
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as connection:
+            return ensure_search_index(connection)
+
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        return True
+    if dialect != "sqlite":
+        return False
+    if not _sqlite_trigram_supported(bind):
+        logger.warning("⚠️ SQLite sin tokenizer trigram; búsqueda de IOCs con LIKE")
+        _fts_ready[bind.engine] = False
+        return False
+
+    objects = {row[0] for row in bind.execute(text(
+        "SELECT name FROM sqlite_master "
+        "WHERE name IN ('ioc_items_fts', 'ioc_items_fts_keys', 'ioc_items_fts_ai')"
+    ))}
+    existed = objects == {"ioc_items_fts", "ioc_items_fts_keys", "ioc_items_fts_ai"}
+    if not existed:
+        for statement in SQLITE_FTS_DROP:
+            bind.execute(text(statement))
+    for statement in SQLITE_FTS_DDL:
+        bind.execute(text(statement))
+    if not existed:
+        bind.execute(text("INSERT INTO ioc_items_fts_keys(ioc_id) SELECT id FROM ioc_items"))
+        bind.execute(text("INSERT INTO ioc_items_fts(ioc_items_fts) VALUES ('rebuild')"))
+        logger.info("🔎 Índice FTS5 de IOCs creado")
+    _fts_ready[bind.engine] = True
+    return True
+
+
+def _uses_fts(db: Session) -> bool:
+    engine = db.get_bind()
+    if engine.dialect.name != "sqlite":
+        return False
+    if engine not in _fts_ready:
+        with engine.connect() as connection:
+            _fts_ready[engine] = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ioc_items_fts'")
+            ).first() is not None
+    return _fts_ready[engine]
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _text_condition(db: Session, term: str):
+    """Condición de subcadena sobre SEARCH_COLUMNS según el backend"""
+    if len(term) >= _TRIGRAM_MIN_TERM and _uses_fts(db):
+        phrase = '"' + term.replace('"', '""') + '"'
+        return text(
+            "ioc_items.id IN (SELECT k.ioc_id FROM ioc_items_fts_keys k WHERE k.key IN "
+            "(SELECT rowid FROM ioc_items_fts WHERE ioc_items_fts MATCH :ioc_fts_phrase))"
+        ).bindparams(ioc_fts_phrase=phrase)
+
+    # PostgreSQL: cada ILIKE usa su índice GIN trigram (BitmapOr)
+    pattern = _like_pattern(term)
+    return or_(*[
+        getattr(IocItem, column).ilike(pattern, escape="\\") for column in SEARCH_COLUMNS
+    ])
+
+
+def build_search_query(db: Session, flt: IocSearchFilter) -> Query:
+    """Consulta de IOCs filtrada (sin orden ni paginación)"""
+    query = db.query(IocItem)
+
+    if flt.text:
+        query = query.filter(_text_condition(db, flt.text))
+    if flt.ioc_types:
+        query = query.filter(IocItem.ioc_type.in_(flt.ioc_types))
+    if flt.threat_levels:
+        query = query.filter(IocItem.threat_level.in_(flt.threat_levels))
+    if flt.statuses:
+        query = query.filter(IocItem.status.in_(flt.statuses))
+    if flt.sources:
+        query = query.filter(IocItem.source.in_(flt.sources))
+    if flt.case_id:
+        query = query.filter(IocItem.case_id == flt.case_id)
+    if flt.date_from:
+        query = query.filter(IocItem.created_at >= flt.date_from)
+    if flt.date_to:
+        query = query.filter(IocItem.created_at <= flt.date_to)
+    if flt.min_confidence:
+        query = query.filter(IocItem.confidence_score >= flt.min_confidence)
+    if flt.tags:
+        # EXISTS en lugar de JOIN: un IOC con varios tags no se duplica
+        query = query.filter(exists().where(and_(
+            IocItemTag.ioc_id == IocItem.id,
+            IocItemTag.tag_id == IocTag.id,
+            IocTag.name.in_([tag.lower() for tag in flt.tags]),
+        )))
+    return query
+
+
+def encode_cursor(sort: str, key: Any, ioc_id: str) -> str:
+    """Cursor opaco con la clave de orden del último IOC devuelto"""
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    raw = json.dumps([sort, key, ioc_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, key, ioc_id = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError("sort mismatch")
+        if sort == "recent":
+            key = datetime.fromisoformat(key)
+        else:
+            key = float(key)
+        return key, str(ioc_id)
+    except Exception:
+        raise ValueError(f"Invalid IOC cursor: {cursor!r}")
+
+
+def count_results(db: Session, query: Query, mode: str = "exact") -> Tuple[Optional[int], bool]:
+    """
+    Total de resultados de ``query`` -> (total, es_aproximado).
+
+    ``approximate`` usa las filas estimadas por el planner en PostgreSQL y un
+    conteo acotado a ``IOC_SEARCH_COUNT_CAP`` en el resto de backends.
+    """
+    if mode == "none":
+        return None, False
+    if mode == "exact":
+        return query.order_by(None).count(), False
+    if mode != "approximate":
+        raise ValueError(f"Unknown count mode: {mode!r}")
+
+    bind = db.get_bind()
+    statement = query.order_by(None).statement
+    if bind.dialect.name == "postgresql":
+        compiled = statement.compile(dialect=bind.dialect, compile_kwargs={"render_postcompile": True})
+        plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), True
+
+    cap = settings.IOC_SEARCH_COUNT_CAP
+    capped = statement.with_only_columns(IocItem.id).limit(cap + 1).subquery()
+    total = db.query(func.count()).select_from(capped).scalar()
+    if total > cap:
+        return cap, True
+    return total, False
+
+
+def search_iocs(
+    db: Session,
+    flt: IocSearchFilter,
+    sort: str = "recent",
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    count: str = "exact",
+) -> IocSearchPage:
+    """
+    Página de IOCs ordenados por ``sort`` descendente.
+
+    Con ``cursor`` la página sigue a la posición codificada (keyset, sin
+    OFFSET); ``offset`` sólo se aplica sin cursor. Siempre se devuelve
+    ``next_cursor`` si quedan resultados. Un cursor inválido lanza ValueError.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown IOC sort: {sort!r}")
+    sort_column = SORT_KEYS[sort]
+
+    query = build_search_query(db, flt)
+    total, approximate = count_results(db, query, count)
+
+    page_query = query
+    if cursor:
+        key, ioc_id = decode_cursor(cursor, sort)
+        page_query = page_query.filter(tuple_(sort_column, IocItem.id) < tuple_(key, ioc_id))
+    page_query = page_query.order_by(sort_column.desc(), IocItem.id.desc())
+    if offset and not cursor:
+        page_query = page_query.offset(offset)
+
+    rows = page_query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, sort_column.key), last.id)
+
+    return IocSearchPage(items=rows, next_cursor=next_cursor, total=total, total_approximate=approximate)
@@ -0,0 +1,322 @@
+"""
+MCP v4.7 - IOC Statistics Rollup
+Estadísticas del IOC Store en tiempo constante para el dashboard.
+
+- Agregación completa en UNA consulta: GROUPING SETS en PostgreSQL,
+  UNION ALL de agregados en SQLite, más los conteos por tag
+- Contadores incrementales mantenidos con eventos de sesión: los cambios
+  de IocItem / IocItemTag / IocTag se acumulan en cada flush y se aplican
+  sólo al hacer commit (un rollback no los toca)
+- Las rutas de borrado masivo (``query.delete()``) no pasan por el flush;
+  se detectan con ``do_orm_execute`` y fuerzan una reagregación
+- Resincronización periódica (``IOC_STATS_RESYNC_SECONDS``) para absorber
+  cambios de otros workers o SQL directo; el snapshot servido se cachea
+  ``IOC_STATS_CACHE_TTL`` segundos
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Delete, Integer, String, Update, case, cast, event, func, inspect, literal, select, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from api.config import settings
+from api.database import SessionLocal
+from api.models.ioc import IocItem, IocItemTag, IocTag
+
+logger = logging.getLogger(__name__)
+
+# Dimensión -> (columna, clave en la respuesta de /stats)
+STATS_DIMENSIONS = {
+    "ioc_type": (IocItem.ioc_type, "by_type"),
+    "threat_level": (IocItem.threat_level, "by_threat_level"),
+    "source": (IocItem.source, "by_source"),
+    "status": (IocItem.status, "by_status"),
+}
+
+TOP_TAGS = 10
+RECENT_WINDOW = timedelta(days=1)
+
+StatsRow = Tuple[str, Optional[str], Optional[int], int, float, int, int]
+# (dimensión, clave, tag_id, conteo, suma de confianza, n con confianza, recientes)
+
+
+def build_stats_query(dialect_name: str, since: datetime):
+    """Consulta única con todas las agregaciones de /stats"""
+    confidence_sum = func.coalesce(func.sum(IocItem.confidence_score), 0.0)
+    confidence_n = func.count(IocItem.confidence_score)
+    recent = func.coalesce(func.sum(case((IocItem.created_at >= since, 1), else_=0)), 0)
+    no_tag = literal(None, Integer)
+
+    if dialect_name == "postgresql":
+        dimension = case(
+            *[(func.grouping(column) == 0, literal(name)) for name, (column, _) in STATS_DIMENSIONS.items()],
+            else_=literal("total"),
+        )
+        key = func.coalesce(*[cast(column, String) for column, _ in STATS_DIMENSIONS.values()])
+        aggregates = select(
+            dimension.label("dimension"), key.label("key"), no_tag.label("tag_id"),
+            func.count().label("n"), confidence_sum, confidence_n, recent,
+        ).group_by(func.grouping_sets(
+            *[tuple_(column) for column, _ in STATS_DIMENSIONS.values()], tuple_()
+        ))
+        parts = [aggregates]
+    else:
+        parts = [
+            select(
+                literal(name).label("dimension"), cast(column, String).label("key"), no_tag.label("tag_id"),
+                func.count().label("n"), confidence_sum, confidence_n, recent,
+            ).group_by(column)
+            for name, (column, _) in STATS_DIMENSIONS.items()
+        ]
+        parts.append(select(
+            literal("total"), literal(None, String), no_tag,
+            func.count(), confidence_sum, confidence_n, recent,
+        ).select_from(IocItem))
+
+    parts.append(
+        select(
+            literal("tag"), IocTag.name, IocTag.id,
+            func.count(IocItemTag.id), literal(0.0), literal(0), literal(0),
+        ).select_from(IocTag).join(IocItemTag, IocItemTag.tag_id == IocTag.id).group_by(IocTag.id, IocTag.name)
+    )
+    return union_all(*parts)
+
+
+class _Delta:
+    """Cambios de una transacción pendientes de commit"""
+
+    def __init__(self):
+        self.counts: Counter = Counter()  # (dimensión, clave) -> delta; ("total", None) incluido
+        self.confidence_sum = 0.0
+        self.confidence_n = 0
+        self.recent = 0
+        self.tags: Counter = Counter()  # tag_id -> delta
+        self.tag_names: Dict[int, str] = {}
+        self.resync = False
+
+    def add_ioc(self, values: Dict[str, Any], sign: int, now: datetime):
+        self.counts[("total", None)] += sign
+        for name in STATS_DIMENSIONS:
+            self.counts[(name, values.get(name))] += sign
+        if values.get("confidence_score") is not None:
+            self.confidence_sum += sign * values["confidence_score"]
+            self.confidence_n += sign
+        created_at = values.get("created_at")
+        if created_at is not None and created_at >= now - RECENT_WINDOW:
+            self.recent += sign
+
+
+_TRACKED = list(STATS_DIMENSIONS) + ["confidence_score", "created_at"]
+
+
+def _values(ioc: IocItem) -> Dict[str, Any]:
+    return {name: getattr(ioc, name) for name in _TRACKED}
+
+
+def _previous_values(ioc: IocItem) -> Optional[Dict[str, Any]]:
+    """Valores antes de la modificación; None si ningún campo seguido cambió"""
+    state = inspect(ioc)
+    previous, changed = {}, False
+    for name in _TRACKED:
+        history = state.attrs[name].history
+        if history.deleted:
+            previous[name] = history.deleted[0]
+            changed = True
+        else:
+            previous[name] = getattr(ioc, name)
+        changed = changed or bool(history.added)
+    return previous if changed else None
+
+
+class IocStatsRollup:
+    """
+    Contadores en memoria de ioc_items / ioc_item_tags.
+
+    ``snapshot(db)`` reagrega con ``build_stats_query`` sólo en frío, tras
+    un borrado masivo o cada ``resync_interval``; el resto del tiempo arma
+    la respuesta a partir de los contadores sin tocar la BD.
+    """
+
+    def __init__(
+        self,
+        session_factory=None,
+        cache_ttl: Optional[float] = None,
+        resync_interval: Optional[float] = None,
+    ):
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.IOC_STATS_CACHE_TTL
+        self.resync_interval = (
+            resync_interval if resync_interval is not None else settings.IOC_STATS_RESYNC_SECONDS
+        )
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._seeded_at: Optional[float] = None
+        self._cached: Optional[Tuple[float, Dict[str, Any]]] = None
+        self._reset()
+        self._pending_key = f"ioc_stats_pending_{id(self)}"
+        self.queries = 0
+
+        session_factory = session_factory or SessionLocal
+        event.listen(session_factory, "before_flush", self._before_flush)
+        event.listen(session_factory, "after_flush", self._after_flush)
+        event.listen(session_factory, "do_orm_execute", self._on_orm_execute)
+        event.listen(session_factory, "after_commit", self._after_commit)
+        event.listen(session_factory, "after_rollback", self._after_rollback)
+
+    def _reset(self):
+        self._counts: Counter = Counter()
+        self._confidence_sum = 0.0
+        self._confidence_n = 0
+        self._recent = 0
+        self._tags: Counter = Counter()
+        self._tag_names: Dict[int, str] = {}
+
+    # ------------------------------------------------------------------
+    # Eventos de sesión
+    # ------------------------------------------------------------------
+
+    def _pending(self, session: Session) -> _Delta:
+        if self._pending_key not in session.info:
+            session.info[self._pending_key] = _Delta()
+        return session.info[self._pending_key]
+
+    def _before_flush(self, session: Session, flush_context, instances):
+        # Borrados y modificaciones antes de que el flush expire/borre filas
+        now = datetime.utcnow()
+        for obj in session.deleted:
+            if isinstance(obj, IocItem):
+                self._pending(session).add_ioc(_values(obj), -1, now)
+            elif isinstance(obj, IocItemTag):
+                self._pending(session).tags[obj.tag_id] -= 1
+        for obj in session.dirty:
+            if isinstance(obj, IocItem) and session.is_modified(obj):
+                previous = _previous_values(obj)
+                if previous is not None:
+                    delta = self._pending(session)
+                    delta.add_ioc(previous, -1, now)
+                    delta.add_ioc(_values(obj), 1, now)
+
+    def _after_flush(self, session: Session, flush_context):
+        # Altas después del INSERT: defaults aplicados y claves asignadas
+        now = datetime.utcnow()
+        for obj in session.new:
+            if isinstance(obj, IocItem):
+                self._pending(session).add_ioc(_values(obj), 1, now)
+            elif isinstance(obj, IocItemTag):
+                self._pending(session).tags[obj.tag_id] += 1
+            elif isinstance(obj, IocTag):
+                self._pending(session).tag_names[obj.id] = obj.name
+
+    def _on_orm_execute(self, orm_execute_state):
+        if not isinstance(orm_execute_state.statement, (Delete, Update)):
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (IocItem, IocItemTag, IocTag):
+            self._pending(orm_execute_state.session).resync = True
+
+    def _after_commit(self, session: Session):
+        delta = session.info.pop(self._pending_key, None)
+        if delta is not None:
+            self.apply(delta)
+
+    def _after_rollback(self, session: Session):
+        session.info.pop(self._pending_key, None)
+
+    # ------------------------------------------------------------------
+    # Contadores
+    # ------------------------------------------------------------------
+
+    def apply(self, delta: _Delta):
+        with self._lock:
+            self._generation += 1
+            self._cached = None
+            if delta.resync:
+                self._seeded_at = None
+            if self._seeded_at is None:
+                return  # se reagregará en la próxima lectura
+            self._counts.update(delta.counts)
+            self._confidence_sum += delta.confidence_sum
+            self._confidence_n += delta.confidence_n
+            self._recent += delta.recent
+            self._tags.update(delta.tags)
+            self._tag_names.update(delta.tag_names)
+
+    def invalidate(self):
+        """Fuerza la reagregación en la próxima lectura"""
+        with self._lock:
+            self._generation += 1
+            self._seeded_at = None
+            self._cached = None
+
+    def seed(self, rows: List[StatsRow]):
+        with self._lock:
+            self._reset()
+            for dimension, key, tag_id, count, confidence_sum, confidence_n, recent in rows:
+                if dimension == "tag":
+                    self._tags[tag_id] = count
+                    self._tag_names[tag_id] = key
+                    continue
+                if dimension == "total":
+                    key = None
+                    self._confidence_sum = float(confidence_sum or 0)
+                    self._confidence_n = int(confidence_n or 0)
+                    self._recent = int(recent or 0)
+                self._counts[(dimension, key)] = count
+            self._seeded_at = time.monotonic()
+
+    def _needs_seed(self) -> bool:
+        return self._seeded_at is None or time.monotonic() - self._seeded_at >= self.resync_interval
+
+    def refresh(self, db: Session):
+        """Reagrega desde la BD con una única consulta"""
+        generation = self._generation
+        statement = build_stats_query(db.get_bind().dialect.name, datetime.utcnow() - RECENT_WINDOW)
+        rows = [tuple(row) for row in db.execute(statement)]
+        self.queries += 1
+        if generation != self._generation:
+            # Un commit concurrente pudo quedar fuera de la consulta: reintentar en la próxima lectura
+            with self._lock:
+                self._seeded_at = None
+        self.seed(rows)
+        if generation != self._generation:
+            self.invalidate()
+
+    def snapshot(self, db: Session) -> Dict[str, Any]:
+        """Respuesta de /stats (misma forma que la versión por consultas)"""
+        cached = self._cached
+        if cached is not None and time.monotonic() < cached[0] and not self._needs_seed():
+            return cached[1]
+
+        if self._needs_seed():
+            self.refresh(db)
+
+        with self._lock:
+            generation = self._generation
+            breakdowns = {response_key: {} for _, response_key in STATS_DIMENSIONS.values()}
+            for (dimension, key), count in self._counts.items():
+                if dimension in STATS_DIMENSIONS and count > 0:
+                    breakdowns[STATS_DIMENSIONS[dimension][1]][key] = count
+            top_tags = sorted(
+                ((self._tag_names.get(tag_id, str(tag_id)), count)
+                 for tag_id, count in self._tags.items() if count > 0),
+                key=lambda item: (-item[1], item[0]),
+            )[:TOP_TAGS]
+            average = self._confidence_sum / self._confidence_n if self._confidence_n else 0
+            stats = {
+                "total": self._counts[("total", None)],
+                **breakdowns,
+                "average_confidence": round(average, 2),
+                "top_tags": dict(top_tags),
+                "recent_24h": self._recent,
+                "generated_at": datetime.utcnow().isoformat(),
+            }
+            if generation == self._generation:
+                self._cached = (time.monotonic() + self.cache_ttl, stats)
+        return stats
+
+
+ioc_stats = IocStatsRollup()
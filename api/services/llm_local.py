@@ -14,6 +14,8 @@ import logging
 import asyncio
 from datetime import datetime
 
+from api.services.ioc_extractor import ioc_extractor
+
 logger = logging.getLogger(__name__)
 
 # Intentar cargar el modelo real
@@ -101,16 +103,6 @@ class Phi4LocalLLM:
         r"failed.*login.*multiple"
     ]
     
-    IOC_PATTERNS = {
-        "ip": r"\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b",
-        "domain": r"\b(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}\b",
-        "email": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
-        "hash_md5": r"\b[a-fA-F0-9]{32}\b",
-        "hash_sha1": r"\b[a-fA-F0-9]{40}\b",
-        "hash_sha256": r"\b[a-fA-F0-9]{64}\b",
-        "url": r"https?://[^\s<>\"{}|\\^`\[\]]+"
-    }
-
     def __init__(self):
         self.use_llm = False
         
@@ -156,34 +148,24 @@ class Phi4LocalLLM:
                 score += 5
         
         # +2 por cada IOC encontrado
-        for ioc_type, pattern in self.IOC_PATTERNS.items():
-            matches = re.findall(pattern, text)
-            score += len(matches) * 2
+        score += sum(1 for _ in ioc_extractor.iter_matches(text)) * 2
         
         return min(score, 100.0)
     
     def extract_iocs(self, findings: Dict) -> List[Dict]:
         """Extrae IOCs de los hallazgos"""
         text = json.dumps(findings, default=str)
-        iocs = []
-        
-        for ioc_type, pattern in self.IOC_PATTERNS.items():
-            matches = set(re.findall(pattern, text, re.IGNORECASE))
-            for match in matches:
-                # Filtrar falsos positivos comunes
-                if ioc_type == "domain" and match in ["localhost", "example.com", "test.com"]:
-                    continue
-                if ioc_type == "ip" and match.startswith("127.") or match.startswith("0."):
-                    continue
-                    
-                iocs.append({
-                    "type": ioc_type,
-                    "value": match,
-                    "source": "ai_extraction",
-                    "extracted_at": datetime.utcnow().isoformat()
-                })
-        
-        return iocs
+        extracted_at = datetime.utcnow().isoformat()
+        
+        return [
+            {
+                "type": ioc["type"],
+                "value": ioc["value"],
+                "source": "ai_extraction",
+                "extracted_at": extracted_at
+            }
+            for ioc in ioc_extractor.extract(text)
+        ]
     
     def generate_recommendations(self, findings: Dict) -> Dict:
         """Genera acciones recomendadas basadas en patrones."""
@@ -25,13 +25,13 @@ import logging
 import os
 import hashlib
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List, BinaryIO, Union
+from typing import Optional, Dict, Any, Iterator, List, BinaryIO, Union
 
 # Import minio with graceful fallback
 try:
     from minio import Minio
     from minio.error import S3Error
-    from minio.commonconfig import ENABLED
+    from minio.commonconfig import ENABLED, Tags
     from minio.versioningconfig import VersioningConfig
     MINIO_AVAILABLE = True
 except ImportError:
@@ -39,14 +39,38 @@ except ImportError:
     Minio = None
     S3Error = Exception
     ENABLED = None
+    Tags = None
     VersioningConfig = None
     logging.getLogger(__name__).warning("minio package not installed - MinIO storage disabled")
 
 from api.config import settings
+from api.services.storage_stats import storage_stats_index
 
 logger = logging.getLogger(__name__)
 
 
+class HashingReader:
+    """
+    File-like que calcula SHA256 y cuenta bytes mientras put_object lee.
+    Permite subir en streaming sin una segunda lectura para el hash.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        if chunk:
+            self._sha256.update(chunk)
+            self.size += len(chunk)
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+
 class MinIOStorageService:
     """
     Servicio de almacenamiento MinIO para evidencias forenses multi-tenant.
@@ -179,17 +203,23 @@ class MinIOStorageService:
         metadata: Optional[Dict[str, str]] = None,
     ) -> Dict[str, Any]:
         """Sube un archivo de evidencia al storage."""
+        if not isinstance(file_data, bytes):
+            # File-like: multipart en streaming, sin leerlo entero
+            return self.upload_evidence_stream(
+                tenant_id=tenant_id,
+                case_id=case_id,
+                stream=file_data,
+                file_name=file_name,
+                evidence_type=evidence_type,
+                metadata=metadata,
+            )
+        
         object_path = f"{tenant_id}/cases/{case_id}/{evidence_type}/{file_name}"
         
         try:
-            if isinstance(file_data, bytes):
-                content = file_data
-                file_stream = io.BytesIO(file_data)
-                size = len(file_data)
-            else:
-                content = file_data.read()
-                file_stream = io.BytesIO(content)
-                size = len(content)
+            content = file_data
+            file_stream = io.BytesIO(file_data)
+            size = len(file_data)
             
             sha256_hash = hashlib.sha256(content).hexdigest()
             
@@ -205,6 +235,7 @@ class MinIOStorageService:
                 for key, value in metadata.items():
                     upload_metadata[f"x-amz-meta-{key}"] = str(value)
             
+            previous_size = self._object_size(object_path)
             result = self.client.put_object(
                 self.bucket_name,
                 object_path,
@@ -212,6 +243,7 @@ class MinIOStorageService:
                 size,
                 metadata=upload_metadata,
             )
+            self._track_put(object_path, size, previous_size)
             
             logger.info(f"📤 Evidence uploaded: {object_path} ({size} bytes)")
             
@@ -230,6 +262,135 @@ class MinIOStorageService:
             logger.error(f"❌ Upload failed: {e}")
             return {"success": False, "error": str(e), "object_name": object_path}
 
+    def upload_evidence_stream(
+        self,
+        tenant_id: str,
+        case_id: str,
+        stream: BinaryIO,
+        file_name: str,
+        length: int = -1,
+        evidence_type: str = "evidence",
+        metadata: Optional[Dict[str, str]] = None,
+        content_type: str = "application/octet-stream",
+        sha256: Optional[str] = None,
+        part_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Sube una evidencia desde un file-like en multipart, sin cargarla en memoria.
+
+        Si no se conoce ``sha256`` se calcula mientras se sube y se guarda como
+        tag del objeto (los metadatos no pueden cambiarse sin copiar el objeto).
+        """
+        object_path = f"{tenant_id}/cases/{case_id}/{evidence_type}/{file_name}"
+        part_size = part_size or settings.MINIO_PART_SIZE
+        reader = HashingReader(stream)
+        
+        upload_metadata = {
+            "x-amz-meta-tenant": tenant_id,
+            "x-amz-meta-case": case_id,
+            "x-amz-meta-type": evidence_type,
+            "x-amz-meta-uploaded": datetime.utcnow().isoformat(),
+        }
+        if sha256:
+            upload_metadata["x-amz-meta-sha256"] = sha256
+        if metadata:
+            for key, value in metadata.items():
+                upload_metadata[f"x-amz-meta-{key}"] = str(value)
+        
+        try:
+            previous_size = self._object_size(object_path)
+            result = self.client.put_object(
+                self.bucket_name,
+                object_path,
+                reader,
+                length,
+                content_type=content_type,
+                metadata=upload_metadata,
+                part_size=part_size,
+            )
+            
+            computed = reader.hexdigest()
+            if sha256 and sha256 != computed:
+                self.client.remove_object(self.bucket_name, object_path)
+                if previous_size is not None:
+                    self._track_delete(object_path, previous_size)
+                logger.error(f"❌ SHA256 mismatch for {object_path}")
+                return {"success": False, "error": "sha256 mismatch", "object_name": object_path}
+            
+            self._track_put(object_path, reader.size, previous_size)
+            
+            if not sha256 and Tags is not None:
+                tags = Tags.new_object_tags()
+                tags["sha256"] = computed
+                self.client.set_object_tags(self.bucket_name, object_path, tags)
+            
+            logger.info(f"📤 Evidence streamed: {object_path} ({reader.size} bytes)")
+            
+            return {
+                "success": True,
+                "object_name": object_path,
+                "etag": result.etag,
+                "version_id": result.version_id,
+                "size": reader.size,
+                "sha256": computed,
+                "bucket": self.bucket_name,
+                "url": f"s3://{self.bucket_name}/{object_path}",
+            }
+            
+        except S3Error as e:
+            logger.error(f"❌ Upload failed: {e}")
+            return {"success": False, "error": str(e), "object_name": object_path}
+
+    def stat_evidence(
+        self,
+        tenant_id: str,
+        case_id: str,
+        file_name: str,
+        evidence_type: str = "evidence",
+    ) -> Optional[Dict[str, Any]]:
+        """Tamaño, content-type y etag de una evidencia (None si no existe)."""
+        object_path = f"{tenant_id}/cases/{case_id}/{evidence_type}/{file_name}"
+        
+        try:
+            stat = self.client.stat_object(self.bucket_name, object_path)
+            return {
+                "object_name": object_path,
+                "size": stat.size,
+                "etag": stat.etag,
+                "content_type": stat.content_type,
+                "last_modified": stat.last_modified.isoformat() if stat.last_modified else None,
+            }
+        except S3Error as e:
+            logger.error(f"❌ Stat failed: {e}")
+            return None
+
+    def stream_evidence(
+        self,
+        tenant_id: str,
+        case_id: str,
+        file_name: str,
+        evidence_type: str = "evidence",
+        offset: int = 0,
+        length: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """
+        Generador de chunks de una evidencia (opcionalmente un rango).
+        La conexión se libera al agotarse o cerrarse el generador.
+        """
+        object_path = f"{tenant_id}/cases/{case_id}/{evidence_type}/{file_name}"
+        chunk_size = chunk_size or settings.MINIO_STREAM_CHUNK_SIZE
+        
+        response = self.client.get_object(
+            self.bucket_name, object_path, offset=offset, length=length or 0
+        )
+        try:
+            for chunk in response.stream(chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
     def download_evidence(
         self,
         tenant_id: str,
@@ -298,7 +459,10 @@ class MinIOStorageService:
         object_path = f"{tenant_id}/cases/{case_id}/{evidence_type}/{file_name}"
         
         try:
+            size = self._object_size(object_path)
             self.client.remove_object(self.bucket_name, object_path)
+            if size is not None:
+                self._track_delete(object_path, size)
             logger.info(f"🗑️ Evidence deleted: {object_path}")
             return True
             
@@ -328,6 +492,7 @@ class MinIOStorageService:
             json_content = json.dumps(results, indent=2, default=str)
             content_bytes = json_content.encode("utf-8")
             
+            previous_size = self._object_size(object_path)
             result = self.client.put_object(
                 self.bucket_name,
                 object_path,
@@ -341,6 +506,7 @@ class MinIOStorageService:
                     "x-amz-meta-timestamp": datetime.utcnow().isoformat(),
                 }
             )
+            self._track_put(object_path, len(content_bytes), previous_size)
             
             logger.info(f"📊 Scan results saved: {object_path}")
             
@@ -432,6 +598,7 @@ class MinIOStorageService:
             json_content = json.dumps(data, indent=2, default=str)
             content_bytes = json_content.encode("utf-8")
             
+            previous_size = self._object_size(object_path)
             result = self.client.put_object(
                 self.bucket_name,
                 object_path,
@@ -439,6 +606,7 @@ class MinIOStorageService:
                 len(content_bytes),
                 content_type="application/json",
             )
+            self._track_put(object_path, len(content_bytes), previous_size)
             
             logger.info(f"📊 M365 data saved: {object_path}")
             
@@ -470,9 +638,42 @@ class MinIOStorageService:
             logger.error(f"❌ Presigned URL failed: {e}")
             return None
 
-    def get_storage_stats(self, tenant_id: Optional[str] = None) -> Dict[str, Any]:
-        """Obtiene estadísticas de almacenamiento."""
-        prefix = f"{tenant_id}/" if tenant_id else ""
+    def get_storage_stats(
+        self,
+        tenant_id: Optional[str] = None,
+        case_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas de almacenamiento desde el índice incremental.
+
+        No lista el bucket salvo la primera vez (o en segundo plano cuando el
+        índice está viejo). Si la BD no está disponible, recorre el bucket.
+        """
+        try:
+            return storage_stats_index.get_or_reconcile(
+                self.bucket_name, self._list_all_objects, tenant_id, case_id
+            )
+        except S3Error as e:
+            logger.error(f"❌ Stats failed: {e}")
+            return {"error": str(e)}
+        except Exception as e:
+            logger.warning(f"⚠️ Storage stats index unavailable, listing bucket: {e}")
+            return self._scan_storage_stats(tenant_id, case_id)
+
+    def reconcile_storage_stats(self) -> Dict[str, int]:
+        """Re-lista el bucket y reconstruye el índice de estadísticas."""
+        return storage_stats_index.reconcile(self.bucket_name, self._list_all_objects())
+
+    def _scan_storage_stats(
+        self,
+        tenant_id: Optional[str] = None,
+        case_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Estadísticas recorriendo los objetos (O(n) llamadas de listado)."""
+        if case_id:
+            prefix = f"{tenant_id}/cases/{case_id}/"
+        else:
+            prefix = f"{tenant_id}/" if tenant_id else ""
         
         try:
             total_size = 0
@@ -489,7 +690,7 @@ class MinIOStorageService:
                     total_objects += 1
                     
                     parts = obj.object_name.split("/")
-                    if len(parts) >= 3:
+                    if len(parts) >= 3 and not case_id:
                         obj_type = parts[2] if tenant_id else parts[1]
                         by_type[obj_type] = by_type.get(obj_type, 0) + 1
             
@@ -499,12 +700,36 @@ class MinIOStorageService:
                 "total_objects": total_objects,
                 "by_type": by_type,
                 "tenant_id": tenant_id,
+                "case_id": case_id,
             }
             
         except S3Error as e:
             logger.error(f"❌ Stats failed: {e}")
             return {"error": str(e)}
 
+    def _list_all_objects(self):
+        return self.client.list_objects(self.bucket_name, prefix="", recursive=True)
+
+    def _object_size(self, object_path: str) -> Optional[int]:
+        """Tamaño del objeto actual o None si no existe."""
+        try:
+            return self.client.stat_object(self.bucket_name, object_path).size
+        except Exception:
+            return None
+
+    def _track_put(self, object_path: str, size: int, previous_size: Optional[int]) -> None:
+        try:
+            storage_stats_index.record_put(self.bucket_name, object_path, size, previous_size)
+        except Exception as e:
+            # La reconciliación corrige la deriva; la subida no debe fallar por esto
+            logger.warning(f"⚠️ Storage stats update failed for {object_path}: {e}")
+
+    def _track_delete(self, object_path: str, size: int) -> None:
+        try:
+            storage_stats_index.record_delete(self.bucket_name, object_path, size)
+        except Exception as e:
+            logger.warning(f"⚠️ Storage stats update failed for {object_path}: {e}")
+
     def health_check(self) -> Dict[str, Any]:
         """Verifica el estado de conexión con MinIO."""
         try:
@@ -1,13 +1,32 @@
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 from api.config import settings
+from api.services.text_chunker import iter_chunks, iter_file_chunks
+from typing import IO, Dict, Iterable, List, Optional
+import asyncio
 import logging
 import os
 import hashlib
+import threading
+import time
+
+try:
+    import chromadb
+    from chromadb.config import Settings
+    from sentence_transformers import SentenceTransformer
+    RAG_AVAILABLE = True
+except ImportError:
+    RAG_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# Texts per collection.add() call (Chroma limits the size of a single add)
+ADD_CHUNK_SIZE = 1000
+
+
+def content_id(case_id: str, text: str) -> str:
+    """Deterministic document ID: identical texts in a case share an ID"""
+    return f"{case_id}_{hashlib.md5(text.encode(), usedforsecurity=False).hexdigest()}"
+
+
 class RAGService:
     _instance = None
 
@@ -20,17 +39,26 @@ class RAGService:
     def __init__(self):
         if self._initialized:
             return
-        
+
+        self._collections: Dict[str, object] = {}
+        self._collections_lock = threading.Lock()
+        # One encode() at a time: the model already uses every core per batch
+        self._encode_lock = threading.Lock()
+
+        if not RAG_AVAILABLE:
+            logger.warning("RAG Service disabled: chromadb/sentence-transformers not installed")
+            return
+
         self.persist_directory = os.path.join(settings.EVIDENCE_DIR, "rag_db")
         os.makedirs(self.persist_directory, exist_ok=True)
-        
+
         logger.info(f"Initializing ChromaDB at {self.persist_directory}")
         try:
             self.client = chromadb.PersistentClient(path=self.persist_directory)
-            
+
             # Use a lightweight model for embeddings
             logger.info("Loading embedding model...")
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embedding_model = SentenceTransformer(settings.RAG_EMBEDDING_MODEL)
             self._initialized = True
         except Exception as e:
             logger.error(f"Failed to initialize RAG Service: {e}")
@@ -43,61 +71,227 @@ class RAGService:
         # Ensure it starts with a letter if needed, but case_id usually does
         return f"case_{safe_id}"
 
+    def _get_collection(self, case_id: str, create: bool = True):
+        """Cached collection handle (None if it does not exist and create=False)"""
+        name = self._get_collection_name(case_id)
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+
+        with self._collections_lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                if create:
+                    collection = self.client.get_or_create_collection(name=name)
+                else:
+                    try:
+                        collection = self.client.get_collection(name=name)
+                    except ValueError:
+                        return None
+                self._collections[name] = collection
+        return collection
+
+    def _encode(self, texts: List[str], batch_size: int, normalize_embeddings: bool) -> List[List[float]]:
+        with self._encode_lock:
+            embeddings = self.embedding_model.encode(
+                texts,
+                batch_size=batch_size,
+                normalize_embeddings=normalize_embeddings,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return embeddings.tolist()
+
+    def add_documents(
+        self,
+        case_id: str,
+        texts: Iterable[str],
+        metadatas: Optional[Iterable[dict]] = None,
+        batch_size: Optional[int] = None,
+        normalize_embeddings: Optional[bool] = None
+    ) -> Dict:
+        """
+        Embed and store many texts with batched encoding.
+
+        Texts already present in the collection (same content hash) or repeated
+        in the input are skipped without being embedded.
+
+        Returns:
+            Stats: added, skipped, total, seconds, docs_per_sec
+        """
+        stats = {"added": 0, "skipped": 0, "total": 0, "seconds": 0.0, "docs_per_sec": 0.0}
+        if not self._initialized:
+            return stats
+
+        batch_size = batch_size or settings.RAG_EMBED_BATCH_SIZE
+        if normalize_embeddings is None:
+            normalize_embeddings = settings.RAG_NORMALIZE_EMBEDDINGS
+
+        started = time.perf_counter()
+        collection = self._get_collection(case_id)
+
+        # Dedup within the input
+        documents: Dict[str, tuple] = {}
+        metadata_iter = iter(metadatas) if metadatas is not None else None
+        for text in texts:
+            metadata = next(metadata_iter, None) if metadata_iter is not None else None
+            stats["total"] += 1
+            if not text or not text.strip():
+                stats["skipped"] += 1
+                continue
+            doc_id = content_id(case_id, text)
+            if doc_id in documents:
+                stats["skipped"] += 1
+                continue
+            documents[doc_id] = (text, metadata or {})
+
+        ids = list(documents)
+        for start in range(0, len(ids), ADD_CHUNK_SIZE):
+            batch_ids = ids[start:start + ADD_CHUNK_SIZE]
+
+            # Dedup against what is already embedded
+            existing = set(collection.get(ids=batch_ids, include=[])["ids"])
+            new_ids = [doc_id for doc_id in batch_ids if doc_id not in existing]
+            stats["skipped"] += len(batch_ids) - len(new_ids)
+            if not new_ids:
+                continue
+
+            batch_texts = [documents[doc_id][0] for doc_id in new_ids]
+            collection.add(
+                documents=batch_texts,
+                embeddings=self._encode(batch_texts, batch_size, normalize_embeddings),
+                metadatas=[documents[doc_id][1] for doc_id in new_ids],
+                ids=new_ids
+            )
+            stats["added"] += len(new_ids)
+
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = round(elapsed, 3)
+        stats["docs_per_sec"] = round(stats["added"] / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(
+            f"RAG ingest for {case_id}: {stats['added']} added, {stats['skipped']} skipped "
+            f"({stats['docs_per_sec']} docs/s)"
+        )
+        return stats
+
     def add_document(self, case_id: str, text: str, metadata: dict = None):
         if not self._initialized:
             return False
-            
+
         try:
-            collection_name = self._get_collection_name(case_id)
-            collection = self.client.get_or_create_collection(name=collection_name)
-            
-            # Generate embedding
-            embedding = self.embedding_model.encode(text).tolist()
-            
-            # Generate ID
-            doc_id = f"{case_id}_{hashlib.md5(text.encode()).hexdigest()}"
-            
-            # Add to collection
-            collection.add(
-                documents=[text],
-                embeddings=[embedding],
-                metadatas=[metadata or {}],
-                ids=[doc_id]
-            )
+            self.add_documents(case_id, [text], [metadata or {}])
             return True
         except Exception as e:
             logger.error(f"Error adding document to RAG: {e}")
             return False
 
+    def ingest_text(
+        self,
+        case_id: str,
+        text: str,
+        metadata: dict = None,
+        chunk_size: Optional[int] = None,
+        overlap: Optional[int] = None
+    ) -> Dict:
+        """Split a long text into overlapping chunks and index them"""
+        return self._ingest_chunks(
+            case_id,
+            iter_chunks([text], chunk_size or settings.RAG_CHUNK_SIZE, self._overlap(overlap)),
+            metadata
+        )
+
+    def ingest_stream(
+        self,
+        case_id: str,
+        stream: IO[str],
+        metadata: dict = None,
+        chunk_size: Optional[int] = None,
+        overlap: Optional[int] = None
+    ) -> Dict:
+        """Index an evidence file (text stream) chunk by chunk, bounded memory"""
+        return self._ingest_chunks(
+            case_id,
+            iter_file_chunks(stream, chunk_size or settings.RAG_CHUNK_SIZE, self._overlap(overlap)),
+            metadata
+        )
+
+    def _overlap(self, overlap: Optional[int]) -> int:
+        return settings.RAG_CHUNK_OVERLAP if overlap is None else overlap
+
+    def _ingest_chunks(self, case_id: str, chunks, metadata: Optional[dict]) -> Dict:
+        totals = {"chunks": 0, "added": 0, "skipped": 0, "seconds": 0.0, "docs_per_sec": 0.0}
+        if not self._initialized:
+            return totals
+
+        started = time.perf_counter()
+        window: List = []
+
+        def flush():
+            result = self.add_documents(
+                case_id,
+                [chunk.text for chunk in window],
+                [{**(metadata or {}), "chunk_index": chunk.index, "offset": chunk.offset}
+                 for chunk in window]
+            )
+            totals["added"] += result["added"]
+            totals["skipped"] += result["skipped"]
+            window.clear()
+
+        for chunk in chunks:
+            totals["chunks"] += 1
+            window.append(chunk)
+            if len(window) >= ADD_CHUNK_SIZE:
+                flush()
+        if window:
+            flush()
+
+        elapsed = time.perf_counter() - started
+        totals["seconds"] = round(elapsed, 3)
+        totals["docs_per_sec"] = round(totals["added"] / elapsed, 1) if elapsed > 0 else 0.0
+        return totals
+
+    async def add_documents_async(self, case_id: str, texts: List[str], metadatas: List[dict] = None, **kwargs) -> Dict:
+        """add_documents in a worker thread (keeps the event loop free)"""
+        return await asyncio.to_thread(self.add_documents, case_id, texts, metadatas, **kwargs)
+
+    async def ingest_text_async(self, case_id: str, text: str, metadata: dict = None, **kwargs) -> Dict:
+        return await asyncio.to_thread(self.ingest_text, case_id, text, metadata, **kwargs)
+
+    async def ingest_stream_async(self, case_id: str, stream: IO[str], metadata: dict = None, **kwargs) -> Dict:
+        return await asyncio.to_thread(self.ingest_stream, case_id, stream, metadata, **kwargs)
+
     def query(self, case_id: str, query_text: str, n_results: int = 5):
         if not self._initialized:
             return []
-            
+
         try:
-            collection_name = self._get_collection_name(case_id)
-            try:
-                collection = self.client.get_collection(name=collection_name)
-            except ValueError:
-                logger.warning(f"Collection {collection_name} not found")
+            collection = self._get_collection(case_id, create=False)
+            if collection is None:
+                logger.warning(f"Collection {self._get_collection_name(case_id)} not found")
                 return []
 
-            query_embedding = self.embedding_model.encode(query_text).tolist()
-            
+            query_embedding = self._encode(
+                [query_text], 1, settings.RAG_NORMALIZE_EMBEDDINGS
+            )[0]
+
             results = collection.query(
                 query_embeddings=[query_embedding],
                 n_results=n_results
             )
-            
+
             return results
         except Exception as e:
             logger.error(f"Error querying RAG: {e}")
             return []
 
+    async def query_async(self, case_id: str, query_text: str, n_results: int = 5):
+        return await asyncio.to_thread(self.query, case_id, query_text, n_results)
+
     def get_context(self, case_id: str, query_text: str) -> str:
         results = self.query(case_id, query_text)
         if not results or not results['documents']:
             return ""
-        
+
         # Flatten documents list (results['documents'] is a list of lists)
         documents = results['documents'][0]
         return "\n\n".join(documents)
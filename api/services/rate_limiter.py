@@ -0,0 +1,179 @@
+"""
+MCP v4.7 - Rate Limiter
+Backends de rate limiting con GCRA (Generic Cell Rate Algorithm).
+
+GCRA guarda un único valor por clave, el TAT (theoretical arrival time):
+cada petición lo adelanta ``window / limit``; se rechaza si quedaría más de
+``window`` por delante de ahora. Equivale a una ventana deslizante que
+admite ráfagas de hasta ``limit`` peticiones, sin listas de timestamps.
+
+- InMemoryRateLimiter: por proceso (desarrollo / un solo worker)
+- RedisRateLimiter: compartido entre workers; un script Lua hace lectura,
+  decisión, escritura y TTL en una sola llamada atómica
+"""
+
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from api.config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit:"
+
+
+@dataclass
+class RateLimitResult:
+    """Resultado de una petición contra el limitador"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # Segundos hasta que se admita otra petición (0 si se admitió)
+    reset_after: float  # Segundos hasta recuperar la ráfaga completa
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class RateLimitBackend(ABC):
+    """Interfaz común de los backends de rate limiting"""
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: float = 60) -> RateLimitResult:
+        """Registrar una petición para ``key`` (máximo ``limit`` por ``window`` segundos)"""
+
+    @abstractmethod
+    async def reset(self, key: str) -> None:
+        """Olvidar el estado de ``key``"""
+
+
+def _gcra(now: float, tat: Optional[float], limit: int, window: float):
+    """Decisión GCRA. Devuelve (resultado, nuevo TAT o None si se rechaza)"""
+    interval = window / limit
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + interval
+    allow_at = new_tat - window
+    if now < allow_at:
+        return RateLimitResult(False, limit, 0, allow_at - now, tat - now), None
+    remaining = int((window - (new_tat - now)) / interval + 1e-9)
+    return RateLimitResult(True, limit, remaining, 0.0, new_tat - now), new_tat
+
+
+class InMemoryRateLimiter(RateLimitBackend):
+    """GCRA en memoria del proceso"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, cleanup_interval: float = 60):
+        self.clock = clock
+        self.cleanup_interval = cleanup_interval
+        self._tat: Dict[str, float] = {}
+        self._last_cleanup = clock()
+
+    async def hit(self, key: str, limit: int, window: float = 60) -> RateLimitResult:
+        return self.hit_sync(key, limit, window)
+
+    def hit_sync(self, key: str, limit: int, window: float = 60) -> RateLimitResult:
+        now = self.clock()
+        if now - self._last_cleanup > self.cleanup_interval:
+            self._cleanup(now)
+
+        result, new_tat = _gcra(now, self._tat.get(key), limit, window)
+        if new_tat is not None:
+            self._tat[key] = new_tat
+        return result
+
+    async def reset(self, key: str) -> None:
+        self._tat.pop(key, None)
+
+    def _cleanup(self, now: float):
+        """Eliminar claves cuyo TAT ya pasó (equivalen a una clave nueva)"""
+        for key in [key for key, tat in self._tat.items() if tat <= now]:
+            del self._tat[key]
+        self._last_cleanup = now
+
+
+# KEYS[1] = clave; ARGV[1] = límite; ARGV[2] = ventana (ms)
+# Devuelve {permitido, restantes, retry_after_ms, reset_after_ms}
+GCRA_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local interval = window / limit
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - window
+if now < allow_at then
+    return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+local ttl = math.ceil(new_tat - now)
+redis.call('SET', KEYS[1], string.format('%.3f', new_tat), 'PX', ttl)
+return {1, math.floor((window - (new_tat - now)) / interval + 1e-9), 0, ttl}
+"""
+
+
+class RedisRateLimiter(RateLimitBackend):
+    """
+    GCRA compartido entre workers vía Redis.
+
+    El reloj es el de Redis (``TIME``), así que los workers no necesitan
+    relojes sincronizados. Si Redis falla se usa un limitador en memoria.
+    """
+
+    def __init__(self, client, prefix: str = KEY_PREFIX,
+                 fallback: Optional[RateLimitBackend] = None):
+        self.client = client
+        self.prefix = prefix
+        self.fallback = fallback or InMemoryRateLimiter()
+        self._script = client.register_script(GCRA_LUA)
+
+    async def hit(self, key: str, limit: int, window: float = 60) -> RateLimitResult:
+        try:
+            allowed, remaining, retry_ms, reset_ms = await self._script(
+                keys=[self.prefix + key], args=[limit, int(window * 1000)]
+            )
+        except Exception as e:
+            logger.error(f"❌ Redis rate limit error, using in-memory fallback: {e}")
+            return await self.fallback.hit(key, limit, window)
+
+        return RateLimitResult(
+            allowed=bool(int(allowed)),
+            limit=limit,
+            remaining=int(remaining),
+            retry_after=int(retry_ms) / 1000,
+            reset_after=int(reset_ms) / 1000,
+        )
+
+    async def reset(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+        await self.fallback.reset(key)
+
+
+def create_rate_limiter() -> RateLimitBackend:
+    """
+    Backend según ``RATE_LIMIT_BACKEND``: ``memory``, ``redis`` o ``auto``
+    (Redis si el cliente de ``redis_cache`` está habilitado).
+    """
+    backend = settings.RATE_LIMIT_BACKEND.lower()
+    if backend in ("auto", "redis"):
+        from api.services import redis_cache
+
+        if redis_cache.REDIS_ENABLED and redis_cache.redis_client is not None:
+            logger.info("🚦 Rate limiting backend: Redis (shared across workers)")
+            return RedisRateLimiter(redis_cache.redis_client)
+        if backend == "redis":
+            logger.warning("⚠️ RATE_LIMIT_BACKEND=redis but Redis is disabled; using in-memory")
+    return InMemoryRateLimiter()
@@ -7,6 +7,7 @@ import os
 import json
 import hashlib
 import logging
+import math
 from typing import Optional, Any, Dict
 from functools import wraps
 
@@ -273,6 +274,9 @@ async def get_cache_stats() -> Dict[str, Any]:
 # Rate Limiting Helper
 # =============================================================================
 
+_rate_limiter = None
+
+
 async def check_rate_limit(
     identifier: str,
     max_requests: int,
@@ -290,7 +294,8 @@ async def check_rate_limit(
         {
             "allowed": bool,
             "remaining": int,
-            "reset_at": timestamp
+            "reset_at": segundos hasta recuperar el límite completo,
+            "retry_after": segundos hasta el próximo intento permitido
         }
     """
     if not REDIS_ENABLED or not redis_client:
@@ -300,36 +305,20 @@ async def check_rate_limit(
             "message": "Rate limiting disabled (Redis not available)"
         }
     
-    key = f"ratelimit:{identifier}"
-    
-    try:
-        # Incrementar contador
-        current = await redis_client.incr(key)
-        
-        # Si es la primera request, setear TTL
-        if current == 1:
-            await redis_client.expire(key, window_seconds)
-        
-        # Obtener TTL restante
-        ttl = await redis_client.ttl(key)
-        
-        allowed = current <= max_requests
-        
-        return {
-            "allowed": allowed,
-            "remaining": max(0, max_requests - current),
-            "reset_at": ttl,
-            "current": current,
-            "limit": max_requests
-        }
+    global _rate_limiter
+    if _rate_limiter is None:
+        # GCRA en un script Lua: una sola llamada atómica (sin claves sin TTL)
+        from api.services.rate_limiter import RedisRateLimiter
+        _rate_limiter = RedisRateLimiter(redis_client)
     
-    except Exception as e:
-        logger.error(f"Rate limit check error: {e}")
-        # En caso de error, permitir la request
-        return {
-            "allowed": True,
-            "error": str(e)
-        }
+    result = await _rate_limiter.hit(identifier, max_requests, window_seconds)
+    return {
+        "allowed": result.allowed,
+        "remaining": result.remaining,
+        "reset_at": math.ceil(result.reset_after),
+        "retry_after": math.ceil(result.retry_after),
+        "limit": max_requests
+    }
 
 
 # =============================================================================
@@ -0,0 +1,229 @@
+"""
+MCP v4.7 - SOAR Checkpoints
+Persistencia de ejecuciones de playbook para reanudarlas tras un reinicio.
+
+- El contexto (sin resultados de pasos) se guarda como JSON compacto comprimido
+- Cada paso terminado se guarda con una clave de idempotencia
+  (ejecución + order + definición del paso); al reanudar se omite
+- Los workers mantienen un latido; las ejecuciones ``running`` sin latido
+  reciente se reclaman con un UPDATE condicional (un solo worker gana)
+"""
+
+import hashlib
+import json
+import os
+import socket
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy.exc import IntegrityError
+
+from api.database import get_db_context
+from api.models.tools import (
+    PlaybookExecution, PlaybookExecutionCheckpoint, PlaybookStepResult, ExecutionStatus
+)
+
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Identidad de este proceso como dueño de ejecuciones
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# Campos de la definición del paso que afectan a su resultado
+_STEP_KEY_FIELDS = (
+    "action_type", "tool_id", "api_endpoint", "api_method", "parameters",
+    "target_from", "condition", "map_over", "map_action"
+)
+
+
+# =============================================================================
+# SERIALIZACIÓN
+# =============================================================================
+
+def serialize_context(context: Dict[str, Any]) -> Tuple[bytes, str]:
+    """Serializa el contexto sin ``steps`` (se reconstruye desde los resultados)"""
+    payload = {k: v for k, v in context.items() if k != "steps"}
+    raw = json.dumps(payload, default=str, separators=(",", ":")).encode("utf-8")
+    if ZSTD_AVAILABLE:
+        return zstd.ZstdCompressor(level=3).compress(raw), "zstd"
+    return zlib.compress(raw, 6), "zlib"
+
+
+def deserialize_context(blob: bytes, codec: str) -> Dict[str, Any]:
+    if codec == "zstd":
+        raw = zstd.ZstdDecompressor().decompress(blob)
+    else:
+        raw = zlib.decompress(blob)
+    context = json.loads(raw)
+    context["steps"] = {}
+    return context
+
+
+def step_idempotency_key(execution_id: str, step: Dict[str, Any]) -> str:
+    """Clave estable de un paso: cambia si cambia su definición"""
+    definition = {field: step.get(field) for field in _STEP_KEY_FIELDS}
+    digest = hashlib.sha256(
+        json.dumps([execution_id, step["order"], definition], sort_keys=True, default=str).encode()
+    )
+    return digest.hexdigest()
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class CheckpointStore:
+    """Acceso a checkpoints y resultados de pasos"""
+
+    def __init__(self, owner: str = WORKER_ID):
+        self.owner = owner
+
+    def begin(self, execution_id: str, context: Dict[str, Any]):
+        """Crea el checkpoint inicial de una ejecución nueva"""
+        blob, codec = serialize_context(context)
+        with get_db_context() as db:
+            db.add(PlaybookExecutionCheckpoint(
+                execution_id=execution_id,
+                context_blob=blob,
+                codec=codec,
+                owner=self.owner,
+                heartbeat_at=datetime.utcnow()
+            ))
+
+    def save_step(
+        self,
+        execution_id: str,
+        step: Dict[str, Any],
+        step_result: Dict[str, Any],
+        context: Dict[str, Any]
+    ):
+        """Guarda resultado del paso y contexto en una sola transacción"""
+        key = step_idempotency_key(execution_id, step)
+        blob, codec = serialize_context(context)
+        now = datetime.utcnow()
+
+        with get_db_context() as db:
+            existing = db.query(PlaybookStepResult).filter(
+                PlaybookStepResult.idempotency_key == key
+            ).first()
+            if existing:
+                existing.status = step_result.get("status")
+                existing.result = step_result
+                existing.completed_at = now
+            else:
+                db.add(PlaybookStepResult(
+                    execution_id=execution_id,
+                    step_order=step["order"],
+                    idempotency_key=key,
+                    status=step_result.get("status"),
+                    result=step_result,
+                    completed_at=now
+                ))
+
+            checkpoint = db.query(PlaybookExecutionCheckpoint).filter(
+                PlaybookExecutionCheckpoint.execution_id == execution_id
+            ).first()
+            if checkpoint:
+                checkpoint.context_blob = blob
+                checkpoint.codec = codec
+                checkpoint.heartbeat_at = now
+
+    def load(self, execution_id: str) -> Tuple[Optional[Dict[str, Any]], Dict[int, Tuple[str, Dict]]]:
+        """
+        Carga el contexto y los resultados guardados.
+
+        Returns:
+            (contexto o None, {order: (idempotency_key, resultado)})
+        """
+        with get_db_context() as db:
+            checkpoint = db.query(PlaybookExecutionCheckpoint).filter(
+                PlaybookExecutionCheckpoint.execution_id == execution_id
+            ).first()
+            context = None
+            if checkpoint and checkpoint.context_blob:
+                context = deserialize_context(checkpoint.context_blob, checkpoint.codec)
+
+            results = {
+                row.step_order: (row.idempotency_key, row.result or {})
+                for row in db.query(PlaybookStepResult).filter(
+                    PlaybookStepResult.execution_id == execution_id
+                ).all()
+            }
+        return context, results
+
+    def heartbeat(self, execution_ids: Iterable[str]):
+        """Renueva el latido de las ejecuciones de este worker"""
+        ids = list(execution_ids)
+        if not ids:
+            return
+        with get_db_context() as db:
+            db.query(PlaybookExecutionCheckpoint).filter(
+                PlaybookExecutionCheckpoint.execution_id.in_(ids),
+                PlaybookExecutionCheckpoint.owner == self.owner
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+
+    def claim_stale(self, stale_seconds: int) -> List[str]:
+        """
+        Reclama ejecuciones ``running`` cuyo dueño dejó de latir.
+        El UPDATE condicional garantiza que sólo un worker gane cada ejecución.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+        claimed = []
+
+        with get_db_context() as db:
+            rows = db.query(PlaybookExecution.id, PlaybookExecutionCheckpoint.heartbeat_at).outerjoin(
+                PlaybookExecutionCheckpoint,
+                PlaybookExecutionCheckpoint.execution_id == PlaybookExecution.id
+            ).filter(
+                PlaybookExecution.status == ExecutionStatus.RUNNING.value
+            ).all()
+
+        for execution_id, heartbeat_at in rows:
+            if heartbeat_at is not None and heartbeat_at >= cutoff:
+                continue
+            try:
+                with get_db_context() as db:
+                    if heartbeat_at is None:
+                        # Ejecución sin checkpoint (anterior a v4.7 o caída antes del primero)
+                        db.add(PlaybookExecutionCheckpoint(
+                            execution_id=execution_id,
+                            owner=self.owner,
+                            heartbeat_at=datetime.utcnow(),
+                            resume_count=1
+                        ))
+                        db.flush()
+                        won = True
+                    else:
+                        won = db.query(PlaybookExecutionCheckpoint).filter(
+                            PlaybookExecutionCheckpoint.execution_id == execution_id,
+                            PlaybookExecutionCheckpoint.heartbeat_at < cutoff
+                        ).update({
+                            "owner": self.owner,
+                            "heartbeat_at": datetime.utcnow(),
+                            "resume_count": PlaybookExecutionCheckpoint.resume_count + 1
+                        }, synchronize_session=False) == 1
+            except IntegrityError:
+                won = False
+
+            if won:
+                claimed.append(execution_id)
+
+        return claimed
+
+    def finish(self, execution_id: str):
+        """Libera el contexto al terminar (los resultados de pasos se conservan)"""
+        with get_db_context() as db:
+            db.query(PlaybookExecutionCheckpoint).filter(
+                PlaybookExecutionCheckpoint.execution_id == execution_id
+            ).delete(synchronize_session=False)
+
+
+checkpoint_store = CheckpointStore()
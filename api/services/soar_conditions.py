@@ -0,0 +1,222 @@
+"""
+MCP v4.7 - SOAR Conditions
+Evaluador seguro de expresiones para pasos condicionales de playbooks.
+
+Soporta un subconjunto de Python parseado con ``ast`` (sin eval):
+- Literales, nombres del contexto, acceso ``a.b`` y ``a[0]`` / ``a["k"]``
+- Comparaciones (==, !=, <, <=, >, >=, in, not in, is None)
+- and / or / not, aritmética básica (``*`` y ``%`` sólo numéricos y acotados)
+  y las funciones len, any, all, min, max
+- Operandos inválidos (campo ausente, división por cero) dan None, así que
+  la comparación que los usa no se cumple
+
+Ejemplos:
+    previous_step.iocs_found > 0
+    steps[1].status == "completed" and len(iocs) >= 3
+    input.severity in ["high", "critical"]
+"""
+
+import ast
+import operator
+from typing import Any, Dict, Mapping
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ConditionError(ValueError):
+    """Expresión inválida o no soportada"""
+    pass
+
+
+_COMPARATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+# Longitud máxima para evitar expresiones abusivas en playbooks custom
+MAX_EXPRESSION_LENGTH = 500
+# Magnitud máxima de los operandos y resultados enteros de ``*``
+MAX_INT_MAGNITUDE = 10 ** 18
+
+_SEQUENCES = (str, bytes, list, tuple)
+
+
+def _safe_mul(left: Any, right: Any) -> Any:
+    """``*`` sólo numérico y acotado: ``"a" * 10**10`` agotaría la memoria"""
+    if isinstance(left, _SEQUENCES) or isinstance(right, _SEQUENCES):
+        raise ConditionError("Sequence repetition not allowed in condition")
+    for value in (left, right):
+        if isinstance(value, int) and abs(value) > MAX_INT_MAGNITUDE:
+            raise ConditionError("Integer operand too large")
+    result = operator.mul(left, right)
+    if isinstance(result, int) and abs(result) > MAX_INT_MAGNITUDE:
+        raise ConditionError("Integer result too large")
+    return result
+
+
+def _safe_mod(left: Any, right: Any) -> Any:
+    """``%`` sólo numérico: el formateo de cadenas (``"%*d"``) no tiene límite de tamaño"""
+    if isinstance(left, (str, bytes)):
+        raise ConditionError("String formatting not allowed in condition")
+    return operator.mod(left, right)
+
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _safe_mul,
+    ast.Div: operator.truediv,
+    ast.Mod: _safe_mod,
+    ast.FloorDiv: operator.floordiv,
+}
+
+_FUNCTIONS = {
+    "len": len,
+    "any": any,
+    "all": all,
+    "min": min,
+    "max": max,
+    "int": int,
+    "float": float,
+    "str": str,
+}
+
+_CONSTANTS = {"true": True, "false": False, "null": None, "none": None}
+
+
+def _compile(expression: str) -> ast.Expression:
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ConditionError("Expression too long")
+    try:
+        return ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ConditionError(f"Invalid expression: {e.msg}") from e
+
+
+def _lookup(container: Any, key: Any) -> Any:
+    """Acceso tolerante: dicts por clave (int o str), listas por índice"""
+    if isinstance(container, Mapping):
+        if key in container:
+            return container[key]
+        # Las claves de steps son int pero pueden escribirse como "3"
+        if isinstance(key, str) and key.isdigit():
+            return container.get(int(key))
+        if isinstance(key, int):
+            return container.get(str(key))
+        return None
+    if isinstance(container, (list, tuple, str)) and isinstance(key, int):
+        return container[key] if -len(container) <= key < len(container) else None
+    return None
+
+
+def _eval(node: ast.AST, names: Mapping[str, Any]) -> Any:
+    if isinstance(node, ast.Expression):
+        return _eval(node.body, names)
+
+    if isinstance(node, ast.Constant):
+        return node.value
+
+    if isinstance(node, ast.Name):
+        if node.id in names:
+            return names[node.id]
+        return _CONSTANTS.get(node.id.lower())
+
+    if isinstance(node, ast.Attribute):
+        return _lookup(_eval(node.value, names), node.attr)
+
+    if isinstance(node, ast.Subscript):
+        return _lookup(_eval(node.value, names), _eval(node.slice, names))
+
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return [_eval(elt, names) for elt in node.elts]
+
+    if isinstance(node, ast.BoolOp):
+        if isinstance(node.op, ast.And):
+            result = True
+            for value in node.values:
+                result = _eval(value, names)
+                if not result:
+                    return result
+            return result
+        result = False
+        for value in node.values:
+            result = _eval(value, names)
+            if result:
+                return result
+        return result
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _eval(node.operand, names)
+        if isinstance(node.op, ast.Not):
+            return not operand
+        try:
+            if isinstance(node.op, ast.USub):
+                return -operand
+            if isinstance(node.op, ast.UAdd):
+                return +operand
+        except TypeError:
+            return None
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        left, right = _eval(node.left, names), _eval(node.right, names)
+        try:
+            return _BINARY_OPS[type(node.op)](left, right)
+        except (TypeError, ArithmeticError):
+            # Campo ausente (None + 1), división por cero...: sin valor, como en Call
+            return None
+
+    if isinstance(node, ast.Compare):
+        left = _eval(node.left, names)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _eval(comparator, names)
+            try:
+                if not _COMPARATORS[type(op)](left, right):
+                    return False
+            except TypeError:
+                # Comparar None con un número, etc.: la condición no se cumple
+                return False
+            left = right
+        return True
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        func = _FUNCTIONS.get(node.func.id)
+        if func is None:
+            raise ConditionError(f"Function not allowed: {node.func.id}")
+        args = [_eval(arg, names) for arg in node.args]
+        try:
+            return func(*args)
+        except TypeError:
+            return None
+
+    raise ConditionError(f"Unsupported expression element: {type(node).__name__}")
+
+
+def evaluate_condition(expression: str, names: Dict[str, Any]) -> bool:
+    """
+    Evalúa una expresión de condición contra un namespace.
+
+    Raises:
+        ConditionError: si la expresión no es válida
+    """
+    return bool(_eval(_compile(expression), names))
+
+
+def validate_condition(expression: str) -> None:
+    """Valida la sintaxis de una condición sin evaluarla (para crear playbooks)"""
+    tree = _compile(expression)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS:
+                raise ConditionError("Function not allowed in condition")
+        elif isinstance(node, (ast.Lambda, ast.NamedExpr, ast.ListComp, ast.DictComp,
+                               ast.SetComp, ast.GeneratorExp, ast.Await, ast.Yield)):
+            raise ConditionError(f"Unsupported expression element: {type(node).__name__}")
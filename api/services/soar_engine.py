@@ -6,7 +6,9 @@ v4.6.0: Integración con SOAR ML para predicción y aprendizaje continuo.
 """
 
 import asyncio
+import time
 import uuid
+from collections import defaultdict
 from datetime import datetime
 from typing import Any, Callable, Dict, List, Optional
 import logging
@@ -14,8 +16,13 @@ import logging
 from api.config import settings
 from api.database import get_db_context
 from api.models.tools import (
-    Playbook, PlaybookExecution, PlaybookTrigger, PlaybookStatus,
-    StepActionType, ExecutionStatus, AuditLog
+    Playbook, PlaybookExecution, PlaybookStep, PlaybookStepExecution, PlaybookTrigger,
+    PlaybookStatus, SecurityPolicy, StepActionType, ExecutionStatus, AuditLog
+)
+from api.services.audit import record_audit_event
+from api.services.soar_conditions import ConditionError, evaluate_condition
+from api.services.soar_checkpoints import (
+    CheckpointStore, checkpoint_store, step_idempotency_key
 )
 
 # v4.6.0: Import ML services
@@ -260,6 +267,59 @@ BUILTIN_PLAYBOOKS = {
 }
 
 
+# =============================================================================
+# EXECUTION PROGRESS
+# =============================================================================
+
+class _ExecutionProgress:
+    """
+    Contadores de progreso de una ejecución con escritura agrupada.
+    
+    Los pasos actualizan contadores en memoria; la BD se escribe como mucho
+    cada SOAR_PROGRESS_FLUSH_SECONDS (el estado final siempre se persiste).
+    """
+    
+    def __init__(self, execution_id: str, flush_interval: Optional[float] = None):
+        self.execution_id = execution_id
+        self.flush_interval = (
+            settings.SOAR_PROGRESS_FLUSH_SECONDS if flush_interval is None else flush_interval
+        )
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.current_step = 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+    
+    def record(self, order: int, status: str):
+        if status == "completed":
+            self.completed += 1
+        elif status == "failed":
+            self.failed += 1
+        elif status == "skipped":
+            self.skipped += 1
+        self.current_step = max(self.current_step, order)
+        self._dirty = True
+    
+    def maybe_flush(self):
+        if self._dirty and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self):
+        with get_db_context() as db:
+            exec_record = db.query(PlaybookExecution).filter(
+                PlaybookExecution.id == self.execution_id
+            ).first()
+            if exec_record:
+                exec_record.current_step = self.current_step
+                exec_record.completed_steps = self.completed
+                exec_record.failed_steps = self.failed
+                exec_record.skipped_steps = self.skipped
+                db.commit()
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+
 # =============================================================================
 # SOAR ENGINE
 # =============================================================================
@@ -271,8 +331,10 @@ class SOAREngine:
     v4.6.0: Integrado con ML para predicción de éxito y recomendaciones.
     """
     
-    def __init__(self):
+    def __init__(self, checkpoints: Optional[CheckpointStore] = None):
         self.active_executions: Dict[str, asyncio.Task] = {}
+        self.checkpoints = checkpoints or checkpoint_store
+        self._heartbeat_task: Optional[asyncio.Task] = None
         self.step_handlers: Dict[str, Callable] = {
             StepActionType.TOOL_EXECUTE.value: self._execute_tool_step,
             StepActionType.API_CALL.value: self._execute_api_step,
@@ -285,6 +347,7 @@ class SOAREngine:
             StepActionType.GRAPH_ENRICH.value: self._execute_graph_step,
             StepActionType.RUN_CORRELATION.value: self._execute_correlation_step,
             StepActionType.APPROVAL_GATE.value: self._execute_approval_step,
+            StepActionType.MAP.value: self._execute_map_step,
         }
     
     # -------------------------------------------------------------------------
@@ -457,7 +520,11 @@ class SOAREngine:
                             wait_for_completion=step_data.get("wait_for_completion", True),
                             timeout_seconds=step_data.get("timeout_seconds", 300),
                             continue_on_error=step_data.get("continue_on_error", False),
-                            requires_approval=step_data.get("requires_approval", False)
+                            requires_approval=step_data.get("requires_approval", False),
+                            depends_on=step_data.get("depends_on"),
+                            map_over=step_data.get("map_over"),
+                            map_action=step_data.get("map_action"),
+                            max_concurrency=step_data.get("max_concurrency")
                         )
                         db.add(step)
                     
@@ -601,29 +668,10 @@ class SOAREngine:
                     raise PermissionError("Red team playbooks not enabled for this tenant")
             
             # Cargar pasos
-            steps = db.query(PlaybookStep).filter(
-                PlaybookStep.playbook_id == playbook_id
-            ).order_by(PlaybookStep.order).all()
-            
-            steps_data = [
-                {
-                    "id": s.id,
-                    "order": s.order,
-                    "name": s.name,
-                    "action_type": s.action_type,
-                    "tool_id": s.tool_id,
-                    "api_endpoint": s.api_endpoint,
-                    "api_method": s.api_method,
-                    "parameters": s.parameters,
-                    "target_from": s.target_from,
-                    "condition": s.condition,
-                    "wait_for_completion": s.wait_for_completion,
-                    "timeout_seconds": s.timeout_seconds,
-                    "continue_on_error": s.continue_on_error,
-                    "requires_approval": s.requires_approval
-                }
-                for s in steps
-            ]
+            steps_data = self._load_steps_data(db, playbook_id)
+        
+        # Validar grafo de dependencias antes de crear la ejecución
+        step_dependencies = self._build_step_dependencies(steps_data)
         
         # Crear ejecución
         execution_id = PlaybookExecution.generate_id()
@@ -663,7 +711,7 @@ class SOAREngine:
         
         logger.info(f"🎬 Starting playbook {playbook_id} (execution: {execution_id})")
         
-        # Ejecutar pasos secuencialmente
+        # Ejecutar pasos (DAG de dependencias; secuencial si no se declaran)
         context = {
             "input": input_data,
             "steps": {},
@@ -676,38 +724,43 @@ class SOAREngine:
             "agent_id": agent_id
         }
         
-        completed_steps = 0
-        failed_steps = 0
-        skipped_steps = 0
+        # Checkpoint inicial: permite reanudar si el proceso cae
+        try:
+            self.checkpoints.begin(execution_id, context)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create checkpoint for {execution_id}: {e}")
+        
+        return await self._run_execution(
+            execution_id=execution_id,
+            playbook_id=playbook_id,
+            steps_data=steps_data,
+            dependencies=step_dependencies,
+            context=context,
+            started_at=execution.started_at
+        )
+    
+    async def _run_execution(
+        self,
+        execution_id: str,
+        playbook_id: str,
+        steps_data: List[Dict],
+        dependencies: Dict[int, List[int]],
+        context: Dict[str, Any],
+        started_at: Optional[datetime],
+        completed_results: Optional[Dict[int, Dict]] = None
+    ) -> Dict[str, Any]:
+        """Ejecuta (o reanuda) los pasos y finaliza la ejecución"""
+        progress = _ExecutionProgress(execution_id)
+        self.active_executions[execution_id] = asyncio.current_task()
         
         try:
-            for step in steps_data:
-                step_execution = await self._execute_step(step, context)
-                
-                # Guardar resultado en contexto
-                context["steps"][step["order"]] = step_execution
-                
-                if step_execution["status"] == "completed":
-                    completed_steps += 1
-                elif step_execution["status"] == "failed":
-                    failed_steps += 1
-                    if not step.get("continue_on_error", False):
-                        logger.warning(f"Step {step['name']} failed, stopping playbook")
-                        break
-                elif step_execution["status"] == "skipped":
-                    skipped_steps += 1
-                
-                # Actualizar progreso
-                with get_db_context() as db:
-                    exec_record = db.query(PlaybookExecution).filter(
-                        PlaybookExecution.id == execution_id
-                    ).first()
-                    if exec_record:
-                        exec_record.current_step = step["order"]
-                        exec_record.completed_steps = completed_steps
-                        exec_record.failed_steps = failed_steps
-                        exec_record.skipped_steps = skipped_steps
-                        db.commit()
+            await self._run_step_graph(
+                steps_data, dependencies, context, progress,
+                completed_results=completed_results
+            )
+            completed_steps = progress.completed
+            failed_steps = progress.failed
+            skipped_steps = progress.skipped
             
             # Determinar estado final
             if failed_steps > 0 and not any(
@@ -721,6 +774,11 @@ class SOAREngine:
             logger.error(f"Playbook execution error: {e}")
             final_status = ExecutionStatus.FAILED.value
             context["error"] = str(e)
+            completed_steps = progress.completed
+            failed_steps = progress.failed
+            skipped_steps = progress.skipped
+        finally:
+            self.active_executions.pop(execution_id, None)
         
         # Finalizar ejecución
         with get_db_context() as db:
@@ -761,10 +819,15 @@ class SOAREngine:
             
             db.commit()
         
+        try:
+            self.checkpoints.finish(execution_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not release checkpoint for {execution_id}: {e}")
+        
         # v4.6.0: Record outcome for ML learning
         execution_duration = (
-            datetime.utcnow() - execution.started_at
-        ).total_seconds() if execution.started_at else 0
+            datetime.utcnow() - started_at
+        ).total_seconds() if started_at else 0
         
         if SOAR_ML_AVAILABLE:
             try:
@@ -793,6 +856,311 @@ class SOAREngine:
             "duration_seconds": execution_duration
         }
     
+    def _load_steps_data(self, db, playbook_id: str) -> List[Dict]:
+        """Carga los pasos de un playbook como dicts"""
+        steps = db.query(PlaybookStep).filter(
+            PlaybookStep.playbook_id == playbook_id
+        ).order_by(PlaybookStep.order).all()
+        
+        return [
+            {
+                "id": s.id,
+                "order": s.order,
+                "name": s.name,
+                "action_type": s.action_type,
+                "tool_id": s.tool_id,
+                "api_endpoint": s.api_endpoint,
+                "api_method": s.api_method,
+                "parameters": s.parameters,
+                "target_from": s.target_from,
+                "condition": s.condition,
+                "wait_for_completion": s.wait_for_completion,
+                "timeout_seconds": s.timeout_seconds,
+                "continue_on_error": s.continue_on_error,
+                "requires_approval": s.requires_approval,
+                "depends_on": s.depends_on,
+                "map_over": s.map_over,
+                "map_action": s.map_action,
+                "max_concurrency": s.max_concurrency
+            }
+            for s in steps
+        ]
+    
+    # -------------------------------------------------------------------------
+    # RESUME (v4.7)
+    # -------------------------------------------------------------------------
+    
+    async def resume_execution(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Reanuda una ejecución interrumpida desde su último checkpoint.
+        Los pasos con resultado guardado (y misma definición) no se repiten.
+        """
+        with get_db_context() as db:
+            record = db.query(PlaybookExecution).filter(
+                PlaybookExecution.id == execution_id
+            ).first()
+            if not record or record.status != ExecutionStatus.RUNNING.value:
+                return None
+            
+            playbook_id = record.playbook_id
+            started_at = record.started_at
+            base_context = {
+                "input": getattr(record, "input_data", None) or {},
+                "steps": {},
+                "iocs": [],
+                "execution_id": execution_id,
+                "case_id": record.case_id,
+                "investigation_id": record.investigation_id,
+                "user_id": getattr(record, "executed_by", None),
+                "tenant_id": getattr(record, "tenant_id", None),
+                "agent_id": getattr(record, "agent_id", None)
+            }
+            steps_data = self._load_steps_data(db, playbook_id)
+        
+        dependencies = self._build_step_dependencies(steps_data)
+        saved_context, saved_results = self.checkpoints.load(execution_id)
+        context = saved_context or base_context
+        
+        by_order = {s["order"]: s for s in steps_data}
+        completed_results = {
+            order: result
+            for order, (key, result) in saved_results.items()
+            if order in by_order and key == step_idempotency_key(execution_id, by_order[order])
+        }
+        
+        logger.info(
+            f"♻️ Resuming playbook {playbook_id} (execution: {execution_id}, "
+            f"{len(completed_results)}/{len(steps_data)} steps already done)"
+        )
+        
+        return await self._run_execution(
+            execution_id=execution_id,
+            playbook_id=playbook_id,
+            steps_data=steps_data,
+            dependencies=dependencies,
+            context=context,
+            started_at=started_at,
+            completed_results=completed_results
+        )
+    
+    async def resume_interrupted_executions(self) -> List[str]:
+        """
+        Escáner de arranque: reclama ejecuciones huérfanas (sin latido) y las
+        reanuda en background. Inicia además el latido de este worker.
+        """
+        self.start_heartbeat()
+        
+        try:
+            claimed = self.checkpoints.claim_stale(settings.SOAR_RESUME_STALE_SECONDS)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not scan interrupted playbook executions: {e}")
+            return []
+        
+        for execution_id in claimed:
+            asyncio.create_task(self._resume_safely(execution_id))
+        
+        if claimed:
+            logger.info(f"♻️ Resuming {len(claimed)} interrupted playbook executions")
+        return claimed
+    
+    async def _resume_safely(self, execution_id: str):
+        try:
+            await self.resume_execution(execution_id)
+        except Exception as e:
+            logger.error(f"❌ Could not resume execution {execution_id}: {e}")
+            self._abandon_execution(execution_id, f"Resume failed: {e}")
+    
+    def _abandon_execution(self, execution_id: str, error: str):
+        """
+        Marca como fallida una ejecución que no se pudo reanudar y libera su
+        checkpoint, para que no se vuelva a reclamar en cada arranque.
+        """
+        try:
+            with get_db_context() as db:
+                exec_record = db.query(PlaybookExecution).filter(
+                    PlaybookExecution.id == execution_id
+                ).first()
+                if exec_record and exec_record.status == ExecutionStatus.RUNNING.value:
+                    exec_record.status = ExecutionStatus.FAILED.value
+                    exec_record.success = False
+                    exec_record.error_message = error
+                    exec_record.completed_at = datetime.utcnow()
+                    db.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not mark execution {execution_id} as failed: {e}")
+        
+        try:
+            self.checkpoints.finish(execution_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not release checkpoint for {execution_id}: {e}")
+    
+    def start_heartbeat(self):
+        """Inicia el latido periódico de las ejecuciones activas de este worker"""
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+    
+    async def stop_heartbeat(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+    
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.SOAR_CHECKPOINT_HEARTBEAT_SECONDS)
+            try:
+                self.checkpoints.heartbeat(list(self.active_executions))
+            except Exception as e:
+                logger.warning(f"⚠️ Playbook heartbeat failed: {e}")
+    
+    # -------------------------------------------------------------------------
+    # STEP GRAPH
+    # -------------------------------------------------------------------------
+    
+    def _build_step_dependencies(self, steps_data: List[Dict]) -> Dict[int, List[int]]:
+        """
+        Construye el grafo de dependencias {order: [orders previos]}.
+        
+        Si ningún paso declara ``depends_on`` se mantiene el comportamiento
+        secuencial (cada paso depende del anterior). Con al menos una
+        declaración, los pasos sin ``depends_on`` son raíces y se ejecutan
+        en paralelo.
+        """
+        orders = [s["order"] for s in steps_data]
+        if len(set(orders)) != len(orders):
+            raise ValueError("Duplicate step order in playbook")
+        
+        if not any(s.get("depends_on") is not None for s in steps_data):
+            ordered = sorted(orders)
+            return {
+                order: [ordered[i - 1]] if i > 0 else []
+                for i, order in enumerate(ordered)
+            }
+        
+        known = set(orders)
+        dependencies = {}
+        for step in steps_data:
+            deps = step.get("depends_on") or []
+            if isinstance(deps, int):
+                deps = [deps]
+            unknown = [d for d in deps if d not in known]
+            if unknown:
+                raise ValueError(f"Step {step['order']} depends on unknown steps: {unknown}")
+            dependencies[step["order"]] = list(deps)
+        
+        # Detección de ciclos (Kahn)
+        pending = {order: len(deps) for order, deps in dependencies.items()}
+        dependents = defaultdict(list)
+        for order, deps in dependencies.items():
+            for dep in deps:
+                dependents[dep].append(order)
+        queue = [order for order, count in pending.items() if count == 0]
+        visited = 0
+        while queue:
+            order = queue.pop()
+            visited += 1
+            for child in dependents[order]:
+                pending[child] -= 1
+                if pending[child] == 0:
+                    queue.append(child)
+        if visited != len(dependencies):
+            raise ValueError("Playbook step dependencies contain a cycle")
+        
+        return dependencies
+    
+    async def _run_step_graph(
+        self,
+        steps_data: List[Dict],
+        dependencies: Dict[int, List[int]],
+        context: Dict,
+        progress: "_ExecutionProgress",
+        max_concurrency: Optional[int] = None,
+        completed_results: Optional[Dict[int, Dict]] = None
+    ):
+        """
+        Ejecuta los pasos respetando dependencias, con concurrencia acotada.
+        
+        Un fallo sin ``continue_on_error`` detiene el lanzamiento de nuevos
+        pasos; los que ya están en curso terminan. ``completed_results``
+        (al reanudar) marca pasos ya terminados que no se vuelven a ejecutar.
+        """
+        by_order = {s["order"]: s for s in steps_data}
+        remaining = {order: set(deps) for order, deps in dependencies.items()}
+        dependents = defaultdict(list)
+        for order, deps in dependencies.items():
+            for dep in deps:
+                dependents[dep].append(order)
+        
+        semaphore = asyncio.Semaphore(max_concurrency or settings.SOAR_MAX_PARALLEL_STEPS)
+        
+        async def run(step: Dict) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._execute_step(step, context)
+        
+        ready: List[int] = []
+        running: Dict[asyncio.Task, int] = {}
+        aborted = False
+        
+        def finish(order: int, step_execution: Dict[str, Any]):
+            nonlocal aborted
+            step = by_order[order]
+            
+            # Guardar resultado en contexto
+            context["steps"][order] = step_execution
+            progress.record(order, step_execution["status"])
+            
+            if step_execution["status"] == "failed" and not step.get("continue_on_error", False):
+                logger.warning(f"Step {step['name']} failed, stopping playbook")
+                aborted = True
+            
+            for child in dependents[order]:
+                remaining[child].discard(order)
+                if not remaining[child]:
+                    ready.append(child)
+        
+        # Pasos ya terminados antes de un reinicio: se restauran sin ejecutar
+        restored = completed_results or {}
+        for order in sorted(restored):
+            finish(order, restored[order])
+        
+        ready = sorted(
+            order for order, deps in remaining.items()
+            if not deps and order not in restored
+        )
+        
+        try:
+            while ready or running:
+                if not aborted:
+                    for order in ready:
+                        if order not in restored:
+                            running[asyncio.create_task(run(by_order[order]))] = order
+                ready = []
+                if not running:
+                    break
+                
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: running[t]):
+                    order = running.pop(task)
+                    step_execution = task.result()
+                    finish(order, step_execution)
+                    self._checkpoint_step(by_order[order], step_execution, context)
+                
+                ready.sort()
+                progress.maybe_flush()
+        finally:
+            for task in running:
+                task.cancel()
+    
+    def _checkpoint_step(self, step: Dict, step_execution: Dict[str, Any], context: Dict):
+        """Persiste el resultado del paso y el contexto (no interrumpe la ejecución si falla)"""
+        try:
+            self.checkpoints.save_step(context["execution_id"], step, step_execution, context)
+        except Exception as e:
+            logger.warning(f"⚠️ Checkpoint failed for step {step['order']}: {e}")
+    
     async def _execute_step(
         self,
         step: Dict,
@@ -805,24 +1173,27 @@ class SOAREngine:
         
         logger.info(f"  📍 Step {step['order']}: {step_name}")
         
-        # Crear registro de ejecución del paso
+        # Crear registro de ejecución del paso (merge: al reanudar, el paso
+        # que estaba en curso durante la caída ya tiene fila y se reinicia)
         step_exec_id = f"{context['execution_id']}-{step['order']:02d}"
         
         with get_db_context() as db:
-            step_exec = PlaybookStepExecution(
+            db.merge(PlaybookStepExecution(
                 id=step_exec_id,
                 playbook_execution_id=context["execution_id"],
                 step_id=step_id,
                 step_order=step["order"],
                 status=ExecutionStatus.RUNNING.value,
-                started_at=datetime.utcnow()
-            )
-            db.add(step_exec)
+                output={},
+                tool_execution_id=None,
+                started_at=datetime.utcnow(),
+                finished_at=None
+            ))
             db.commit()
         
         # Evaluar condición si existe
         if step.get("condition"):
-            should_run = self._evaluate_condition(step["condition"], context)
+            should_run = self._evaluate_condition(step["condition"], context, step)
             if not should_run:
                 logger.info("    ⏭️ Condition not met, skipping")
                 await self._update_step_execution(
@@ -891,26 +1262,47 @@ class SOAREngine:
                 step_exec.tool_execution_id = output.get("execution_id")
                 db.commit()
     
-    def _evaluate_condition(self, condition: str, context: Dict) -> bool:
-        """Evalúa condición para ejecución condicional"""
+    def _evaluate_condition(
+        self,
+        condition: str,
+        context: Dict,
+        step: Optional[Dict] = None
+    ) -> bool:
+        """
+        Evalúa condición para ejecución condicional.
+        
+        Nombres disponibles: ``previous_step`` (última dependencia del paso o
+        paso anterior), ``steps`` (resultados por order), ``input``, ``iocs``
+        y ``context``. Cada resultado expone además ``iocs_found``.
+        """
+        def view(result: Optional[Dict]) -> Dict:
+            result = result or {}
+            return {**result, "iocs_found": len(result.get("iocs") or [])}
+        
+        steps = context.get("steps", {})
+        deps = (step or {}).get("depends_on")
+        if isinstance(deps, int):
+            deps = [deps]
+        if deps:
+            candidates = [o for o in deps if o in steps]
+        else:
+            current = (step or {}).get("order")
+            candidates = [o for o in steps if current is None or o < current]
+        previous = steps.get(max(candidates)) if candidates else None
+        
+        names = {
+            "previous_step": view(previous),
+            "steps": {order: view(result) for order, result in steps.items()},
+            "input": context.get("input", {}),
+            "iocs": context.get("iocs", []),
+            "context": context,
+        }
+        
         try:
-            # Parsear condición simple: "previous_step.iocs_found > 0"
-            if "previous_step" in condition:
-                prev_order = max(context["steps"].keys()) if context["steps"] else 0
-                prev_result = context["steps"].get(prev_order, {})
-                
-                if "iocs_found" in condition:
-                    iocs_count = len(prev_result.get("iocs", []))
-                    # Evaluar operador
-                    if "> 0" in condition:
-                        return iocs_count > 0
-                    elif "== 0" in condition:
-                        return iocs_count == 0
-            
-            return True  # Por defecto ejecutar
-        except Exception as e:
+            return evaluate_condition(condition, names)
+        except ConditionError as e:
             logger.warning(f"Condition evaluation error: {e}")
-            return True
+            return True  # Por defecto ejecutar
     
     # -------------------------------------------------------------------------
     # STEP HANDLERS
@@ -1053,7 +1445,8 @@ class SOAREngine:
         from api.services.ioc_service import IOCService
         
         sources = step.get("enrichment_sources", ["virustotal"])
-        ioc_ids = context.get("iocs", [])
+        # En un paso MAP se enriquece sólo el elemento asignado
+        ioc_ids = [step["map_item"]] if "map_item" in step else context.get("iocs", [])
         
         enriched = 0
         ioc_service = IOCService()
@@ -1198,6 +1591,67 @@ class SOAREngine:
         logger.info("🚧 Approval gate reached (auto-approved in dev)")
         return {"approved": True, "approved_by": "system_dev"}
     
+    async def _execute_map_step(
+        self,
+        step: Dict,
+        context: Dict
+    ) -> Dict[str, Any]:
+        """
+        Ejecuta paso de tipo MAP (fan-out).
+        
+        Aplica ``map_action`` (plantilla de paso) a cada elemento de la lista
+        referenciada por ``map_over`` (p.ej. "iocs" o "steps.1.iocs") con
+        concurrencia ``max_concurrency``. Los parámetros "item" / "item.campo"
+        de la plantilla se sustituyen por el elemento.
+        """
+        items = self._resolve_reference(step.get("map_over", "iocs"), context) or []
+        if not isinstance(items, (list, tuple)):
+            raise ValueError(f"map_over must reference a list: {step.get('map_over')}")
+        
+        template = step.get("map_action") or {}
+        action_type = template.get("action_type")
+        handler = self.step_handlers.get(action_type)
+        if not handler or action_type == StepActionType.MAP.value:
+            raise ValueError(f"Invalid map_action: {action_type}")
+        
+        semaphore = asyncio.Semaphore(step.get("max_concurrency") or settings.SOAR_MAP_MAX_CONCURRENCY)
+        item_timeout = template.get("timeout_seconds")
+        
+        async def apply(index: int, item: Any) -> Dict[str, Any]:
+            sub_step = {
+                **template,
+                "id": f"{step['id']}-{index}",
+                "order": step["order"],
+                "name": f"{step['name']}[{index}]",
+                "parameters": self._bind_map_item(template.get("parameters", {}), item),
+                "map_item": item
+            }
+            async with semaphore:
+                try:
+                    if item_timeout:
+                        result = await asyncio.wait_for(handler(sub_step, context), timeout=item_timeout)
+                    else:
+                        result = await handler(sub_step, context)
+                    return {"item": item, "status": "completed", **result}
+                except (asyncio.TimeoutError, TimeoutError):
+                    return {"item": item, "status": "failed", "error": f"Item timeout after {item_timeout}s"}
+                except Exception as e:
+                    return {"item": item, "status": "failed", "error": str(e)}
+        
+        results = await asyncio.gather(*(apply(i, item) for i, item in enumerate(items)))
+        failed = sum(1 for r in results if r["status"] == "failed")
+        
+        if results and failed == len(results):
+            raise RuntimeError(f"All {failed} map items failed: {results[0].get('error')}")
+        
+        return {
+            "items_total": len(results),
+            "items_completed": len(results) - failed,
+            "items_failed": failed,
+            "results": results,
+            "iocs": [ioc for r in results for ioc in (r.get("iocs") or [])]
+        }
+    
     # -------------------------------------------------------------------------
     # HELPERS
     # -------------------------------------------------------------------------
@@ -1217,6 +1671,18 @@ class SOAREngine:
         
         return current
     
+    def _bind_map_item(self, parameters: Dict, item: Any) -> Dict:
+        """Sustituye referencias 'item' / 'item.campo' en los parámetros de un MAP"""
+        bound = {}
+        for key, value in (parameters or {}).items():
+            if value == "item":
+                bound[key] = item
+            elif isinstance(value, str) and value.startswith("item."):
+                bound[key] = self._resolve_reference(value, {"item": item})
+            else:
+                bound[key] = value
+        return bound
+    
     # -------------------------------------------------------------------------
     # TRIGGER HANDLERS
     # -------------------------------------------------------------------------
@@ -141,6 +141,8 @@ class SOARIntelligenceEngine:
     def __init__(self):
         self.llm = llm_local
         self.queue = agent_queue
+        # Las acciones encoladas sobreviven a un reinicio con AGENT_QUEUE_DURABLE
+        self.queue.register_handler("soar.execute_action", self._execute_action)
         
     def _categorize_threat(self, findings: Dict) -> List[ThreatCategory]:
         """Categoriza la amenaza basándose en patrones"""
@@ -2,14 +2,29 @@
 MCP v4.6.0 - SOAR ML Service
 Machine Learning para predicción de éxito de playbooks y aprendizaje continuo.
 Usa scikit-learn para modelos de clasificación basados en historial de ejecuciones.
+
+v4.7:
+- Feature store con agregados por playbook mantenidos incrementalmente
+  (sin consultas a BD por predicción)
+- Predicción por lotes: un único ``predict_proba`` para todos los candidatos
+- Reentrenamiento incremental (warm start) en un process pool
+- Modelos versionados en disco con carga perezosa
 """
 
 import asyncio
+import copy
 import json
 import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Deque, Dict, List, Optional, Tuple
 from pathlib import Path
+import multiprocessing
 import pickle
 
 import numpy as np
@@ -38,7 +53,18 @@ MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
 MIN_TRAINING_SAMPLES = 50  # Mínimo de ejecuciones para entrenar
 RETRAIN_INTERVAL_HOURS = 24
+RETRAIN_MIN_NEW_OUTCOMES = 50  # Outcomes nuevos que disparan un reentrenamiento incremental
 PREDICTION_CACHE_TTL = 300  # 5 minutos
+RECENT_FAILURE_WINDOW_HOURS = 24
+
+WARM_START_TREES = 25  # Árboles añadidos en cada reentrenamiento incremental
+MAX_FOREST_TREES = 300  # Por encima se reentrena desde cero
+MIN_INCREMENTAL_SAMPLES = 10
+REPLAY_BUFFER_SIZE = 2000  # Muestras recientes conservadas para warm start
+MAX_MODEL_VERSIONS = 5  # Versiones conservadas en disco
+
+SUCCESS_STATUSES = ("success", "completed")
+FAILURE_STATUSES = ("failed",)
 
 # Feature names for model
 FEATURE_NAMES = [
@@ -56,6 +82,249 @@ FEATURE_NAMES = [
     "tool_availability_score",    # Disponibilidad de herramientas
 ]
 
+# Vocabularios de features categóricos. El índice es el del valor ordenado,
+# igual que LabelEncoder, para que los modelos ya entrenados sigan siendo válidos.
+ENCODER_VOCABULARIES = {
+    "playbook_type": ["blue", "red", "purple"],
+    "category": [
+        "general", "incident_response", "malware_analysis",
+        "reconnaissance", "threat_hunting", "containment"
+    ],
+    "trigger": ["manual", "on_ioc_create", "scheduled", "on_alert"],
+    "priority": ["low", "medium", "high", "critical"],
+}
+
+_ENCODER_INDEX = {
+    name: {value: index for index, value in enumerate(sorted(values))}
+    for name, values in ENCODER_VOCABULARIES.items()
+}
+
+
+def _encode(encoder_name: str, value: Optional[str], default: int = 0) -> int:
+    return _ENCODER_INDEX[encoder_name].get(value, default)
+
+
+def _tool_availability(steps: List[Dict]) -> float:
+    """
+    Score de disponibilidad de herramientas requeridas (0 a 1).
+    """
+    if not steps:
+        return 1.0
+    
+    tool_steps = [s for s in steps if isinstance(s, dict) and s.get("action_type") == "tool_execute"]
+    if not tool_steps:
+        return 1.0
+    
+    # TODO: Integrar con verificación real de herramientas
+    # Por ahora retornar 0.9 como valor por defecto
+    return 0.9
+
+
+def build_feature_row(
+    playbook: Dict,
+    priority: str,
+    at: datetime,
+    recent_failures: int,
+    avg_execution_minutes: float
+) -> List[float]:
+    """Vector de features (orden de FEATURE_NAMES); compartido por entrenamiento y predicción"""
+    steps = playbook.get("steps") or []
+    return [
+        _encode("playbook_type", playbook.get("team_type") or "blue"),
+        _encode("category", playbook.get("category") or "general"),
+        _encode("trigger", playbook.get("trigger") or "manual"),
+        len(steps),
+        1 if playbook.get("requires_approval", False) else 0,
+        at.hour,
+        at.weekday(),
+        playbook.get("success_rate", 0.5) if playbook.get("success_rate") is not None else 0.5,
+        recent_failures,
+        avg_execution_minutes,
+        _encode("priority", priority or "medium"),
+        _tool_availability(steps),
+    ]
+
+
+# =============================================================================
+# FEATURE STORE
+# =============================================================================
+
+@dataclass
+class _PlaybookStats:
+    executions: int = 0
+    successes: int = 0
+    total_seconds: float = 0.0
+    timed: int = 0
+    failures: Deque[datetime] = field(default_factory=deque)
+
+
+class PlaybookFeatureStore:
+    """
+    Agregados por playbook mantenidos incrementalmente.
+    Se calienta una vez desde BD y después se actualiza con cada outcome,
+    así las predicciones no consultan la BD.
+    """
+    
+    def __init__(self, failure_window_hours: int = RECENT_FAILURE_WINDOW_HOURS):
+        self.window = timedelta(hours=failure_window_hours)
+        self._stats: Dict[str, _PlaybookStats] = {}
+        self._lock = threading.Lock()
+        self.warmed = False
+    
+    def _get(self, playbook_id: str) -> _PlaybookStats:
+        stats = self._stats.get(playbook_id)
+        if stats is None:
+            stats = self._stats[playbook_id] = _PlaybookStats()
+        return stats
+    
+    def _prune(self, stats: _PlaybookStats, now: datetime):
+        cutoff = now - self.window
+        while stats.failures and stats.failures[0] < cutoff:
+            stats.failures.popleft()
+    
+    def record(
+        self,
+        playbook_id: str,
+        success: bool,
+        duration_seconds: Optional[float] = None,
+        at: Optional[datetime] = None
+    ):
+        """Registra un outcome (O(1) amortizado)"""
+        at = at or datetime.utcnow()
+        with self._lock:
+            stats = self._get(playbook_id)
+            stats.executions += 1
+            if success:
+                stats.successes += 1
+            else:
+                stats.failures.append(at)
+                self._prune(stats, at)
+            if duration_seconds:
+                stats.total_seconds += duration_seconds
+                stats.timed += 1
+    
+    def recent_failures(self, playbook_id: str, now: Optional[datetime] = None) -> int:
+        stats = self._stats.get(playbook_id)
+        if stats is None:
+            return 0
+        with self._lock:
+            self._prune(stats, now or datetime.utcnow())
+            return len(stats.failures)
+    
+    def avg_execution_minutes(self, playbook_id: str, default_seconds: float = 300) -> float:
+        stats = self._stats.get(playbook_id)
+        if stats is None or not stats.timed:
+            return default_seconds / 60
+        return stats.total_seconds / stats.timed / 60
+    
+    def warm(self):
+        """Carga los fallos recientes de todos los playbooks en una sola consulta"""
+        cutoff = datetime.utcnow() - self.window
+        try:
+            with get_db_context() as db:
+                from api.models.tools import PlaybookExecution
+                
+                rows = db.query(
+                    PlaybookExecution.playbook_id, PlaybookExecution.started_at
+                ).filter(
+                    PlaybookExecution.status.in_(FAILURE_STATUSES),
+                    PlaybookExecution.started_at >= cutoff
+                ).order_by(PlaybookExecution.started_at).all()
+            
+            with self._lock:
+                for playbook_id, started_at in rows:
+                    self._get(playbook_id).failures.append(started_at)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not warm SOAR feature store: {e}")
+        self.warmed = True
+
+
+# =============================================================================
+# TRAINING (process pool)
+# =============================================================================
+
+_training_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_training_pool() -> ProcessPoolExecutor:
+    """Pool de un proceso ("spawn") para entrenar sin bloquear el event loop"""
+    global _training_pool
+    if _training_pool is None:
+        _training_pool = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _training_pool
+
+
+def shutdown_training_pool():
+    global _training_pool
+    if _training_pool is not None:
+        _training_pool.shutdown(wait=False, cancel_futures=True)
+        _training_pool = None
+
+
+def _evaluate(model, X_test, y_test) -> Dict[str, Any]:
+    y_pred = model.predict(X_test)
+    return {
+        "accuracy": round(accuracy_score(y_test, y_pred), 3),
+        "precision": round(precision_score(y_test, y_pred, zero_division=0), 3),
+        "recall": round(recall_score(y_test, y_pred, zero_division=0), 3),
+        "f1": round(f1_score(y_test, y_pred, zero_division=0), 3),
+    }
+
+
+def _fit_forest(
+    X: np.ndarray,
+    y: np.ndarray,
+    model: Optional["RandomForestClassifier"] = None,
+    scaler: Optional["StandardScaler"] = None,
+    new_trees: int = WARM_START_TREES
+):
+    """
+    Entrena el bosque. Con ``model`` añade ``new_trees`` árboles (warm start)
+    conservando el scaler original; sin él entrena desde cero.
+    Se ejecuta en el process pool, por eso es una función de módulo.
+    """
+    stratify = y if len(set(y.tolist())) > 1 and min(np.bincount(y)) >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=stratify
+    )
+    
+    if model is None:
+        # Scale features
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        
+        # Train model (Random Forest with optimized hyperparameters)
+        model = RandomForestClassifier(
+            n_estimators=100,
+            max_depth=10,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            class_weight="balanced",
+            random_state=42,
+            n_jobs=-1,
+            warm_start=True
+        )
+    else:
+        # Los árboles existentes dependen del scaler: se mantiene fijo
+        X_train_scaled = scaler.transform(X_train)
+        model.n_estimators += new_trees
+    
+    model.fit(X_train_scaled, y_train)
+    
+    metrics = _evaluate(model, scaler.transform(X_test), y_test)
+    metrics.update({
+        "training_samples": len(X_train),
+        "test_samples": len(X_test),
+        "n_estimators": model.n_estimators,
+        "feature_importance": dict(zip(
+            FEATURE_NAMES,
+            [round(float(imp), 3) for imp in model.feature_importances_]
+        ))
+    })
+    return model, scaler, metrics
+
 
 # =============================================================================
 # SOAR ML MODEL
@@ -67,69 +336,167 @@ class SOARMLModel:
     Aprende de ejecuciones históricas para predecir probabilidad de éxito.
     """
     
-    def __init__(self):
+    def __init__(self, model_dir: Path = MODEL_DIR, use_process_pool: bool = True):
+        self.model_dir = Path(model_dir)
+        self.use_process_pool = use_process_pool
         self.model: Optional[RandomForestClassifier] = None
         self.scaler: Optional[StandardScaler] = None
-        self.encoders: Dict[str, LabelEncoder] = {}
         self.is_trained = False
         self.last_trained: Optional[datetime] = None
         self.training_metrics: Dict[str, float] = {}
         self.prediction_cache: Dict[str, Tuple[float, datetime]] = {}
+        self.feature_store = PlaybookFeatureStore()
         
-        # Cargar modelo existente si existe
-        self._load_model()
+        # Estado del entrenamiento incremental
+        self.version: Optional[str] = None
+        self.training_cursor: Optional[datetime] = None
+        self.replay_X: Optional[np.ndarray] = None
+        self.replay_y: Optional[np.ndarray] = None
+        self.outcomes_since_training = 0
+        self.training_attempts = 0
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._train_lock = asyncio.Lock()
+        self._training_task: Optional[asyncio.Task] = None
+    
+    # -------------------------------------------------------------------------
+    # PERSISTENCIA VERSIONADA
+    # -------------------------------------------------------------------------
+    
+    @property
+    def _versions_dir(self) -> Path:
+        return self.model_dir / "versions"
     
-    def _load_model(self):
-        """Cargar modelo persistido desde disco."""
+    def list_versions(self) -> List[str]:
+        if not self._versions_dir.exists():
+            return []
+        return sorted(p.name for p in self._versions_dir.iterdir() if (p / "model.pkl").exists())
+    
+    def _ensure_loaded(self):
+        """Carga perezosa: el modelo se lee de disco en el primer uso"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load_model()
+                self._loaded = True
+    
+    def _load_model(self, version: Optional[str] = None):
+        """Cargar la versión activa (o ``version``) desde disco."""
         if not SKLEARN_AVAILABLE:
             return
-            
-        model_path = MODEL_DIR / "playbook_success_model.pkl"
-        scaler_path = MODEL_DIR / "scaler.pkl"
-        encoders_path = MODEL_DIR / "encoders.pkl"
-        metadata_path = MODEL_DIR / "metadata.json"
         
         try:
-            if model_path.exists():
-                with open(model_path, 'rb') as f:
+            if version is None:
+                current = self.model_dir / "CURRENT"
+                if current.exists():
+                    version = current.read_text().strip()
+            
+            if version:
+                with open(self._versions_dir / version / "model.pkl", 'rb') as f:
+                    bundle = pickle.load(f)
+                self.model = bundle["model"]
+                self.scaler = bundle["scaler"]
+                self.replay_X = bundle.get("replay_X")
+                self.replay_y = bundle.get("replay_y")
+                with open(self._versions_dir / version / "metadata.json", 'r') as f:
+                    metadata = json.load(f)
+                self.version = version
+            elif (self.model_dir / "playbook_success_model.pkl").exists():
+                # Formato anterior a v4.7 (pickles sueltos)
+                with open(self.model_dir / "playbook_success_model.pkl", 'rb') as f:
                     self.model = pickle.load(f)
-                with open(scaler_path, 'rb') as f:
+                with open(self.model_dir / "scaler.pkl", 'rb') as f:
                     self.scaler = pickle.load(f)
-                with open(encoders_path, 'rb') as f:
-                    self.encoders = pickle.load(f)
-                with open(metadata_path, 'r') as f:
+                with open(self.model_dir / "metadata.json", 'r') as f:
                     metadata = json.load(f)
-                    self.last_trained = datetime.fromisoformat(metadata["last_trained"])
-                    self.training_metrics = metadata.get("metrics", {})
-                
-                self.is_trained = True
-                logger.info(f"✅ SOAR ML model loaded. Last trained: {self.last_trained}")
+            else:
+                return
+            
+            self.last_trained = datetime.fromisoformat(metadata["last_trained"])
+            self.training_metrics = metadata.get("metrics", {})
+            cursor = metadata.get("training_cursor")
+            self.training_cursor = datetime.fromisoformat(cursor) if cursor else None
+            self.is_trained = True
+            self.prediction_cache.clear()
+            logger.info(f"✅ SOAR ML model {self.version or 'legacy'} loaded. Last trained: {self.last_trained}")
         except Exception as e:
             logger.warning(f"⚠️ Could not load SOAR ML model: {e}")
     
     def _save_model(self):
-        """Persistir modelo a disco."""
+        """Persistir el modelo como una nueva versión y activarla."""
         if not self.model:
             return
-            
+        
         try:
-            with open(MODEL_DIR / "playbook_success_model.pkl", 'wb') as f:
-                pickle.dump(self.model, f)
-            with open(MODEL_DIR / "scaler.pkl", 'wb') as f:
-                pickle.dump(self.scaler, f)
-            with open(MODEL_DIR / "encoders.pkl", 'wb') as f:
-                pickle.dump(self.encoders, f)
-            with open(MODEL_DIR / "metadata.json", 'w') as f:
+            existing = self.list_versions()
+            number = int(existing[-1][1:]) + 1 if existing else 1
+            version = f"v{number:04d}"
+            target = self._versions_dir / version
+            target.mkdir(parents=True, exist_ok=True)
+            
+            with open(target / "model.pkl", 'wb') as f:
+                pickle.dump({
+                    "model": self.model,
+                    "scaler": self.scaler,
+                    "replay_X": self.replay_X,
+                    "replay_y": self.replay_y
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(target / "metadata.json", 'w') as f:
                 json.dump({
+                    "version": version,
                     "last_trained": self.last_trained.isoformat() if self.last_trained else None,
+                    "training_cursor": self.training_cursor.isoformat() if self.training_cursor else None,
                     "metrics": self.training_metrics,
                     "feature_names": FEATURE_NAMES
                 }, f, indent=2)
             
-            logger.info("💾 SOAR ML model saved to disk")
+            # Activación atómica
+            tmp = self.model_dir / "CURRENT.tmp"
+            tmp.write_text(version)
+            os.replace(tmp, self.model_dir / "CURRENT")
+            self.version = version
+            
+            for old in self.list_versions()[:-MAX_MODEL_VERSIONS]:
+                for path in (self._versions_dir / old).iterdir():
+                    path.unlink()
+                (self._versions_dir / old).rmdir()
+            
+            logger.info(f"💾 SOAR ML model saved as {version}")
         except Exception as e:
             logger.error(f"❌ Failed to save SOAR ML model: {e}")
     
+    def activate_version(self, version: str) -> bool:
+        """Activar una versión anterior (rollback)."""
+        if version not in self.list_versions():
+            return False
+        tmp = self.model_dir / "CURRENT.tmp"
+        tmp.write_text(version)
+        os.replace(tmp, self.model_dir / "CURRENT")
+        self._load_model(version)
+        self._loaded = True
+        return True
+    
+    # -------------------------------------------------------------------------
+    # FEATURES
+    # -------------------------------------------------------------------------
+    
+    async def _ensure_feature_store(self):
+        if not self.feature_store.warmed:
+            await asyncio.to_thread(self.feature_store.warm)
+    
+    def _feature_row(self, playbook: Dict, case: Optional[Dict], now: datetime) -> List[float]:
+        playbook_id = playbook.get("id", "")
+        return build_feature_row(
+            playbook,
+            priority=case.get("priority", "medium") if case else "medium",
+            at=now,
+            recent_failures=self.feature_store.recent_failures(playbook_id, now),
+            avg_execution_minutes=self.feature_store.avg_execution_minutes(
+                playbook_id, playbook.get("avg_execution_time_seconds") or 300
+            )
+        )
+    
     async def extract_features(
         self,
         playbook: Dict,
@@ -145,88 +512,26 @@ class SOARMLModel:
             execution_context: Contexto adicional de ejecución
         
         Returns:
-            Array de features normalizados
+            Array de features (1 x len(FEATURE_NAMES))
         """
-        now = datetime.utcnow()
-        
-        # Encode categorical features
-        playbook_type = playbook.get("team_type", "blue")
-        category = playbook.get("category", "general")
-        trigger = playbook.get("trigger", "manual")
-        
-        # Get or create encoders
-        if "playbook_type" not in self.encoders:
-            self.encoders["playbook_type"] = LabelEncoder()
-            self.encoders["playbook_type"].fit(["blue", "red", "purple"])
-        if "category" not in self.encoders:
-            self.encoders["category"] = LabelEncoder()
-            self.encoders["category"].fit([
-                "general", "incident_response", "malware_analysis",
-                "reconnaissance", "threat_hunting", "containment"
-            ])
-        if "trigger" not in self.encoders:
-            self.encoders["trigger"] = LabelEncoder()
-            self.encoders["trigger"].fit(["manual", "on_ioc_create", "scheduled", "on_alert"])
-        if "priority" not in self.encoders:
-            self.encoders["priority"] = LabelEncoder()
-            self.encoders["priority"].fit(["low", "medium", "high", "critical"])
-        
-        # Safe encode (handle unknown values)
-        def safe_encode(encoder: LabelEncoder, value: str, default: int = 0) -> int:
-            try:
-                return int(encoder.transform([value])[0])
-            except ValueError:
-                return default
-        
-        # Build feature vector
-        features = [
-            safe_encode(self.encoders["playbook_type"], playbook_type),
-            safe_encode(self.encoders["category"], category),
-            safe_encode(self.encoders["trigger"], trigger),
-            len(playbook.get("steps", [])),
-            1 if playbook.get("requires_approval", False) else 0,
-            now.hour,
-            now.weekday(),
-            playbook.get("success_rate", 0.5),
-            await self._get_recent_failures(playbook.get("id", "")),
-            playbook.get("avg_execution_time_seconds", 300) / 60,  # Convert to minutes
-            safe_encode(self.encoders["priority"], case.get("priority", "medium") if case else "medium"),
-            await self._check_tool_availability(playbook.get("steps", []))
-        ]
-        
-        return np.array(features).reshape(1, -1)
+        await self._ensure_feature_store()
+        return np.array(self._feature_row(playbook, case, datetime.utcnow())).reshape(1, -1)
     
     async def _get_recent_failures(self, playbook_id: str, hours: int = 24) -> int:
-        """Contar fallos recientes de un playbook."""
-        try:
-            with get_db_context() as db:
-                from api.models.tools import PlaybookExecution
-                
-                cutoff = datetime.utcnow() - timedelta(hours=hours)
-                count = db.query(PlaybookExecution).filter(
-                    PlaybookExecution.playbook_id == playbook_id,
-                    PlaybookExecution.status == "failed",
-                    PlaybookExecution.started_at >= cutoff
-                ).count()
-                return count
-        except Exception:
-            return 0
+        """Contar fallos recientes de un playbook (desde el feature store)."""
+        await self._ensure_feature_store()
+        return self.feature_store.recent_failures(playbook_id)
     
     async def _check_tool_availability(self, steps: List[Dict]) -> float:
         """
         Verificar disponibilidad de herramientas requeridas.
         Retorna score de 0 a 1.
         """
-        if not steps:
-            return 1.0
-        
-        tool_steps = [s for s in steps if s.get("action_type") == "tool_execute"]
-        if not tool_steps:
-            return 1.0
-        
-        # TODO: Integrar con verificación real de herramientas
-        # Por ahora retornar 0.9 como valor por defecto
-        return 0.9
+        return _tool_availability(steps)
+    
+    # -------------------------------------------------------------------------
+    # PREDICCIÓN
+    # -------------------------------------------------------------------------
     
     async def predict_success(
         self,
@@ -245,62 +550,90 @@ class SOARMLModel:
         Returns:
             Dict con predicción, probabilidad, y factores de riesgo
         """
+        return (await self.predict_batch([playbook], case, execution_context))[0]
+    
+    async def predict_batch(
+        self,
+        playbooks: List[Dict],
+        case: Optional[Dict] = None,
+        execution_context: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Predecir el éxito de varios playbooks con una sola llamada a predict_proba.
+        
+        Returns:
+            Predicciones en el mismo orden que ``playbooks``
+        """
         if not SKLEARN_AVAILABLE:
-            return {
+            return [{
                 "prediction": "unknown",
                 "probability": 0.5,
                 "confidence": 0.0,
                 "risk_factors": ["ML not available"],
                 "recommendation": "execute_with_monitoring"
-            }
+            } for _ in playbooks]
         
-        playbook_id = playbook.get("id", "")
-        
-        # Check cache
-        cache_key = f"{playbook_id}_{case.get('id', '') if case else ''}"
-        if cache_key in self.prediction_cache:
-            prob, cached_at = self.prediction_cache[cache_key]
-            if (datetime.utcnow() - cached_at).seconds < PREDICTION_CACHE_TTL:
-                return self._format_prediction(prob, playbook)
+        self._ensure_loaded()
         
         # Check if model is trained
         if not self.is_trained:
             # Fall back to historical success rate
-            historical_rate = playbook.get("success_rate", 0.7)
-            return {
-                "prediction": "likely_success" if historical_rate > 0.6 else "uncertain",
-                "probability": historical_rate,
-                "confidence": 0.3,  # Low confidence without ML
-                "risk_factors": ["Model not trained yet"],
-                "recommendation": "execute_with_monitoring",
-                "model_status": "untrained"
-            }
+            results = []
+            for playbook in playbooks:
+                historical_rate = playbook.get("success_rate", 0.7)
+                results.append({
+                    "prediction": "likely_success" if historical_rate > 0.6 else "uncertain",
+                    "probability": historical_rate,
+                    "confidence": 0.3,  # Low confidence without ML
+                    "risk_factors": ["Model not trained yet"],
+                    "recommendation": "execute_with_monitoring",
+                    "model_status": "untrained"
+                })
+            return results
         
-        try:
-            # Extract features
-            features = await self.extract_features(playbook, case, execution_context)
-            
-            # Scale features
-            if self.scaler:
-                features = self.scaler.transform(features)
-            
-            # Predict
-            prob = self.model.predict_proba(features)[0][1]  # Probability of success
-            
-            # Cache result
-            self.prediction_cache[cache_key] = (prob, datetime.utcnow())
-            
-            return self._format_prediction(prob, playbook)
-            
-        except Exception as e:
-            logger.error(f"❌ Prediction error: {e}")
-            return {
-                "prediction": "error",
-                "probability": 0.5,
-                "confidence": 0.0,
-                "risk_factors": [str(e)],
-                "recommendation": "manual_review"
-            }
+        now = datetime.utcnow()
+        case_id = case.get("id", "") if case else ""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(playbooks)
+        pending: List[int] = []
+        
+        # Check cache
+        for index, playbook in enumerate(playbooks):
+            cached = self.prediction_cache.get(f"{playbook.get('id', '')}_{case_id}")
+            if cached and (now - cached[1]).total_seconds() < PREDICTION_CACHE_TTL:
+                results[index] = self._format_prediction(cached[0], playbook)
+            else:
+                pending.append(index)
+        
+        if pending:
+            try:
+                await self._ensure_feature_store()
+                features = np.array([self._feature_row(playbooks[i], case, now) for i in pending])
+                
+                # Scale features
+                if self.scaler:
+                    features = self.scaler.transform(features)
+                
+                # Predict (probability of success)
+                success_column = list(self.model.classes_).index(1)
+                probabilities = self.model.predict_proba(features)[:, success_column]
+                
+                for index, prob in zip(pending, probabilities):
+                    prob = float(prob)
+                    self.prediction_cache[f"{playbooks[index].get('id', '')}_{case_id}"] = (prob, now)
+                    results[index] = self._format_prediction(prob, playbooks[index])
+                    
+            except Exception as e:
+                logger.error(f"❌ Prediction error: {e}")
+                for index in pending:
+                    results[index] = {
+                        "prediction": "error",
+                        "probability": 0.5,
+                        "confidence": 0.0,
+                        "risk_factors": [str(e)],
+                        "recommendation": "manual_review"
+                    }
+        
+        return results
     
     def _format_prediction(self, probability: float, playbook: Dict) -> Dict[str, Any]:
         """Formatear predicción con recomendaciones."""
@@ -344,12 +677,18 @@ class SOARMLModel:
             "last_trained": self.last_trained.isoformat() if self.last_trained else None
         }
     
-    async def train(self, force: bool = False) -> Dict[str, Any]:
+    async def train(self, force: bool = False, incremental: bool = True) -> Dict[str, Any]:
         """
         Entrenar modelo con datos históricos de ejecuciones.
         
+        Si ya hay un modelo, sólo se leen las ejecuciones posteriores al último
+        entrenamiento y se añaden árboles (warm start); si el bosque supera
+        MAX_FOREST_TREES se reentrena desde cero. El ajuste corre en un
+        process pool para no bloquear el event loop.
+        
         Args:
             force: Forzar entrenamiento aunque no haya pasado el intervalo
+            incremental: Permitir warm start sobre el modelo actual
         
         Returns:
             Métricas de entrenamiento
@@ -357,170 +696,203 @@ class SOARMLModel:
         if not SKLEARN_AVAILABLE:
             return {"status": "error", "message": "scikit-learn not available"}
         
+        self._ensure_loaded()
+        
         # Check if retraining is needed
         if not force and self.last_trained:
-            hours_since = (datetime.utcnow() - self.last_trained).seconds / 3600
-            if hours_since < RETRAIN_INTERVAL_HOURS:
+            hours_since = (datetime.utcnow() - self.last_trained).total_seconds() / 3600
+            if hours_since < RETRAIN_INTERVAL_HOURS and self.outcomes_since_training < RETRAIN_MIN_NEW_OUTCOMES:
                 return {
                     "status": "skipped",
                     "message": f"Model trained {hours_since:.1f}h ago. Next training in {RETRAIN_INTERVAL_HOURS - hours_since:.1f}h"
                 }
         
-        logger.info("🎓 Starting SOAR ML model training...")
-        
-        try:
-            # Fetch training data
-            X, y = await self._prepare_training_data()
-            
-            if len(X) < MIN_TRAINING_SAMPLES:
-                return {
-                    "status": "insufficient_data",
-                    "message": f"Need {MIN_TRAINING_SAMPLES} samples, have {len(X)}",
-                    "samples_available": len(X)
-                }
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42, stratify=y
-            )
-            
-            # Scale features
-            self.scaler = StandardScaler()
-            X_train_scaled = self.scaler.fit_transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
+        async with self._train_lock:
+            self.training_attempts += 1
+            self.outcomes_since_training = 0
             
-            # Train model (Random Forest with optimized hyperparameters)
-            self.model = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                min_samples_split=5,
-                min_samples_leaf=2,
-                class_weight="balanced",
-                random_state=42,
-                n_jobs=-1
+            warm = (
+                incremental
+                and self.model is not None
+                and self.training_cursor is not None
+                and self.replay_X is not None
+                and getattr(self.model, "warm_start", False)
+                and self.model.n_estimators + WARM_START_TREES <= MAX_FOREST_TREES
             )
-            self.model.fit(X_train_scaled, y_train)
-            
-            # Evaluate
-            y_pred = self.model.predict(X_test_scaled)
-            
-            self.training_metrics = {
-                "accuracy": round(accuracy_score(y_test, y_pred), 3),
-                "precision": round(precision_score(y_test, y_pred, zero_division=0), 3),
-                "recall": round(recall_score(y_test, y_pred, zero_division=0), 3),
-                "f1": round(f1_score(y_test, y_pred, zero_division=0), 3),
-                "training_samples": len(X_train),
-                "test_samples": len(X_test)
-            }
-            
-            # Feature importance
-            feature_importance = dict(zip(
-                FEATURE_NAMES,
-                [round(imp, 3) for imp in self.model.feature_importances_]
-            ))
-            self.training_metrics["feature_importance"] = feature_importance
-            
-            # Update state
-            self.is_trained = True
-            self.last_trained = datetime.utcnow()
-            self.prediction_cache.clear()
-            
-            # Save model
-            self._save_model()
+            logger.info(f"🎓 Starting SOAR ML model training ({'incremental' if warm else 'full'})...")
             
-            logger.info(f"✅ SOAR ML model trained. Accuracy: {self.training_metrics['accuracy']}")
-            
-            return {
-                "status": "success",
-                "metrics": self.training_metrics,
-                "trained_at": self.last_trained.isoformat()
-            }
-            
-        except Exception as e:
-            logger.error(f"❌ Training failed: {e}")
-            return {"status": "error", "message": str(e)}
+            try:
+                # Fetch training data
+                X, y, cursor = await asyncio.to_thread(
+                    self._prepare_training_data, self.training_cursor if warm else None
+                )
+                
+                if warm:
+                    if len(X) < MIN_INCREMENTAL_SAMPLES:
+                        return {
+                            "status": "skipped",
+                            "message": f"Need {MIN_INCREMENTAL_SAMPLES} new samples, have {len(X)}",
+                            "samples_available": len(X)
+                        }
+                    X = np.vstack([self.replay_X, X])
+                    y = np.concatenate([self.replay_y, y])
+                elif len(X) < MIN_TRAINING_SAMPLES:
+                    return {
+                        "status": "insufficient_data",
+                        "message": f"Need {MIN_TRAINING_SAMPLES} samples, have {len(X)}",
+                        "samples_available": len(X)
+                    }
+                
+                if len(np.unique(y)) < 2:
+                    return {
+                        "status": "insufficient_data",
+                        "message": "Training data contains a single outcome class",
+                        "samples_available": len(X)
+                    }
+                
+                model, scaler, metrics = await self._fit(
+                    X, y, self.model if warm else None, self.scaler if warm else None
+                )
+                metrics["mode"] = "incremental" if warm else "full"
+                
+                # Update state
+                self.model = model
+                self.scaler = scaler
+                self.training_metrics = metrics
+                self.replay_X = X[-REPLAY_BUFFER_SIZE:]
+                self.replay_y = y[-REPLAY_BUFFER_SIZE:]
+                self.training_cursor = cursor or self.training_cursor
+                self.is_trained = True
+                self.last_trained = datetime.utcnow()
+                self.prediction_cache.clear()
+                
+                # Save model
+                await asyncio.to_thread(self._save_model)
+                
+                logger.info(
+                    f"✅ SOAR ML model trained ({metrics['mode']}, {metrics['n_estimators']} trees). "
+                    f"Accuracy: {metrics['accuracy']}"
+                )
+                
+                return {
+                    "status": "success",
+                    "mode": metrics["mode"],
+                    "version": self.version,
+                    "metrics": self.training_metrics,
+                    "trained_at": self.last_trained.isoformat()
+                }
+                
+            except Exception as e:
+                logger.error(f"❌ Training failed: {e}")
+                return {"status": "error", "message": str(e)}
+    
+    async def _fit(self, X: np.ndarray, y: np.ndarray, model, scaler):
+        """Ejecuta _fit_forest en el process pool (o en un hilo si no está disponible)."""
+        if self.use_process_pool:
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(_get_training_pool(), _fit_forest, X, y, model, scaler)
+            except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+                logger.warning(f"⚠️ Training process pool unavailable, using a thread: {e}")
+                shutdown_training_pool()
+        
+        # En el mismo proceso se entrena sobre una copia: el modelo activo sigue prediciendo
+        return await asyncio.to_thread(
+            _fit_forest, X, y, copy.deepcopy(model), copy.deepcopy(scaler)
+        )
+    
+    def schedule_training(self) -> Optional[asyncio.Task]:
+        """Lanza un reentrenamiento en background si no hay uno en curso."""
+        if self._training_task and not self._training_task.done():
+            return None
+        self._training_task = asyncio.create_task(self.train())
+        return self._training_task
     
-    async def _prepare_training_data(self) -> Tuple[np.ndarray, np.ndarray]:
-        """Preparar datos de entrenamiento desde historial de ejecuciones."""
+    def _prepare_training_data(
+        self,
+        since: Optional[datetime] = None
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[datetime]]:
+        """
+        Preparar datos de entrenamiento desde historial de ejecuciones.
+        
+        Una sola consulta (ejecuciones + playbook) ordenada por fecha. Los
+        features de historial se calculan reproduciendo un feature store en
+        orden, igual que en predicción. Con ``since`` sólo se emiten muestras
+        posteriores (la ventana previa se lee para los fallos recientes).
+        
+        Returns:
+            (X, y, fecha de la última muestra emitida)
+        """
         X = []
         y = []
+        cursor = since
+        replay = PlaybookFeatureStore()
         
         with get_db_context() as db:
             from api.models.tools import PlaybookExecution, Playbook
             
-            # Fetch completed executions (both success and failure)
-            executions = db.query(PlaybookExecution).filter(
-                PlaybookExecution.status.in_(["completed", "failed"])
-            ).limit(10000).all()
+            # Fetch finished executions (both success and failure)
+            query = db.query(PlaybookExecution, Playbook).join(
+                Playbook, Playbook.id == PlaybookExecution.playbook_id
+            ).filter(
+                PlaybookExecution.status.in_(SUCCESS_STATUSES + FAILURE_STATUSES)
+            )
+            if since is not None:
+                query = query.filter(PlaybookExecution.started_at >= since - replay.window)
+            
+            # Las 10000 más recientes, procesadas en orden cronológico
+            rows = query.order_by(PlaybookExecution.started_at.desc()).limit(10000).all()
+            rows.reverse()
             
             playbook_cache = {}
             
-            for exec_record in executions:
+            for exec_record, playbook in rows:
                 try:
-                    # Get playbook data
-                    if exec_record.playbook_id not in playbook_cache:
-                        playbook = db.query(Playbook).filter(
-                            Playbook.id == exec_record.playbook_id
-                        ).first()
-                        if playbook:
-                            playbook_cache[exec_record.playbook_id] = {
-                                "id": playbook.id,
-                                "team_type": playbook.team_type or "blue",
-                                "category": playbook.category or "general",
-                                "trigger": playbook.trigger or "manual",
-                                "steps": playbook.steps or [],
-                                "requires_approval": playbook.requires_approval,
-                                "success_rate": playbook.success_rate or 0.5
-                            }
-                    
-                    playbook_data = playbook_cache.get(exec_record.playbook_id)
-                    if not playbook_data:
-                        continue
+                    playbook_data = playbook_cache.get(playbook.id)
+                    if playbook_data is None:
+                        playbook_data = playbook_cache[playbook.id] = {
+                            "id": playbook.id,
+                            "team_type": getattr(playbook, "team_type", None) or "blue",
+                            "category": playbook.category or "general",
+                            "trigger": getattr(playbook, "trigger", None) or "manual",
+                            "steps": playbook.steps or [],
+                            "requires_approval": playbook.requires_approval,
+                            "success_rate": playbook.success_rate or 0.5
+                        }
                     
-                    # Extract features (sync version for training)
                     started_at = exec_record.started_at or datetime.utcnow()
+                    success = exec_record.status in SUCCESS_STATUSES
+                    duration = (
+                        (exec_record.completed_at - started_at).total_seconds()
+                        if exec_record.completed_at else None
+                    )
                     
-                    features = [
-                        self._safe_encode_sync("playbook_type", playbook_data.get("team_type", "blue")),
-                        self._safe_encode_sync("category", playbook_data.get("category", "general")),
-                        self._safe_encode_sync("trigger", playbook_data.get("trigger", "manual")),
-                        len(playbook_data.get("steps", [])),
-                        1 if playbook_data.get("requires_approval") else 0,
-                        started_at.hour,
-                        started_at.weekday(),
-                        playbook_data.get("success_rate", 0.5),
-                        0,  # Recent failures (simplified for training)
-                        5,  # Default execution time
-                        1,  # Default priority (medium)
-                        0.9  # Default tool availability
-                    ]
+                    if since is None or started_at > since:
+                        X.append(build_feature_row(
+                            playbook_data,
+                            priority="medium",
+                            at=started_at,
+                            recent_failures=replay.recent_failures(playbook.id, started_at),
+                            avg_execution_minutes=replay.avg_execution_minutes(playbook.id)
+                        ))
+                        y.append(1 if success else 0)
+                        cursor = started_at if cursor is None else max(cursor, started_at)
                     
-                    X.append(features)
-                    y.append(1 if exec_record.status == "completed" else 0)
+                    replay.record(playbook.id, success, duration, at=started_at)
                     
                 except Exception as e:
                     logger.debug(f"Skipping execution {exec_record.id}: {e}")
                     continue
         
-        return np.array(X), np.array(y)
+        return (
+            np.array(X, dtype=float).reshape(-1, len(FEATURE_NAMES)),
+            np.array(y, dtype=int),
+            cursor
+        )
     
     def _safe_encode_sync(self, encoder_name: str, value: str) -> int:
         """Sync version of safe encoding for training."""
-        encoder_map = {
-            "playbook_type": ["blue", "red", "purple"],
-            "category": ["general", "incident_response", "malware_analysis", "reconnaissance", "threat_hunting", "containment"],
-            "trigger": ["manual", "on_ioc_create", "scheduled", "on_alert"],
-            "priority": ["low", "medium", "high", "critical"]
-        }
-        
-        if encoder_name not in self.encoders:
-            self.encoders[encoder_name] = LabelEncoder()
-            self.encoders[encoder_name].fit(encoder_map.get(encoder_name, [value]))
-        
-        try:
-            return int(self.encoders[encoder_name].transform([value])[0])
-        except ValueError:
-            return 0
+        return _encode(encoder_name, value)
 
 
 # =============================================================================
@@ -555,10 +927,10 @@ class PlaybookRecommender:
         """
         recommendations = []
         
-        for playbook in available_playbooks:
-            # Get ML prediction
-            prediction = await self.ml_model.predict_success(playbook, case)
-            
+        # Una sola inferencia para todos los candidatos
+        predictions = await self.ml_model.predict_batch(available_playbooks, case)
+        
+        for playbook, prediction in zip(available_playbooks, predictions):
             # Calculate relevance score
             relevance = self._calculate_relevance(playbook, case)
             
@@ -673,6 +1045,10 @@ class OutcomeTracker:
             error_message: Mensaje de error si aplica
             user_feedback: Feedback del usuario (opcional)
         """
+        # Agregados en memoria para las próximas predicciones
+        self.ml_model.feature_store.record(playbook_id, success, execution_time_seconds)
+        self.ml_model.outcomes_since_training += 1
+        
         try:
             with get_db_context() as db:
                 from api.models.tools import Playbook, PlaybookExecution
@@ -721,15 +1097,28 @@ class OutcomeTracker:
             logger.error(f"❌ Failed to record outcome: {e}")
     
     async def trigger_retraining_if_needed(self):
-        """Verificar si es necesario reentrenar el modelo."""
-        if not self.ml_model.last_trained:
-            await self.ml_model.train()
-            return
+        """
+        Verificar si es necesario reentrenar el modelo.
+        El entrenamiento se lanza en background (no retrasa la ejecución).
+        """
+        model = self.ml_model
+        model._ensure_loaded()
+        
+        if model.last_trained:
+            hours_since = (datetime.utcnow() - model.last_trained).total_seconds() / 3600
+            due = (
+                hours_since >= RETRAIN_INTERVAL_HOURS
+                or model.outcomes_since_training >= RETRAIN_MIN_NEW_OUTCOMES
+            )
+        else:
+            # Sin modelo: un intento al arrancar y luego cada RETRAIN_MIN_NEW_OUTCOMES
+            due = (
+                model.training_attempts == 0
+                or model.outcomes_since_training >= RETRAIN_MIN_NEW_OUTCOMES
+            )
         
-        hours_since = (datetime.utcnow() - self.ml_model.last_trained).total_seconds() / 3600
-        if hours_since >= RETRAIN_INTERVAL_HOURS:
-            logger.info("🔄 Triggering scheduled model retraining...")
-            await self.ml_model.train()
+        if due and model.schedule_training():
+            logger.info("🔄 Triggering model retraining...")
 
 
 # =============================================================================
@@ -0,0 +1,281 @@
+"""
+MCP v4.7 - Storage Stats Index
+Contadores incrementales de bytes y objetos del bucket de evidencias MinIO.
+
+- Cada subida/borrado ajusta las filas de sus ámbitos (bucket, tenant,
+  categoría y caso/grupo) con un UPDATE aditivo: sin re-listar el bucket
+- La reconciliación re-lista el bucket en segundo plano cuando el índice es
+  más viejo que ``STORAGE_STATS_RECONCILE_SECONDS`` y reemplaza las filas;
+  corrige la deriva (subidas fuera de la API, fallos entre put y update)
+- Si el bucket nunca se reconcilió, la primera consulta lo hace en línea
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from api.config import settings
+from api.database import get_db_context
+from api.models.evidence_management import StorageUsageStat
+
+logger = logging.getLogger(__name__)
+
+Scope = Tuple[str, str, str]  # (tenant_id, category, group_key); "" = todos
+
+BUCKET_SCOPE: Scope = ("", "", "")
+
+
+def stat_scopes(object_name: str) -> List[Scope]:
+    """
+    Ámbitos afectados por un objeto ``{tenant}/{category}/{group}/.../{file}``.
+
+    Los marcadores ``.keep`` de las carpetas no cuentan.
+    """
+    if object_name.endswith(".keep"):
+        return []
+
+    parts = object_name.split("/")
+    scopes = [BUCKET_SCOPE]
+    if len(parts) < 2:
+        return scopes
+
+    tenant_id = parts[0]
+    scopes.append((tenant_id, "", ""))
+    if len(parts) >= 3:
+        category = parts[1]
+        scopes.append(("", category, ""))
+        scopes.append((tenant_id, category, ""))
+        if len(parts) >= 4:
+            scopes.append((tenant_id, category, parts[2]))
+    return scopes
+
+
+def _scope_filter(query, bucket: str, scope: Scope):
+    tenant_id, category, group_key = scope
+    return query.filter(
+        StorageUsageStat.bucket == bucket,
+        StorageUsageStat.tenant_id == tenant_id,
+        StorageUsageStat.category == category,
+        StorageUsageStat.group_key == group_key,
+    )
+
+
+class StorageStatsIndex:
+    """Índice de uso por bucket/tenant/caso persistido en ``storage_usage_stats``"""
+
+    def __init__(self, reconcile_after_seconds: Optional[int] = None):
+        self.reconcile_after_seconds = (
+            reconcile_after_seconds
+            if reconcile_after_seconds is not None
+            else settings.STORAGE_STATS_RECONCILE_SECONDS
+        )
+        self._lock = threading.Lock()
+        self._reconciling: Dict[str, threading.Thread] = {}
+
+    # ------------------------------------------------------------------
+    # Actualización incremental
+    # ------------------------------------------------------------------
+
+    def apply(self, bucket: str, object_name: str, bytes_delta: int, count_delta: int) -> None:
+        """Suma ``bytes_delta``/``count_delta`` a todos los ámbitos del objeto"""
+        scopes = stat_scopes(object_name)
+        if not scopes or (bytes_delta == 0 and count_delta == 0):
+            return
+
+        for attempt in range(2):
+            try:
+                with get_db_context() as db:
+                    for scope in scopes:
+                        updated = _scope_filter(db.query(StorageUsageStat), bucket, scope).update(
+                            {
+                                StorageUsageStat.total_bytes: StorageUsageStat.total_bytes + bytes_delta,
+                                StorageUsageStat.object_count: StorageUsageStat.object_count + count_delta,
+                                StorageUsageStat.updated_at: datetime.utcnow(),
+                            },
+                            synchronize_session=False,
+                        )
+                        if not updated:
+                            tenant_id, category, group_key = scope
+                            db.add(StorageUsageStat(
+                                bucket=bucket,
+                                tenant_id=tenant_id,
+                                category=category,
+                                group_key=group_key,
+                                total_bytes=max(bytes_delta, 0),
+                                object_count=max(count_delta, 0),
+                            ))
+                            db.flush()
+                return
+            except IntegrityError:
+                # Otro proceso creó la fila a la vez: el reintento la actualiza
+                if attempt:
+                    raise
+
+    def record_put(self, bucket: str, object_name: str, size: int,
+                   previous_size: Optional[int] = None) -> None:
+        """Registra una subida; ``previous_size`` si sobrescribe un objeto existente"""
+        if previous_size is None:
+            self.apply(bucket, object_name, size, 1)
+        else:
+            self.apply(bucket, object_name, size - previous_size, 0)
+
+    def record_delete(self, bucket: str, object_name: str, size: int) -> None:
+        self.apply(bucket, object_name, -size, -1)
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def get_stats(
+        self,
+        bucket: str,
+        tenant_id: Optional[str] = None,
+        case_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Estadísticas desde el índice (lecturas por clave única).
+
+        Returns:
+            None si el bucket nunca se ha reconciliado
+        """
+        with get_db_context() as db:
+            bucket_row = _scope_filter(db.query(StorageUsageStat), bucket, BUCKET_SCOPE).first()
+            if bucket_row is None or bucket_row.last_reconciled_at is None:
+                return None
+            reconciled_at = bucket_row.last_reconciled_at
+
+            by_type: Dict[str, int] = {}
+            if case_id:
+                row = _scope_filter(
+                    db.query(StorageUsageStat), bucket, (tenant_id or "", "cases", case_id)
+                ).first()
+            elif tenant_id:
+                row = _scope_filter(db.query(StorageUsageStat), bucket, (tenant_id, "", "")).first()
+                groups = db.query(StorageUsageStat.group_key, StorageUsageStat.object_count).filter(
+                    StorageUsageStat.bucket == bucket,
+                    StorageUsageStat.tenant_id == tenant_id,
+                    StorageUsageStat.group_key != "",
+                )
+                for group_key, count in groups:
+                    by_type[group_key] = by_type.get(group_key, 0) + count
+            else:
+                row = bucket_row
+                categories = db.query(StorageUsageStat.category, StorageUsageStat.object_count).filter(
+                    StorageUsageStat.bucket == bucket,
+                    StorageUsageStat.tenant_id == "",
+                    StorageUsageStat.category != "",
+                )
+                by_type = {category: count for category, count in categories}
+
+            total_bytes = max(row.total_bytes, 0) if row else 0
+            total_objects = max(row.object_count, 0) if row else 0
+
+        return {
+            "total_size_bytes": total_bytes,
+            "total_size_mb": round(total_bytes / (1024 * 1024), 2),
+            "total_objects": total_objects,
+            "by_type": {key: count for key, count in by_type.items() if count > 0},
+            "tenant_id": tenant_id,
+            "case_id": case_id,
+            "last_reconciled_at": reconciled_at.isoformat(),
+            "stale": self._is_stale(reconciled_at),
+        }
+
+    def get_or_reconcile(
+        self,
+        bucket: str,
+        list_objects: Callable[[], Iterable[Any]],
+        tenant_id: Optional[str] = None,
+        case_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Lee el índice; reconcilia en línea la primera vez y en segundo plano
+        cuando está viejo (se responde con los valores actuales).
+        """
+        stats = self.get_stats(bucket, tenant_id, case_id)
+        if stats is None:
+            self.reconcile(bucket, list_objects())
+            stats = self.get_stats(bucket, tenant_id, case_id)
+        elif stats["stale"]:
+            self.schedule_reconcile(bucket, list_objects)
+        return stats
+
+    def _is_stale(self, reconciled_at: datetime) -> bool:
+        return datetime.utcnow() - reconciled_at > timedelta(seconds=self.reconcile_after_seconds)
+
+    # ------------------------------------------------------------------
+    # Reconciliación
+    # ------------------------------------------------------------------
+
+    def reconcile(self, bucket: str, objects: Iterable[Any]) -> Dict[str, int]:
+        """
+        Reconstruye las filas del bucket a partir de un listado completo.
+
+        ``objects`` es un iterable de objetos con ``object_name`` y ``size``
+        (lo que devuelve ``Minio.list_objects(recursive=True)``).
+        """
+        totals: Dict[Scope, List[int]] = {BUCKET_SCOPE: [0, 0]}
+        listed = 0
+        for obj in objects:
+            size = obj.size or 0
+            for scope in stat_scopes(obj.object_name):
+                counters = totals.setdefault(scope, [0, 0])
+                counters[0] += size
+                counters[1] += 1
+            listed += 1
+
+        now = datetime.utcnow()
+        with get_db_context() as db:
+            db.query(StorageUsageStat).filter(
+                StorageUsageStat.bucket == bucket
+            ).delete(synchronize_session=False)
+            db.add_all([
+                StorageUsageStat(
+                    bucket=bucket,
+                    tenant_id=tenant_id,
+                    category=category,
+                    group_key=group_key,
+                    total_bytes=total_bytes,
+                    object_count=object_count,
+                    updated_at=now,
+                    last_reconciled_at=now if (tenant_id, category, group_key) == BUCKET_SCOPE else None,
+                )
+                for (tenant_id, category, group_key), (total_bytes, object_count) in totals.items()
+            ])
+
+        logger.info(f"📊 Storage stats reconciled for {bucket}: {listed} objects, {len(totals)} scopes")
+        return {"objects": listed, "scopes": len(totals)}
+
+    def schedule_reconcile(self, bucket: str, list_objects: Callable[[], Iterable[Any]]) -> bool:
+        """Lanza la reconciliación en un hilo; False si ya hay una en curso para el bucket"""
+        with self._lock:
+            running = self._reconciling.get(bucket)
+            if running is not None and running.is_alive():
+                return False
+            thread = threading.Thread(
+                target=self._reconcile_in_background,
+                args=(bucket, list_objects),
+                name=f"storage-stats-{bucket}",
+                daemon=True,
+            )
+            self._reconciling[bucket] = thread
+            thread.start()
+        return True
+
+    def _reconcile_in_background(self, bucket: str, list_objects: Callable[[], Iterable[Any]]) -> None:
+        try:
+            self.reconcile(bucket, list_objects())
+        except Exception as e:
+            logger.warning(f"⚠️ Storage stats reconciliation failed for {bucket}: {e}")
+
+    def wait_for_reconcile(self, bucket: str, timeout: Optional[float] = None) -> None:
+        """Espera a la reconciliación en curso del bucket (tests / shutdown)"""
+        thread = self._reconciling.get(bucket)
+        if thread is not None:
+            thread.join(timeout)
+
+
+storage_stats_index = StorageStatsIndex()
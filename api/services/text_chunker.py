@@ -0,0 +1,93 @@
+"""
+MCP v4.7 - Text Chunker
+Divide textos largos (logs, reportes de evidencia) en chunks con solape para
+indexarlos en RAG.
+
+- Corta preferentemente en salto de línea o espacio dentro de la segunda
+  mitad de la ventana, para no partir líneas de log ni IOCs
+- Funciona en streaming: los archivos se leen por bloques, memoria acotada
+- Cada chunk incluye su offset (en caracteres) en el texto original
+"""
+
+from typing import IO, Iterable, Iterator, NamedTuple, Optional
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class TextChunk(NamedTuple):
+    index: int
+    offset: int
+    text: str
+
+
+def _cut_position(buffer: str, start: int, chunk_size: int) -> int:
+    """Mejor punto de corte en (start, start + chunk_size] (salto de línea > espacio > duro)"""
+    end = start + chunk_size
+    floor = start + chunk_size // 2
+    for separator in ("\n", " "):
+        position = buffer.rfind(separator, floor, end)
+        if position != -1:
+            return position + 1
+    return end
+
+
+def iter_chunks(
+    pieces: Iterable[str],
+    chunk_size: int = 1000,
+    overlap: int = 200
+) -> Iterator[TextChunk]:
+    """
+    Genera chunks con solape a partir de fragmentos de texto arbitrarios.
+
+    Args:
+        pieces: Fragmentos consecutivos del texto (p.ej. bloques de un archivo)
+        chunk_size: Tamaño máximo de cada chunk en caracteres
+        overlap: Caracteres compartidos entre chunks consecutivos
+
+    Raises:
+        ValueError: si overlap >= chunk_size / 2
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if overlap < 0 or overlap * 2 >= chunk_size:
+        raise ValueError("overlap must be smaller than half of chunk_size")
+
+    buffer = ""
+    buffer_offset = 0  # Offset del inicio del buffer en el texto original
+    emitted_end = 0  # Fin del último chunk emitido (offset absoluto)
+    index = 0
+
+    for piece in pieces:
+        # Compactar una vez por fragmento (no por chunk)
+        buffer += piece
+        start = 0
+        while len(buffer) - start >= chunk_size:
+            cut = _cut_position(buffer, start, chunk_size)
+            text = buffer[start:cut]
+            if text.strip():
+                yield TextChunk(index, buffer_offset + start, text)
+                index += 1
+            emitted_end = buffer_offset + cut
+            start = cut - overlap
+        buffer = buffer[start:]
+        buffer_offset += start
+
+    # Resto: sólo si aporta texto no cubierto por el chunk anterior
+    if buffer_offset + len(buffer) > emitted_end and buffer.strip():
+        yield TextChunk(index, buffer_offset, buffer)
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list:
+    """Divide un texto completo en chunks (lista de TextChunk)"""
+    return list(iter_chunks([text], chunk_size, overlap))
+
+
+def iter_file_chunks(
+    stream: IO[str],
+    chunk_size: int = 1000,
+    overlap: int = 200,
+    read_size: Optional[int] = None
+) -> Iterator[TextChunk]:
+    """Chunks de un archivo de texto abierto, leído por bloques"""
+    read_size = read_size or READ_BLOCK_SIZE
+    return iter_chunks(iter(lambda: stream.read(read_size), ""), chunk_size, overlap)
@@ -3,29 +3,178 @@ Timeline Service v4.4
 ======================
 Gestión de línea de tiempo de eventos para investigaciones
 Completamente orientado a casos con persistencia
+
+v4.7: Los eventos viven en un TimelineEventStore (SQL por defecto) con
+índice (case_id, event_time) y paginación keyset
 """
 
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 import uuid
 import json
 
+from api.config import settings
 from api.services.llm_provider import get_llm_manager
+from api.services.timeline_store import (
+    HISTOGRAM_INTERVALS,
+    TimelineEventStore,
+    TimelineFilter,
+    choose_interval,
+    create_timeline_store,
+    to_utc_naive,
+    truncate_time,
+)
 
 logger = logging.getLogger(__name__)
 
+SEVERITY_WEIGHT = {"info": 0.1, "low": 0.3, "medium": 0.5, "high": 0.8, "critical": 1.0}
+
+# Columna -> clave del desglose en cada bucket del histograma
+HISTOGRAM_BREAKDOWNS = {"data_source": "by_source", "severity": "by_severity", "event_type": "by_type"}
+
+Entity = Tuple[str, str]  # (tipo, valor): ("ip", "10.0.0.5"), ("user", "alice"), ("host", "WS01")
+
+
+def event_entities(event: Dict) -> List[Entity]:
+    """Entidades de un evento: IPs, origen (usuario por defecto) y destino"""
+    entities = []
+    for field in ("source_ip", "destination_ip"):
+        if event.get(field):
+            entities.append(("ip", event[field]))
+    source = event.get("source_name") or event.get("source_id")
+    if source:
+        entities.append((event.get("source_type") or "user", source))
+    target = event.get("target_name") or event.get("target_id")
+    if target and event.get("target_type"):
+        entities.append((event["target_type"], target))
+    return entities
+
+
+def cluster_events_by_entity(
+    events: Iterable[Dict],
+    window: timedelta,
+    min_events: int = 3
+) -> List[Dict]:
+    """
+    Agrupa eventos que comparten una entidad dentro de ``window``.
+
+    Barrido único en orden cronológico: cada evento se une (union-find) con
+    la última aparición de cada una de sus entidades si ocurrió hace menos de
+    ``window``. Un evento con IP y usuario enlaza ambas cadenas, así que los
+    grupos siguen IP → usuario → host. O(n log n) por la ordenación y casi
+    O(1) por evento después.
+
+    Returns:
+        Grupos con ``events``, ``entities``, ``start``, ``end``,
+        ``duration_seconds``, ``severity`` y ``score`` (0-1), de mayor a
+        menor puntuación
+    """
+    ordered = sorted(
+        ((datetime.fromisoformat(e["event_time"]), e) for e in events),
+        key=lambda item: item[0]
+    )
+    parent = list(range(len(ordered)))
+    size = [1] * len(ordered)
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(a: int, b: int):
+        a, b = find(a), find(b)
+        if a == b:
+            return
+        if size[a] < size[b]:
+            a, b = b, a
+        parent[b] = a
+        size[a] += size[b]
+
+    last_seen: Dict[Entity, int] = {}
+    entities_by_event = []
+    for i, (event_time, event) in enumerate(ordered):
+        entities = event_entities(event)
+        entities_by_event.append(entities)
+        for entity in entities:
+            previous = last_seen.get(entity)
+            if previous is not None and event_time - ordered[previous][0] <= window:
+                union(i, previous)
+            last_seen[entity] = i
+
+    members: Dict[int, List[int]] = {}
+    for i in range(len(ordered)):
+        members.setdefault(find(i), []).append(i)
+
+    groups = []
+    for indexes in members.values():
+        if len(indexes) < min_events:
+            continue
+        group_events = [ordered[i][1] for i in indexes]
+        counts: Dict[Entity, int] = {}
+        for i in indexes:
+            for entity in set(entities_by_event[i]):
+                counts[entity] = counts.get(entity, 0) + 1
+        # Entidades que realmente enlazan el grupo (aparecen en más de un evento)
+        shared = sorted(entity for entity, count in counts.items() if count > 1)
+
+        severities = [e.get("severity") or "info" for e in group_events]
+        start, end = ordered[indexes[0]][0], ordered[indexes[-1]][0]
+        groups.append({
+            "events": group_events,
+            "entities": [f"{kind}:{value}" for kind, value in shared],
+            "start": start,
+            "end": end,
+            "duration_seconds": int((end - start).total_seconds()),
+            "severity": max(severities, key=lambda sev: SEVERITY_WEIGHT.get(sev, 0)),
+            "score": _group_score(group_events, severities, shared),
+        })
+
+    groups.sort(key=lambda g: g["score"], reverse=True)
+    return groups
+
+
+def _group_score(events: List[Dict], severities: List[str], shared: List[Entity]) -> float:
+    """Severidad media (50%), proporción sospechosa (30%) y variedad de tipos de entidad (20%)"""
+    severity = sum(SEVERITY_WEIGHT.get(sev, 0.1) for sev in severities) / len(severities)
+    suspicious = sum(1 for e in events if e.get("is_suspicious") or e.get("is_malicious")) / len(events)
+    diversity = min(len({kind for kind, _ in shared}), 3) / 3
+    return round(0.5 * severity + 0.3 * suspicious + 0.2 * diversity, 3)
+
+
+def rebucket_histogram(histogram: Dict, interval: str) -> Dict:
+    """
+    Reagrupa un histograma en un intervalo más grueso (alejar el zoom sin
+    volver a consultar la BD)
+    """
+    order = list(HISTOGRAM_INTERVALS)
+    if order.index(interval) < order.index(histogram["interval"]):
+        raise ValueError(f"Cannot rebucket {histogram['interval']} histogram into {interval}")
+
+    merged: Dict[str, Dict] = {}
+    for bucket in histogram["buckets"]:
+        start = truncate_time(datetime.fromisoformat(bucket["timestamp"]), interval).isoformat()
+        target = merged.setdefault(start, {"timestamp": start, "count": 0})
+        target["count"] += bucket["count"]
+        for key, values in bucket.items():
+            if key.startswith("by_"):
+                breakdown = target.setdefault(key, {})
+                for value, count in values.items():
+                    breakdown[value] = breakdown.get(value, 0) + count
+
+    return {**histogram, "interval": interval, "buckets": [merged[k] for k in sorted(merged)]}
+
 
 class TimelineService:
     """Servicio de Timeline de Eventos v4.4"""
     
-    def __init__(self):
-        self.events: Dict[str, Dict] = {}
+    def __init__(self, store: Optional[TimelineEventStore] = None):
+        # v4.7: Eventos persistidos e indexados por (case_id, event_time)
+        self.store = store or create_timeline_store()
         self.correlations: Dict[str, Dict] = {}
-        # v4.4: Índice por caso
-        self.case_events: Dict[str, List[str]] = {}
         
-    async def create_event(
+    def _build_event(
         self,
         event_time: datetime,
         event_type: str,
@@ -34,7 +183,7 @@ class TimelineService:
         **kwargs
     ) -> Dict:
         """
-        Crea un nuevo evento en la timeline
+        Construye el dict de un evento nuevo (sin guardarlo)
         
         Args:
             event_time: Timestamp del evento
@@ -44,13 +193,13 @@ class TimelineService:
             **kwargs: Campos adicionales
             
         Returns:
-            Evento creado
+            Evento
         """
         event_id = f"evt_{uuid.uuid4().hex[:12]}"
         
         event = {
             "event_id": event_id,
-            "event_time": event_time.isoformat(),
+            "event_time": to_utc_naive(event_time).isoformat(),
             "event_type": event_type,
             "title": title,
             "case_id": case_id,
@@ -78,20 +227,38 @@ class TimelineService:
             "created_by": kwargs.get("created_by")
         }
         
-        self.events[event_id] = event
+        return event
+    
+    async def create_event(
+        self,
+        event_time: datetime,
+        event_type: str,
+        title: str,
+        case_id: str,  # v4.4: OBLIGATORIO
+        **kwargs
+    ) -> Dict:
+        """
+        Crea un nuevo evento en la timeline
         
-        # v4.4: Registrar en índice de caso
-        if case_id not in self.case_events:
-            self.case_events[case_id] = []
-        self.case_events[case_id].append(event_id)
+        Args:
+            event_time: Timestamp del evento
+            event_type: Tipo (login, file_access, command, network, etc.)
+            title: Título descriptivo
+            case_id: ID del caso asociado (OBLIGATORIO en v4.4)
+            **kwargs: Campos adicionales (ver _build_event)
+            
+        Returns:
+            Evento creado
+        """
+        event = self.store.add(self._build_event(event_time, event_type, title, case_id, **kwargs))
         
-        logger.info(f"📅 Evento creado: {event_id} - {title} (caso: {case_id})")
+        logger.info(f"📅 Evento creado: {event['event_id']} - {title} (caso: {case_id})")
         
         return event
     
     async def get_event(self, event_id: str) -> Optional[Dict]:
         """Obtiene un evento por ID"""
-        return self.events.get(event_id)
+        return self.store.get(event_id)
     
     async def get_events(
         self,
@@ -116,47 +283,49 @@ class TimelineService:
         Returns:
             Lista de eventos ordenados cronológicamente
         """
-        events = list(self.events.values())
-        
-        # Aplicar filtros
-        if case_id:
-            events = [e for e in events if e.get("case_id") == case_id]
-        
-        if event_type:
-            events = [e for e in events if e.get("event_type") == event_type]
-        
-        if severity:
-            severity_order = {"info": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
-            min_sev = severity_order.get(severity, 0)
-            events = [e for e in events if severity_order.get(e.get("severity", "info"), 0) >= min_sev]
-        
-        if start_time:
-            events = [e for e in events if datetime.fromisoformat(e["event_time"]) >= start_time]
-        
-        if end_time:
-            events = [e for e in events if datetime.fromisoformat(e["event_time"]) <= end_time]
-        
-        # Ordenar por tiempo
-        events.sort(key=lambda x: x["event_time"])
-        
-        return events[:limit]
+        page = await self.get_events_page(
+            case_id=case_id,
+            start_time=start_time,
+            end_time=end_time,
+            event_types=[event_type] if event_type else None,
+            severity=severity,
+            limit=limit
+        )
+        return page["events"]
     
-    async def update_event(self, event_id: str, updates: Dict) -> Optional[Dict]:
-        """Actualiza un evento"""
-        if event_id not in self.events:
-            return None
-        
-        self.events[event_id].update(updates)
-        self.events[event_id]["updated_at"] = datetime.utcnow().isoformat()
+    async def get_events_page(
+        self,
+        case_id: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        event_types: Optional[List[str]] = None,
+        sources: Optional[List[str]] = None,
+        severity: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 500
+    ) -> Dict:
+        """
+        Página de eventos en orden cronológico (paginación keyset)
         
-        return self.events[event_id]
-    
-    async def delete_event(self, event_id: str) -> bool:
-        """Elimina un evento"""
-        if event_id in self.events:
-            del self.events[event_id]
-            return True
-        return False
+        Args:
+            cursor: ``next_cursor`` de la página anterior
+            
+        Returns:
+            Dict con ``events`` y ``next_cursor`` (None en la última página)
+        """
+        page = self.store.query(
+            TimelineFilter(
+                case_id=case_id,
+                start_time=start_time,
+                end_time=end_time,
+                event_types=event_types,
+                sources=sources,
+                min_severity=severity,
+            ),
+            cursor=cursor,
+            limit=limit,
+        )
+        return {"events": page.events, "next_cursor": page.next_cursor}
     
     async def bulk_import_events(
         self,
@@ -167,6 +336,8 @@ class TimelineService:
         """
         Importa múltiples eventos de una fuente
         
+        Los eventos válidos se guardan con un único INSERT por lotes.
+        
         Args:
             events_data: Lista de eventos en formato raw
             case_id: ID del caso
@@ -175,7 +346,7 @@ class TimelineService:
         Returns:
             Resumen de importación
         """
-        imported = 0
+        events = []
         errors = 0
         
         for event_data in events_data:
@@ -186,20 +357,22 @@ class TimelineService:
                 elif not event_time:
                     event_time = datetime.utcnow()
                 
-                await self.create_event(
+                events.append(self._build_event(
                     event_time=event_time,
                     event_type=event_data.get("type", "unknown"),
                     title=event_data.get("title", "Imported Event"),
                     case_id=case_id,
                     data_source=data_source,
                     raw_data=event_data,
-                    **{k: v for k, v in event_data.items() if k not in ["timestamp", "event_time", "type", "title"]}
-                )
-                imported += 1
+                    **{k: v for k, v in event_data.items() if k not in ["timestamp", "event_time", "type", "title", "case_id", "data_source", "raw_data"]}
+                ))
             except Exception as e:
                 logger.warning(f"Error importando evento: {e}")
                 errors += 1
         
+        imported = self.store.add_many(events)
+        logger.info(f"📅 {imported} eventos importados de {data_source} (caso: {case_id})")
+        
         return {
             "imported": imported,
             "errors": errors,
@@ -230,8 +403,7 @@ class TimelineService:
         correlation_id = f"corr_{uuid.uuid4().hex[:10]}"
         
         # Obtener eventos para calcular timeframe
-        events = [self.events.get(eid) for eid in event_ids if eid in self.events]
-        events = [e for e in events if e]
+        events = self.store.get_many(event_ids)
         
         if not events:
             return {"error": "No valid events found"}
@@ -256,6 +428,7 @@ class TimelineService:
             "severity": kwargs.get("severity", "medium"),
             "confidence_score": kwargs.get("confidence_score", 0.8),
             "correlation_type": kwargs.get("correlation_type", "manual"),
+            "entities": kwargs.get("entities", []),
             "is_confirmed": False,
             "created_at": datetime.utcnow().isoformat(),
             "created_by": kwargs.get("created_by")
@@ -264,9 +437,7 @@ class TimelineService:
         self.correlations[correlation_id] = correlation
         
         # Actualizar eventos con referencia a correlación
-        for event_id in event_ids:
-            if event_id in self.events:
-                self.events[event_id]["correlation_id"] = correlation_id
+        self.store.update_many(event_ids, {"correlation_id": correlation_id})
         
         logger.info(f"🔗 Correlación creada: {correlation_id} con {len(events)} eventos")
         
@@ -277,10 +448,7 @@ class TimelineService:
         corr = self.correlations.get(correlation_id)
         if corr:
             # Incluir eventos
-            corr["events"] = [
-                self.events.get(eid) for eid in corr.get("event_ids", [])
-                if eid in self.events
-            ]
+            corr["events"] = self.store.get_many(corr.get("event_ids", []))
         return corr
     
     async def get_correlations(
@@ -302,77 +470,63 @@ class TimelineService:
     async def auto_correlate(
         self,
         case_id: str,
-        time_window_minutes: int = 30
+        time_window_minutes: Optional[int] = None,
+        min_events: int = 3
     ) -> List[Dict]:
         """
         Auto-correlaciona eventos de un caso
         
-        Busca patrones como:
-        - Misma IP en múltiples eventos
-        - Mismo usuario con diferentes acciones
-        - Secuencias de ataque conocidas
+        Agrupa eventos que comparten entidad (IP, usuario, host...) a menos de
+        ``time_window_minutes`` entre sí, enlazando cadenas entre tipos de
+        entidad (ver cluster_events_by_entity).
         
         Args:
             case_id: ID del caso
             time_window_minutes: Ventana de tiempo para correlación
+                (por defecto TIMELINE_CORRELATION_WINDOW_MINUTES)
+            min_events: Eventos mínimos por grupo
             
         Returns:
-            Lista de correlaciones creadas
+            Lista de correlaciones creadas, de mayor a menor puntuación
         """
-        events = await self.get_events(case_id=case_id)
-        if len(events) < 2:
-            return []
+        window = timedelta(
+            minutes=time_window_minutes or settings.TIMELINE_CORRELATION_WINDOW_MINUTES
+        )
+        groups = cluster_events_by_entity(self._iter_case_events(case_id), window, min_events)
         
         created_correlations = []
-        time_window = timedelta(minutes=time_window_minutes)
-        
-        # Agrupar por IP
-        by_ip = {}
-        for event in events:
-            ip = event.get("source_ip")
-            if ip:
-                if ip not in by_ip:
-                    by_ip[ip] = []
-                by_ip[ip].append(event)
-        
-        # Crear correlaciones por IP con múltiples eventos
-        for ip, ip_events in by_ip.items():
-            if len(ip_events) >= 3:
-                corr = await self.create_correlation(
-                    event_ids=[e["event_id"] for e in ip_events],
-                    name=f"Actividad desde IP: {ip}",
-                    case_id=case_id,
-                    correlation_type="auto",
-                    description=f"Múltiples eventos ({len(ip_events)}) desde la misma IP"
+        for group in groups:
+            entities = group["entities"]
+            label = ", ".join(entities[:3]) or "entidades compartidas"
+            corr = await self.create_correlation(
+                event_ids=[e["event_id"] for e in group["events"]],
+                name=f"Actividad relacionada: {label}",
+                case_id=case_id,
+                correlation_type="auto",
+                severity=group["severity"],
+                confidence_score=group["score"],
+                entities=entities,
+                description=(
+                    f"{len(group['events'])} eventos en {group['duration_seconds']}s "
+                    f"enlazados por {len(entities)} entidades"
                 )
-                created_correlations.append(corr)
-        
-        # Agrupar por usuario
-        by_user = {}
-        for event in events:
-            user = event.get("source_name") or event.get("source_id")
-            if user:
-                if user not in by_user:
-                    by_user[user] = []
-                by_user[user].append(event)
-        
-        # Crear correlaciones por usuario con actividad sospechosa
-        for user, user_events in by_user.items():
-            suspicious = [e for e in user_events if e.get("is_suspicious") or e.get("severity") in ["high", "critical"]]
-            if len(suspicious) >= 2:
-                corr = await self.create_correlation(
-                    event_ids=[e["event_id"] for e in suspicious],
-                    name=f"Actividad sospechosa de: {user}",
-                    case_id=case_id,
-                    correlation_type="auto",
-                    severity="high",
-                    description=f"Usuario con {len(suspicious)} eventos sospechosos"
-                )
-                created_correlations.append(corr)
+            )
+            created_correlations.append(corr)
         
         logger.info(f"🔗 Auto-correlación completada: {len(created_correlations)} correlaciones creadas")
         return created_correlations
     
+    def _iter_case_events(self, case_id: str, page_size: int = 5000) -> Iterable[Dict]:
+        """Todos los eventos del caso en orden cronológico, por páginas keyset"""
+        flt = TimelineFilter(case_id=case_id)
+        cursor = None
+        while True:
+            page = self.store.query(flt, cursor=cursor, limit=page_size)
+            yield from page.events
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
+    
     async def generate_narrative(self, correlation_id: str) -> Dict:
         """
         Genera narrativa del ataque usando LLM
@@ -498,10 +652,11 @@ Responde en español, formato Markdown."""
 
     async def get_stats(self) -> Dict:
         """Obtiene estadísticas globales del servicio"""
+        stats = self.store.stats()
         return {
-            "total_events": len(self.events),
+            "total_events": stats["total_events"],
             "total_correlations": len(self.correlations),
-            "cases_tracked": len(set(e.get("case_id") for e in self.events.values() if e.get("case_id")))
+            "cases_tracked": stats["cases_tracked"]
         }
 
     async def get_timeline(
@@ -509,24 +664,29 @@ Responde en español, formato Markdown."""
         case_id: str,
         filters: Dict = None,
         limit: int = 500,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None
     ) -> Dict:
-        """Obtiene timeline con paginación y filtros"""
-        events = await self.get_events(
+        """
+        Obtiene timeline con paginación y filtros
+        
+        Con ``cursor`` la página se lee por keyset y se ignora ``offset``.
+        """
+        filters = filters or {}
+        flt = TimelineFilter(
             case_id=case_id,
-            start_time=filters.get("start_time") if filters else None,
-            end_time=filters.get("end_time") if filters else None,
-            event_type=filters.get("event_types", [None])[0] if filters and filters.get("event_types") else None,
-            severity=filters.get("severity") if filters else None,
-            limit=limit + offset
+            start_time=filters.get("start_time"),
+            end_time=filters.get("end_time"),
+            event_types=filters.get("event_types"),
+            sources=filters.get("sources"),
+            min_severity=filters.get("severity"),
         )
-        
-        # Aplicar offset
-        paginated = events[offset:offset + limit]
+        page = self.store.query(flt, cursor=cursor, limit=limit, offset=0 if cursor else offset)
         
         return {
-            "total": len(events),
-            "events": paginated
+            "total": self.store.count(flt),
+            "events": page.events,
+            "next_cursor": page.next_cursor
         }
 
     async def add_event(
@@ -545,6 +705,27 @@ Responde en español, formato Markdown."""
     ) -> Dict:
         """Agregar evento al timeline (wrapper para create_event)"""
         return await self.create_event(
+            **self._add_event_fields(
+                case_id, event_time, event_type, source, title, description,
+                severity, indicators, raw_data, correlation_ids
+            )
+        )
+
+    def _add_event_fields(
+        self,
+        case_id: str,
+        event_time: datetime,
+        event_type: str,
+        source: str,
+        title: str,
+        description: Optional[str] = None,
+        severity: str = "info",
+        indicators: List[str] = None,
+        raw_data: Dict = None,
+        correlation_ids: List[str] = None
+    ) -> Dict:
+        """Argumentos de create_event/_build_event para add_event"""
+        return dict(
             event_time=event_time,
             event_type=event_type,
             title=title,
@@ -558,14 +739,13 @@ Responde en español, formato Markdown."""
         )
 
     async def bulk_add_events(self, case_id: str, events: List[Dict]) -> Dict:
-        """Agregar múltiples eventos"""
-        added = 0
+        """Agregar múltiples eventos (un único INSERT por lotes)"""
+        built = []
         failed = 0
-        event_ids = []
         
         for event_data in events:
             try:
-                result = await self.add_event(
+                built.append(self._build_event(**self._add_event_fields(
                     case_id=case_id,
                     event_time=event_data["event_time"],
                     event_type=event_data["event_type"],
@@ -573,34 +753,27 @@ Responde en español, formato Markdown."""
                     title=event_data["title"],
                     description=event_data.get("description"),
                     severity=event_data.get("severity", "info"),
-                    entities=event_data.get("entities"),
                     indicators=event_data.get("indicators"),
                     raw_data=event_data.get("raw_data"),
                     correlation_ids=event_data.get("correlation_ids")
-                )
-                event_ids.append(result["event_id"])
-                added += 1
+                )))
             except Exception as e:
                 logger.error(f"Error agregando evento: {e}")
                 failed += 1
         
-        return {"added": added, "failed": failed, "event_ids": event_ids}
+        added = self.store.add_many(built)
+        return {"added": added, "failed": failed, "event_ids": [e["event_id"] for e in built]}
 
     async def update_event(self, event_id: str, updates: Dict) -> bool:
         """Actualizar un evento"""
-        if event_id not in self.events:
-            return False
-        
-        self.events[event_id].update(updates)
-        self.events[event_id]["updated_at"] = datetime.utcnow().isoformat()
-        return True
+        updated = self.store.update(
+            event_id, {**updates, "updated_at": datetime.utcnow().isoformat()}
+        )
+        return updated is not None
 
     async def delete_event(self, event_id: str) -> bool:
         """Eliminar un evento"""
-        if event_id in self.events:
-            del self.events[event_id]
-            return True
-        return False
+        return self.store.delete(event_id)
 
     async def correlate_events(
         self,
@@ -625,11 +798,11 @@ Responde en español, formato Markdown."""
         self.correlations[correlation_id] = correlation
         
         # Actualizar eventos con el ID de correlación
-        for event_id in event_ids:
-            if event_id in self.events:
-                if "correlation_ids" not in self.events[event_id]:
-                    self.events[event_id]["correlation_ids"] = []
-                self.events[event_id]["correlation_ids"].append(correlation_id)
+        for event in self.store.get_many(event_ids):
+            self.store.update(
+                event["event_id"],
+                {"correlation_ids": (event.get("correlation_ids") or []) + [correlation_id]}
+            )
         
         return correlation
 
@@ -637,42 +810,104 @@ Responde en español, formato Markdown."""
         """Alias para get_timeline_summary"""
         return await self.get_timeline_summary(case_id)
 
-    async def get_graph_data(self, case_id: str, resolution: str = "hour") -> Dict:
-        """Obtiene datos para gráfico de timeline"""
-        events = await self.get_events(case_id=case_id)
+    async def get_histogram(
+        self,
+        case_id: str,
+        interval: str = "auto",
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        event_types: Optional[List[str]] = None,
+        sources: Optional[List[str]] = None,
+        severity: Optional[str] = None,
+        group_by: Optional[List[str]] = None,
+        max_buckets: Optional[int] = None,
+        fill_empty: bool = True
+    ) -> Dict:
+        """
+        Histograma de eventos por intervalo, calculado en el almacén
         
-        if not events:
-            return {"data_points": 0, "series": []}
+        Args:
+            interval: minute, hour, day o auto (el más fino que deja como
+                mucho ``max_buckets`` en el rango; al hacer zoom basta con
+                volver a pedir el nuevo rango)
+            group_by: Desgloses por bucket (por defecto fuente y severidad)
+            fill_empty: Incluir buckets vacíos del rango si caben en ``max_buckets``
+            
+        Returns:
+            Dict con ``interval``, ``start``, ``end``, ``total`` y ``buckets``
+            (``timestamp``, ``count``, ``by_source``, ``by_severity``...)
+        """
+        group_by = group_by or ["data_source", "severity"]
+        unknown = [dim for dim in group_by if dim not in HISTOGRAM_BREAKDOWNS]
+        if unknown:
+            raise ValueError(f"Unknown histogram dimensions: {unknown}")
+        max_buckets = max_buckets or settings.TIMELINE_HISTOGRAM_MAX_BUCKETS
         
-        # Agrupar por intervalo de tiempo
-        series_data = {}
+        flt = TimelineFilter(
+            case_id=case_id,
+            start_time=start_time,
+            end_time=end_time,
+            event_types=event_types,
+            sources=sources,
+            min_severity=severity,
+        )
+        start, end = flt.start_time, flt.end_time
+        if start is None or end is None:
+            first, last = self.store.time_range(flt)
+            start, end = start or first, end or last
+        if interval == "auto":
+            interval = choose_interval(start, end, max_buckets)
+        elif interval not in HISTOGRAM_INTERVALS:
+            raise ValueError(f"Unknown histogram interval: {interval!r}")
+        
+        buckets: Dict[str, Dict] = {}
+        total = 0
+        for timestamp, values, count in self.store.histogram(flt, interval, group_by):
+            bucket = buckets.get(timestamp)
+            if bucket is None:
+                bucket = buckets[timestamp] = {
+                    "timestamp": timestamp,
+                    "count": 0,
+                    **{HISTOGRAM_BREAKDOWNS[dim]: {} for dim in group_by}
+                }
+            bucket["count"] += count
+            for dim, value in zip(group_by, values):
+                breakdown = bucket[HISTOGRAM_BREAKDOWNS[dim]]
+                breakdown[value] = breakdown.get(value, 0) + count
+            total += count
+        
+        if fill_empty and start is not None and end is not None:
+            step = HISTOGRAM_INTERVALS[interval]
+            slot = truncate_time(start, interval)
+            if (end - slot) / step < max_buckets:
+                while slot <= end:
+                    buckets.setdefault(slot.isoformat(), {
+                        "timestamp": slot.isoformat(),
+                        "count": 0,
+                        **{HISTOGRAM_BREAKDOWNS[dim]: {} for dim in group_by}
+                    })
+                    slot += step
         
-        for event in events:
-            event_time = datetime.fromisoformat(event["event_time"])
-            
-            if resolution == "minute":
-                bucket = event_time.replace(second=0, microsecond=0)
-            elif resolution == "hour":
-                bucket = event_time.replace(minute=0, second=0, microsecond=0)
-            else:  # day
-                bucket = event_time.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            bucket_str = bucket.isoformat()
-            event_type = event.get("event_type", "unknown")
-            
-            if bucket_str not in series_data:
-                series_data[bucket_str] = {}
-            
-            if event_type not in series_data[bucket_str]:
-                series_data[bucket_str][event_type] = 0
-            
-            series_data[bucket_str][event_type] += 1
+        return {
+            "case_id": case_id,
+            "interval": interval,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "total": total,
+            "buckets": [buckets[k] for k in sorted(buckets)]
+        }
+
+    async def get_graph_data(self, case_id: str, resolution: str = "hour") -> Dict:
+        """Obtiene datos para gráfico de timeline (conteos por tipo de evento)"""
+        histogram = await self.get_histogram(
+            case_id, interval=resolution, group_by=["event_type"], fill_empty=False
+        )
         
         return {
-            "data_points": len(series_data),
+            "data_points": len(histogram["buckets"]),
             "series": [
-                {"timestamp": ts, "counts": counts}
-                for ts, counts in sorted(series_data.items())
+                {"timestamp": bucket["timestamp"], "counts": bucket["by_type"]}
+                for bucket in histogram["buckets"]
             ]
         }
 
@@ -0,0 +1,477 @@
+"""
+MCP v4.7 - Timeline Event Store
+Almacenamiento de eventos de timeline indexado por (case_id, event_time).
+
+- SQLTimelineStore: persistente sobre ``timeline_events``; los rangos por
+  caso usan el índice compuesto y se paginan por keyset
+  ``(event_time, event_id)`` en lugar de OFFSET
+- InMemoryTimelineStore: listas ordenadas por caso con bisect; para tests
+  y desarrollo (``TIMELINE_STORE_BACKEND=memory``)
+- Histogramas: conteos por intervalo (minuto/hora/día) y dimensión
+  calculados con GROUP BY en SQL o en una sola pasada en memoria
+
+Los eventos entran y salen como dicts (el formato de TimelineService), con
+``event_time`` en ISO 8601 UTC sin zona horaria.
+"""
+
+import base64
+import bisect
+import logging
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, tuple_
+
+from api.config import settings
+from api.database import get_db_context
+from api.models.timeline import TimelineEvent
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_ORDER = {"info": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
+
+HISTOGRAM_INTERVALS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Columnas por las que se puede desglosar un histograma -> valor si es NULL
+HISTOGRAM_DIMENSIONS = {"data_source": "unknown", "severity": "info", "event_type": "unknown"}
+
+_SQLITE_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%dT%H:%M:00",
+    "hour": "%Y-%m-%dT%H:00:00",
+    "day": "%Y-%m-%dT00:00:00",
+}
+
+HistogramRow = Tuple[str, Tuple[str, ...], int]  # (inicio del bucket ISO, valores de dimensión, conteo)
+
+_COLUMNS = [column.name for column in TimelineEvent.__table__.columns if column.name != "id"]
+_DATETIME_COLUMNS = {"event_time", "event_time_end", "created_at", "updated_at"}
+
+
+def to_utc_naive(value: Any) -> Optional[datetime]:
+    """datetime o ISO 8601 -> datetime UTC sin tzinfo (como se guarda en BD)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def truncate_time(value: datetime, interval: str) -> datetime:
+    """Inicio del bucket de ``interval`` que contiene ``value``"""
+    if interval == "minute":
+        return value.replace(second=0, microsecond=0)
+    if interval == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    if interval == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown histogram interval: {interval!r}")
+
+
+def choose_interval(start: Optional[datetime], end: Optional[datetime], max_buckets: int) -> str:
+    """El intervalo más fino que cubre ``start``-``end`` con como mucho ``max_buckets``"""
+    if start is None or end is None:
+        return "hour"
+    span = end - start
+    for name, step in HISTOGRAM_INTERVALS.items():
+        if span / step < max_buckets:
+            return name
+    return "day"
+
+
+def encode_cursor(event_time: datetime, event_id: str) -> str:
+    """Cursor opaco con la posición del último evento devuelto"""
+    raw = f"{event_time.isoformat()}|{event_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        event_time, event_id = raw.split("|", 1)
+        return datetime.fromisoformat(event_time), event_id
+    except Exception:
+        raise ValueError(f"Invalid timeline cursor: {cursor!r}")
+
+
+@dataclass
+class TimelineFilter:
+    """Filtros de consulta de eventos"""
+    case_id: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    event_types: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    min_severity: Optional[str] = None
+
+    def __post_init__(self):
+        self.start_time = to_utc_naive(self.start_time)
+        self.end_time = to_utc_naive(self.end_time)
+
+    @property
+    def severities(self) -> Optional[List[str]]:
+        """Severidades iguales o mayores que ``min_severity``"""
+        if not self.min_severity:
+            return None
+        minimum = SEVERITY_ORDER.get(self.min_severity, 0)
+        return [name for name, level in SEVERITY_ORDER.items() if level >= minimum]
+
+    def matches(self, event: Dict, event_time: datetime) -> bool:
+        if self.case_id and event.get("case_id") != self.case_id:
+            return False
+        if self.start_time and event_time < self.start_time:
+            return False
+        if self.end_time and event_time > self.end_time:
+            return False
+        if self.event_types and event.get("event_type") not in self.event_types:
+            return False
+        if self.sources and event.get("data_source") not in self.sources:
+            return False
+        severities = self.severities
+        if severities and (event.get("severity") or "info") not in severities:
+            return False
+        return True
+
+
+@dataclass
+class TimelinePage:
+    """Página de eventos; ``next_cursor`` es None en la última"""
+    events: List[Dict] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+class TimelineEventStore(ABC):
+    """Interfaz común de los almacenes de eventos"""
+
+    @abstractmethod
+    def add(self, event: Dict) -> Dict:
+        """Guardar un evento"""
+
+    @abstractmethod
+    def add_many(self, events: List[Dict]) -> int:
+        """Guardar eventos en bloque; devuelve cuántos se guardaron"""
+
+    @abstractmethod
+    def get(self, event_id: str) -> Optional[Dict]:
+        """Evento por ID"""
+
+    @abstractmethod
+    def get_many(self, event_ids: List[str]) -> List[Dict]:
+        """Eventos existentes de ``event_ids``, en el mismo orden"""
+
+    @abstractmethod
+    def update(self, event_id: str, updates: Dict) -> Optional[Dict]:
+        """Actualizar campos; None si no existe"""
+
+    @abstractmethod
+    def update_many(self, event_ids: List[str], updates: Dict) -> int:
+        """Aplicar los mismos cambios a varios eventos"""
+
+    @abstractmethod
+    def delete(self, event_id: str) -> bool:
+        """Eliminar un evento"""
+
+    @abstractmethod
+    def query(
+        self,
+        flt: TimelineFilter,
+        cursor: Optional[str] = None,
+        limit: int = 500,
+        offset: int = 0,
+    ) -> TimelinePage:
+        """Eventos en orden cronológico a partir de ``cursor``"""
+
+    @abstractmethod
+    def count(self, flt: TimelineFilter) -> int:
+        """Número de eventos que cumplen los filtros"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """``total_events`` y ``cases_tracked``"""
+
+    @abstractmethod
+    def histogram(self, flt: TimelineFilter, interval: str, group_by: List[str]) -> List[HistogramRow]:
+        """Conteos por bucket de ``interval`` y valores de las columnas ``group_by``"""
+
+    @abstractmethod
+    def time_range(self, flt: TimelineFilter) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """Primer y último ``event_time`` que cumplen los filtros"""
+
+
+class InMemoryTimelineStore(TimelineEventStore):
+    """Eventos en memoria con una lista ordenada (event_time, event_id) por caso"""
+
+    def __init__(self):
+        self._events: Dict[str, Dict] = {}
+        self._keys: Dict[str, Tuple[datetime, str]] = {}
+        self._by_case: Dict[Optional[str], List[Tuple[datetime, str]]] = {}
+
+    def add(self, event: Dict) -> Dict:
+        event_id = event["event_id"]
+        if event_id in self._events:
+            self.delete(event_id)
+        key = (to_utc_naive(event["event_time"]), event_id)
+        self._events[event_id] = event
+        self._keys[event_id] = key
+        bisect.insort(self._by_case.setdefault(event.get("case_id"), []), key)
+        return event
+
+    def add_many(self, events: List[Dict]) -> int:
+        for event in events:
+            self.add(event)
+        return len(events)
+
+    def get(self, event_id: str) -> Optional[Dict]:
+        return self._events.get(event_id)
+
+    def get_many(self, event_ids: List[str]) -> List[Dict]:
+        return [self._events[event_id] for event_id in event_ids if event_id in self._events]
+
+    def update(self, event_id: str, updates: Dict) -> Optional[Dict]:
+        event = self._events.get(event_id)
+        if event is None:
+            return None
+        if "event_time" in updates or "case_id" in updates:
+            self.delete(event_id)
+            event = {**event, **updates}
+            return self.add(event)
+        event.update(updates)
+        return event
+
+    def update_many(self, event_ids: List[str], updates: Dict) -> int:
+        return sum(1 for event_id in event_ids if self.update(event_id, dict(updates)) is not None)
+
+    def delete(self, event_id: str) -> bool:
+        event = self._events.pop(event_id, None)
+        if event is None:
+            return False
+        key = self._keys.pop(event_id)
+        keys = self._by_case[event.get("case_id")]
+        keys.pop(bisect.bisect_left(keys, key))
+        return True
+
+    def _iter_keys(self, flt: TimelineFilter, after: Optional[Tuple[datetime, str]]) -> Iterable[Tuple[datetime, str]]:
+        if flt.case_id is not None:
+            keys = self._by_case.get(flt.case_id, [])
+        else:
+            keys = sorted(self._keys.values())
+
+        lo = 0
+        if after is not None:
+            lo = bisect.bisect_right(keys, after)
+        elif flt.start_time is not None:
+            lo = bisect.bisect_left(keys, (flt.start_time, ""))
+        for key in keys[lo:]:
+            if flt.end_time is not None and key[0] > flt.end_time:
+                break
+            yield key
+
+    def query(self, flt: TimelineFilter, cursor: Optional[str] = None,
+              limit: int = 500, offset: int = 0) -> TimelinePage:
+        after = decode_cursor(cursor) if cursor else None
+        events = []
+        last_key = None
+        for key in self._iter_keys(flt, after):
+            event = self._events[key[1]]
+            if not flt.matches(event, key[0]):
+                continue
+            if offset:
+                offset -= 1
+                continue
+            if len(events) == limit:
+                return TimelinePage(events, encode_cursor(*last_key))
+            events.append(event)
+            last_key = key
+        return TimelinePage(events, None)
+
+    def count(self, flt: TimelineFilter) -> int:
+        return sum(1 for key in self._iter_keys(flt, None) if flt.matches(self._events[key[1]], key[0]))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "total_events": len(self._events),
+            "cases_tracked": len([case_id for case_id, keys in self._by_case.items() if case_id and keys]),
+        }
+
+    def histogram(self, flt: TimelineFilter, interval: str, group_by: List[str]) -> List[HistogramRow]:
+        counts: Counter = Counter()
+        for key in self._iter_keys(flt, None):
+            event = self._events[key[1]]
+            if not flt.matches(event, key[0]):
+                continue
+            values = tuple(event.get(dim) or HISTOGRAM_DIMENSIONS[dim] for dim in group_by)
+            counts[(truncate_time(key[0], interval).isoformat(), values)] += 1
+        return [(bucket, values, count) for (bucket, values), count in sorted(counts.items())]
+
+    def time_range(self, flt: TimelineFilter) -> Tuple[Optional[datetime], Optional[datetime]]:
+        times = [key[0] for key in self._iter_keys(flt, None) if flt.matches(self._events[key[1]], key[0])]
+        return (times[0], times[-1]) if times else (None, None)
+
+
+def _to_values(event: Dict) -> Dict[str, Any]:
+    values = {name: event[name] for name in _COLUMNS if name in event}
+    for name in _DATETIME_COLUMNS & values.keys():
+        values[name] = to_utc_naive(values[name])
+    return values
+
+
+def _to_dict(row: TimelineEvent) -> Dict:
+    event = {}
+    for name in _COLUMNS:
+        value = getattr(row, name)
+        event[name] = value.isoformat() if isinstance(value, datetime) else value
+    return event
+
+
+class SQLTimelineStore(TimelineEventStore):
+    """Eventos persistidos en ``timeline_events``"""
+
+    def __init__(self, session_factory: Callable = None, batch_size: Optional[int] = None):
+        self.session_factory = session_factory or get_db_context
+        self.batch_size = batch_size or settings.TIMELINE_BULK_INSERT_BATCH
+
+    def add(self, event: Dict) -> Dict:
+        with self.session_factory() as db:
+            db.add(TimelineEvent(**_to_values(event)))
+        return event
+
+    def add_many(self, events: List[Dict]) -> int:
+        """INSERT multi-fila en lotes de ``batch_size`` dentro de una transacción"""
+        if not events:
+            return 0
+        rows = [_to_values(event) for event in events]
+        with self.session_factory() as db:
+            for start in range(0, len(rows), self.batch_size):
+                db.execute(insert(TimelineEvent), rows[start:start + self.batch_size])
+        return len(rows)
+
+    def get(self, event_id: str) -> Optional[Dict]:
+        with self.session_factory() as db:
+            row = db.query(TimelineEvent).filter(TimelineEvent.event_id == event_id).first()
+            return _to_dict(row) if row else None
+
+    def get_many(self, event_ids: List[str]) -> List[Dict]:
+        if not event_ids:
+            return []
+        with self.session_factory() as db:
+            rows = db.query(TimelineEvent).filter(TimelineEvent.event_id.in_(event_ids)).all()
+            found = {row.event_id: _to_dict(row) for row in rows}
+        return [found[event_id] for event_id in event_ids if event_id in found]
+
+    def update(self, event_id: str, updates: Dict) -> Optional[Dict]:
+        with self.session_factory() as db:
+            row = db.query(TimelineEvent).filter(TimelineEvent.event_id == event_id).first()
+            if row is None:
+                return None
+            for name, value in _to_values(updates).items():
+                setattr(row, name, value)
+            db.flush()
+            return _to_dict(row)
+
+    def update_many(self, event_ids: List[str], updates: Dict) -> int:
+        if not event_ids:
+            return 0
+        with self.session_factory() as db:
+            return db.query(TimelineEvent).filter(
+                TimelineEvent.event_id.in_(event_ids)
+            ).update(_to_values(updates), synchronize_session=False)
+
+    def delete(self, event_id: str) -> bool:
+        with self.session_factory() as db:
+            deleted = db.query(TimelineEvent).filter(
+                TimelineEvent.event_id == event_id
+            ).delete(synchronize_session=False)
+        return bool(deleted)
+
+    def _filtered(self, db, flt: TimelineFilter):
+        q = db.query(TimelineEvent)
+        if flt.case_id:
+            q = q.filter(TimelineEvent.case_id == flt.case_id)
+        if flt.start_time:
+            q = q.filter(TimelineEvent.event_time >= flt.start_time)
+        if flt.end_time:
+            q = q.filter(TimelineEvent.event_time <= flt.end_time)
+        if flt.event_types:
+            q = q.filter(TimelineEvent.event_type.in_(flt.event_types))
+        if flt.sources:
+            q = q.filter(TimelineEvent.data_source.in_(flt.sources))
+        if flt.severities:
+            q = q.filter(func.coalesce(TimelineEvent.severity, "info").in_(flt.severities))
+        return q
+
+    def query(self, flt: TimelineFilter, cursor: Optional[str] = None,
+              limit: int = 500, offset: int = 0) -> TimelinePage:
+        with self.session_factory() as db:
+            q = self._filtered(db, flt)
+            if cursor:
+                q = q.filter(
+                    tuple_(TimelineEvent.event_time, TimelineEvent.event_id) > decode_cursor(cursor)
+                )
+            rows = q.order_by(
+                TimelineEvent.event_time, TimelineEvent.event_id
+            ).offset(offset).limit(limit + 1).all()
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1].event_time, rows[-1].event_id)
+            return TimelinePage([_to_dict(row) for row in rows], next_cursor)
+
+    def count(self, flt: TimelineFilter) -> int:
+        with self.session_factory() as db:
+            return self._filtered(db, flt).order_by(None).count()
+
+    def stats(self) -> Dict[str, int]:
+        with self.session_factory() as db:
+            total, cases = db.query(
+                func.count(TimelineEvent.id), func.count(func.distinct(TimelineEvent.case_id))
+            ).one()
+        return {"total_events": total, "cases_tracked": cases}
+
+    @staticmethod
+    def _bucket_expression(db, interval: str):
+        if interval not in HISTOGRAM_INTERVALS:
+            raise ValueError(f"Unknown histogram interval: {interval!r}")
+        if db.get_bind().dialect.name == "postgresql":
+            return func.date_trunc(interval, TimelineEvent.event_time)
+        return func.strftime(_SQLITE_BUCKET_FORMATS[interval], TimelineEvent.event_time)
+
+    def histogram(self, flt: TimelineFilter, interval: str, group_by: List[str]) -> List[HistogramRow]:
+        """Un único GROUP BY bucket, dimensiones sobre el rango del índice (case_id, event_time)"""
+        with self.session_factory() as db:
+            bucket = self._bucket_expression(db, interval).label("bucket")
+            dims = [
+                func.coalesce(getattr(TimelineEvent, dim), HISTOGRAM_DIMENSIONS[dim]).label(dim)
+                for dim in group_by
+            ]
+            rows = self._filtered(db, flt).with_entities(
+                bucket, *dims, func.count(TimelineEvent.id)
+            ).group_by(bucket, *dims).order_by(bucket).all()
+        return [(_bucket_iso(row[0]), tuple(row[1:-1]), row[-1]) for row in rows]
+
+    def time_range(self, flt: TimelineFilter) -> Tuple[Optional[datetime], Optional[datetime]]:
+        with self.session_factory() as db:
+            return tuple(self._filtered(db, flt).with_entities(
+                func.min(TimelineEvent.event_time), func.max(TimelineEvent.event_time)
+            ).one())
+
+
+def _bucket_iso(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat()
+    return str(value)
+
+
+def create_timeline_store() -> TimelineEventStore:
+    """Almacén según ``TIMELINE_STORE_BACKEND``: ``sql`` (defecto) o ``memory``"""
+    if settings.TIMELINE_STORE_BACKEND.lower() == "memory":
+        return InMemoryTimelineStore()
+    return SQLTimelineStore()
@@ -670,6 +670,75 @@ PUBLIC_ROUTES = [
 ]
 
 
+class RouteTrie:
+    """
+    Tablas de rutas compiladas en un trie por caracteres.
+
+    Conserva la semántica del escaneo lineal (prefijo de cadena, no de
+    segmento): la primera ruta pública de la lista que sea prefijo gana; entre
+    las protegidas gana el prefijo más largo cuyo método coincida y, a igual
+    prefijo, la que aparece antes. Cada consulta recorre sólo los caracteres
+    del path que siguen dentro del trie.
+    """
+
+    __slots__ = ("_root",)
+
+    # Nodo: [hijos, (índice, ruta pública) | None, {método: (índice, ruta)}]
+    def __init__(self, public_routes: List[str], protected_routes: List[RoutePermission]):
+        self._root = [{}, None, {}]
+        for index, prefix in enumerate(public_routes):
+            node = self._insert(prefix)
+            if node[1] is None:
+                node[1] = (index, RoutePermission(path_prefix=prefix, public=True))
+        for index, route in enumerate(protected_routes):
+            node = self._insert(route.path_prefix)
+            node[2].setdefault(route.method, (index, route))
+
+    def _insert(self, prefix: str) -> list:
+        node = self._root
+        for char in prefix:
+            node = node[0].setdefault(char, [{}, None, {}])
+        return node
+
+    def match(self, path: str, method: str = "GET") -> Optional[RoutePermission]:
+        public = None
+        protected = None
+        node = self._root
+        position = 0
+        length = len(path)
+        while True:
+            if node[1] is not None and (public is None or node[1][0] < public[0]):
+                public = node[1]
+            routes = node[2]
+            if routes:
+                exact = routes.get(method)
+                wildcard = routes.get("*")
+                if exact is not None and (wildcard is None or exact[0] < wildcard[0]):
+                    protected = exact
+                elif wildcard is not None:
+                    protected = wildcard
+            if position == length:
+                break
+            node = node[0].get(path[position])
+            if node is None:
+                break
+            position += 1
+
+        if public is not None:
+            return public[1]
+        return protected[1] if protected is not None else None
+
+
+_route_trie: Optional[RouteTrie] = None
+
+
+def compile_route_table() -> RouteTrie:
+    """Compilar PUBLIC_ROUTES / PROTECTED_ROUTES (llamar de nuevo si se modifican)"""
+    global _route_trie
+    _route_trie = RouteTrie(PUBLIC_ROUTES, PROTECTED_ROUTES)
+    return _route_trie
+
+
 def get_route_permissions(path: str, method: str = "GET") -> RoutePermission:
     """
     Obtener configuración de permisos para una ruta
@@ -681,6 +750,12 @@ def get_route_permissions(path: str, method: str = "GET") -> RoutePermission:
     Returns:
         RoutePermission o None si no está protegida
     """
+    trie = _route_trie or compile_route_table()
+    return trie.match(path, method)
+
+
+def _scan_route_permissions(path: str, method: str = "GET") -> RoutePermission:
+    """Escaneo lineal de referencia (equivalente a get_route_permissions)"""
     # Verificar rutas públicas
     for public_path in PUBLIC_ROUTES:
         if path.startswith(public_path):
@@ -724,6 +799,10 @@ def get_user_permissions(role: Role) -> Set[Permission]:
     return ROLE_PERMISSIONS.get(role, set())
 
 
+# Compilar las tablas de rutas al importar el módulo
+compile_route_table()
+
+
 # Módulos que necesitan auth_required: true (actualización pendiente en modules.json)
 MODULES_REQUIRING_AUTH_UPDATE = [
     "tenants",      # Actualmente: false -> Debe ser: true
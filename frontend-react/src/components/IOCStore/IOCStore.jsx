@@ -215,24 +215,16 @@ export default function IOCStore() {
 
   const handleExport = async (format) => {
     try {
-      const response = await api.get('/api/iocs/export', { params: { format } });
-      const data = response.data;
-      
-      if (format === 'csv') {
-        const blob = new Blob([data.content], { type: 'text/csv' });
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `iocs_export_${new Date().toISOString().slice(0,10)}.csv`;
-        a.click();
-      } else {
-        const blob = new Blob([JSON.stringify(data, null, 2)], { type: 'application/json' });
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `iocs_export_${new Date().toISOString().slice(0,10)}.json`;
-        a.click();
-      }
+      // El backend devuelve el fichero como flujo (Content-Disposition: attachment)
+      const response = await api.get('/api/iocs/export', { params: { format }, responseType: 'blob' });
+      const disposition = response.headers['content-disposition'] || '';
+      const match = disposition.match(/filename="([^"]+)"/);
+      const url = URL.createObjectURL(response.data);
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = match ? match[1] : `iocs_export_${new Date().toISOString().slice(0,10)}.${format}`;
+      a.click();
+      URL.revokeObjectURL(url);
     } catch (error) {
       console.error('Error exporting IOCs:', error);
     }
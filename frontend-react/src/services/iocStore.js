@@ -160,7 +160,8 @@ const iocStoreService = {
   },
 
   exportIOCs: async (params = {}) => {
-    const response = await api.get('/api/iocs/export', { params });
+    // Devuelve un Blob: la exportación se sirve como flujo, no como JSON
+    const response = await api.get('/api/iocs/export', { params, responseType: 'blob' });
     return response.data;
   },
 };
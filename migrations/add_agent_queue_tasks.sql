@@ -0,0 +1,33 @@
+-- Migration: Add durable AgentQueue tasks
+-- Version: v4.7.0
+-- Date: 2026-10-18
+-- Description: Persists AgentQueue tasks (durable mode) so queued and running
+--              tasks survive a restart; running tasks hold a heartbeat lease
+
+-- ============================================================================
+-- AgentQueue Tasks Table
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS agent_queue_tasks (
+    id VARCHAR(50) PRIMARY KEY,
+    handler VARCHAR(200) NOT NULL,  -- Registered task function name
+    kwargs TEXT,  -- JSON stored as TEXT
+    priority INTEGER NOT NULL,
+    agent_type VARCHAR(20) NOT NULL,
+    case_id VARCHAR(50),
+    investigation_id VARCHAR(50),
+    state VARCHAR(20) NOT NULL DEFAULT 'queued',  -- queued, running, done, failed, dead_letter, cancelled
+    attempts INTEGER DEFAULT 0,
+    max_retries INTEGER DEFAULT 3,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- Retry backoff
+    lease_owner VARCHAR(100),  -- host:pid:nonce of the worker running it
+    lease_expires_at TIMESTAMP,
+    result TEXT,  -- JSON stored as TEXT
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_agent_queue_tasks_state ON agent_queue_tasks(state);
+CREATE INDEX IF NOT EXISTS idx_agent_queue_tasks_case ON agent_queue_tasks(case_id);
+CREATE INDEX IF NOT EXISTS idx_agent_queue_tasks_lease ON agent_queue_tasks(lease_expires_at);
@@ -0,0 +1,37 @@
+-- ============================================================================
+-- Migration: Indexed IOC Search
+-- Version: v4.7.0
+-- Date: 2026-10-18
+-- Description: Substring search on ioc_items served by pg_trgm GIN indexes
+--              (value, description, context, source) and keyset pagination
+--              indexes for the recent/confidence listings.
+--              PostgreSQL only; on SQLite the FTS5 table ioc_items_fts is
+--              created at startup by api.services.ioc_search
+
+-- ============================================================================
+-- Backfill: keyset pagination skips rows with a NULL sort key
+-- ============================================================================
+UPDATE ioc_items SET created_at = COALESCE(first_seen, NOW()) WHERE created_at IS NULL;
+UPDATE ioc_items SET confidence_score = 50.0 WHERE confidence_score IS NULL;
+
+-- ============================================================================
+-- Trigram indexes
+-- ============================================================================
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ioc_items_value_trgm
+    ON ioc_items USING gin (value gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ioc_items_description_trgm
+    ON ioc_items USING gin (description gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ioc_items_context_trgm
+    ON ioc_items USING gin (context gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ioc_items_source_trgm
+    ON ioc_items USING gin (source gin_trgm_ops);
+
+-- ============================================================================
+-- Keyset pagination indexes
+-- ============================================================================
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ioc_items_created ON ioc_items (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ioc_items_confidence ON ioc_items (confidence_score, id);
+
+ANALYZE ioc_items;
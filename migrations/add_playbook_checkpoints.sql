@@ -0,0 +1,38 @@
+-- Migration: Add Playbook Execution Checkpoints
+-- Version: v4.7.0
+-- Date: 2026-10-18
+-- Description: Persists playbook execution context and per-step results so
+--              interrupted executions can be resumed after a restart
+
+-- ============================================================================
+-- Execution Checkpoints Table
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS playbook_execution_checkpoints (
+    execution_id VARCHAR(50) PRIMARY KEY,
+    context_blob BLOB,  -- Compact JSON, zstd/zlib compressed
+    codec VARCHAR(10) DEFAULT 'zlib',
+    owner VARCHAR(100),  -- host:pid:nonce of the owning worker
+    heartbeat_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    resume_count INTEGER DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (execution_id) REFERENCES playbook_executions(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_playbook_checkpoints_owner ON playbook_execution_checkpoints(owner);
+CREATE INDEX IF NOT EXISTS idx_playbook_checkpoints_heartbeat ON playbook_execution_checkpoints(heartbeat_at);
+
+-- ============================================================================
+-- Step Results Table
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS playbook_step_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    execution_id VARCHAR(50) NOT NULL,
+    step_order INTEGER NOT NULL,
+    idempotency_key VARCHAR(64) UNIQUE NOT NULL,  -- sha256(execution, order, step definition)
+    status VARCHAR(20) NOT NULL,
+    result TEXT,  -- JSON stored as TEXT
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (execution_id) REFERENCES playbook_executions(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_playbook_step_results_execution ON playbook_step_results(execution_id);
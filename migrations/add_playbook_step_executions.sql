@@ -0,0 +1,32 @@
+-- Migration: Add playbook step executions and red team security policy
+-- Version: v4.7.0
+-- Date: 2026-10-18
+-- Description: Per-step execution rows written by the SOAR engine, and the
+--              tenant / red team columns read from security_policies before
+--              running Red playbooks. is_enabled is reused as is_active.
+
+-- ============================================================================
+-- Step Executions Table
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS playbook_step_executions (
+    id VARCHAR(60) PRIMARY KEY,  -- {execution_id}-{order:02d}
+    playbook_execution_id VARCHAR(50) NOT NULL,
+    step_id VARCHAR(50),
+    step_order INTEGER NOT NULL,
+    status VARCHAR(20) DEFAULT 'running',
+    output TEXT,  -- JSON stored as TEXT
+    tool_execution_id VARCHAR(50),
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (playbook_execution_id) REFERENCES playbook_executions(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_playbook_step_executions_execution ON playbook_step_executions(playbook_execution_id);
+
+-- ============================================================================
+-- Security Policies: red team enablement per tenant
+-- ============================================================================
+ALTER TABLE security_policies ADD COLUMN tenant_id VARCHAR(50);
+ALTER TABLE security_policies ADD COLUMN redteam_enabled BOOLEAN DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_security_policies_tenant ON security_policies(tenant_id);
@@ -0,0 +1,27 @@
+-- Migration: Add playbook step graph and MAP columns
+-- Version: v4.7.0
+-- Date: 2026-10-18
+-- Description: Columns read by the SOAR engine for each playbook step:
+--              dependencies between steps (DAG), MAP fan-out and the action
+--              fields that the v4.1 playbook_steps table did not have.
+--              step_number, action_config and timeout are reused as the
+--              step order, parameters and timeout (seconds).
+
+-- ============================================================================
+-- Playbook Steps: action fields
+-- ============================================================================
+ALTER TABLE playbook_steps ADD COLUMN tool_id VARCHAR(100);
+ALTER TABLE playbook_steps ADD COLUMN api_endpoint VARCHAR(500);
+ALTER TABLE playbook_steps ADD COLUMN api_method VARCHAR(10);
+ALTER TABLE playbook_steps ADD COLUMN target_from VARCHAR(200);
+ALTER TABLE playbook_steps ADD COLUMN wait_for_completion BOOLEAN DEFAULT 1;
+ALTER TABLE playbook_steps ADD COLUMN continue_on_error BOOLEAN DEFAULT 0;
+ALTER TABLE playbook_steps ADD COLUMN requires_approval BOOLEAN DEFAULT 0;
+
+-- ============================================================================
+-- Playbook Steps: dependency graph and MAP fan-out
+-- ============================================================================
+ALTER TABLE playbook_steps ADD COLUMN depends_on TEXT;  -- JSON array of step orders; NULL = sequential
+ALTER TABLE playbook_steps ADD COLUMN map_over VARCHAR(200);  -- Context list to iterate (MAP steps)
+ALTER TABLE playbook_steps ADD COLUMN map_action TEXT;  -- JSON action template applied per item
+ALTER TABLE playbook_steps ADD COLUMN max_concurrency INTEGER;  -- Concurrent items in MAP steps
@@ -0,0 +1,21 @@
+-- Migration: Add Storage Usage Stats Index
+-- Version: v4.7.0
+-- Date: 2026-10-18
+-- Description: Incremental byte/object counters per bucket, tenant, category
+--              and case, updated on upload/delete and rebuilt by reconciliation
+
+-- ============================================================================
+-- Storage Usage Stats Table
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS storage_usage_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bucket VARCHAR(255) NOT NULL,
+    tenant_id VARCHAR(100) NOT NULL DEFAULT '',  -- '' = all tenants
+    category VARCHAR(100) NOT NULL DEFAULT '',  -- cases, scans, m365_graph...
+    group_key VARCHAR(255) NOT NULL DEFAULT '',  -- case_id, scan_type...
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    object_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_reconciled_at TIMESTAMP,  -- Only set on the bucket row
+    CONSTRAINT uq_storage_usage_scope UNIQUE (bucket, tenant_id, category, group_key)
+);
@@ -0,0 +1,20 @@
+-- ============================================================================
+-- Migration: Persistent Timeline Event Store
+-- Version: v4.7.0
+-- Date: 2026-10-18
+-- Description: timeline_events becomes the backing store of TimelineService.
+--              Composite (case_id, event_time, event_id) index for range
+--              queries and keyset pagination, plus source/type indexes
+
+-- ============================================================================
+-- Columns
+-- ============================================================================
+ALTER TABLE timeline_events ADD COLUMN correlation_ids JSON;
+
+-- ============================================================================
+-- Indexes
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS ix_timeline_events_case_time
+    ON timeline_events (case_id, event_time, event_id);
+CREATE INDEX IF NOT EXISTS ix_timeline_events_source ON timeline_events (data_source);
+CREATE INDEX IF NOT EXISTS ix_timeline_events_type ON timeline_events (event_type);
@@ -0,0 +1,331 @@
+"""
+MCP Kali Forensics - Tests for AgentQueue v4.7
+Planificador por eventos: heap (prioridad, llegada), semáforos por tipo y tareas aparcadas
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401
+from api.database import Base
+from api.models.tools import AgentQueueTaskRecord
+from api.services.agent_queue import AgentQueue, TaskStatus
+from api.services.agent_queue_store import LEASE_EXPIRED_ERROR, AgentQueueStore
+
+
+async def _drain(queue, task_ids, timeout=5):
+    deadline = time.monotonic() + timeout
+    while any(queue.tasks[task_id].status not in (TaskStatus.COMPLETED, TaskStatus.FAILED)
+              for task_id in task_ids):
+        assert time.monotonic() < deadline, queue.get_queue_stats()
+        await asyncio.sleep(0.01)
+
+
+async def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.005)
+
+
+class TestDispatch:
+    """Orden de ejecución"""
+
+    @pytest.mark.asyncio
+    async def test_strict_fifo_within_priority(self):
+        queue = AgentQueue(max_concurrent_total=1)
+        order = []
+
+        async def job(name):
+            order.append(name)
+
+        plan = [("low", "L1"), ("normal", "N1"), ("critical", "C1"), ("normal", "N2"),
+                ("low", "L2"), ("high", "H1"), ("critical", "C2"), ("normal", "N3")]
+        task_ids = [await queue.add_task(job, priority=priority, name=name) for priority, name in plan]
+        await queue.start()
+        await _drain(queue, task_ids)
+        await queue.stop()
+
+        assert order == ["C1", "C2", "H1", "N1", "N2", "N3", "L1", "L2"]
+
+    @pytest.mark.asyncio
+    async def test_blocked_type_is_parked_not_requeued(self):
+        """Un tipo lleno no bloquea a los demás ni hace girar al worker"""
+        queue = AgentQueue(max_concurrent_total=10, max_concurrent_per_type={"red": 1, "blue": 5})
+        release = asyncio.Event()
+        order = []
+
+        async def job(name, wait=False):
+            order.append(name)
+            if wait:
+                await release.wait()
+
+        await queue.start()
+        first = await queue.add_task(job, agent_type="red", priority="low", name="R1", wait=True)
+        await asyncio.sleep(0.05)
+        reds = [await queue.add_task(job, agent_type="red", priority=priority, name=name)
+                for priority, name in [("low", "R2"), ("critical", "R3"), ("low", "R4")]]
+        blue = await queue.add_task(job, agent_type="blue", priority="low", name="B1")
+        await _drain(queue, [blue])
+
+        stats = queue.get_queue_stats()
+        assert order == ["R1", "B1"]
+        assert stats["parked_by_type"] == {"red": 3}
+        assert stats["pending_by_priority"]["LOW"] == 2
+        rounds = queue.dispatch_rounds
+        await asyncio.sleep(0.2)
+        assert queue.dispatch_rounds == rounds  # aparcadas: sin vueltas extra
+
+        release.set()
+        await _drain(queue, [first, *reds])
+        await queue.stop()
+        assert order == ["R1", "B1", "R3", "R2", "R4"]
+
+    @pytest.mark.asyncio
+    async def test_global_limit_and_retries(self):
+        queue = AgentQueue(max_concurrent_total=2, retry_backoff=0.01)
+        running = peak = 0
+        attempts = []
+
+        async def job(fail_times=0):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            attempts.append(fail_times)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if attempts.count(fail_times) <= fail_times:
+                raise RuntimeError("boom")
+
+        await queue.start()
+        task_ids = [await queue.add_task(job) for _ in range(6)]
+        flaky = await queue.add_task(job, fail_times=2)
+        await _drain(queue, [*task_ids, flaky])
+        await queue.stop()
+
+        assert peak == 2
+        assert queue.tasks[flaky].status == TaskStatus.COMPLETED
+        assert queue.tasks[flaky].retries == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_queued_task_is_skipped(self):
+        queue = AgentQueue(max_concurrent_total=1)
+        order = []
+
+        async def job(name):
+            order.append(name)
+
+        first = await queue.add_task(job, name="A")
+        dropped = await queue.add_task(job, name="B")
+        last = await queue.add_task(job, name="C")
+        assert await queue.cancel_task(dropped)
+        await queue.start()
+        await _drain(queue, [first, last])
+        await queue.stop()
+
+        assert order == ["A", "C"]
+        assert queue.get_queue_stats()["pending_by_priority"]["NORMAL"] == 0
+
+
+class TestIdle:
+    """Sin sondeo: la cola ociosa no consume CPU"""
+
+    @pytest.mark.asyncio
+    async def test_zero_idle_cpu(self):
+        queue = AgentQueue()
+        await queue.start()
+        await asyncio.sleep(0.01)
+        rounds = queue.dispatch_rounds
+        cpu = time.process_time()
+        await asyncio.sleep(0.5)
+
+        assert queue.dispatch_rounds == rounds == 1
+        assert time.process_time() - cpu < 0.05
+
+        done = asyncio.Event()
+
+        async def job():
+            done.set()
+
+        await queue.add_task(job)
+        await asyncio.wait_for(done.wait(), 1)
+        await queue.stop()
+        assert queue._worker_task.done()
+
+
+@pytest.fixture
+def queue_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[AgentQueueTaskRecord.__table__])
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    def rows():
+        db = Session()
+        try:
+            found = db.query(AgentQueueTaskRecord).all()
+            db.expunge_all()
+            return {row.id: row for row in found}
+        finally:
+            db.close()
+
+    return db_context, rows
+
+
+def _durable_queue(db_context, owner, **kwargs):
+    store = AgentQueueStore(owner=owner, session_factory=db_context)
+    return AgentQueue(store=store, lease_seconds=kwargs.pop("lease_seconds", 0.3), **kwargs)
+
+
+class TestDurable:
+    """Persistencia, leases y recuperación tras una caída"""
+
+    @pytest.mark.asyncio
+    async def test_crash_mid_task_is_recovered_by_another_worker(self, queue_db):
+        db_context, rows = queue_db
+        started = asyncio.Event()
+        order = []
+
+        async def hang(name):
+            started.set()
+            await asyncio.Event().wait()
+
+        async def run(name):
+            order.append(name)
+            return {"name": name}
+
+        queue_a = _durable_queue(db_context, "worker-a", max_concurrent_total=1)
+        queue_a.register_handler("slow", hang)
+        queue_a.register_handler("fast", run)
+        await queue_a.start()
+        slow = await queue_a.add_task(hang, name="slow")
+        await asyncio.wait_for(started.wait(), 1)
+        fast = [await queue_a.add_task(run, name=name) for name in ("fast1", "fast2")]
+        transient = await queue_a.add_task(run, name="sin-persistir", callback=object())
+        assert rows()[slow].state == "running" and rows()[slow].lease_owner == "worker-a"
+        assert transient not in rows()  # argumentos no serializables: sólo en memoria
+
+        # Caída: el proceso muere sin cerrar nada (ni latido ni estado en BD)
+        for task in [queue_a._worker_task, queue_a._heartbeat_task, *queue_a.running_tasks.values()]:
+            task.cancel()
+        await asyncio.sleep(0.05)
+        assert rows()[slow].state == "running"
+
+        # Lease vigente: otro worker no la toca
+        store_b = AgentQueueStore(owner="worker-b", session_factory=db_context)
+        assert [record["id"] for record in store_b.recover()] == fast
+
+        await asyncio.sleep(0.35)
+        queue_b = _durable_queue(db_context, "worker-b", max_concurrent_total=1)
+        queue_b.register_handler("slow", run)
+        queue_b.register_handler("fast", run)
+        await queue_b.start()
+        await _drain(queue_b, [slow, *fast])
+        await queue_b.stop()
+
+        assert order == ["slow", "fast1", "fast2"]
+        final = rows()
+        assert {final[task_id].state for task_id in [slow, *fast]} == {"done"}
+        assert final[slow].attempts == 2 and final[slow].last_error == LEASE_EXPIRED_ERROR
+        assert final[slow].result == {"name": "slow"} and final[slow].lease_owner is None
+        assert not queue_a.store.complete(slow, None)  # el lease ya no es de worker-a
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_swept_without_restart(self, queue_db):
+        """Un worker ya arrancado recoge la tarea en cuanto vence el lease del caído"""
+        db_context, rows = queue_db
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.Event().wait()
+
+        async def run():
+            return "ok"
+
+        queue_a = _durable_queue(db_context, "worker-a")
+        queue_a.register_handler("job", hang)
+        await queue_a.start()
+        task_id = await queue_a.add_task(hang)
+        await asyncio.wait_for(started.wait(), 1)
+        for task in [queue_a._worker_task, queue_a._heartbeat_task, *queue_a.running_tasks.values()]:
+            task.cancel()
+
+        # B arranca con el lease de A aún vigente: no la recupera al arrancar
+        queue_b = _durable_queue(db_context, "worker-b")
+        queue_b.register_handler("job", run)
+        await queue_b.start()
+        assert task_id not in queue_b.tasks
+
+        lease_expires_at = rows()[task_id].lease_expires_at
+        await _wait_for(lambda: task_id in queue_b.tasks, timeout=1)
+        await _drain(queue_b, [task_id])
+        await queue_b.stop()
+
+        assert datetime.utcnow() - lease_expires_at < timedelta(seconds=0.5)
+        row = rows()[task_id]
+        assert row.state == "done" and row.attempts == 2 and row.last_error == LEASE_EXPIRED_ERROR
+
+    @pytest.mark.asyncio
+    async def test_exponential_backoff_then_dead_letter(self, queue_db):
+        db_context, rows = queue_db
+        queue = _durable_queue(db_context, "worker-a", retry_backoff=0.05, retry_backoff_max=0.08)
+        attempts = []
+
+        async def broken():
+            attempts.append(time.monotonic())
+            raise RuntimeError("boom")
+
+        queue.register_handler("broken", broken)
+        await queue.start()
+        task_id = await queue.add_task(broken)
+        await _wait_for(lambda: queue.tasks[task_id].status == TaskStatus.RETRYING)
+        row = rows()[task_id]
+        assert row.state == "failed" and row.available_at > datetime.utcnow()
+        await _drain(queue, [task_id])
+        await queue.stop()
+
+        assert [queue.retry_delay(n) for n in (1, 2, 3)] == [0.05, 0.08, 0.08]
+        gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+        assert len(attempts) == 3 and gaps[0] >= 0.05 and gaps[1] >= 0.08
+        assert queue.tasks[task_id].status == TaskStatus.FAILED
+        row = rows()[task_id]
+        assert row.state == "dead_letter" and row.attempts == 3 and row.last_error == "boom"
+        assert AgentQueueStore(session_factory=db_context).recover() == []
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_extends_lease(self, queue_db):
+        db_context, rows = queue_db
+        queue = _durable_queue(db_context, "worker-a", lease_seconds=0.3)
+
+        async def long_job():
+            await asyncio.sleep(0.6)
+
+        queue.register_handler("long", long_job)
+        await queue.start()
+        task_id = await queue.add_task(long_job)
+        await asyncio.sleep(0.05)
+        first = rows()[task_id].lease_expires_at
+        await asyncio.sleep(0.4)
+        renewed = rows()[task_id].lease_expires_at
+        assert renewed > first and renewed > datetime.utcnow()
+        assert AgentQueueStore(owner="worker-b", session_factory=db_context).recover() == []
+
+        await _drain(queue, [task_id])
+        await queue.stop()
+        row = rows()[task_id]
+        assert row.state == "done" and row.attempts == 1 and row.lease_expires_at is None
@@ -265,6 +265,196 @@ def test_yara_scan_performance():
     print(f"\n✅ YARA scan: {result['mean_ms']/1000:.2f}s")
 
 
+# =============================================================================
+# IOC Extraction Benchmarks
+# =============================================================================
+
+def test_ioc_extractor_throughput():
+    """Benchmark: IOC extractor throughput (MB/s) over synthetic tool output"""
+    from api.services.ioc_extractor import ioc_extractor
+    
+    benchmark = PerformanceBenchmark()
+    
+    ioc_line = (
+        "2024-01-01T00:00:00Z sshd[123]: Failed password from 45.33.{a}.{b} "
+        "host=web{a}.corp.example.com url=hxxp://bad{b}[.]ru/p.php md5={h:032x}\n"
+    )
+    filler = "Jan 01 00:00:00 kernel: usb 1-1: new high-speed USB device number 2 status ok\n"
+    text = "".join(
+        ioc_line.format(a=i % 256, b=(i * 7) % 256, h=i) if i % 10 == 0 else filler
+        for i in range(50000)
+    )
+    size_mb = len(text.encode()) / (1024 * 1024)
+    chunks = [text[i:i + 1024 * 1024] for i in range(0, len(text), 1024 * 1024)]
+    
+    result = benchmark.measure(
+        "IOC: extract_stream", lambda: ioc_extractor.extract_stream(chunks), iterations=3
+    )
+    throughput = size_mb / (result["mean_ms"] / 1000)
+    
+    assert len(ioc_extractor.extract_stream(chunks)) > 100
+    
+    print(f"\n✅ IOC extraction: {throughput:.1f} MB/s over {size_mb:.1f} MB")
+
+
+def test_ioc_matcher_throughput():
+    """Benchmark: IOC matcher events/sec over a synthetic sign-in log stream"""
+    from api.services.ioc_matcher import IocIndex, IocRef
+    
+    benchmark = PerformanceBenchmark()
+    
+    iocs = (
+        [IocRef(f"H{i}", "hash_sha256", f"{i:064x}", "high", None) for i in range(20000)]
+        + [IocRef(f"I{i}", "ip", f"45.{i // 250}.{i % 250}.7", "high", None) for i in range(5000)]
+        + [IocRef(f"C{i}", "ip", f"100.{i % 200}.0.0/16", "medium", None) for i in range(500)]
+        + [IocRef(f"D{i}", "domain", f"bad{i}.ru", "high", None) for i in range(5000)]
+        + [IocRef(f"U{i}", "url", f"http://evil{i}.top/p.php", "high", None) for i in range(3000)]
+        + [IocRef(f"A{i}", "user_agent", f"python-requests/2.{i}", "low", None) for i in range(200)]
+    )
+    user_agents = [
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Microsoft Office/16.0",
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X)",
+    ]
+    events = [
+        {
+            "timestamp": f"2024-06-01T10:{i // 6000 % 60:02d}:{i // 100 % 60:02d}.{i % 1000:03d}Z",
+            "event_type": "login_success",
+            "source_ip": f"81.2.{i % 250}.{i % 211}",
+            "username": f"user{i % 5000}@corp.com",
+            "user_agent": user_agents[i % 3],
+            "app": "Office 365",
+            "geo_country": "ES",
+            "status": "success",
+        }
+        for i in range(100000)
+    ]
+    events[5]["source_ip"] = "45.0.5.7"
+    events[7]["source_ip"] = "100.3.4.5"
+    events[9]["user_agent"] = "python-requests/2.31.0"
+    
+    def run():
+        index = IocIndex(iocs)  # caché de valores vacía en cada iteración
+        started = time.perf_counter()
+        matched = sum(len(index.match_event(event)) for event in events)
+        run.elapsed.append(time.perf_counter() - started)
+        assert matched == 6
+    
+    run.elapsed = []
+    benchmark.measure("IOC: match_event", run, iterations=3)
+    events_per_second = len(events) / statistics.median(run.elapsed)
+    
+    # SLA: >= 100k eventos/s
+    assert events_per_second >= 100000, f"IOC matcher too slow: {events_per_second:.0f} events/s"
+    
+    print(f"\n✅ IOC matcher: {events_per_second:,.0f} events/s against {len(iocs)} IOCs")
+
+
+def test_ioc_scan_throughput():
+    """Benchmark: bulk IOC scan MB/s and peak memory over a generated log file"""
+    import tracemalloc
+    from api.services.ioc_matcher import IocIndex, IocRef
+    from api.services.ioc_scan import scan_chunks
+    
+    index = IocIndex(
+        [IocRef(f"H{i}", "hash_md5", f"{i:032x}", "high", None) for i in range(20000)]
+        + [IocRef(f"I{i}", "ip", f"45.{i // 250}.{i % 250}.7", "high", None) for i in range(5000)]
+        + [IocRef(f"D{i}", "domain", f"bad{i}.ru", "high", None) for i in range(5000)]
+        + [IocRef(f"U{i}", "url", f"http://evil{i}.top/p.php", "high", None) for i in range(3000)]
+    )
+    block = "".join(
+        f"2024-06-01T10:00:{i % 60:02d}Z fw01 ALLOW tcp 81.2.{i % 250}.{i % 211}:51{i % 100:03d} -> "
+        f"10.0.{i % 200}.4:443 bytes={i * 7} host=cdn{i % 97}.example.com user=user{i % 5000}@corp.com\n"
+        for i in range(10000)
+    ).encode()
+    
+    def chunks(size_mb):
+        # Generado al vuelo: el archivo completo nunca está en memoria
+        yield b"2024-06-01 fw01 DENY tcp 45.0.5.7 -> bad42.ru md5=" + b"%032x" % 77 + b"\n"
+        for _ in range(size_mb * 1048576 // len(block)):
+            yield block
+    
+    def run():
+        report = scan_chunks(chunks(64), index, "fw.log")
+        run.reports.append(report)
+        assert report.per_ioc == {"I5": 1, "D42": 1, "H77": 1}
+    
+    def peak_memory(size_mb):
+        tracemalloc.start()
+        scan_chunks(chunks(size_mb), index, "fw.log")
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    
+    run.reports = []
+    benchmark = PerformanceBenchmark()
+    benchmark.measure("IOC: scan file", run, iterations=1)
+    report = run.reports[-1]
+    small, large = peak_memory(2), peak_memory(8)
+    
+    # SLA: >= 10 MB/s, memoria acotada por bloque + línea (no crece con el archivo)
+    assert report.throughput_mb_s >= 10, f"IOC scan too slow: {report.throughput_mb_s} MB/s"
+    assert large < 1.5 * small, f"IOC scan memory grew with file size: {small} -> {large} bytes"
+    
+    print(f"\n✅ IOC scan: {report.throughput_mb_s} MB/s over {report.bytes_scanned / 1048576:.0f} MB, "
+          f"peak {large / 1048576:.1f} MB")
+
+
+# =============================================================================
+# RBAC Benchmarks
+# =============================================================================
+
+@pytest.mark.asyncio
+async def test_rbac_middleware_overhead(monkeypatch):
+    """Benchmark: RBAC per-request overhead (route lookup + bearer validation)"""
+    import jwt
+    from unittest.mock import Mock
+    from api.config import settings
+    from api.middleware import rbac
+    from core.rbac_config import get_route_permissions, _scan_route_permissions
+    
+    benchmark = PerformanceBenchmark()
+    requests_per_run = 2000
+    
+    token = jwt.encode(
+        {"sub": "bench", "roles": ["analyst"], "exp": int(time.time()) + 3600},
+        settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+    paths = [
+        ("/api/iocs/IOC-2024-001", "GET"),
+        ("/forensics/case/CASE-2024-001/evidence", "POST"),
+        ("/active-investigation/execute", "POST"),
+        ("/timeline/CASE-2024-001", "GET"),
+        ("/api/v1/unknown/route", "GET"),
+    ]
+    middleware = rbac.RBACMiddleware(app=Mock())
+    
+    async def run(lookup):
+        for i in range(requests_per_run):
+            path, method = paths[i % len(paths)]
+            lookup(path, method)
+            await middleware._validate_bearer_token(token)
+    
+    # Antes: escaneo lineal de rutas y JWT decodificado en cada petición
+    monkeypatch.setattr(rbac, "token_cache", rbac.TokenClaimsCache(max_size=0))
+    before = await benchmark.measure_async(
+        "RBAC: linear scan + JWT decode", lambda: run(_scan_route_permissions), iterations=5
+    )
+    
+    # Después: trie compilado y claims cacheados
+    monkeypatch.setattr(rbac, "token_cache", rbac.TokenClaimsCache())
+    after = await benchmark.measure_async(
+        "RBAC: route trie + token cache", lambda: run(get_route_permissions), iterations=5
+    )
+    
+    before_us = before["mean_ms"] * 1000 / requests_per_run
+    after_us = after["mean_ms"] * 1000 / requests_per_run
+    assert after["mean_ms"] < before["mean_ms"]
+    
+    print(f"\n✅ RBAC overhead: {before_us:.1f}µs -> {after_us:.1f}µs per request")
+
+
 # =============================================================================
 # WebSocket Benchmarks
 # =============================================================================
@@ -0,0 +1,124 @@
+"""
+MCP Kali Forensics - Tests for streaming evidence upload v4.7
+Tests de subida por chunks con hash en una sola pasada
+"""
+
+import hashlib
+import os
+import tracemalloc
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import UploadFile
+
+import api.services.evidence_service as evidence_module
+from api.database import Base
+from api.models.evidence_management import EvidenceSource, ExternalEvidence
+from api.services.evidence_service import EvidenceService, EvidenceTooLargeError
+
+MB = 1024 * 1024
+
+
+def _sample_file(path, size_mb):
+    """Archivo con contenido no trivial, escrito por bloques"""
+    block = os.urandom(MB)
+    with open(path, "wb") as f:
+        for i in range(size_mb):
+            f.write(block[i:] + block[:i])
+    return path
+
+
+def _expected_hashes(path):
+    md5, sha1, sha256 = hashlib.md5(), hashlib.sha1(), hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(MB):
+            md5.update(chunk)
+            sha1.update(chunk)
+            sha256.update(chunk)
+    return {"md5": md5.hexdigest(), "sha1": sha1.hexdigest(), "sha256": sha256.hexdigest()}
+
+
+class TestStreamToFile:
+    """Tests de escritura en streaming"""
+
+    @pytest.mark.asyncio
+    async def test_hashes_match_and_memory_bounded(self, tmp_path):
+        """64 MB se escriben con hashes correctos sin cargar el archivo en memoria"""
+        source = _sample_file(tmp_path / "disk.raw", 64)
+        destination = tmp_path / "case" / "disk.raw"
+        destination.parent.mkdir()
+
+        with open(source, "rb") as f:
+            upload = UploadFile(file=f, filename="disk.raw")
+            tracemalloc.start()
+            size, hashes = await EvidenceService.stream_to_file(upload, destination, chunk_size=2 * MB)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        assert size == 64 * MB
+        assert hashes == _expected_hashes(source)
+        assert destination.read_bytes()[:MB] == source.read_bytes()[:MB]
+        assert peak < 16 * MB
+        assert os.listdir(destination.parent) == ["disk.raw"]
+
+    @pytest.mark.asyncio
+    async def test_max_size_aborts_without_leftovers(self, tmp_path):
+        """Superar el límite aborta y no deja archivo final ni temporal"""
+        source = _sample_file(tmp_path / "big.bin", 4)
+        destination = tmp_path / "case" / "big.bin"
+        destination.parent.mkdir()
+
+        with open(source, "rb") as f:
+            with pytest.raises(EvidenceTooLargeError):
+                await EvidenceService.stream_to_file(
+                    UploadFile(file=f, filename="big.bin"), destination,
+                    chunk_size=MB, max_bytes=3 * MB
+                )
+
+        assert os.listdir(destination.parent) == []
+
+
+class TestUploadEvidence:
+    """Tests del flujo completo con BD"""
+
+    @pytest.fixture
+    def db(self, tmp_path, monkeypatch):
+        engine = create_engine(f"sqlite:///{tmp_path / 'evidence.db'}")
+        Base.metadata.create_all(engine, tables=[EvidenceSource.__table__, ExternalEvidence.__table__])
+        monkeypatch.setattr(evidence_module, "EVIDENCE_STORAGE", tmp_path / "external")
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+
+    @pytest.mark.asyncio
+    async def test_upload_records_single_pass_hashes(self, db, tmp_path):
+        """El registro guarda tamaño y los tres hashes calculados al subir"""
+        source = _sample_file(tmp_path / "mem.dmp", 3)
+        with open(source, "rb") as f:
+            evidence = await EvidenceService.upload_evidence(
+                db, UploadFile(file=f, filename="../mem.dmp"), "Memory dump", "memory_dump"
+            )
+
+        expected = _expected_hashes(source)
+        assert evidence.file_size == 3 * MB
+        assert evidence.file_hash_md5 == expected["md5"]
+        assert evidence.file_hash_sha1 == expected["sha1"]
+        assert evidence.file_hash_sha256 == expected["sha256"]
+        # El nombre se limita al basename dentro de la carpeta de la evidencia
+        assert os.path.dirname(evidence.file_path) == str(tmp_path / "external" / evidence.id)
+        assert EvidenceService.calculate_file_hashes(evidence.file_path) == expected
+
+    @pytest.mark.asyncio
+    async def test_oversized_upload_rejected(self, db, tmp_path, monkeypatch):
+        """Con EVIDENCE_MAX_UPLOAD_BYTES se rechaza y se limpia la carpeta"""
+        monkeypatch.setattr(evidence_module.settings, "EVIDENCE_MAX_UPLOAD_BYTES", MB)
+        source = _sample_file(tmp_path / "image.e01", 2)
+        with open(source, "rb") as f:
+            with pytest.raises(EvidenceTooLargeError):
+                await EvidenceService.upload_evidence(
+                    db, UploadFile(file=f, filename="image.e01"), "Image", "disk_image"
+                )
+
+        assert list((tmp_path / "external").iterdir()) == []
+        assert db.query(ExternalEvidence).count() == 0
@@ -0,0 +1,132 @@
+"""
+MCP Kali Forensics - Tests for Threat Hunting Batch v4.7
+Batches concurrentes con límite y timeout por hunt, cache LRU con TTL de resultados
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routes import hunting as hunting_routes
+from api.services.hunting import HuntResultCache, ThreatHuntingService
+from core import process_manager
+
+QUERY_IDS = ["suspicious_sign_ins", "suspicious_mailbox_rules", "mass_download", "oauth_consent_grants"]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """Servicio con fuentes simuladas instrumentadas y sin LLM"""
+    service = ThreatHuntingService(results_cache=HuntResultCache(max_size=16, ttl=60))
+    service.calls = []
+    service.running = service.peak = 0
+    service.delays = {}
+
+    async def execute_kql(query, tenant_id, time_range):
+        service.calls.append((query["name"], time_range))
+        service.running += 1
+        service.peak = max(service.peak, service.running)
+        try:
+            await asyncio.sleep(service.delays.get(query["category"], 0.1))
+        finally:
+            service.running -= 1
+        return [{"category": query["category"]}]
+
+    async def no_llm(query, results, case_id):
+        return None
+
+    monkeypatch.setattr(service, "_execute_kql_hunt", execute_kql)
+    monkeypatch.setattr(service, "_analyze_with_llm", no_llm)
+    return service
+
+
+class TestBatchExecute:
+    """Ejecución concurrente"""
+
+    @pytest.mark.asyncio
+    async def test_runs_concurrently_up_to_limit(self, service):
+        started = time.perf_counter()
+        batch = await service.batch_execute(QUERY_IDS, case_id="CASE-1", max_concurrency=2)
+        elapsed = time.perf_counter() - started
+
+        assert service.peak == 2
+        assert elapsed < 0.35  # en serie serían 0.4s
+        assert batch["successful"] == 4 and batch["failed"] == 0
+        assert [r["query_id"] for r in batch["results"]] == QUERY_IDS  # orden de entrada
+        assert batch["max_concurrency"] == 2
+
+    @pytest.mark.asyncio
+    async def test_per_hunt_timeout(self, service):
+        service.delays["exfiltration"] = 5
+        batch = await service.batch_execute(QUERY_IDS, case_id="CASE-TIMEOUT", hunt_timeout=0.3)
+
+        assert batch["successful"] == 3
+        assert batch["errors"] == [{"query_id": "mass_download", "error": "Timeout after 0.3s"}]
+        hung = [p for p in process_manager.get_case_processes("CASE-TIMEOUT")
+                if p.name == "Hunt: Descarga masiva de archivos"]
+        assert [p.status.value for p in hung] == ["failed"]
+
+    @pytest.mark.asyncio
+    async def test_repeated_batch_is_served_from_cache(self, service):
+        first = await service.batch_execute(QUERY_IDS, case_id="CASE-1")
+        second = await service.batch_execute(QUERY_IDS, case_id="CASE-1")
+        other_range = await service.batch_execute(QUERY_IDS[:1], case_id="CASE-1", time_range="30d")
+        other_case = await service.batch_execute(QUERY_IDS[:1], case_id="CASE-2")
+
+        assert first["cached"] == 0 and second["cached"] == 4
+        assert [r["result_id"] for r in second["results"]] == [r["result_id"] for r in first["results"]]
+        assert other_range["cached"] == other_case["cached"] == 0
+        assert len(service.calls) == 6
+        assert service.results_cache.stats()["hits"] == 4
+        assert len(await service.get_case_results("CASE-1")) == 5
+
+
+class TestResultCache:
+    """LRU acotada por tamaño y TTL"""
+
+    def _result(self, result_id, case_id="CASE-1"):
+        return {"result_id": result_id, "case_id": case_id}
+
+    def test_lru_eviction_and_index_by_id(self):
+        cache = HuntResultCache(max_size=2, ttl=60)
+        keys = [cache.key({"query": f"q{i}"}, "CASE-1", "7d") for i in range(3)]
+        cache.put(keys[0], self._result("r0"))
+        cache.put(keys[1], self._result("r1"))
+        assert cache.get(keys[0])["result_id"] == "r0"  # r0 pasa a ser el más reciente
+        cache.put(keys[2], self._result("r2"))
+
+        assert cache.get(keys[1]) is None and cache.get_by_id("r1") is None
+        assert cache.get_by_id("r0") and cache.get_by_id("r2")
+        assert cache.key({"query": "q0"}, "CASE-1", "7d", parameters={"a": 1}) != keys[0]
+        assert cache.stats() == {
+            "entries": 2, "max_size": 2, "ttl": 60, "hits": 1, "misses": 1,
+            "hit_rate": 0.5, "evictions": 1, "expirations": 0,
+        }
+
+    def test_ttl_expiry(self):
+        cache = HuntResultCache(max_size=10, ttl=0.05)
+        key = cache.key({"query": "q"}, "CASE-1", "7d")
+        cache.put(key, self._result("r0"))
+        assert cache.values() == [self._result("r0")]
+        time.sleep(0.06)
+
+        assert cache.values() == [] and cache.get(key) is None and cache.get_by_id("r0") is None
+        assert cache.stats()["expirations"] == 1 and len(cache) == 0
+
+
+class TestCacheStatsRoute:
+    """GET /hunting/cache/stats"""
+
+    def test_stats_endpoint(self, service, monkeypatch):
+        monkeypatch.setattr(hunting_routes, "hunting_service", service)
+        asyncio.run(service.batch_execute(QUERY_IDS[:2] * 2, case_id="CASE-1", max_concurrency=1))
+
+        app = FastAPI()
+        app.include_router(hunting_routes.router, prefix="/hunting")
+        body = TestClient(app).get("/hunting/cache/stats").json()
+
+        assert body["hits"] == 2 and body["misses"] == 2
+        assert body["entries"] == 2 and body["evictions"] == 0
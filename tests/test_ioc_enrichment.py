@@ -0,0 +1,161 @@
+"""
+MCP Kali Forensics - Tests for Concurrent IOC Enrichment v4.7
+Fuentes consultadas en paralelo con timeout por fuente y plazo global
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401
+from api.database import Base, get_db
+from api.models.ioc import IocEnrichment, IocItem
+from api.routes import ioc_store
+from api.services import ioc_enrichment
+from api.services.ioc_enrichment import EnrichmentProvider, apply_confidence, enrich_concurrently
+
+
+class FakeProvider(EnrichmentProvider):
+    """Proveedor local con latencia inyectada"""
+
+    def __init__(self, name, delay=0.0, data=None, error=None, ioc_types=None, boost=0):
+        self.name = name
+        self.delay = delay
+        self.data = data or {"source": name}
+        self.error = error
+        self.ioc_types = ioc_types
+        self.boost = boost
+        self.calls = 0
+
+    async def fetch(self, ioc_type, value):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        return dict(self.data)
+
+    def adjust_confidence(self, confidence, data):
+        return min(95, confidence + self.boost)
+
+
+def _providers(*providers):
+    return {provider.name: provider for provider in providers}
+
+
+class TestEnrichConcurrently:
+    """Fan-out de fuentes"""
+
+    @pytest.mark.asyncio
+    async def test_sources_run_in_parallel(self):
+        """El tiempo total es el de la fuente más lenta, no la suma"""
+        providers = _providers(*(FakeProvider(f"src{i}", delay=0.2) for i in range(5)))
+        started = time.perf_counter()
+        results = await enrich_concurrently("ip", "10.0.0.1", list(providers), providers=providers,
+                                            source_timeout=2, deadline=5)
+        elapsed = time.perf_counter() - started
+
+        assert elapsed < 0.6
+        assert list(results) == [f"src{i}" for i in range(5)]
+        assert all(result.status == "success" for result in results.values())
+
+    @pytest.mark.asyncio
+    async def test_source_timeout_only_marks_that_source(self):
+        providers = _providers(
+            FakeProvider("fast", delay=0.01),
+            FakeProvider("slow", delay=5),
+            FakeProvider("broken", error="HTTP 500"),
+            FakeProvider("emails", ioc_types={"email"}),
+        )
+        results = await enrich_concurrently("ip", "10.0.0.1", ["fast", "slow", "broken", "emails", "nope"],
+                                            providers=providers, source_timeout=0.1, deadline=5)
+
+        assert {source: result.status for source, result in results.items()} == {
+            "fast": "success", "slow": "timeout", "broken": "error", "emails": "skipped", "nope": "error",
+        }
+        assert results["broken"].error == "HTTP 500"
+        assert providers["emails"].calls == 0
+        assert results["emails"].as_response()["skipped"] is True
+
+    @pytest.mark.asyncio
+    async def test_global_deadline_returns_partial_results(self):
+        providers = _providers(FakeProvider("fast", delay=0.01), FakeProvider("slow", delay=5))
+        started = time.perf_counter()
+        results = await enrich_concurrently("ip", "10.0.0.1", ["slow", "fast"], providers=providers,
+                                            source_timeout=10, deadline=0.2)
+
+        assert time.perf_counter() - started < 1
+        assert results["fast"].status == "success"
+        assert results["slow"].status == "timeout"
+        assert "deadline" in results["slow"].error
+
+    @pytest.mark.asyncio
+    async def test_aliases_and_confidence_order(self):
+        """El ajuste sigue el orden pedido aunque las fuentes terminen en otro orden"""
+        providers = _providers(
+            FakeProvider("fullcontact_person", delay=0.05, boost=10),
+            FakeProvider("late", delay=0.1, boost=30),
+        )
+        results = await enrich_concurrently("ip", "10.0.0.1", ["fullcontact", "late", "fullcontact_person"],
+                                            providers=providers, source_timeout=1, deadline=2)
+
+        assert list(results) == ["fullcontact_person", "late"]
+        assert apply_confidence(50.0, results, providers=providers) == {"fullcontact_person": 60.0, "late": 90.0}
+
+
+class TestEnrichRoute:
+    """POST /api/iocs/{id}/enrich"""
+
+    def test_rows_written_in_one_transaction(self, tmp_path, monkeypatch):
+        engine = create_engine(f"sqlite:///{tmp_path / 'enrich.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(engine, tables=[IocItem.__table__, IocEnrichment.__table__])
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            db.add(IocItem(id="IOC-ENR-1", value="10.9.9.9", ioc_type="ip", confidence_score=50.0))
+            db.commit()
+
+        providers = _providers(
+            FakeProvider("virustotal", delay=0.05, data={"malicious": 12, "harmless": 3}, boost=20),
+            FakeProvider("abuseipdb", delay=0.05, boost=15),
+            FakeProvider("shodan", delay=5),
+        )
+        monkeypatch.setattr(ioc_enrichment, "ENRICHMENT_PROVIDERS", providers)
+        monkeypatch.setattr(ioc_enrichment.settings, "IOC_ENRICH_SOURCE_TIMEOUT", 0.2)
+
+        app = FastAPI()
+        app.include_router(ioc_store.router)
+
+        def override_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_db
+        commits = []
+        event.listen(engine, "commit", lambda conn: commits.append(conn))
+
+        response = TestClient(app).post(
+            "/api/iocs/IOC-ENR-1/enrich", params={"sources": ["virustotal", "abuseipdb", "shodan"]}
+        )
+        body = response.json()
+
+        assert response.status_code == 200
+        assert body["partial"] is True
+        assert body["sources_status"] == {"virustotal": "success", "abuseipdb": "success", "shodan": "timeout"}
+        assert body["new_confidence_score"] == 85.0
+        assert len(commits) == 1
+
+        with Session() as db:
+            rows = {row.source: row for row in db.query(IocEnrichment).all()}
+            assert set(rows) == {"virustotal", "abuseipdb", "shodan"}
+            assert (rows["virustotal"].malicious_count, rows["virustotal"].reputation_score) == (12, 70.0)
+            assert rows["shodan"].status == "timeout" and rows["shodan"].error_message
+            ioc = db.get(IocItem, "IOC-ENR-1")
+            assert ioc.confidence_score == 85.0
+            assert set(ioc.enrichment_data) == {"virustotal", "abuseipdb", "shodan"}
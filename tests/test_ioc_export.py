@@ -0,0 +1,211 @@
+"""
+MCP Kali Forensics - Tests for IOC Streaming Export v4.7
+Exportación CSV/NDJSON/JSON/STIX 2.1/MISP en flujo, con gzip y memoria constante
+"""
+
+import csv
+import gzip
+import io
+import json
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401
+import api.routes.ioc_store as ioc_store
+from api.database import Base
+from api.models.ioc import IocItem, IocItemTag, IocTag
+from api.services import ioc_export
+from api.services.ioc_export import stix_pattern, stream_export
+from api.services.ioc_search import IocSearchFilter
+
+T0 = datetime(2024, 7, 1, 9, 30, 0)
+TYPES = ["ip", "domain", "url", "hash_sha256", "mutex"]
+
+
+@pytest.fixture
+def export_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(
+        engine, tables=[IocItem.__table__, IocTag.__table__, IocItemTag.__table__]
+    )
+    return engine
+
+
+def _session_factory(engine):
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    return db_context
+
+
+def _seed(engine, n, start=0):
+    rows = [
+        {
+            "id": f"IOC-{i:06d}",
+            "value": f"10.2.{i // 250}.{i % 250}" if i % 5 == 0 else f"o'evil-{i}.example",
+            "ioc_type": TYPES[i % 5],
+            "threat_level": ["high", "low"][i % 2],
+            "confidence_score": 80.0,
+            "status": "active",
+            "source": "threat_intel",
+            "description": f"row {i}, \"quoted\"",
+            "created_at": T0 + timedelta(seconds=i),
+            "first_seen": T0,
+            "updated_at": T0,
+        }
+        for i in range(start, start + n)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(IocItem), rows)
+
+
+def _export(engine, fmt, compress=False, **filters):
+    data = b"".join(stream_export(
+        fmt, IocSearchFilter(**filters), compress=compress,
+        session_factory=_session_factory(engine), yield_per=100,
+    ))
+    return gzip.decompress(data) if compress else data
+
+
+class TestExportFormats:
+    """Cada formato es un documento válido y completo"""
+
+    def test_csv(self, export_engine):
+        _seed(export_engine, 250)
+        rows = list(csv.reader(io.StringIO(_export(export_engine, "csv").decode())))
+        assert rows[0][:3] == ["id", "value", "type"]
+        assert len(rows) == 251
+        assert rows[2][7] == 'row 1, "quoted"'
+
+    def test_ndjson_and_json(self, export_engine):
+        _seed(export_engine, 250)
+        lines = _export(export_engine, "ndjson", ioc_types=["ip"]).decode().splitlines()
+        assert len(lines) == 50
+        assert json.loads(lines[0])["value"] == "10.2.0.0"
+
+        document = json.loads(_export(export_engine, "json"))
+        assert document["count"] == 250
+        assert [item["id"] for item in document["items"][:2]] == ["IOC-000000", "IOC-000001"]
+
+    def test_stix_bundle(self, export_engine):
+        _seed(export_engine, 10)
+        bundle = json.loads(_export(export_engine, "stix"))
+        assert bundle["type"] == "bundle"
+        assert len(bundle["objects"]) == 10
+
+        indicator = bundle["objects"][1]
+        assert indicator["spec_version"] == "2.1"
+        assert indicator["id"].startswith("indicator--") and len(indicator["id"]) == len("indicator--") + 36
+        assert indicator["pattern"] == "[domain-name:value = 'o\\'evil-1.example']"
+        assert indicator["created"] == "2024-07-01T09:30:01.000Z"
+        assert indicator["confidence"] == 80
+
+    def test_stix_patterns(self):
+        assert stix_pattern("ip", "10.0.0.1") == "[ipv4-addr:value = '10.0.0.1']"
+        assert stix_pattern("ip", "2001:db8::1") == "[ipv6-addr:value = '2001:db8::1']"
+        assert stix_pattern("hash_sha256", "ab") == "[file:hashes.'SHA-256' = 'ab']"
+        assert stix_pattern("user_agent", "x\\y") == "[x-mcp-user-agent:value = 'x\\\\y']"
+
+    def test_misp_event(self, export_engine):
+        _seed(export_engine, 10)
+        event_doc = json.loads(_export(export_engine, "misp"))["Event"]
+        assert event_doc["info"].startswith("IOC Export")
+        attributes = event_doc["Attribute"]
+        assert len(attributes) == 10
+        assert (attributes[0]["type"], attributes[0]["category"]) == ("ip-dst", "Network activity")
+        assert attributes[4]["type"] == "mutex"
+
+    def test_empty_export(self, export_engine):
+        assert json.loads(_export(export_engine, "stix"))["objects"] == []
+        assert json.loads(_export(export_engine, "json")) == {"format": "json", "items": [], "count": 0}
+        assert _export(export_engine, "csv").decode().strip().startswith("id,value")
+
+
+class TestStreaming:
+    """Flujo incremental, gzip y memoria constante"""
+
+    def test_gzip_roundtrip(self, export_engine):
+        _seed(export_engine, 500)
+        plain = _export(export_engine, "ndjson")
+        assert _export(export_engine, "ndjson", compress=True) == plain
+
+    def test_rows_read_in_batches(self, export_engine, monkeypatch):
+        """El primer bloque sale antes de leer toda la tabla"""
+        _seed(export_engine, 1000)
+        selects = []
+
+        @event.listens_for(export_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            selects.append(statement)
+
+        monkeypatch.setattr(ioc_export.settings, "IOC_EXPORT_CHUNK_BYTES", 1024)
+        chunks = stream_export("ndjson", IocSearchFilter(),
+                               session_factory=_session_factory(export_engine), yield_per=50)
+        first = next(chunks)
+        chunks.close()
+
+        assert len(first) < 5000
+        assert len(selects) == 1
+        assert "LIMIT" not in selects[0].upper()
+
+    def test_constant_memory(self, export_engine):
+        """El pico de memoria no crece con el número de filas"""
+        def peak():
+            tracemalloc.start()
+            for _ in stream_export("stix", IocSearchFilter(),
+                                   session_factory=_session_factory(export_engine), yield_per=200):
+                pass
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak_bytes
+
+        _seed(export_engine, 1000)
+        small = peak()
+        _seed(export_engine, 7000, start=1000)
+        large = peak()
+
+        assert large < small * 1.5
+
+
+class TestExportRoute:
+    """Endpoint /api/iocs/export"""
+
+    def test_streaming_response(self, export_engine, monkeypatch):
+        _seed(export_engine, 30)
+        factory = _session_factory(export_engine)
+        monkeypatch.setattr(
+            ioc_store, "stream_export",
+            lambda fmt, flt, compress=False: stream_export(fmt, flt, compress=compress, session_factory=factory),
+        )
+        app = FastAPI()
+        app.include_router(ioc_store.router)
+        client = TestClient(app)
+
+        response = client.get("/api/iocs/export", params={"format": "csv", "threat_level": "high"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="iocs_export_' in response.headers["content-disposition"]
+        assert len(response.text.strip().splitlines()) == 16
+
+        response = client.get("/api/iocs/export", params={"format": "stix", "gzip": "true"})
+        assert response.headers["content-type"] == "application/gzip"
+        assert response.headers["content-disposition"].endswith('.stix.json.gz"')
+        assert len(json.loads(gzip.decompress(response.content))["objects"]) == 30
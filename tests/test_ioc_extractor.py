@@ -0,0 +1,124 @@
+"""
+MCP Kali Forensics - Tests for IOC Extractor v4.6
+Tests unitarios del extractor de IOCs de una sola pasada
+"""
+
+import pytest
+
+from api.services.ioc_extractor import (
+    IOCExtractor, ioc_extractor, extract_iocs, refang, defang, is_public_ip
+)
+
+
+def _values(iocs, ioc_type):
+    return {i["value"] for i in iocs if i["type"] == ioc_type}
+
+
+class TestIOCExtraction:
+    """Tests de extracción por tipo"""
+
+    def test_extracts_all_types_in_one_pass(self):
+        """Un solo texto con todos los tipos soportados"""
+        text = (
+            "conn 8.8.8.8 -> https://evil.example.ru/payload.exe "
+            "from admin@phish.co md5 d41d8cd98f00b204e9800998ecf8427e "
+            "sha1 da39a3ee5e6b4b0d3255bfef95601890afd80709 "
+            "sha256 e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855 "
+            "exploit CVE-2021-44228 c2 badhost.xyz"
+        )
+        iocs = extract_iocs(text)
+
+        assert _values(iocs, "ip") == {"8.8.8.8"}
+        assert _values(iocs, "url") == {"https://evil.example.ru/payload.exe"}
+        assert _values(iocs, "email") == {"admin@phish.co"}
+        assert _values(iocs, "hash_md5") == {"d41d8cd98f00b204e9800998ecf8427e"}
+        assert _values(iocs, "hash_sha1") == {"da39a3ee5e6b4b0d3255bfef95601890afd80709"}
+        assert len(_values(iocs, "hash_sha256")) == 1
+        assert _values(iocs, "cve") == {"CVE-2021-44228"}
+        assert {"evil.example.ru", "badhost.xyz"} <= _values(iocs, "domain")
+
+    def test_private_and_reserved_ips_filtered(self):
+        """Rangos privados, loopback, link-local y multicast se descartan"""
+        text = "10.1.2.3 172.20.0.1 192.168.1.1 127.0.0.1 169.254.1.1 224.0.0.1 0.0.0.0 1.1.1.1"
+        assert _values(extract_iocs(text), "ip") == {"1.1.1.1"}
+
+    def test_private_ips_optional(self):
+        """include_private_ips conserva las IPs internas"""
+        extractor = IOCExtractor(include_private_ips=True)
+        assert "10.1.2.3" in _values(extractor.extract("host 10.1.2.3"), "ip")
+
+    def test_invalid_ip_rejected(self):
+        """Octetos fuera de rango no son IPs"""
+        assert _values(extract_iocs("999.1.1.1"), "ip") == set()
+
+    def test_tld_validation(self):
+        """Dominios con TLD inexistente o de extensión de archivo se descartan"""
+        iocs = extract_iocs("report.json main.py run.sh config.yaml real-c2.com")
+        assert _values(iocs, "domain") == {"real-c2.com"}
+
+    def test_defanged_indicators_refanged(self):
+        """hxxp, [.], [@] y (dot) se normalizan"""
+        iocs = extract_iocs("hxxps[:]//bad[.]ru/x user[@]evil[.]com c2(dot)net 45[.]33[.]1[.]2")
+        assert _values(iocs, "url") == {"https://bad.ru/x"}
+        assert _values(iocs, "email") == {"user@evil.com"}
+        assert "c2.net" in _values(iocs, "domain")
+        assert _values(iocs, "ip") == {"45.33.1.2"}
+
+
+class TestDedupAndLimits:
+    """Tests de deduplicación tipada y límites"""
+
+    def test_typed_dedup_with_counts(self):
+        """Mismo valor normalizado cuenta como un único IOC"""
+        iocs = extract_iocs("EVIL.com evil.com evil[.]com")
+        domains = [i for i in iocs if i["type"] == "domain"]
+        assert len(domains) == 1
+        assert domains[0]["count"] == 3
+
+    def test_limit_keeps_first_unique(self):
+        """El límite se aplica tras deduplicar"""
+        text = " ".join(f"8.8.{i}.{i}" for i in range(1, 50))
+        assert len(extract_iocs(text, limit=10)) == 10
+        assert len(extract_iocs(text)) == 49
+
+
+class TestStreaming:
+    """Tests de extracción por chunks"""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 64])
+    def test_chunk_boundaries_do_not_split_iocs(self, chunk_size):
+        """El arrastre de frontera produce el mismo resultado que el texto completo"""
+        text = (
+            "first 8.8.4.4 then https://very-long-domain-name.example.org/a/b?c=d "
+            "and d41d8cd98f00b204e9800998ecf8427e\nnext line evil[.]ru CVE-2023-12345\n"
+        )
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        assert ioc_extractor.extract_stream(chunks) == ioc_extractor.extract(text)
+
+    def test_extract_file(self, tmp_path):
+        """Archivos se leen por chunks"""
+        log = tmp_path / "tool.log"
+        log.write_text("line 1.2.3.4\n" * 1000 + "tail evil.com\n")
+        iocs = ioc_extractor.extract_file(log, chunk_size=100)
+        assert _values(iocs, "ip") == {"1.2.3.4"}
+        assert _values(iocs, "domain") == {"evil.com"}
+
+
+class TestFangHelpers:
+    """Tests de defang/refang"""
+
+    def test_defang_refang_roundtrip(self):
+        """defang es reversible con refang"""
+        for value in ["http://evil.com/a.php", "bad@phish.ru", "8.8.8.8"]:
+            assert refang(defang(value)) == value
+
+    def test_defang_leaves_hashes(self):
+        """Los hashes no se alteran"""
+        value = "d41d8cd98f00b204e9800998ecf8427e"
+        assert defang(value, "hash_md5") == value
+
+    def test_is_public_ip(self):
+        """Clasificación de IPs públicas"""
+        assert is_public_ip("8.8.8.8")
+        assert not is_public_ip("192.168.0.1")
+        assert not is_public_ip("not-an-ip")
@@ -0,0 +1,198 @@
+"""
+MCP Kali Forensics - Tests for IOC Hit Accounting v4.7
+Hits agregados en memoria y volcados con un único UPDATE ... CASE
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401
+from api.database import Base, get_db
+from api.models.ioc import IocItem, IocItemTag, IocTag
+from api.routes import ioc_store
+from api.services.ioc_hits import IocHitBuffer
+
+IOC_IDS = [f"IOC-HIT-{i}" for i in range(5)]
+T0 = datetime(2024, 6, 1, 10, 0, 0)
+
+
+@pytest.fixture
+def hits_db(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'hits.db'}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(
+        engine, tables=[IocItem.__table__, IocTag.__table__, IocItemTag.__table__]
+    )
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        for i, ioc_id in enumerate(IOC_IDS):
+            db.add(IocItem(id=ioc_id, value=f"hit-{i}.example", ioc_type="domain",
+                           hit_count=i, last_seen=T0, updated_at=T0))
+        db.commit()
+    return engine, Session
+
+
+def _session_factory(Session):
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    return db_context
+
+
+def _hit_counts(Session):
+    with Session() as db:
+        return {ioc.id: ioc.hit_count for ioc in db.query(IocItem).all()}
+
+
+class TestIocHitBuffer:
+    """Tests del buffer de hits"""
+
+    def test_concurrent_lookups_exact_after_flush(self, hits_db):
+        """16 hilos registrando hits con volcados intercalados: totales exactos"""
+        _, Session = hits_db
+        buffer = IocHitBuffer(session_factory=_session_factory(Session), batch_size=2)
+        stop = threading.Event()
+
+        def flusher():
+            while not stop.is_set():
+                buffer.flush()
+
+        def reader(worker):
+            for n in range(500):
+                buffer.record([IOC_IDS[(worker + n) % len(IOC_IDS)]])
+
+        background = threading.Thread(target=flusher)
+        background.start()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(reader, range(16)))
+        stop.set()
+        background.join()
+        buffer.flush()
+
+        counts = _hit_counts(Session)
+        assert sum(counts.values()) == sum(range(5)) + 16 * 500
+        assert counts == {ioc_id: i + 1600 for i, ioc_id in enumerate(IOC_IDS)}
+        assert buffer.stats()["pending_hits"] == 0
+        assert buffer.written == 16 * 500
+
+    def test_flush_is_one_update_per_batch(self, hits_db):
+        engine, Session = hits_db
+        buffer = IocHitBuffer(session_factory=_session_factory(Session), batch_size=500)
+        statements = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        later = T0 + timedelta(hours=1)
+        for i in range(30):
+            buffer.record(IOC_IDS[:3], when=T0 + timedelta(minutes=i))
+        buffer.record(["IOC-HIT-0"], when=later)
+
+        assert buffer.flush() == 91
+        assert len(statements) == 1
+        assert statements[0].startswith("UPDATE ioc_items SET")
+        assert "CASE" in statements[0]
+
+        with Session() as db:
+            ioc = db.get(IocItem, "IOC-HIT-0")
+            assert (ioc.hit_count, ioc.last_seen, ioc.updated_at) == (31, later, T0)
+            assert db.get(IocItem, "IOC-HIT-4").last_seen == T0
+
+    def test_record_counts_aggregates_by_id(self, hits_db):
+        """Millones de hits de un barrido son una suma por IOC, no un append por hit"""
+        _, Session = hits_db
+        buffer = IocHitBuffer(session_factory=_session_factory(Session))
+        buffer.record(["IOC-HIT-1"], when=T0)
+        buffer.record_counts({"IOC-HIT-1": 2_000_000, "IOC-HIT-2": 5, "IOC-HIT-3": 0},
+                             when=T0 + timedelta(minutes=1))
+
+        assert buffer.pending("IOC-HIT-1") == (2_000_001, T0 + timedelta(minutes=1))
+        assert buffer.pending("IOC-HIT-3") is None
+        assert buffer.flush() == 2_000_006
+        counts = _hit_counts(Session)
+        assert (counts["IOC-HIT-1"], counts["IOC-HIT-2"]) == (2_000_002, 7)
+
+    def test_failed_flush_keeps_hits(self, hits_db):
+        _, Session = hits_db
+
+        @contextmanager
+        def broken():
+            raise RuntimeError("db down")
+            yield
+
+        buffer = IocHitBuffer(session_factory=broken)
+        buffer.record(["IOC-HIT-1", "IOC-HIT-1"])
+        assert buffer.flush() == 0
+        assert buffer.pending("IOC-HIT-1")[0] == 2
+
+        buffer.session_factory = _session_factory(Session)
+        assert buffer.flush() == 2
+        assert _hit_counts(Session)["IOC-HIT-1"] == 3
+
+    @pytest.mark.asyncio
+    async def test_background_task_and_stop(self, hits_db):
+        _, Session = hits_db
+        buffer = IocHitBuffer(flush_seconds=3600, session_factory=_session_factory(Session))
+        buffer.record(["IOC-HIT-2"])
+        assert buffer._task is not None and not buffer._task.done()
+
+        await buffer.stop()
+        assert buffer._task is None
+        assert _hit_counts(Session)["IOC-HIT-2"] == 3
+
+
+class TestIocReadRoutes:
+    """Las lecturas de IOCs no escriben en BD"""
+
+    def test_get_and_lookup_are_pure_selects(self, hits_db, monkeypatch):
+        engine, Session = hits_db
+        buffer = IocHitBuffer(session_factory=_session_factory(Session))
+        monkeypatch.setattr(ioc_store, "ioc_hits", buffer)
+
+        app = FastAPI()
+        app.include_router(ioc_store.router)
+
+        def override_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_db
+        client = TestClient(app)
+        statements = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        first = client.get("/api/iocs/IOC-HIT-3").json()
+        second = client.get("/api/iocs/IOC-HIT-3").json()
+        found = client.get("/api/iocs/lookup", params={"value": "hit-3.example"}).json()
+
+        assert all(s.lstrip().upper().startswith("SELECT") for s in statements)
+        assert (first["hit_count"], second["hit_count"]) == (4, 5)
+        assert found["found"] is True and found["matches"][0]["hit_count"] == 6
+
+        buffer.flush()
+        assert _hit_counts(Session)["IOC-HIT-3"] == 6
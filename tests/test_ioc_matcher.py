@@ -0,0 +1,221 @@
+"""
+MCP Kali Forensics - Tests for IOC Matcher v4.7
+Índice en memoria (hash, radix CIDR, trie de dominios, Aho-Corasick) con recarga en caliente
+"""
+
+import ipaddress
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401
+import api.services.correlation_engine as correlation
+import api.services.ioc_hits as ioc_hits_module
+from api.database import Base
+from api.models.ioc import IocItem, IocSighting
+from api.services.ioc_hits import IocHitBuffer
+from api.services.ioc_matcher import (
+    AhoCorasick, CidrTree, DomainTrie, IocIndex, IocMatcher, IocRef,
+)
+
+
+def _ref(ioc_id, ioc_type, value, threat_level="high"):
+    return IocRef(ioc_id, ioc_type, value, threat_level, None)
+
+
+INDEX = IocIndex([
+    _ref("HASH", "hash_sha256", "A" * 64),
+    _ref("IP", "ip", "45.33.32.156"),
+    _ref("NET", "ip", "10.20.0.0/16", "medium"),
+    _ref("NET6", "ip", "2001:db8::/32"),
+    _ref("DOM", "domain", "evil.example.ru"),
+    _ref("URL", "url", "http://bad.top/gate.php"),
+    _ref("UA", "user_agent", "python-requests/"),
+    _ref("EXE", "file_name", "mimikatz.exe", "critical"),
+    _ref("MAIL", "email", "ceo@phish.net"),
+    _ref("YARA", "yara_rule", "rule_x"),
+])
+
+
+def _ids(matches):
+    return sorted({match.ioc.id for match in matches})
+
+
+class TestStructures:
+    """Estructuras por tipo de indicador"""
+
+    def test_aho_corasick_overlapping(self):
+        automaton = AhoCorasick()
+        for word in ["he", "she", "his", "hers"]:
+            automaton.add(word, word)
+        automaton.build()
+        assert sorted(automaton.iter("ushers")) == [(1, "she"), (2, "he"), (2, "hers")]
+        assert list(automaton.iter("xyz")) == []
+
+    def test_cidr_tree_nested_prefixes(self):
+        tree = CidrTree()
+        tree.add(ipaddress.ip_network("10.0.0.0/8"), "wide")
+        tree.add(ipaddress.ip_network("10.1.0.0/16"), "narrow")
+        tree.add(ipaddress.ip_network("2001:db8::/32"), "v6")
+        assert tree.lookup(ipaddress.ip_address("10.1.2.3")) == ["wide", "narrow"]
+        assert tree.lookup(ipaddress.ip_address("10.2.0.1")) == ["wide"]
+        assert tree.lookup(ipaddress.ip_address("11.0.0.1")) == []
+        assert tree.lookup(ipaddress.ip_address("2001:db8::1")) == ["v6"]
+
+    def test_domain_trie_suffixes(self):
+        trie = DomainTrie()
+        trie.add("evil.com", "evil")
+        assert trie.lookup("evil.com") == ["evil"]
+        assert trie.lookup("a.b.evil.com") == ["evil"]
+        assert trie.lookup("notevil.com") == []
+        assert trie.lookup("com") == []
+
+
+class TestIocIndex:
+    """Búsqueda sobre eventos"""
+
+    def test_match_event_types(self):
+        event = {
+            "source_ip": "45.33.32.156",
+            "host": {"ip": "10.20.7.1", "ipv6": "2001:db8:0:0::5"},
+            "query": "cdn.EVIL.example.ru",
+            "CommandLine": "C:\\Tools\\MIMIKATZ.EXE && curl http://bad.top/gate.php?id=1",
+            "files": [{"sha256": "a" * 64}],
+            "user_agent": "python-requests/2.31.0",
+            "sender": "CEO@phish.net",
+            "timestamp": "45.33.32.156",
+        }
+        matches = INDEX.match_event(event)
+        assert _ids(matches) == ["DOM", "EXE", "HASH", "IP", "MAIL", "NET", "NET6", "UA", "URL"]
+
+        by_id = {match.ioc.id: match for match in matches}
+        assert by_id["HASH"].field == "files[0].sha256"
+        assert by_id["NET"].field == "host.ip"
+        assert by_id["EXE"].offset == 9
+        assert by_id["URL"].offset == 30
+
+    def test_no_false_positives(self):
+        event = {
+            "ip": "45.33.32.15",
+            "domain": "notevil.example.ru.com",
+            "path": "C:\\data\\notmimikatz.exe",
+            "text": "10.21.0.1 and 999.1.1.1",
+        }
+        assert INDEX.match_event(event) == []
+
+    def test_ips_inside_text_and_cache(self):
+        first = INDEX.match_event({"msg": "blocked 10.20.255.1 -> 45.33.32.156:443"})
+        again = INDEX.match_event({"other": "blocked 10.20.255.1 -> 45.33.32.156:443"})
+        assert _ids(first) == _ids(again) == ["IP", "NET"]
+        assert again[0].field == "other"
+        assert INDEX.stats()["skipped"] == 1
+
+
+@pytest.fixture
+def ioc_session(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'matcher.db'}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine, tables=[IocItem.__table__, IocSighting.__table__])
+    return sessionmaker(bind=engine)
+
+
+class TestHotReload:
+    """Recarga del índice tras commits sobre IocItem"""
+
+    def test_commits_invalidate_index(self, ioc_session):
+        matcher = IocMatcher(session_factory=ioc_session, reload_interval=0)
+        assert matcher.stale
+        matcher.refresh_if_stale()
+        assert matcher.match_event({"ip": "203.0.113.9"}) == []
+
+        with ioc_session() as db:
+            db.add(IocItem(id="IOC-R1", value="203.0.113.9", ioc_type="ip"))
+            db.commit()
+        assert matcher.stale
+        assert matcher.refresh_if_stale() is True
+        assert _ids(matcher.match_event({"ip": "203.0.113.9"})) == ["IOC-R1"]
+
+        with ioc_session() as db:
+            db.get(IocItem, "IOC-R1").status = "whitelisted"
+            db.rollback()
+        assert not matcher.stale
+
+        with ioc_session() as db:
+            db.get(IocItem, "IOC-R1").status = "whitelisted"
+            db.commit()
+        matcher.refresh_if_stale()
+        assert matcher.match_event({"ip": "203.0.113.9"}) == []
+
+        with ioc_session() as db:
+            db.add(IocItem(id="IOC-R2", value="bad.example", ioc_type="domain"))
+            db.commit()
+        matcher.refresh_if_stale()
+        with ioc_session() as db:
+            db.query(IocItem).filter(IocItem.id == "IOC-R2").delete()
+            db.commit()
+        assert matcher.stale
+        matcher.refresh_if_stale()
+        assert matcher.index.size == 0
+
+    def test_reload_is_debounced(self, ioc_session):
+        matcher = IocMatcher(session_factory=ioc_session, reload_interval=3600)
+        matcher.refresh_if_stale()
+        with ioc_session() as db:
+            db.add(IocItem(id="IOC-D1", value="d1.example", ioc_type="domain"))
+            db.commit()
+        assert matcher.refresh_if_stale() is False
+        assert matcher.reloads == 1
+        matcher.reload()
+        assert matcher.index.size == 1
+
+
+class TestCorrelationIntegration:
+    """CorrelationEngine.ingest_event marca IOCs conocidos"""
+
+    @pytest.mark.asyncio
+    async def test_ingest_records_sightings(self, ioc_session, monkeypatch):
+        with ioc_session() as db:
+            db.add(IocItem(id="IOC-C1", value="198.51.100.7", ioc_type="ip", threat_level="critical"))
+            db.add(IocItem(id="IOC-C2", value="phish.example", ioc_type="domain", threat_level="low"))
+            db.commit()
+
+        @contextmanager
+        def db_context():
+            db = ioc_session()
+            try:
+                yield db
+                db.commit()
+            finally:
+                db.close()
+
+        hits = IocHitBuffer(session_factory=db_context)
+        monkeypatch.setattr(correlation, "ioc_matcher", IocMatcher(session_factory=ioc_session))
+        monkeypatch.setattr(correlation, "get_db_context", db_context)
+        monkeypatch.setattr(ioc_hits_module, "ioc_hits", hits)
+
+        engine = correlation.CorrelationEngine()
+        engine.initialized = True  # _persist_event real: su fallo no impide el matching
+
+        alerts = await engine.ingest_event(
+            {"event_type": "signin", "src_ip": "198.51.100.7", "hostname": "ws01",
+             "url": "https://login.phish.example/auth"},
+            source="azure", case_id="CASE-9",
+        )
+        assert len(alerts) == 1
+        assert alerts[0]["rule_id"] == "IOC-001"
+        assert alerts[0]["severity"] == "critical"
+        assert sorted(m["ioc_id"] for m in alerts[0]["ioc_matches"]) == ["IOC-C1", "IOC-C2"]
+
+        with ioc_session() as db:
+            sightings = {s.ioc_id: s for s in db.query(IocSighting).all()}
+        assert set(sightings) == {"IOC-C1", "IOC-C2"}
+        assert (sightings["IOC-C1"].source_system, sightings["IOC-C1"].source_host) == ("azure", "ws01")
+        assert sightings["IOC-C1"].source_ip == "198.51.100.7"
+        assert sightings["IOC-C2"].case_id == "CASE-9"
+        assert hits.pending("IOC-C1")[0] == 1
+
+        assert await engine.ingest_event({"src_ip": "192.0.2.1"}, source="azure") == []
+        await hits.stop()
@@ -0,0 +1,199 @@
+"""
+MCP Kali Forensics - Tests for Bulk IOC Scan v4.7
+Barrido de archivos de evidencia por bloques con desplazamientos y avistamientos por lotes
+"""
+
+import gzip
+from contextlib import contextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401
+from api.database import Base
+from api.models.ioc import IocItem, IocSighting
+from api.routes import ioc_store
+from api.services.ioc_matcher import IocIndex, IocMatcher, IocRef
+from api.services.ioc_scan import (
+    WINDOW_OVERLAP, SightingBatcher, iter_segments, maybe_gunzip, scan_chunks,
+)
+
+
+def _ref(ioc_id, ioc_type, value):
+    return IocRef(ioc_id, ioc_type, value, "high", None)
+
+
+INDEX = IocIndex([
+    _ref("IP", "ip", "45.33.32.156"),
+    _ref("NET", "ip", "10.20.0.0/16"),
+    _ref("DOM", "domain", "evil.example.ru"),
+    _ref("HASH", "hash_md5", "d41d8cd98f00b204e9800998ecf8427e"),
+    _ref("MAIL", "email", "ceo@phish.net"),
+    _ref("EXE", "file_name", "mimikatz.exe"),
+])
+
+LOG = (
+    b"2024-01-01 ok nothing here\n"
+    b"2024-01-01 conn 10.20.3.4 -> 45.33.32.156:443\r\n"
+    b"2024-01-01 dns cdn.evil.example.ru md5=D41D8CD98F00B204E9800998ECF8427E.\n"
+    b"2024-01-01 \xc3\xa1\xc3\xa9 mail from ceo@phish.net run mimikatz.exe"
+)
+
+
+def _chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def _located(report, data):
+    """(ioc, texto en el desplazamiento informado)"""
+    return sorted(
+        (match["ioc_id"], data[match["offset"]:match["offset"] + 6].decode())
+        for match in report.matches
+    )
+
+
+class TestSegments:
+    """Partición en líneas y ventanas"""
+
+    @pytest.mark.parametrize("size", [1, 7, 4096])
+    def test_blocks_of_whole_lines(self, size):
+        segments = list(iter_segments(_chunked(LOG, size)))
+        assert b"".join(segment.data for segment in segments) == LOG
+        assert [segment.offset for segment in segments] == [
+            sum(len(previous.data) for previous in segments[:i]) for i in range(len(segments))
+        ]
+        assert all(segment.data.endswith(b"\n") for segment in segments[:-1])
+        assert sum(segment.lines for segment in segments) == 4
+
+    def test_long_line_windows_report_each_match_once(self):
+        """Indicadores en los bordes de ventana se informan una sola vez"""
+        max_line = 8 * WINDOW_OVERLAP
+        line = bytearray(b"x" * (5 * max_line))
+        positions = [0, max_line - WINDOW_OVERLAP - 3, max_line - 2 * WINDOW_OVERLAP - 5, 3 * max_line + 17]
+        for position in positions:
+            line[position:position + 14] = b" 45.33.32.156 "
+        data = b"head\n" + bytes(line) + b"\ntail 45.33.32.156\n"
+
+        report = scan_chunks(_chunked(data, 3000), INDEX, "big.log", max_line=max_line)
+
+        offsets = sorted(match["offset"] for match in report.matches)
+        assert offsets == sorted([5 + position + 1 for position in positions] + [len(data) - 13])
+        assert all(data[offset:offset + 12] == b"45.33.32.156" for offset in offsets)
+        assert report.lines == 3
+        # Memoria acotada por bloque leído + línea pendiente, no por longitud de línea
+        assert max(len(segment.data) for segment in iter_segments(_chunked(data, 3000), max_line=max_line)) \
+            <= max_line + 3000
+
+
+class TestScanChunks:
+    """Coincidencias, desplazamientos y métricas"""
+
+    def test_matches_with_byte_offsets(self):
+        report = scan_chunks(_chunked(LOG, 5), INDEX, "auth.log")
+
+        assert _located(report, LOG) == [
+            ("DOM", "cdn.ev"), ("EXE", "mimika"), ("HASH", "D41D8C"),
+            ("IP", "45.33."), ("MAIL", "ceo@ph"), ("NET", "10.20."),
+        ]
+        assert {match["ioc_id"]: match["line"] for match in report.matches}["MAIL"] == 4
+        assert report.lines == 4 and report.match_count == 6
+        assert report.bytes_scanned == report.bytes_read == len(LOG)
+        assert report.as_dict()["throughput_mb_s"] > 0
+
+    def test_gzip_and_truncated_report(self):
+        data = LOG + b"\n" + LOG
+        compressed = gzip.compress(data[:100]) + gzip.compress(data[100:])
+        assert list(maybe_gunzip([b"plain"])) == [b"plain"]
+
+        report = scan_chunks(_chunked(compressed, 16), INDEX, "auth.log.gz", max_matches=3)
+
+        assert report.bytes_read == len(compressed) and report.bytes_scanned == len(data)
+        assert report.match_count == 12 and len(report.matches) == 3 and report.truncated
+        assert report.per_ioc["IP"] == 2
+
+
+@pytest.fixture
+def ioc_session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'scan.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[IocItem.__table__, IocSighting.__table__])
+    return engine, sessionmaker(bind=engine)
+
+
+class TestSightings:
+    """Avistamientos insertados por lotes"""
+
+    def test_batched_inserts_with_per_ioc_cap(self, ioc_session):
+        engine, Session = ioc_session
+        with Session() as db:
+            db.add(IocItem(id="IP", value="45.33.32.156", ioc_type="ip"))
+            db.add(IocItem(id="MAIL", value="ceo@phish.net", ioc_type="email"))
+            db.commit()
+
+        @contextmanager
+        def db_context():
+            db = Session()
+            try:
+                yield db
+                db.commit()
+            finally:
+                db.close()
+
+        inserts = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: inserts.append(statement)
+                     if statement.startswith("INSERT") else None)
+
+        data = b"".join(b"%d 45.33.32.156 ceo@phish.net\n" % i for i in range(50))
+        sightings = SightingBatcher(session_factory=db_context, batch_size=10, per_ioc_limit=20,
+                                    source_system="edr", case_id="CASE-1")
+        report = scan_chunks([data], INDEX, "dump.txt", sightings=sightings)
+
+        assert report.match_count == 100 and report.sightings_recorded == 40
+        assert len(inserts) == 4  # un INSERT por lote (executemany)
+        with Session() as db:
+            rows = db.query(IocSighting).all()
+        assert len(rows) == 40
+        assert {row.ioc_id for row in rows} == {"IP", "MAIL"}
+        assert all(row.case_id == "CASE-1" and row.source_system == "edr" for row in rows)
+        assert rows[0].raw_event == {"file": "dump.txt", "offset": 2, "line": 1}
+
+
+class TestScanRoute:
+    """POST /api/iocs/scan"""
+
+    def test_local_evidence_and_traversal(self, tmp_path, ioc_session, monkeypatch):
+        engine, Session = ioc_session
+        with Session() as db:
+            db.add(IocItem(id="IOC-S1", value="45.33.32.156", ioc_type="ip"))
+            db.commit()
+
+        case_dir = tmp_path / "evidence" / "CASE-7" / "logs"
+        case_dir.mkdir(parents=True)
+        (case_dir / "fw.log.gz").write_bytes(gzip.compress(LOG))
+        monkeypatch.setattr(ioc_store.settings, "EVIDENCE_DIR", tmp_path / "evidence")
+        monkeypatch.setattr(ioc_store, "ioc_matcher", IocMatcher(session_factory=Session))
+        recorded = []
+        monkeypatch.setattr(ioc_store.ioc_hits, "record_counts", lambda counts, when=None: recorded.append(counts))
+
+        app = FastAPI()
+        app.include_router(ioc_store.router)
+        client = TestClient(app)
+
+        response = client.post("/api/iocs/scan", json={
+            "case_id": "CASE-7", "path": "logs/fw.log.gz", "record_sightings": False,
+        })
+        body = response.json()
+        assert response.status_code == 200
+        assert body["source"] == "logs/fw.log.gz"
+        assert body["per_ioc"] == {"IOC-S1": 1}
+        assert body["matches"][0]["offset"] == LOG.index(b"45.33.32.156")
+        assert body["bytes_scanned"] == len(LOG)
+        assert recorded == [{"IOC-S1": 1}]
+
+        assert client.post("/api/iocs/scan", json={"case_id": "CASE-7", "path": "../../x"}).status_code == 400
+        assert client.post("/api/iocs/scan", json={"case_id": "..", "path": "evidence"}).status_code == 400
+        assert client.post("/api/iocs/scan", json={"case_id": "CASE-7", "path": "nope.log"}).status_code == 404
+        assert client.post("/api/iocs/scan", json={"case_id": "CASE-7"}).status_code == 400
@@ -0,0 +1,299 @@
+"""
+MCP Kali Forensics - Tests for IOC Search v4.7
+Búsqueda por subcadena indexada (FTS5 trigram / pg_trgm) con paginación keyset
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
+
+import api.models  # noqa: F401
+import api.services.ioc_search as ioc_search
+from api.database import Base, get_db
+from api.models.ioc import IocItem, IocItemTag, IocTag
+from api.routes import ioc_store
+from api.services.ioc_search import IocSearchFilter, build_search_query, search_iocs
+
+T0 = datetime(2024, 5, 1, 8, 0, 0)
+
+
+@pytest.fixture
+def ioc_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'iocs.db'}")
+    Base.metadata.create_all(
+        engine, tables=[IocItem.__table__, IocTag.__table__, IocItemTag.__table__]
+    )
+    return engine
+
+
+@pytest.fixture
+def db(ioc_engine):
+    session = sessionmaker(bind=ioc_engine)()
+    yield session
+    session.close()
+
+
+def _seed(db, n=30):
+    """IOCs con created_at repetidos (de 3 en 3) para forzar desempates por id"""
+    for i in range(n):
+        db.add(IocItem(
+            id=f"IOC-{i:04d}",
+            value=f"evil-{i}.example.com" if i % 2 else f"10.0.{i}.1",
+            ioc_type="domain" if i % 2 else "ip",
+            description="Cobalt Strike beacon" if i % 5 == 0 else "scanner",
+            context="seen in phishing_campaign" if i % 7 == 0 else None,
+            source="threat_intel" if i % 3 == 0 else "manual",
+            confidence_score=float(i % 4) * 25,
+            created_at=T0 + timedelta(minutes=i // 3),
+        ))
+    db.commit()
+
+
+def _ids(items):
+    return [ioc.id for ioc in items]
+
+
+def _all_pages(db, flt, sort, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = search_iocs(db, flt, sort=sort, cursor=cursor, limit=limit, count="none")
+        ids.extend(_ids(page.items))
+        pages += 1
+        if page.next_cursor is None:
+            return ids, pages
+        cursor = page.next_cursor
+
+
+class TestSQLiteFTSIndex:
+    """Índice FTS5 trigram y su sincronización"""
+
+    def test_created_with_table(self, ioc_engine):
+        assert "ioc_items_fts" in inspect(ioc_engine).get_table_names()
+        indexes = {ix["name"] for ix in inspect(ioc_engine).get_indexes("ioc_items")}
+        assert {"ix_ioc_items_created", "ix_ioc_items_confidence"} <= indexes
+        assert not any(name.endswith("_trgm") for name in indexes)  # sólo PostgreSQL
+
+    def test_triggers_keep_index_in_sync(self, db):
+        _seed(db, 5)
+        flt = IocSearchFilter(text="COBALT")
+        assert _ids(build_search_query(db, flt).all()) == ["IOC-0000"]
+
+        ioc = db.get(IocItem, "IOC-0001")
+        ioc.description = "cobalt strike loader"
+        db.commit()
+        db.query(IocItem).filter(IocItem.id == "IOC-0000").delete()
+        db.commit()
+
+        assert _ids(build_search_query(db, flt).all()) == ["IOC-0001"]
+
+    def test_index_survives_rowid_renumbering(self, db):
+        """VACUUM puede renumerar el rowid implícito de ioc_items; el índice no depende de él"""
+        _seed(db, 5)
+        db.execute(text("UPDATE ioc_items SET rowid = rowid + 100"))
+        db.commit()
+
+        assert _ids(build_search_query(db, IocSearchFilter(text="cobalt")).all()) == ["IOC-0000"]
+        db.query(IocItem).filter(IocItem.id == "IOC-0000").delete()
+        db.commit()
+        assert build_search_query(db, IocSearchFilter(text="cobalt")).all() == []
+        with db.get_bind().connect() as conn:
+            conn.execute(text("INSERT INTO ioc_items_fts(ioc_items_fts) VALUES ('integrity-check')"))
+
+    def test_legacy_rowid_index_is_rebuilt(self, ioc_engine, db):
+        """El índice anterior (content_rowid='rowid') se sustituye al arrancar"""
+        _seed(db, 5)
+        with ioc_engine.begin() as conn:
+            for statement in ioc_search.SQLITE_FTS_DROP:
+                conn.execute(text(statement))
+            conn.execute(text("CREATE VIRTUAL TABLE ioc_items_fts USING fts5(value, description, context,"
+                              " source, content='ioc_items', content_rowid='rowid', tokenize='trigram')"))
+
+        assert ioc_search.ensure_search_index(ioc_engine) is True
+        assert _ids(build_search_query(db, IocSearchFilter(text="cobalt")).all()) == ["IOC-0000"]
+
+    def test_recreated_table_gets_fresh_index(self, ioc_engine, db):
+        """drop_all/create_all no deja claves huérfanas que bloqueen inserts"""
+        _seed(db, 3)
+        db.close()
+        IocItem.__table__.drop(ioc_engine)
+        IocItem.__table__.create(ioc_engine)
+        _seed(db, 3)
+
+        assert _ids(build_search_query(db, IocSearchFilter(text="cobalt")).all()) == ["IOC-0000"]
+
+    def test_existing_rows_indexed_on_ensure(self, tmp_path):
+        """Una BD previa sin FTS se indexa al arrancar"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE ioc_items (id VARCHAR PRIMARY KEY, value VARCHAR,"
+                              " description TEXT, context TEXT, source VARCHAR)"))
+            conn.execute(text("INSERT INTO ioc_items VALUES ('IOC-1', 'mimikatz.exe', NULL, NULL, 'manual')"))
+
+        assert ioc_search.ensure_search_index(engine) is True
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT rowid FROM ioc_items_fts WHERE ioc_items_fts MATCH '\"katz\"'"))
+            assert len(rows.all()) == 1
+
+
+class TestSubstringSearch:
+    """La búsqueda indexada devuelve lo mismo que el LIKE de antes"""
+
+    @pytest.mark.parametrize("term", ["evil-1", "CoBaLt", "phishing_camp", "10.0.2", "threat_intel", "ev", "%"])
+    def test_fts_matches_like(self, db, ioc_engine, term):
+        _seed(db)
+        fts = set(_ids(build_search_query(db, IocSearchFilter(text=term)).all()))
+
+        ioc_search._fts_ready[ioc_engine] = False
+        try:
+            like = set(_ids(build_search_query(db, IocSearchFilter(text=term)).all()))
+        finally:
+            ioc_search._fts_ready[ioc_engine] = True
+
+        assert fts == like
+        if term == "%":
+            assert fts == set()  # comodines escapados: búsqueda literal
+
+    def test_uses_fts_match(self, db, ioc_engine):
+        _seed(db)
+        statements = []
+
+        @event.listens_for(ioc_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        search_iocs(db, IocSearchFilter(text="example"), limit=5, count="none")
+        assert len(statements) == 1
+        assert "ioc_items_fts MATCH" in statements[0]
+        assert "LIKE" not in statements[0].upper()
+
+    def test_tag_filter_does_not_duplicate(self, db):
+        _seed(db, 3)
+        malware, c2 = IocTag(name="malware"), IocTag(name="c2")
+        db.add_all([malware, c2])
+        db.flush()
+        db.add_all([IocItemTag(ioc_id="IOC-0001", tag_id=malware.id),
+                    IocItemTag(ioc_id="IOC-0001", tag_id=c2.id)])
+        db.commit()
+
+        page = search_iocs(db, IocSearchFilter(tags=["Malware", "c2"]))
+        assert _ids(page.items) == ["IOC-0001"]
+        assert page.total == 1
+
+
+class TestKeysetPagination:
+    """Paginación por cursor"""
+
+    @pytest.mark.parametrize("sort", ["recent", "confidence"])
+    def test_cursor_pages_equal_offset_pages(self, db, sort):
+        """Las páginas por cursor recorren lo mismo que OFFSET, sin huecos ni duplicados"""
+        _seed(db)
+        flt = IocSearchFilter(text="e")  # < 3 caracteres: LIKE
+        expected = _ids(search_iocs(db, flt, sort=sort, limit=100).items)
+
+        ids, pages = _all_pages(db, flt, sort, limit=4)
+        assert ids == expected
+        assert len(set(ids)) == len(ids) == 30
+        assert pages == 8
+
+        offset_ids = []
+        for offset in range(0, 30, 4):
+            offset_ids += _ids(search_iocs(db, flt, sort=sort, limit=4, offset=offset).items)
+        assert offset_ids == expected
+
+    def test_cursor_has_no_offset(self, db, ioc_engine):
+        _seed(db)
+        first = search_iocs(db, IocSearchFilter(), limit=10, count="none")
+        statements = []
+
+        @event.listens_for(ioc_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        search_iocs(db, IocSearchFilter(), cursor=first.next_cursor, limit=10, count="none")
+        [(statement, parameters)] = statements
+        assert "(ioc_items.created_at, ioc_items.id) < (?, ?)" in statement
+        assert parameters[-2:] == (11, 0)  # SQLite siempre emite OFFSET; aquí es 0
+
+    def test_invalid_or_foreign_cursor(self, db):
+        _seed(db, 5)
+        recent = search_iocs(db, IocSearchFilter(), sort="recent", limit=2)
+        with pytest.raises(ValueError):
+            search_iocs(db, IocSearchFilter(), sort="confidence", cursor=recent.next_cursor)
+        with pytest.raises(ValueError):
+            search_iocs(db, IocSearchFilter(), cursor="garbage")
+
+
+class TestCountModes:
+    """Conteo exacto, aproximado y sin conteo"""
+
+    def test_modes(self, db, monkeypatch):
+        _seed(db)
+        flt = IocSearchFilter(ioc_types=["domain"])
+
+        exact = search_iocs(db, flt, limit=5)
+        assert (exact.total, exact.total_approximate) == (15, False)
+        assert search_iocs(db, flt, limit=5, count="none").total is None
+
+        assert search_iocs(db, flt, count="approximate").total == 15
+        monkeypatch.setattr(ioc_search.settings, "IOC_SEARCH_COUNT_CAP", 10)
+        capped = search_iocs(db, flt, count="approximate")
+        assert (capped.total, capped.total_approximate) == (10, True)
+
+    def test_postgres_statements_compile(self, db, monkeypatch):
+        """Índices GIN trigram y la consulta del EXPLAIN compilan para PostgreSQL"""
+        ddl = str(CreateIndex(next(ix for ix in IocItem.__table__.indexes
+                                   if ix.name == "ix_ioc_items_value_trgm")).compile(dialect=postgresql.dialect()))
+        assert "USING gin (value gin_trgm_ops)" in ddl
+
+        flt = IocSearchFilter(text="o'brien", ioc_types=["ip", "domain"], date_from=T0, min_confidence=10)
+        monkeypatch.setattr(ioc_search, "_uses_fts", lambda db: False)
+        statement = build_search_query(db, flt).order_by(None).statement
+        compiled = statement.compile(dialect=postgresql.psycopg2.dialect(),
+                                     compile_kwargs={"render_postcompile": True})
+        assert "ioc_items.value ILIKE %(value_1)s" in str(compiled)
+        assert compiled.params["value_1"] == "%o'brien%"
+        assert compiled.params["ioc_type_1_2"] == "domain"
+
+
+class TestIocListRoutes:
+    """Endpoints de listado sobre el constructor de búsqueda"""
+
+    def test_list_and_search_with_cursor(self, db, ioc_engine):
+        _seed(db)
+        app = FastAPI()
+        app.include_router(ioc_store.router)
+        Session = sessionmaker(bind=ioc_engine)
+
+        def override_db():
+            session = Session()
+            try:
+                yield session
+            finally:
+                session.close()
+
+        app.dependency_overrides[get_db] = override_db
+        client = TestClient(app)
+
+        first = client.get("/api/iocs/", params={"search": "example", "limit": 10, "count": "approximate"}).json()
+        assert (first["total"], first["pages"], first["total_approximate"]) == (15, 2, False)
+        second = client.get("/api/iocs/", params={"search": "example", "limit": 10,
+                                                  "cursor": first["next_cursor"], "count": "none"}).json()
+        assert second["total"] is None and second["next_cursor"] is None
+        assert len({i["id"] for i in first["items"] + second["items"]}) == 15
+
+        found = client.post("/api/iocs/search", json={"query": "cobalt", "ioc_types": ["ip"]}).json()
+        assert [i["id"] for i in found["items"]] == ["IOC-0010", "IOC-0020", "IOC-0000"]
+
+        assert client.get("/api/iocs/", params={"cursor": "nope"}).status_code == 400
+
+        db.get(IocItem, "IOC-0003").case_id = "CASE-1"  # source threat_intel
+        db.commit()
+        assert client.get("/api/iocs/cloud/cases").json() == {
+            "cases": [{"case_id": "CASE-1", "ioc_count": 1}], "total": 1,
+        }
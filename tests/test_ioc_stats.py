@@ -0,0 +1,175 @@
+"""
+MCP Kali Forensics - Tests for IOC Statistics Rollup v4.7
+Estadísticas en una sola consulta y contadores incrementales por commit
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401
+from api.database import Base
+from api.models.investigation import InvestigationIocLink
+from api.models.ioc import IocEnrichment, IocItem, IocItemTag, IocSighting, IocTag
+from api.services.ioc_stats import IocStatsRollup, build_stats_query
+
+
+@pytest.fixture
+def stats_db(tmp_path):
+    """BD SQLite aislada, rollup enganchado a su sessionmaker y contador de consultas"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    Base.metadata.create_all(
+        engine, tables=[model.__table__ for model in (
+            IocItem, IocTag, IocItemTag, IocEnrichment, IocSighting, InvestigationIocLink
+        )]
+    )
+    Session = sessionmaker(bind=engine)
+    rollup = IocStatsRollup(Session, cache_ttl=0, resync_interval=3600)
+    queries = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    with Session() as db:
+        tags = [IocTag(name=name) for name in ("malware", "c2", "phishing")]
+        db.add_all(tags)
+        for i in range(40):
+            ioc = IocItem(
+                value=f"10.1.0.{i}",
+                ioc_type=["ip", "domain", "hash_sha256"][i % 3],
+                threat_level=["critical", "high", "medium", "low"][i % 4],
+                source=["manual", "threat_intel"][i % 2],
+                confidence_score=None if i == 3 else float(i),
+                created_at=datetime.utcnow() - timedelta(hours=i),
+            )
+            db.add(ioc)
+            db.flush()
+            db.add(IocItemTag(ioc_id=ioc.id, tag_id=tags[i % 3].id if i % 4 else tags[0].id))
+        db.commit()
+
+    queries.clear()
+    return Session, rollup, queries
+
+
+def _reference(db):
+    """Estadísticas calculadas con consultas independientes (la versión anterior)"""
+    def grouped(column):
+        return {key: n for key, n in db.query(column, func.count(IocItem.id)).group_by(column).all()}
+
+    tag_counts = db.query(IocTag.name, func.count(IocItemTag.id)).join(IocItemTag).group_by(
+        IocTag.name).order_by(func.count(IocItemTag.id).desc(), IocTag.name).limit(10).all()
+    since = datetime.utcnow() - timedelta(days=1)
+    return {
+        "total": db.query(IocItem).count(),
+        "by_type": grouped(IocItem.ioc_type),
+        "by_threat_level": grouped(IocItem.threat_level),
+        "by_source": grouped(IocItem.source),
+        "by_status": grouped(IocItem.status),
+        "average_confidence": round(db.query(func.avg(IocItem.confidence_score)).scalar() or 0, 2),
+        "top_tags": dict(tag_counts),
+        "recent_24h": db.query(IocItem).filter(IocItem.created_at >= since).count(),
+    }
+
+
+def _snapshot(rollup, db):
+    stats = dict(rollup.snapshot(db))
+    stats.pop("generated_at")
+    return stats
+
+
+class TestStatsQuery:
+    """Agregación completa"""
+
+    def test_single_query_matches_reference(self, stats_db):
+        Session, rollup, queries = stats_db
+        with Session() as db:
+            stats = _snapshot(rollup, db)
+            assert len(queries) == 1
+            assert "UNION ALL" in queries[0]
+            assert stats == _reference(db)
+        assert stats["total"] == 40
+        assert sum(stats["by_type"].values()) == 40
+
+    def test_postgres_uses_grouping_sets(self):
+        sql = str(build_stats_query("postgresql", datetime.utcnow()).compile(dialect=postgresql.dialect()))
+        assert "GROUPING SETS((ioc_items.ioc_type), (ioc_items.threat_level)" in sql
+        assert sql.count("FROM ioc_items") == 1
+
+
+class TestIncrementalCounters:
+    """Contadores mantenidos por los eventos de sesión"""
+
+    def test_create_update_delete_without_queries(self, stats_db):
+        """Tras los cambios, /stats sale de los contadores y coincide con la BD"""
+        Session, rollup, queries = stats_db
+        with Session() as db:
+            rollup.snapshot(db)
+
+        with Session() as db:
+            new_tag = IocTag(name="ransomware")
+            ioc = IocItem(value="evil.example", ioc_type="domain", source="osint")  # defaults de columna
+            db.add_all([new_tag, ioc])
+            db.flush()
+            db.add(IocItemTag(ioc_id=ioc.id, tag_id=new_tag.id))
+
+            first = db.query(IocItem).filter(IocItem.value == "10.1.0.1").one()
+            first.threat_level = "critical"
+            first.status = "whitelisted"
+            first.confidence_score = 99.0
+            first.description = "no cambia contadores"
+
+            victim = db.query(IocItem).filter(IocItem.value == "10.1.0.2").one()
+            db.delete(victim)  # borra en cascada su IocItemTag
+            db.commit()
+
+        queries.clear()
+        with Session() as db:
+            stats = _snapshot(rollup, db)
+            assert queries == []
+            assert stats == _reference(db)
+        assert stats["by_status"]["whitelisted"] == 1
+        assert stats["top_tags"]["ransomware"] == 1
+
+    def test_rollback_discards_pending(self, stats_db):
+        Session, rollup, _ = stats_db
+        with Session() as db:
+            before = _snapshot(rollup, db)
+
+        with Session() as db:
+            db.add(IocItem(value="rolled.back", ioc_type="domain"))
+            db.flush()
+            db.rollback()
+
+        with Session() as db:
+            assert _snapshot(rollup, db) == before
+
+    def test_bulk_delete_forces_resync(self, stats_db):
+        """query.delete() no pasa por el flush: la siguiente lectura reagrega"""
+        Session, rollup, queries = stats_db
+        with Session() as db:
+            rollup.snapshot(db)
+            db.query(IocItem).filter(IocItem.ioc_type == "ip").delete(synchronize_session=False)
+            db.commit()
+
+        queries.clear()
+        with Session() as db:
+            stats = _snapshot(rollup, db)
+            assert len(queries) == 1
+            assert "ip" not in stats["by_type"]
+            assert stats["total"] == 26
+
+    def test_snapshot_cached_for_ttl(self, stats_db):
+        Session, _, queries = stats_db
+        rollup = IocStatsRollup(Session, cache_ttl=60, resync_interval=3600)
+        with Session() as db:
+            first = rollup.snapshot(db)
+            assert rollup.snapshot(db) is first
+
+            db.add(IocItem(value="new.example", ioc_type="domain"))
+            db.commit()
+            assert rollup.snapshot(db)["total"] == 41  # el commit invalida el snapshot
+        assert rollup.queries == 1
@@ -0,0 +1,110 @@
+"""
+MCP Kali Forensics - Tests for RAG Service v4.7
+Tests de ingesta por lotes con colección y modelo de embeddings falsos
+"""
+
+import io
+import threading
+
+import numpy as np
+import pytest
+
+try:
+    from api.services.rag_service import RAGService, content_id
+except Exception:  # chromadb / sentence-transformers no instalados o incompatibles
+    RAGService = None
+
+pytestmark = pytest.mark.skipif(RAGService is None, reason="RAG dependencies not available")
+
+
+class _FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self.add_calls = 0
+
+    def get(self, ids, include=None):
+        return {"ids": [i for i in ids if i in self.docs]}
+
+    def add(self, documents, embeddings, metadatas, ids):
+        self.add_calls += 1
+        assert len(documents) == len(embeddings) == len(metadatas) == len(ids)
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.docs[doc_id] = (document, metadata)
+
+
+class _FakeClient:
+    def __init__(self):
+        self.collection = _FakeCollection()
+        self.lookups = 0
+
+    def get_or_create_collection(self, name):
+        self.lookups += 1
+        return self.collection
+
+    def get_collection(self, name):
+        self.lookups += 1
+        return self.collection
+
+
+class _FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, **kwargs):
+        self.calls.append((len(texts), batch_size, normalize_embeddings))
+        return np.ones((len(texts), 4))
+
+
+@pytest.fixture
+def service():
+    """Servicio sin singleton ni dependencias reales"""
+    svc = object.__new__(RAGService)
+    svc._initialized = True
+    svc._collections = {}
+    svc._collections_lock = threading.Lock()
+    svc._encode_lock = threading.Lock()
+    svc.client = _FakeClient()
+    svc.embedding_model = _FakeModel()
+    return svc
+
+
+class TestBatchIngest:
+    """Tests de add_documents e ingesta por chunks"""
+
+    def test_single_encode_per_batch(self, service):
+        """Cien textos se codifican en una llamada con el batch_size pedido"""
+        texts = [f"event {i}" for i in range(100)]
+        stats = service.add_documents("CASE-1", texts, batch_size=16, normalize_embeddings=True)
+        assert stats["added"] == 100
+        assert service.embedding_model.calls == [(100, 16, True)]
+        assert stats["docs_per_sec"] > 0
+
+    def test_dedup_by_content_hash(self, service):
+        """Textos repetidos o ya indexados no se vuelven a embeber"""
+        service.add_documents("CASE-1", ["a", "b"])
+        stats = service.add_documents("CASE-1", ["a", "b", "c", "c"])
+        assert stats == {**stats, "added": 1, "skipped": 3, "total": 4}
+        assert service.embedding_model.calls[-1][0] == 1
+        assert content_id("CASE-1", "c") in service.client.collection.docs
+
+    def test_collection_handle_cached(self, service):
+        """get_or_create_collection se llama una sola vez por caso"""
+        for i in range(5):
+            service.add_document("CASE-1", f"doc {i}")
+        assert service.client.lookups == 1
+
+    def test_ingest_stream_chunks_with_metadata(self, service):
+        """Un archivo largo se indexa por chunks con offset e índice"""
+        text = "".join(f"line {i} suspicious powershell -enc AAAA\n" for i in range(500))
+        stats = service.ingest_stream("CASE-1", io.StringIO(text), {"source": "ps.log"},
+                                      chunk_size=1000, overlap=200)
+        assert stats["chunks"] == stats["added"] > 1
+        metadatas = [m for _, m in service.client.collection.docs.values()]
+        assert {m["source"] for m in metadatas} == {"ps.log"}
+        assert sorted(m["chunk_index"] for m in metadatas) == list(range(stats["chunks"]))
+
+    @pytest.mark.asyncio
+    async def test_async_runs_off_loop(self, service):
+        """La variante async devuelve las mismas estadísticas"""
+        stats = await service.add_documents_async("CASE-2", ["x", "y"])
+        assert stats["added"] == 2
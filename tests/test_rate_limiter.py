@@ -0,0 +1,148 @@
+"""
+MCP Kali Forensics - Tests for Rate Limiter v4.7
+GCRA en memoria y en Redis (fakeredis), y cabeceras del middleware RBAC
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.config import settings
+from api.middleware import rbac
+from api.services.rate_limiter import InMemoryRateLimiter, RedisRateLimiter
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+requires_fakeredis = pytest.mark.skipif(fakeredis is None, reason="fakeredis not installed")
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _BrokenRedis:
+    def register_script(self, script):
+        async def run(keys, args):
+            raise ConnectionError("redis down")
+        return run
+
+
+class TestInMemoryRateLimiter:
+    """Tests del GCRA en memoria"""
+
+    @pytest.mark.asyncio
+    async def test_burst_then_retry_after(self):
+        """Admite ``limit`` peticiones de golpe y luego indica cuándo reintentar"""
+        clock = _Clock()
+        limiter = InMemoryRateLimiter(clock=clock)
+
+        results = [await limiter.hit("k", limit=5, window=60) for _ in range(6)]
+
+        assert [r.allowed for r in results] == [True] * 5 + [False]
+        assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+        assert results[5].retry_after == pytest.approx(12)
+        assert results[5].headers()["Retry-After"] == "12"
+
+        clock.now += 12
+        assert (await limiter.hit("k", limit=5, window=60)).allowed is True
+        assert (await limiter.hit("k", limit=5, window=60)).allowed is False
+
+    @pytest.mark.asyncio
+    async def test_sliding_window_recovers_gradually(self):
+        """Cada ``window / limit`` segundos se recupera una petición"""
+        clock = _Clock()
+        limiter = InMemoryRateLimiter(clock=clock)
+        for _ in range(4):
+            await limiter.hit("k", limit=4, window=8)
+
+        clock.now += 4
+        result = await limiter.hit("k", limit=4, window=8)
+        assert result.allowed is True
+        assert result.remaining == 1
+
+    @pytest.mark.asyncio
+    async def test_cleanup_forgets_idle_keys(self):
+        clock = _Clock()
+        limiter = InMemoryRateLimiter(clock=clock, cleanup_interval=10)
+        await limiter.hit("idle", limit=10, window=1)
+        clock.now += 11
+        await limiter.hit("other", limit=10, window=1)
+        assert "idle" not in limiter._tat
+
+
+@requires_fakeredis
+class TestRedisRateLimiter:
+    """Tests del GCRA en Lua contra fakeredis"""
+
+    @pytest.mark.asyncio
+    async def test_limit_shared_between_workers(self):
+        """Dos workers con su propio cliente comparten el mismo límite"""
+        server = fakeredis.FakeServer()
+        worker_a = RedisRateLimiter(fakeredis.FakeAsyncRedis(server=server))
+        worker_b = RedisRateLimiter(fakeredis.FakeAsyncRedis(server=server))
+
+        results = []
+        for i in range(6):
+            worker = worker_a if i % 2 == 0 else worker_b
+            results.append(await worker.hit("k", limit=4, window=60))
+
+        assert [r.allowed for r in results] == [True] * 4 + [False] * 2
+        assert results[3].remaining == 0
+        assert 14 < results[4].retry_after <= 15
+
+    @pytest.mark.asyncio
+    async def test_every_key_has_ttl(self):
+        """El estado se escribe con TTL en la misma llamada"""
+        client = fakeredis.FakeAsyncRedis()
+        limiter = RedisRateLimiter(client)
+        for _ in range(3):
+            await limiter.hit("k", limit=3, window=30)
+
+        ttl_ms = await client.pttl("ratelimit:k")
+        assert 0 < ttl_ms <= 30_000
+
+    @pytest.mark.asyncio
+    async def test_concurrent_hits_never_exceed_limit(self):
+        """Peticiones concurrentes no superan el límite (script atómico)"""
+        limiter = RedisRateLimiter(fakeredis.FakeAsyncRedis())
+        results = await asyncio.gather(*[limiter.hit("k", limit=10, window=60) for _ in range(50)])
+        assert sum(r.allowed for r in results) == 10
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_falls_back_to_memory(self):
+        limiter = RedisRateLimiter(_BrokenRedis())
+        results = [await limiter.hit("k", limit=2, window=60) for _ in range(3)]
+        assert [r.allowed for r in results] == [True, True, False]
+
+
+class TestRBACRateLimitHeaders:
+    """Tests de cabeceras de rate limit en el middleware"""
+
+    def test_headers_and_429(self, monkeypatch):
+        """Respuestas con X-RateLimit-*; al agotar el límite, 429 con Retry-After"""
+        monkeypatch.setattr(rbac, "rate_limiter", InMemoryRateLimiter())
+        app = FastAPI()
+        app.add_middleware(rbac.RBACMiddleware)
+
+        @app.post("/pentest/run")
+        async def run():
+            return {"ok": True}
+
+        client = TestClient(app)
+        headers = {"X-API-Key": settings.API_KEY}
+        responses = [client.post("/pentest/run", headers=headers) for _ in range(11)]
+
+        assert [r.status_code for r in responses] == [200] * 10 + [429]
+        assert responses[0].headers["X-RateLimit-Limit"] == "10"
+        assert responses[0].headers["X-RateLimit-Remaining"] == "9"
+        assert int(responses[10].headers["Retry-After"]) == 6
+        assert responses[10].json()["retry_after"] == 6
@@ -235,6 +235,113 @@ class TestRolePermissionMapping:
         assert viewer_perms.issubset(analyst_perms)
 
 
+class TestCompiledRouteTable:
+    """Tests para el trie de rutas compilado"""
+    
+    def test_matches_linear_scan(self):
+        """El trie devuelve lo mismo que el escaneo lineal"""
+        from core.rbac_config import PROTECTED_ROUTES, _scan_route_permissions
+        
+        prefixes = list(PUBLIC_ROUTES) + [r.path_prefix for r in PROTECTED_ROUTES]
+        paths = {"", "/", "/unknown", "/api", "/api/x"}
+        for prefix in prefixes:
+            paths.update({prefix, prefix[:-1], prefix[:len(prefix) // 2]})
+            paths.update(prefix + suffix for suffix in ("/", "/123", "/a/b", "-x"))
+        
+        for path in paths:
+            for method in ("GET", "POST", "PUT", "DELETE"):
+                compiled = get_route_permissions(path, method)
+                scanned = _scan_route_permissions(path, method)
+                if scanned is None:
+                    assert compiled is None, (path, method)
+                else:
+                    assert (compiled.path_prefix, compiled.method, compiled.public,
+                            compiled.permissions) == (
+                        scanned.path_prefix, scanned.method, scanned.public,
+                        scanned.permissions), (path, method)
+    
+    def test_method_specific_route_wins_at_same_prefix(self):
+        """A igual prefijo gana la primera regla de la lista cuyo método coincide"""
+        from core.rbac_config import RouteTrie
+        
+        trie = RouteTrie([], [
+            RoutePermission(path_prefix="/x", method="POST", permissions={Permission.WRITE}),
+            RoutePermission(path_prefix="/x", permissions={Permission.READ}),
+            RoutePermission(path_prefix="/x/y", method="DELETE", permissions={Permission.DELETE}),
+        ])
+        
+        assert trie.match("/x/y", "POST").permissions == {Permission.WRITE}
+        assert trie.match("/x/y", "GET").permissions == {Permission.READ}
+        assert trie.match("/x/y/z", "DELETE").permissions == {Permission.DELETE}
+        assert trie.match("/z", "GET") is None
+
+
+class TestTokenClaimsCache:
+    """Tests para la cache de tokens JWT validados"""
+    
+    def _token(self, **claims):
+        import jwt
+        from api.config import settings
+        return jwt.encode(claims, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    
+    @pytest.mark.asyncio
+    async def test_cached_token_skips_decode(self, monkeypatch):
+        """El segundo uso del token no vuelve a verificar la firma"""
+        import time
+        import jwt
+        from api.middleware import rbac
+        
+        monkeypatch.setattr(rbac, "token_cache", rbac.TokenClaimsCache())
+        token = self._token(sub="u1", roles=["analyst"], exp=int(time.time()) + 3600)
+        middleware = rbac.RBACMiddleware(app=Mock())
+        
+        first = await middleware._validate_bearer_token(token)
+        with patch.object(jwt, "decode", side_effect=AssertionError("decoded again")):
+            second = await middleware._validate_bearer_token(token)
+        
+        assert second is first
+        assert Permission.RUN_TOOLS in second["permissions"]
+        assert rbac.token_cache.hits == 1
+    
+    def test_entry_never_outlives_exp(self):
+        """La entrada caduca con el exp del token aunque el TTL sea mayor"""
+        from api.middleware.rbac import TokenClaimsCache
+        import time
+        
+        cache = TokenClaimsCache(max_size=10, ttl=3600)
+        cache.put("k", {"user_id": "u1"}, token_exp=time.time() - 1)
+        assert cache.get("k") is None
+    
+    @pytest.mark.asyncio
+    async def test_expired_token_rejected(self, monkeypatch):
+        """Un token expirado no se cachea y sigue devolviendo 401"""
+        import time
+        from api.middleware import rbac
+        
+        monkeypatch.setattr(rbac, "token_cache", rbac.TokenClaimsCache())
+        token = self._token(sub="u1", exp=int(time.time()) - 10)
+        middleware = rbac.RBACMiddleware(app=Mock())
+        
+        for _ in range(2):
+            with pytest.raises(HTTPException) as exc:
+                await middleware._validate_bearer_token(token)
+            assert exc.value.status_code == 401
+    
+    def test_lru_eviction(self):
+        """Se descarta la entrada menos usada al superar max_size"""
+        from api.middleware.rbac import TokenClaimsCache
+        
+        cache = TokenClaimsCache(max_size=2, ttl=60)
+        cache.put("a", {"user_id": "a"})
+        cache.put("b", {"user_id": "b"})
+        cache.get("a")
+        cache.put("c", {"user_id": "c"})
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == {"user_id": "a"}
+        assert cache.get("c") == {"user_id": "c"}
+
+
 # =============================================================================
 # INTEGRATION TESTS (requieren app running)
 # =============================================================================
@@ -0,0 +1,305 @@
+"""
+MCP Kali Forensics - Tests for SOAR Checkpoints v4.7
+Tests de persistencia y reanudación de ejecuciones de playbooks
+"""
+
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import api.services.soar_checkpoints as soar_checkpoints
+import api.services.soar_engine as soar_engine
+from api.database import Base
+from api.models.tools import (
+    Playbook, PlaybookExecution, PlaybookExecutionCheckpoint, PlaybookStep, PlaybookStepExecution,
+    PlaybookStepResult
+)
+from api.services.soar_checkpoints import (
+    CheckpointStore, deserialize_context, serialize_context, step_idempotency_key
+)
+from api.services.soar_engine import SOAREngine, _ExecutionProgress
+
+
+@pytest.fixture
+def checkpoint_db(tmp_path, monkeypatch):
+    """BD SQLite aislada con las tablas de ejecución y checkpoints"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'soar.db'}")
+    Base.metadata.create_all(engine, tables=[
+        Playbook.__table__,
+        PlaybookStep.__table__,
+        PlaybookExecution.__table__,
+        PlaybookExecutionCheckpoint.__table__,
+        PlaybookStepResult.__table__,
+        PlaybookStepExecution.__table__,
+    ])
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    monkeypatch.setattr(soar_checkpoints, "get_db_context", db_context)
+    monkeypatch.setattr(soar_engine, "get_db_context", db_context)
+    monkeypatch.setattr(soar_engine, "SOAR_ML_AVAILABLE", False)
+    return db_context
+
+
+def _step(order, depends_on=None):
+    return {"id": f"S{order}", "order": order, "name": f"step {order}",
+            "action_type": "wait", "parameters": {"n": order}, "depends_on": depends_on}
+
+
+def _add_running_execution(db_context, execution_id):
+    with db_context() as db:
+        db.add(PlaybookExecution(id=execution_id, playbook_id="PB-TEST", status="running"))
+
+
+def _add_playbook(db_context, depends_on=None):
+    with db_context() as db:
+        db.add(Playbook(id="PB-TEST", name="Resume test", execution_count=0, success_rate=0.0))
+        for order in (1, 2, 3):
+            db.add(PlaybookStep(
+                id=f"PB-TEST-S{order:02d}", playbook_id="PB-TEST", order=order,
+                name=f"step {order}", action_type="wait", parameters={"n": order},
+                depends_on=(depends_on or {}).get(order, [order - 1] if order > 1 else [])
+            ))
+
+
+def _orphan_execution(db_context, execution_id, completed_steps=()):
+    """Ejecución en curso cuyo worker dejó de latir tras completar ``completed_steps``"""
+    _add_running_execution(db_context, execution_id)
+    dead = CheckpointStore(owner="dead-worker")
+    context = {"input": {}, "steps": {}, "iocs": [], "execution_id": execution_id}
+    dead.begin(execution_id, context)
+    for step in completed_steps:
+        dead.save_step(execution_id, step, {"status": "completed", "output": step["name"]}, context)
+    with db_context() as db:
+        db.query(PlaybookExecutionCheckpoint).filter(
+            PlaybookExecutionCheckpoint.execution_id == execution_id
+        ).update({"heartbeat_at": datetime.utcnow() - timedelta(days=1)})
+
+
+async def _wait_until_finished(db_context, execution_id):
+    for _ in range(200):
+        with db_context() as db:
+            record = db.query(PlaybookExecution).filter(PlaybookExecution.id == execution_id).first()
+            db.expunge_all()
+        if record.status != "running":
+            return record
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{execution_id} still running")
+
+
+class _NoFlushProgress(_ExecutionProgress):
+    def __init__(self):
+        super().__init__("PEXE-CKPT", flush_interval=3600)
+
+    def flush(self):
+        self._dirty = False
+
+
+class TestSerialization:
+    """Tests de serialización de contexto"""
+
+    def test_context_roundtrip_drops_steps(self):
+        """Los resultados de pasos no se duplican en el blob del contexto"""
+        context = {"input": {"ip": "8.8.8.8"}, "steps": {1: {"output": "x" * 1000}},
+                   "iocs": [{"type": "ip", "value": "8.8.8.8"}], "execution_id": "PEXE-1"}
+        blob, codec = serialize_context(context)
+        restored = deserialize_context(blob, codec)
+        assert restored["input"] == context["input"]
+        assert restored["iocs"] == context["iocs"]
+        assert restored["steps"] == {}
+        assert len(blob) < 200
+
+    def test_idempotency_key_tracks_definition(self):
+        """La clave cambia si cambia la definición del paso"""
+        step = _step(1)
+        key = step_idempotency_key("PEXE-1", step)
+        assert key == step_idempotency_key("PEXE-1", dict(step, name="renamed"))
+        assert key != step_idempotency_key("PEXE-1", dict(step, parameters={"n": 2}))
+        assert key != step_idempotency_key("PEXE-2", step)
+
+
+class TestCheckpointStore:
+    """Tests del store de checkpoints"""
+
+    def test_save_and_load(self, checkpoint_db):
+        """Contexto y resultados sobreviven a una nueva instancia"""
+        _add_running_execution(checkpoint_db, "PEXE-A")
+        store = CheckpointStore(owner="worker-1")
+        context = {"input": {"a": 1}, "steps": {}, "iocs": [], "execution_id": "PEXE-A"}
+        store.begin("PEXE-A", context)
+        context["iocs"].append({"type": "domain", "value": "evil.com"})
+        store.save_step("PEXE-A", _step(1), {"status": "completed", "output": "ok"}, context)
+        # Guardar dos veces el mismo paso no duplica filas
+        store.save_step("PEXE-A", _step(1), {"status": "completed", "output": "ok"}, context)
+
+        loaded_context, results = CheckpointStore(owner="worker-2").load("PEXE-A")
+        assert loaded_context["iocs"] == [{"type": "domain", "value": "evil.com"}]
+        assert list(results) == [1]
+        assert results[1][0] == step_idempotency_key("PEXE-A", _step(1))
+        assert results[1][1]["output"] == "ok"
+
+    def test_claim_stale_single_winner(self, checkpoint_db):
+        """Sólo un worker reclama una ejecución huérfana; las vivas no se tocan"""
+        _add_running_execution(checkpoint_db, "PEXE-DEAD")
+        _add_running_execution(checkpoint_db, "PEXE-ALIVE")
+        _add_running_execution(checkpoint_db, "PEXE-LEGACY")
+        dead = CheckpointStore(owner="dead-worker")
+        dead.begin("PEXE-DEAD", {"steps": {}})
+        dead.begin("PEXE-ALIVE", {"steps": {}})
+        with checkpoint_db() as db:
+            db.query(PlaybookExecutionCheckpoint).filter(
+                PlaybookExecutionCheckpoint.execution_id == "PEXE-DEAD"
+            ).update({"heartbeat_at": datetime.utcnow() - timedelta(minutes=10)})
+
+        first = CheckpointStore(owner="worker-1").claim_stale(120)
+        second = CheckpointStore(owner="worker-2").claim_stale(120)
+
+        assert sorted(first) == ["PEXE-DEAD", "PEXE-LEGACY"]
+        assert second == []
+
+
+class TestResume:
+    """Tests de reanudación tras una caída"""
+
+    @pytest.mark.asyncio
+    async def test_crash_mid_execution_resumes_without_repeating(self, checkpoint_db):
+        """Los pasos terminados antes de la caída no se vuelven a ejecutar"""
+        _add_running_execution(checkpoint_db, "PEXE-CKPT")
+        steps = [_step(1, []), _step(2, [1]), _step(3, [2])]
+        context = {"input": {}, "steps": {}, "iocs": [], "execution_id": "PEXE-CKPT"}
+
+        crashed = SOAREngine(checkpoints=CheckpointStore(owner="worker-1"))
+        crashed.checkpoints.begin("PEXE-CKPT", context)
+        executed = []
+
+        async def hangs_on_step_2(step, ctx):
+            executed.append(step["order"])
+            if step["order"] == 2:
+                await asyncio.sleep(3600)
+            return {"status": "completed", "output": f"step {step['order']}"}
+
+        crashed._execute_step = hangs_on_step_2
+        task = asyncio.create_task(crashed._run_step_graph(
+            steps, crashed._build_step_dependencies(steps), context, _NoFlushProgress()
+        ))
+        while executed != [1, 2]:
+            await asyncio.sleep(0.01)
+        task.cancel()  # Simula la caída del proceso
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # Nuevo proceso: carga checkpoint y continúa
+        resumed = SOAREngine(checkpoints=CheckpointStore(owner="worker-2"))
+        saved_context, saved = resumed.checkpoints.load("PEXE-CKPT")
+        completed = {
+            order: result for order, (key, result) in saved.items()
+            if key == step_idempotency_key("PEXE-CKPT", steps[order - 1])
+        }
+        assert list(completed) == [1]
+
+        rerun = []
+
+        async def record(step, ctx):
+            rerun.append(step["order"])
+            return {"status": "completed"}
+
+        resumed._execute_step = record
+        progress = _NoFlushProgress()
+        await resumed._run_step_graph(
+            steps, resumed._build_step_dependencies(steps), saved_context, progress,
+            completed_results=completed
+        )
+
+        assert rerun == [2, 3]
+        assert progress.completed == 3
+        assert saved_context["steps"][1]["output"] == "step 1"
+
+    @pytest.mark.asyncio
+    async def test_startup_scan_resumes_execution_end_to_end(self, checkpoint_db):
+        """El escáner de arranque reclama, reanuda y finaliza la ejecución huérfana"""
+        _add_playbook(checkpoint_db)
+        engine = SOAREngine(checkpoints=CheckpointStore(owner="worker-2"))
+        with checkpoint_db() as db:
+            steps = engine._load_steps_data(db, "PB-TEST")
+        _orphan_execution(checkpoint_db, "PEXE-E2E", completed_steps=steps[:1])
+
+        rerun = []
+
+        async def record(step, ctx):
+            rerun.append(step["order"])
+            return {"status": "completed"}
+
+        engine._execute_step = record
+        try:
+            assert await engine.resume_interrupted_executions() == ["PEXE-E2E"]
+            finished = await _wait_until_finished(checkpoint_db, "PEXE-E2E")
+        finally:
+            await engine.stop_heartbeat()
+
+        assert rerun == [2, 3]
+        assert finished.status == "success"
+        with checkpoint_db() as db:
+            assert db.query(PlaybookExecutionCheckpoint).count() == 0
+            assert db.query(Playbook).first().execution_count == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_resume_marks_execution_failed(self, checkpoint_db):
+        """Si la reanudación falla, la ejecución se cierra y no se reclama otra vez"""
+        _add_playbook(checkpoint_db, depends_on={3: [9]})  # grafo inválido
+        _orphan_execution(checkpoint_db, "PEXE-BROKEN")
+        engine = SOAREngine(checkpoints=CheckpointStore(owner="worker-2"))
+        try:
+            assert await engine.resume_interrupted_executions() == ["PEXE-BROKEN"]
+            finished = await _wait_until_finished(checkpoint_db, "PEXE-BROKEN")
+        finally:
+            await engine.stop_heartbeat()
+
+        assert finished.status == "failed" and finished.success is False
+        assert "unknown steps" in finished.error_message
+        assert finished.completed_at is not None
+        with checkpoint_db() as db:
+            assert db.query(PlaybookExecutionCheckpoint).count() == 0
+        assert CheckpointStore(owner="worker-3").claim_stale(120) == []
+
+    @pytest.mark.asyncio
+    async def test_step_in_flight_at_crash_is_rerun(self, checkpoint_db):
+        """El paso en curso durante la caída se repite sobre su fila existente"""
+        _add_playbook(checkpoint_db)
+        with checkpoint_db() as db:
+            db.query(PlaybookStep).update({"parameters": {"seconds": 0}}, synchronize_session=False)
+        engine = SOAREngine(checkpoints=CheckpointStore(owner="worker-2"))
+        with checkpoint_db() as db:
+            steps = engine._load_steps_data(db, "PB-TEST")
+        _orphan_execution(checkpoint_db, "PEXE-INFLIGHT", completed_steps=steps[:1])
+        with checkpoint_db() as db:
+            db.add(PlaybookStepExecution(id="PEXE-INFLIGHT-02", playbook_execution_id="PEXE-INFLIGHT",
+                                         step_id=steps[1]["id"], step_order=2, status="running"))
+
+        try:
+            assert await engine.resume_interrupted_executions() == ["PEXE-INFLIGHT"]
+            finished = await _wait_until_finished(checkpoint_db, "PEXE-INFLIGHT")
+        finally:
+            await engine.stop_heartbeat()
+
+        assert finished.status == "success"
+        with checkpoint_db() as db:
+            rows = db.query(PlaybookStepExecution).order_by(PlaybookStepExecution.step_order).all()
+            assert [(row.id, row.status) for row in rows] == [
+                ("PEXE-INFLIGHT-02", "completed"), ("PEXE-INFLIGHT-03", "completed")
+            ]
+            assert rows[0].output == {"waited_seconds": 0} and rows[0].finished_at is not None
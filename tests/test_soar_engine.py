@@ -0,0 +1,312 @@
+"""
+MCP Kali Forensics - Tests for SOAR Engine step graph v4.7
+Tests unitarios de ejecución concurrente de pasos, MAP y condiciones
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import api.services.soar_engine as soar_engine
+from api.database import Base
+from api.models.tools import Playbook, PlaybookExecution, PlaybookStep, PlaybookStepExecution
+from api.services.soar_engine import SOAREngine, _ExecutionProgress
+from api.services.soar_conditions import (
+    ConditionError, evaluate_condition, validate_condition
+)
+
+
+def _step(order, depends_on=None, **extra):
+    return {"id": f"S{order}", "order": order, "name": f"step {order}",
+            "action_type": "wait", "depends_on": depends_on, **extra}
+
+
+def _context():
+    return {"input": {}, "steps": {}, "iocs": [], "execution_id": "PEXE-TEST"}
+
+
+class _NoFlushProgress(_ExecutionProgress):
+    """Progreso sin escritura en BD"""
+
+    def __init__(self):
+        super().__init__("PEXE-TEST", flush_interval=3600)
+
+    def flush(self):
+        self._dirty = False
+
+
+class _NoCheckpoints:
+    """Store de checkpoints sin BD"""
+
+    def save_step(self, execution_id, step, step_result, context):
+        pass
+
+
+@pytest.fixture
+def step_db(tmp_path, monkeypatch):
+    """BD SQLite aislada para los registros de ejecución de pasos"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'step_exec.db'}")
+    Base.metadata.create_all(engine, tables=[PlaybookExecution.__table__, PlaybookStepExecution.__table__])
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def rows():
+        with db_context() as db:
+            found = db.query(PlaybookStepExecution).order_by(PlaybookStepExecution.step_order).all()
+            db.expunge_all()
+        return found
+
+    monkeypatch.setattr(soar_engine, "get_db_context", db_context)
+    with db_context() as db:
+        db.add(PlaybookExecution(id="PEXE-TEST", playbook_id="PB-TEST", status="running"))
+    return rows
+
+
+class TestStepDependencies:
+    """Tests de construcción del grafo"""
+
+    def test_sequential_when_no_dependencies_declared(self):
+        """Sin depends_on cada paso depende del anterior"""
+        engine = SOAREngine()
+        steps = [{"order": 1}, {"order": 3}, {"order": 2}]
+        assert engine._build_step_dependencies(steps) == {1: [], 2: [1], 3: [2]}
+
+    def test_declared_dependencies(self):
+        """Pasos sin depends_on son raíces en modo DAG"""
+        engine = SOAREngine()
+        steps = [_step(1, []), _step(2), _step(3, [1, 2])]
+        assert engine._build_step_dependencies(steps) == {1: [], 2: [], 3: [1, 2]}
+
+    def test_cycle_rejected(self):
+        """Un ciclo invalida el playbook"""
+        engine = SOAREngine()
+        with pytest.raises(ValueError):
+            engine._build_step_dependencies([_step(1, [2]), _step(2, [1])])
+
+    def test_unknown_dependency_rejected(self):
+        """Dependencia a un paso inexistente"""
+        engine = SOAREngine()
+        with pytest.raises(ValueError):
+            engine._build_step_dependencies([_step(1, [9])])
+
+
+class TestStepGraphExecution:
+    """Tests del scheduler de pasos"""
+
+    @pytest.mark.asyncio
+    async def test_independent_steps_run_concurrently(self):
+        """Tres pasos independientes de 0.1s tardan ~0.1s, no 0.3s"""
+        engine = SOAREngine(checkpoints=_NoCheckpoints())
+
+        async def fake_execute(step, context):
+            await asyncio.sleep(0.1)
+            return {"status": "completed"}
+
+        engine._execute_step = fake_execute
+        steps = [_step(1, []), _step(2, []), _step(3, []), _step(4, [1, 2, 3])]
+        progress = _NoFlushProgress()
+
+        start = time.perf_counter()
+        await engine._run_step_graph(
+            steps, engine._build_step_dependencies(steps), _context(), progress, max_concurrency=4
+        )
+        elapsed = time.perf_counter() - start
+
+        assert progress.completed == 4
+        assert elapsed < 0.35
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_respected(self):
+        """Nunca se superan max_concurrency pasos en curso"""
+        engine = SOAREngine(checkpoints=_NoCheckpoints())
+        in_flight = 0
+        peak = 0
+
+        async def fake_execute(step, context):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+            return {"status": "completed"}
+
+        engine._execute_step = fake_execute
+        steps = [_step(i, []) for i in range(1, 11)]
+        await engine._run_step_graph(
+            steps, engine._build_step_dependencies(steps), _context(), _NoFlushProgress(),
+            max_concurrency=3
+        )
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_failure_stops_dependents(self):
+        """Un fallo sin continue_on_error no lanza pasos nuevos"""
+        engine = SOAREngine(checkpoints=_NoCheckpoints())
+        executed = []
+
+        async def fake_execute(step, context):
+            executed.append(step["order"])
+            return {"status": "failed" if step["order"] == 1 else "completed"}
+
+        engine._execute_step = fake_execute
+        steps = [_step(1, []), _step(2, [1]), _step(3, [2])]
+        progress = _NoFlushProgress()
+        await engine._run_step_graph(
+            steps, engine._build_step_dependencies(steps), _context(), progress
+        )
+        assert executed == [1]
+        assert progress.failed == 1
+
+
+class TestMapStep:
+    """Tests del paso MAP"""
+
+    @pytest.mark.asyncio
+    async def test_map_applies_action_in_parallel(self):
+        """Cada elemento se procesa con su propio sub-paso"""
+        engine = SOAREngine(checkpoints=_NoCheckpoints())
+        seen = []
+
+        async def fake_handler(step, context):
+            await asyncio.sleep(0.05)
+            seen.append(step["parameters"]["value"])
+            return {"looked_up": step["parameters"]["value"]}
+
+        engine.step_handlers["fake_lookup"] = fake_handler
+        context = _context()
+        context["iocs"] = [{"type": "ip", "value": f"8.8.8.{i}"} for i in range(10)]
+        step = _step(1, None, action_type="map", map_over="iocs", max_concurrency=10,
+                     map_action={"action_type": "fake_lookup", "parameters": {"value": "item.value"}})
+
+        start = time.perf_counter()
+        result = await engine._execute_map_step(step, context)
+        elapsed = time.perf_counter() - start
+
+        assert result["items_completed"] == 10
+        assert sorted(seen) == sorted(i["value"] for i in context["iocs"])
+        assert elapsed < 0.3
+
+    @pytest.mark.asyncio
+    async def test_map_partial_failures_reported(self):
+        """Fallos individuales no abortan el MAP"""
+        engine = SOAREngine(checkpoints=_NoCheckpoints())
+
+        async def flaky(step, context):
+            if step["map_item"] % 2:
+                raise RuntimeError("provider down")
+            return {}
+
+        engine.step_handlers["flaky"] = flaky
+        context = _context()
+        context["input"] = {"items": [0, 1, 2, 3]}
+        step = _step(1, None, action_type="map", map_over="input.items",
+                     map_action={"action_type": "flaky"})
+        result = await engine._execute_map_step(step, context)
+        assert result["items_failed"] == 2
+        assert result["items_completed"] == 2
+
+
+class TestStepModel:
+    """Columnas de grafo y MAP persistidas en playbook_steps"""
+
+    def test_load_steps_data_roundtrip(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'steps.db'}")
+        Base.metadata.create_all(engine, tables=[Playbook.__table__, PlaybookStep.__table__])
+        with sessionmaker(bind=engine)() as db:
+            db.add(Playbook(id="PB-1", name="fan-out"))
+            db.add(PlaybookStep(id="PB-1-S02", playbook_id="PB-1", order=2, name="enrich",
+                                action_type="map", depends_on=[1], map_over="iocs",
+                                map_action={"action_type": "enrich_ioc"}, max_concurrency=4))
+            db.add(PlaybookStep(id="PB-1-S01", playbook_id="PB-1", order=1, name="collect",
+                                action_type="wait", parameters={"seconds": 1}))
+            db.commit()
+            steps = SOAREngine()._load_steps_data(db, "PB-1")
+
+        assert [s["order"] for s in steps] == [1, 2]
+        assert steps[0]["parameters"] == {"seconds": 1} and steps[0]["depends_on"] is None
+        assert steps[0]["timeout_seconds"] == 300 and steps[0]["wait_for_completion"] is True
+        assert (steps[1]["depends_on"], steps[1]["map_over"], steps[1]["max_concurrency"]) == ([1], "iocs", 4)
+        assert steps[1]["map_action"] == {"action_type": "enrich_ioc"}
+
+
+    @pytest.mark.asyncio
+    async def test_execute_step_records_step_execution(self, step_db):
+        """Un paso real (sin stub de _execute_step) deja su fila terminada"""
+        engine = SOAREngine()
+        context = _context()
+        waited = await engine._execute_step(_step(1, parameters={"seconds": 0}), context)
+        context["steps"][1] = waited
+        skipped = await engine._execute_step(_step(2, [1], condition="previous_step.waited_seconds > 0"), context)
+
+        assert waited == {"status": "completed", "waited_seconds": 0}
+        assert skipped == {"status": "skipped", "reason": "condition_not_met"}
+        rows = step_db()
+        assert [(r.id, r.status) for r in rows] == [("PEXE-TEST-01", "completed"), ("PEXE-TEST-02", "skipped")]
+        assert rows[0].output == {"waited_seconds": 0} and rows[0].finished_at is not None
+
+
+class TestConditions:
+    """Tests del evaluador de condiciones"""
+
+    def test_previous_step_iocs_found(self):
+        """Compatibilidad con previous_step.iocs_found"""
+        engine = SOAREngine()
+        context = _context()
+        context["steps"] = {1: {"status": "completed", "iocs": [{"value": "x"}]}}
+        assert engine._evaluate_condition("previous_step.iocs_found > 0", context, _step(2))
+        assert not engine._evaluate_condition("previous_step.iocs_found == 0", context, _step(2))
+
+    def test_expressions(self):
+        """Operadores booleanos, in, len y subíndices"""
+        names = {"input": {"severity": "high"}, "steps": {1: {"status": "completed"}}, "iocs": [1, 2, 3]}
+        assert evaluate_condition('input.severity in ["high", "critical"]', names)
+        assert evaluate_condition('steps[1].status == "completed" and len(iocs) >= 3', names)
+        assert not evaluate_condition("not iocs", names)
+        assert not evaluate_condition("input.missing > 0", names)
+
+    def test_unsafe_expressions_rejected(self):
+        """Llamadas y construcciones arbitrarias no se permiten"""
+        with pytest.raises(ConditionError):
+            validate_condition("__import__('os').system('id')")
+        with pytest.raises(ConditionError):
+            evaluate_condition("open('/etc/passwd')", {})
+
+    def test_unbounded_multiplication_rejected(self):
+        """Repetición de secuencias y enteros enormes no agotan la memoria"""
+        names = {"iocs": [1, 2], "name": "a", "big": 10 ** 19}
+        for expression in ['"a" * 10000000000 == ""', "name * 3 == 'aaa'", "iocs * 2",
+                           "2 * big > 0", "999999999999 * 999999999999 > 0", '"%*d" % 5']:
+            with pytest.raises(ConditionError):
+                evaluate_condition(expression, names)
+        assert evaluate_condition("len(iocs) * 2.5 == 5 and 7 % 4 == 3", names)
+
+    def test_invalid_operands_do_not_raise(self):
+        """Campos ausentes y división por cero no cumplen la condición (ni lanzan)"""
+        names = {"previous_step": {"status": "completed"}}
+        for expression in ["previous_step.score + 1 > 0", "-previous_step.x", "1/0 > 0",
+                           "previous_step.status - 1 == 0", "7 % 0 == 0"]:
+            assert not evaluate_condition(expression, names)
+        assert evaluate_condition("previous_step.score + 1 > 0 or previous_step.status", names)
+
+    @pytest.mark.asyncio
+    async def test_bad_condition_skips_step(self, step_db):
+        """Una condición con operandos inválidos salta el paso sin romper el playbook"""
+        engine = SOAREngine()
+        result = await engine._execute_step(_step(1, condition="1/0 > 0", parameters={"seconds": 0}), _context())
+        assert result == {"status": "skipped", "reason": "condition_not_met"}
+        assert [row.status for row in step_db()] == ["skipped"]
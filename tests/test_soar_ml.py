@@ -0,0 +1,177 @@
+"""
+MCP Kali Forensics - Tests for SOAR ML v4.7
+Tests de feature store, predicción por lotes, entrenamiento incremental y versionado
+"""
+
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import api.services.soar_ml as soar_ml
+from api.database import Base
+from api.models.tools import Playbook, PlaybookExecution
+from api.services.soar_ml import (
+    FEATURE_NAMES, PlaybookFeatureStore, PlaybookRecommender, SOARMLModel
+)
+
+pytestmark = pytest.mark.skipif(not soar_ml.SKLEARN_AVAILABLE, reason="scikit-learn not installed")
+
+
+@pytest.fixture
+def history_db(tmp_path, monkeypatch):
+    """BD SQLite aislada con playbooks y ejecuciones"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'soar_ml.db'}")
+    Base.metadata.create_all(engine, tables=[Playbook.__table__, PlaybookExecution.__table__])
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    monkeypatch.setattr(soar_ml, "get_db_context", db_context)
+    with db_context() as db:
+        for i in range(3):
+            db.add(Playbook(id=f"PB-{i}", name=f"playbook {i}", category="incident_response",
+                            steps=[{"action_type": "tool_execute"}] * (i + 1), success_rate=0.5))
+    return db_context
+
+
+def _add_executions(db_context, count, start, seed=0):
+    """PB-0 casi siempre falla, PB-2 casi siempre tiene éxito"""
+    rng = random.Random(seed)
+    with db_context() as db:
+        for n in range(count):
+            playbook = n % 3
+            success = rng.random() < (0.1, 0.5, 0.9)[playbook]
+            started = start + timedelta(minutes=n)
+            db.add(PlaybookExecution(
+                id=f"PEXE-{seed}-{n}", playbook_id=f"PB-{playbook}",
+                status="success" if success else "failed",
+                started_at=started, completed_at=started + timedelta(seconds=30 + playbook * 60)
+            ))
+
+
+def _candidates():
+    return [{"id": f"PB-{i}", "name": f"playbook {i}", "category": "incident_response",
+             "steps": [{"action_type": "tool_execute"}] * (i + 1), "success_rate": 0.5}
+            for i in range(3)]
+
+
+class TestFeatureStore:
+    """Tests de agregados incrementales"""
+
+    def test_recent_failures_window(self):
+        """Los fallos fuera de la ventana se descartan"""
+        store = PlaybookFeatureStore(failure_window_hours=24)
+        now = datetime.utcnow()
+        store.record("PB-1", False, at=now - timedelta(hours=30))
+        store.record("PB-1", False, at=now - timedelta(hours=1))
+        store.record("PB-1", True, at=now)
+        assert store.recent_failures("PB-1", now) == 1
+        assert store.recent_failures("PB-unknown", now) == 0
+
+    def test_avg_execution_minutes(self):
+        """Media sólo sobre outcomes con duración; default si no hay datos"""
+        store = PlaybookFeatureStore()
+        store.record("PB-1", True, 60)
+        store.record("PB-1", True, 180)
+        store.record("PB-1", True, None)
+        assert store.avg_execution_minutes("PB-1") == 2.0
+        assert store.avg_execution_minutes("PB-2", default_seconds=600) == 10.0
+
+
+class TestTrainingAndPrediction:
+    """Tests de entrenamiento, warm start y predicción por lotes"""
+
+    @pytest.mark.asyncio
+    async def test_full_then_incremental_training(self, history_db, tmp_path):
+        """El segundo entrenamiento sólo lee ejecuciones nuevas y añade árboles"""
+        model = SOARMLModel(model_dir=tmp_path / "models", use_process_pool=False)
+        start = datetime.utcnow() - timedelta(days=3)
+        _add_executions(history_db, 120, start)
+
+        result = await model.train(force=True)
+        assert result["status"] == "success"
+        assert result["mode"] == "full"
+        trees = model.model.n_estimators
+
+        X_new, _, _ = model._prepare_training_data(model.training_cursor)
+        assert len(X_new) == 0
+
+        _add_executions(history_db, 30, start + timedelta(days=1), seed=1)
+        result = await model.train(force=True)
+        assert result["status"] == "success"
+        assert result["mode"] == "incremental"
+        assert model.model.n_estimators == trees + soar_ml.WARM_START_TREES
+        assert model.list_versions() == ["v0001", "v0002"]
+
+    @pytest.mark.asyncio
+    async def test_training_runs_in_process_pool(self, history_db, tmp_path):
+        """El ajuste se ejecuta fuera del proceso del event loop"""
+        model = SOARMLModel(model_dir=tmp_path / "models", use_process_pool=True)
+        _add_executions(history_db, 90, datetime.utcnow() - timedelta(days=1))
+        try:
+            result = await model.train(force=True)
+        finally:
+            soar_ml.shutdown_training_pool()
+        assert result["status"] == "success"
+        assert model.model.n_estimators == 100
+
+    @pytest.mark.asyncio
+    async def test_batch_prediction_single_inference(self, history_db, tmp_path):
+        """Todos los candidatos se puntúan con una sola llamada a predict_proba"""
+        model = SOARMLModel(model_dir=tmp_path / "models", use_process_pool=False)
+        _add_executions(history_db, 150, datetime.utcnow() - timedelta(days=2))
+        await model.train(force=True)
+
+        calls = []
+        original = model.model.predict_proba
+
+        def counting_predict_proba(features):
+            calls.append(features.shape)
+            return original(features)
+
+        model.model.predict_proba = counting_predict_proba
+        recommendations = await PlaybookRecommender(model).recommend({"id": "CASE-1"}, _candidates())
+
+        assert calls == [(3, len(FEATURE_NAMES))]
+        assert len(recommendations) == 3
+        assert all(r["ml_prediction"]["model_status"] == "trained" for r in recommendations)
+
+        # Segunda llamada: todo sale de la caché
+        await model.predict_batch(_candidates(), {"id": "CASE-1"})
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_lazy_versioned_load_and_rollback(self, history_db, tmp_path):
+        """Una instancia nueva no lee disco hasta el primer uso; se puede volver a una versión anterior"""
+        model_dir = tmp_path / "models"
+        trainer = SOARMLModel(model_dir=model_dir, use_process_pool=False)
+        _add_executions(history_db, 120, datetime.utcnow() - timedelta(days=3))
+        await trainer.train(force=True)
+        _add_executions(history_db, 30, datetime.utcnow() - timedelta(days=1), seed=1)
+        await trainer.train(force=True)
+
+        fresh = SOARMLModel(model_dir=model_dir, use_process_pool=False)
+        assert fresh.model is None
+        predictions = await fresh.predict_batch(_candidates())
+        assert fresh.version == "v0002"
+        assert all(0.0 <= p["probability"] <= 1.0 for p in predictions)
+
+        assert fresh.activate_version("v0001")
+        assert fresh.version == "v0001"
+        assert fresh.model.n_estimators == 100
+        assert (model_dir / "CURRENT").read_text() == "v0001"
+        assert not fresh.activate_version("v0999")
@@ -0,0 +1,182 @@
+"""
+MCP Kali Forensics - Tests for Storage Stats Index v4.7
+Contadores incrementales por bucket/tenant/caso y reconciliación perezosa
+"""
+
+import io
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import api.services.storage_stats as storage_stats
+from api.database import Base
+from api.models.evidence_management import StorageUsageStat
+from api.services.storage_stats import StorageStatsIndex, stat_scopes
+
+try:
+    from api.services.minio_storage import MinIOStorageService
+except Exception:  # minio no instalado o incompatible
+    MinIOStorageService = None
+
+BUCKET = "forensics-evidence"
+
+
+@pytest.fixture
+def stats_db(tmp_path, monkeypatch):
+    """BD SQLite aislada con la tabla de estadísticas"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    Base.metadata.create_all(engine, tables=[StorageUsageStat.__table__])
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    monkeypatch.setattr(storage_stats, "get_db_context", db_context)
+    return db_context
+
+
+def _obj(name, size):
+    return SimpleNamespace(object_name=name, size=size)
+
+
+class _ListingMinio:
+    """Cliente S3 mínimo que cuenta los listados completos"""
+
+    def __init__(self):
+        self.objects = {}
+        self.list_calls = 0
+
+    def put_object(self, bucket, name, data, length, **kwargs):
+        self.objects[name] = len(data.read())
+        return SimpleNamespace(etag="etag", version_id=None)
+
+    def set_object_tags(self, bucket, name, tags):
+        pass
+
+    def stat_object(self, bucket, name):
+        return SimpleNamespace(size=self.objects[name])
+
+    def remove_object(self, bucket, name):
+        self.objects.pop(name, None)
+
+    def list_objects(self, bucket, prefix="", recursive=False):
+        self.list_calls += 1
+        return [_obj(name, size) for name, size in self.objects.items() if name.startswith(prefix)]
+
+
+class TestScopes:
+    """Tests de ámbitos de un objeto"""
+
+    def test_case_object_scopes(self):
+        """Un objeto de caso cuenta en bucket, tenant, categoría y caso"""
+        assert stat_scopes("acme/cases/CASE-1/evidence/a.bin") == [
+            ("", "", ""), ("acme", "", ""), ("", "cases", ""),
+            ("acme", "cases", ""), ("acme", "cases", "CASE-1"),
+        ]
+
+    def test_keep_markers_ignored(self):
+        assert stat_scopes("acme/cases/.keep") == []
+
+
+class TestStorageStatsIndex:
+    """Tests del índice incremental"""
+
+    def test_unreconciled_bucket_returns_none(self, stats_db):
+        index = StorageStatsIndex()
+        index.record_put(BUCKET, "acme/cases/CASE-1/evidence/a.bin", 10)
+        assert index.get_stats(BUCKET) is None
+
+    def test_incremental_matches_full_listing(self, stats_db):
+        """Subidas, sobrescrituras y borrados dejan los mismos totales que un re-listado"""
+        index = StorageStatsIndex()
+        index.reconcile(BUCKET, [_obj("acme/cases/CASE-1/evidence/a.bin", 100)])
+
+        index.record_put(BUCKET, "acme/cases/CASE-1/evidence/b.bin", 50)
+        index.record_put(BUCKET, "acme/cases/CASE-2/evidence/c.bin", 7)
+        index.record_put(BUCKET, "acme/cases/CASE-1/evidence/a.bin", 120, previous_size=100)
+        index.record_put(BUCKET, "beta/scans/nmap/nmap_1.json", 3)
+        index.record_delete(BUCKET, "acme/cases/CASE-2/evidence/c.bin", 7)
+
+        incremental = {
+            key: index.get_stats(BUCKET, *key)
+            for key in [(None, None), ("acme", None), ("acme", "CASE-1"), ("acme", "CASE-2")]
+        }
+
+        index.reconcile(BUCKET, [
+            _obj("acme/cases/CASE-1/evidence/a.bin", 120),
+            _obj("acme/cases/CASE-1/evidence/b.bin", 50),
+            _obj("beta/scans/nmap/nmap_1.json", 3),
+        ])
+        for key, stats in incremental.items():
+            rebuilt = index.get_stats(BUCKET, *key)
+            for field in ("total_size_bytes", "total_objects", "by_type"):
+                assert stats[field] == rebuilt[field], (key, field)
+
+        assert incremental[(None, None)]["total_size_bytes"] == 173
+        assert incremental[(None, None)]["by_type"] == {"cases": 2, "scans": 1}
+        assert incremental[("acme", None)]["by_type"] == {"CASE-1": 2}
+        assert incremental[("acme", "CASE-1")]["total_objects"] == 2
+        assert incremental[("acme", "CASE-2")]["total_objects"] == 0
+
+    def test_stale_index_reconciles_in_background(self, stats_db):
+        """Un índice viejo responde al momento y se re-lista en segundo plano"""
+        index = StorageStatsIndex(reconcile_after_seconds=60)
+        index.reconcile(BUCKET, [_obj("acme/cases/CASE-1/evidence/a.bin", 5)])
+        with stats_db() as db:
+            db.query(StorageUsageStat).filter(StorageUsageStat.tenant_id == "").update(
+                {"last_reconciled_at": datetime.utcnow() - timedelta(hours=1)}
+            )
+
+        listed = [_obj("acme/cases/CASE-1/evidence/a.bin", 5),
+                  _obj("acme/cases/CASE-1/evidence/z.bin", 9)]
+        stats = index.get_or_reconcile(BUCKET, lambda: listed)
+        assert stats["stale"] is True
+        assert stats["total_objects"] == 1
+
+        index.wait_for_reconcile(BUCKET, timeout=5)
+        refreshed = index.get_stats(BUCKET)
+        assert refreshed["stale"] is False
+        assert refreshed["total_objects"] == 2
+
+
+@pytest.mark.skipif(MinIOStorageService is None, reason="minio client not available")
+class TestMinIOStorageStats:
+    """Tests de integración con el servicio MinIO"""
+
+    def _service(self):
+        service = MinIOStorageService.__new__(MinIOStorageService)
+        service.enabled = True
+        service.bucket_name = BUCKET
+        service.client = _ListingMinio()
+        return service
+
+    def test_stats_list_bucket_only_once(self, stats_db):
+        """Tras la primera reconciliación, las estadísticas no vuelven a listar"""
+        service = self._service()
+        service.upload_evidence("acme", "CASE-1", b"x" * 10, "a.bin")
+        assert service.get_storage_stats()["total_objects"] == 1
+        assert service.client.list_calls == 1
+
+        service.upload_evidence("acme", "CASE-1", b"y" * 30, "b.bin")
+        service.upload_evidence("acme", "CASE-1", b"z" * 4, "a.bin")  # sobrescritura
+        service.upload_evidence_stream("acme", "CASE-2", io.BytesIO(b"s" * 6), "s.bin", length=6)
+        service.delete_evidence("acme", "CASE-2", "s.bin")
+
+        stats = service.get_storage_stats("acme", "CASE-1")
+        assert stats["total_size_bytes"] == 34
+        assert stats["total_objects"] == 2
+        assert service.get_storage_stats()["total_objects"] == 2
+        assert service.client.list_calls == 1
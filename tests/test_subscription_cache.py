@@ -0,0 +1,172 @@
+"""
+MCP Kali Forensics - Tests for Subscription Entitlement Cache v4.7
+Snapshot de suscripción/plan por tenant sin consultas en el camino caliente
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401  (registra los modelos antes que el middleware)
+import api.middleware.subscription as subscription_mw
+from api.database import Base
+from api.middleware.subscription import (
+    EntitlementCache,
+    EntitlementSnapshot,
+    check_subscription_access,
+    evaluate_access,
+    get_subscription_info,
+    invalidate_entitlements,
+)
+from api.models.subscription import Subscription, SubscriptionPlan
+
+TENANT = str(uuid.uuid4())
+
+
+@pytest.fixture
+def subscription_db(tmp_path, monkeypatch):
+    """BD SQLite aislada con planes y suscripciones; cuenta las consultas"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'subs.db'}")
+    Base.metadata.create_all(
+        engine, tables=[SubscriptionPlan.__table__, Subscription.__table__]
+    )
+    Session = sessionmaker(bind=engine)
+    queries = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_queries(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    monkeypatch.setattr(subscription_mw, "SessionLocal", Session)
+    monkeypatch.setattr(subscription_mw, "entitlement_cache", EntitlementCache(ttl=30))
+
+    with Session() as db:
+        plan = SubscriptionPlan(
+            plan_id="pro", name="Pro", max_users=5, max_cases=100,
+            features=["m365", "pentest"],
+        )
+        db.add(plan)
+        db.flush()
+        db.add(Subscription(
+            tenant_id=uuid.UUID(TENANT), plan_id=plan.id, status="active",
+            current_period_end=datetime.utcnow() + timedelta(days=30),
+        ))
+        db.commit()
+
+    queries.clear()
+    return Session, queries
+
+
+def _set_status(Session, **values):
+    with Session() as db:
+        db.query(Subscription).update(values)
+        db.commit()
+
+
+class TestEntitlementCache:
+    """Tests de la caché de entitlements"""
+
+    def test_hot_path_does_no_queries(self, subscription_db):
+        """Sólo la primera petición consulta la BD (una única consulta)"""
+        _, queries = subscription_db
+        for _ in range(50):
+            assert check_subscription_access(TENANT, "/api/cases", "POST") == (True, False, "OK")
+
+        assert len(queries) == 1
+        assert subscription_mw.entitlement_cache.stats()["hits"] == 49
+
+    def test_snapshot_exposes_plan(self, subscription_db):
+        info = get_subscription_info(TENANT)
+        assert info["status"] == "active"
+        assert info["features"] == ["m365", "pentest"]
+        assert info["limits"]["max_cases"] == 100
+
+    def test_invalidation_refreshes_snapshot(self, subscription_db):
+        """Tras invalidar, el siguiente acceso ve el cambio de la suscripción"""
+        Session, _ = subscription_db
+        assert check_subscription_access(TENANT, "/api/cases", "POST")[0] is True
+
+        _set_status(Session, status="past_due")
+        assert check_subscription_access(TENANT, "/api/cases", "POST")[0] is True  # aún en caché
+
+        invalidate_entitlements(TENANT)
+        allowed, read_only, _ = check_subscription_access(TENANT, "/api/cases", "POST")
+        assert (allowed, read_only) == (False, True)
+
+    def test_ttl_expiry_reloads(self, subscription_db, monkeypatch):
+        Session, queries = subscription_db
+        cache = subscription_mw.entitlement_cache
+        cache.get(TENANT)
+
+        clock = [subscription_mw.time.monotonic() + 31]
+        monkeypatch.setattr(subscription_mw.time, "monotonic", lambda: clock[0])
+        _set_status(Session, status="canceled")
+        queries.clear()
+
+        assert cache.get(TENANT).status == "canceled"
+        assert len(queries) == 1
+
+    def test_invalidation_during_load_is_not_cached(self):
+        """Una carga que compite con una invalidación no guarda el snapshot viejo"""
+        cache = EntitlementCache(ttl=30)
+
+        def loader(tenant_id):
+            cache.invalidate(tenant_id)
+            return EntitlementSnapshot(tenant_id=tenant_id, has_subscription=False)
+
+        cache.loader = loader
+        cache.get(TENANT)
+        assert cache.stats()["entries"] == 0
+
+    def test_lookup_error_denies_and_is_not_cached(self, subscription_db):
+        """Un error al cargar (id malformado, BD caída) deniega en vez de abrir"""
+        Session, queries = subscription_db
+        allowed, read_only, message = check_subscription_access("not-a-uuid", "/api/cases", "POST")
+        assert (allowed, read_only) == (False, True)
+        assert message.startswith("No active subscription")
+        assert subscription_mw.entitlement_cache.stats()["entries"] == 0
+
+        Session.kw["bind"].dispose()
+        Base.metadata.drop_all(Session.kw["bind"], tables=[Subscription.__table__])
+        assert check_subscription_access(TENANT, "/api/cases", "POST")[:2] == (False, True)
+        assert subscription_mw.entitlement_cache.stats()["entries"] == 0
+
+
+class TestEvaluateAccess:
+    """Tests de las decisiones de acceso a partir del snapshot"""
+
+    def test_no_subscription_blocked(self):
+        snapshot = EntitlementSnapshot(tenant_id=TENANT, has_subscription=False)
+        assert evaluate_access(snapshot, "GET")[:2] == (False, True)
+
+    def test_expired_trial_is_read_only(self):
+        snapshot = EntitlementSnapshot(
+            tenant_id=TENANT, has_subscription=True, status="trialing",
+            is_trial=True, trial_end=datetime.utcnow() - timedelta(days=1),
+        )
+        assert evaluate_access(snapshot, "GET")[:2] == (True, True)
+        assert evaluate_access(snapshot, "POST")[:2] == (False, True)
+
+    def test_canceled_within_paid_period(self):
+        snapshot = EntitlementSnapshot(
+            tenant_id=TENANT, has_subscription=True, status="canceled",
+            current_period_end=datetime.utcnow() + timedelta(days=3),
+        )
+        assert evaluate_access(snapshot, "POST")[:2] == (True, False)
+
+    def test_expired_trial_marked_once(self, subscription_db):
+        """El vencimiento del trial se persiste una vez y la caché se refresca"""
+        Session, _ = subscription_db
+        _set_status(Session, status="trialing", is_trial=True,
+                    trial_end=datetime.utcnow() - timedelta(hours=1))
+
+        assert check_subscription_access(TENANT, "/api/cases", "GET")[:2] == (True, True)
+        with Session() as db:
+            sub = db.query(Subscription).one()
+            assert (sub.status, sub.trial_expired_notified, sub.is_read_only) == ("expired", True, True)
+
+        snapshot = subscription_mw.entitlement_cache.get(TENANT)
+        assert snapshot.trial_expired_notified is True
@@ -0,0 +1,70 @@
+"""
+MCP Kali Forensics - Tests for Text Chunker v4.7
+Tests unitarios del chunker con solape usado por RAG
+"""
+
+import io
+
+import pytest
+
+from api.services.text_chunker import chunk_text, iter_chunks, iter_file_chunks
+
+
+def _log(lines=200):
+    return "".join(f"2024-01-01T00:00:{i % 60:02d} sshd[{i}]: Failed password from 10.0.0.{i % 255}\n"
+                   for i in range(lines))
+
+
+class TestChunker:
+    """Tests de tamaño, solape y offsets"""
+
+    def test_chunks_respect_size_and_cover_text(self):
+        """Ningún chunk supera chunk_size y juntos cubren todo el texto"""
+        text = _log()
+        chunks = chunk_text(text, chunk_size=500, overlap=100)
+        assert all(len(c.text) <= 500 for c in chunks)
+        assert chunks[0].offset == 0
+        assert chunks[-1].offset + len(chunks[-1].text) == len(text)
+        for chunk in chunks:
+            assert text[chunk.offset:chunk.offset + len(chunk.text)] == chunk.text
+
+    def test_consecutive_chunks_overlap(self):
+        """Cada chunk empieza dentro del anterior, exactamente overlap caracteres antes"""
+        chunks = chunk_text(_log(), chunk_size=500, overlap=100)
+        for previous, current in zip(chunks, chunks[1:]):
+            assert current.offset == previous.offset + len(previous.text) - 100
+
+    def test_cuts_on_line_boundaries(self):
+        """En logs se corta tras un salto de línea, no a mitad de línea"""
+        chunks = chunk_text(_log(), chunk_size=500, overlap=100)
+        assert all(c.text.endswith("\n") for c in chunks)
+
+    def test_short_text_single_chunk(self):
+        """Textos cortos producen un único chunk; vacío no produce ninguno"""
+        assert [c.text for c in chunk_text("hello world", 100, 10)] == ["hello world"]
+        assert chunk_text("   \n", 100, 10) == []
+
+    def test_invalid_overlap_rejected(self):
+        """El solape debe ser menor que la mitad del chunk"""
+        with pytest.raises(ValueError):
+            chunk_text("x" * 100, chunk_size=100, overlap=50)
+
+    @pytest.mark.parametrize("read_size", [1, 37, 4096])
+    def test_streaming_matches_full_text(self, read_size):
+        """Leer el archivo por bloques produce los mismos chunks"""
+        text = _log(500)
+        streamed = list(iter_file_chunks(io.StringIO(text), 700, 150, read_size=read_size))
+        assert streamed == chunk_text(text, 700, 150)
+
+    def test_pieces_are_consumed_lazily(self):
+        """El generador no materializa todo el texto"""
+        consumed = []
+
+        def pieces():
+            for i in range(1000):
+                consumed.append(i)
+                yield "word " * 100
+
+        first = next(iter_chunks(pieces(), chunk_size=1000, overlap=100))
+        assert first.index == 0
+        assert len(consumed) <= 3
@@ -0,0 +1,115 @@
+"""
+MCP Kali Forensics - Tests for Timeline Auto-Correlation v4.7
+Agrupación por entidad dentro de una ventana de tiempo con enlace de cadenas
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from api.services.timeline import TimelineService, cluster_events_by_entity
+from api.services.timeline_store import InMemoryTimelineStore
+
+T0 = datetime(2024, 3, 1, 9, 0, 0)
+WINDOW = timedelta(minutes=10)
+
+
+def _event(n, minutes, **fields):
+    return {
+        "event_id": f"evt_{n}",
+        "event_time": (T0 + timedelta(minutes=minutes)).isoformat(),
+        "severity": fields.pop("severity", "info"),
+        **fields,
+    }
+
+
+class TestClusterEventsByEntity:
+    """Tests del barrido de correlación"""
+
+    def test_distant_events_not_grouped(self):
+        """Misma IP con meses de diferencia no forma grupo"""
+        events = [
+            _event(1, 0, source_ip="10.0.0.5"),
+            _event(2, 5, source_ip="10.0.0.5"),
+            _event(3, 60 * 24 * 60, source_ip="10.0.0.5"),
+            _event(4, 60 * 24 * 60 + 5, source_ip="10.0.0.5"),
+        ]
+        assert cluster_events_by_entity(events, WINDOW, min_events=3) == []
+        groups = cluster_events_by_entity(events, WINDOW, min_events=2)
+        assert [[e["event_id"] for e in g["events"]] for g in groups] == [["evt_1", "evt_2"], ["evt_3", "evt_4"]]
+
+    def test_chain_links_ip_user_host(self):
+        """IP → usuario → host: eventos sin entidad común directa acaban en el mismo grupo"""
+        events = [
+            _event(1, 0, source_ip="203.0.113.7"),
+            _event(2, 4, source_ip="203.0.113.7", source_name="alice"),
+            _event(3, 9, source_name="alice", target_type="host", target_name="WS01"),
+            _event(4, 15, source_type="process", source_name="psexec", target_type="host", target_name="WS01"),
+            _event(5, 16, source_ip="198.51.100.1"),  # otra IP, aislado
+        ]
+        [group] = cluster_events_by_entity(events, WINDOW, min_events=3)
+
+        assert [e["event_id"] for e in group["events"]] == ["evt_1", "evt_2", "evt_3", "evt_4"]
+        assert group["entities"] == ["host:WS01", "ip:203.0.113.7", "user:alice"]
+        assert group["duration_seconds"] == 15 * 60
+
+    def test_chain_gaps_within_window(self):
+        """Las cadenas se extienden mientras cada salto sea menor que la ventana"""
+        events = [_event(i, i * 8, source_name="bob") for i in range(5)]
+        [group] = cluster_events_by_entity(events, WINDOW)
+        assert len(group["events"]) == 5
+
+        events = [_event(i, i * 11, source_name="bob") for i in range(5)]
+        assert cluster_events_by_entity(events, WINDOW, min_events=2) == []
+
+    def test_score_orders_groups(self):
+        benign = [_event(i, i, source_ip="10.0.0.1") for i in range(3)]
+        hostile = [
+            _event(10 + i, i, source_ip="10.0.0.2", source_name="eve",
+                   severity="critical", is_suspicious=True)
+            for i in range(3)
+        ]
+        groups = cluster_events_by_entity(benign + hostile, WINDOW)
+
+        assert [g["severity"] for g in groups] == ["critical", "info"]
+        assert groups[0]["score"] > groups[1]["score"]
+        assert 0 < groups[1]["score"] <= groups[0]["score"] <= 1
+
+    def test_unsorted_input_and_scale(self):
+        """Entrada desordenada y 50k eventos en un tiempo lineal-logarítmico"""
+        order = [(i * 7919) % 50_000 for i in range(50_000)]  # permutación
+        events = [_event(j, j // 10, source_ip=f"10.0.{j % 50}.1") for j in order]
+        started = time.perf_counter()
+        groups = cluster_events_by_entity(events, WINDOW)
+        elapsed = time.perf_counter() - started
+
+        assert len(groups) == 50  # una cadena por IP (aparece cada 5 minutos)
+        assert sum(len(g["events"]) for g in groups) == 50_000
+        assert elapsed < 5
+
+
+class TestAutoCorrelate:
+    """Tests de TimelineService.auto_correlate"""
+
+    @pytest.mark.asyncio
+    async def test_creates_scored_correlations(self):
+        service = TimelineService(store=InMemoryTimelineStore())
+        for minutes, fields in [
+            (0, {"source_ip": "203.0.113.7", "severity": "high"}),
+            (3, {"source_ip": "203.0.113.7", "source_name": "alice"}),
+            (6, {"source_name": "alice", "target_type": "host", "target_name": "WS01"}),
+            (600, {"source_name": "alice"}),
+        ]:
+            await service.create_event(T0 + timedelta(minutes=minutes), "login", "e", case_id="CASE-1", **fields)
+
+        [corr] = await service.auto_correlate("CASE-1", time_window_minutes=10)
+
+        assert corr["event_count"] == 3
+        assert corr["severity"] == "high"
+        assert corr["entities"] == ["ip:203.0.113.7", "user:alice"]
+        assert corr["duration_seconds"] == 360
+        assert 0 < corr["confidence_score"] <= 1
+
+        linked = [e for e in await service.get_events(case_id="CASE-1") if e.get("correlation_id")]
+        assert len(linked) == 3
@@ -0,0 +1,303 @@
+"""
+MCP Kali Forensics - Tests for Timeline Event Store v4.7
+Almacén persistente indexado por (case_id, event_time) con paginación keyset
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401
+from api.database import Base
+from api.models.timeline import TimelineEvent
+from api.services.timeline import TimelineService, rebucket_histogram
+from api.services.timeline_store import (
+    InMemoryTimelineStore,
+    SQLTimelineStore,
+    TimelineFilter,
+)
+
+T0 = datetime(2024, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def sql_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'timeline.db'}")
+    Base.metadata.create_all(engine, tables=[TimelineEvent.__table__])
+    return engine
+
+
+def _session_factory(engine):
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    return db_context
+
+
+@pytest.fixture(params=["memory", "sql"])
+def store(request, sql_engine):
+    if request.param == "memory":
+        return InMemoryTimelineStore()
+    return SQLTimelineStore(_session_factory(sql_engine), batch_size=7)
+
+
+def _event(i, case_id="CASE-1", minutes=None, **extra):
+    event_time = T0 + timedelta(minutes=i if minutes is None else minutes)
+    return {
+        "event_id": f"evt_{i:04d}",
+        "case_id": case_id,
+        "event_time": event_time.isoformat(),
+        "event_type": extra.pop("event_type", "login"),
+        "title": f"Event {i}",
+        "severity": extra.pop("severity", "info"),
+        "data_source": extra.pop("data_source", "m365_audit"),
+        **extra,
+    }
+
+
+def _all_pages(store, flt, limit):
+    events, cursor, pages = [], None, 0
+    while True:
+        page = store.query(flt, cursor=cursor, limit=limit)
+        events.extend(page.events)
+        pages += 1
+        if page.next_cursor is None:
+            return events, pages
+        cursor = page.next_cursor
+
+
+class TestTimelineStoreContract:
+    """Comportamiento común de los almacenes en memoria y SQL"""
+
+    def test_keyset_pages_cover_range_once(self, store):
+        """Las páginas recorren el caso en orden, sin huecos ni duplicados (también con timestamps iguales)"""
+        events = [_event(i, minutes=i // 3) for i in range(25)]
+        events += [_event(100 + i, case_id="CASE-2") for i in range(5)]
+        assert store.add_many(list(reversed(events))) == 30
+
+        got, pages = _all_pages(store, TimelineFilter(case_id="CASE-1"), limit=4)
+
+        assert [e["event_id"] for e in got] == [f"evt_{i:04d}" for i in range(25)]
+        assert pages == 7
+
+    def test_range_and_filters(self, store):
+        store.add_many([
+            _event(0, severity="low"),
+            _event(1, severity="high", data_source="endpoint_loki"),
+            _event(2, severity="critical", event_type="network"),
+            _event(3, severity="medium"),
+            _event(4, severity="high"),
+        ])
+        flt = TimelineFilter(case_id="CASE-1", start_time=T0 + timedelta(minutes=1),
+                             end_time=T0 + timedelta(minutes=3))
+        assert [e["event_id"] for e in store.query(flt).events] == ["evt_0001", "evt_0002", "evt_0003"]
+        assert store.count(flt) == 3
+
+        flt = TimelineFilter(case_id="CASE-1", min_severity="high", sources=["m365_audit"])
+        assert [e["event_id"] for e in store.query(flt).events] == ["evt_0002", "evt_0004"]
+
+        flt = TimelineFilter(case_id="CASE-1", event_types=["network"])
+        assert store.count(flt) == 1
+
+    def test_offset_and_cursor_agree(self, store):
+        store.add_many([_event(i) for i in range(10)])
+        flt = TimelineFilter(case_id="CASE-1")
+        first = store.query(flt, limit=3)
+        assert store.query(flt, cursor=first.next_cursor, limit=3).events == store.query(flt, limit=3, offset=3).events
+
+    def test_update_delete_and_stats(self, store):
+        store.add_many([_event(0), _event(1), _event(2, case_id="CASE-2")])
+
+        assert store.update_many(["evt_0000", "evt_0001", "missing"], {"correlation_id": "corr_1"}) == 2
+        assert store.get("evt_0001")["correlation_id"] == "corr_1"
+        assert store.update("evt_0000", {"title": "Renamed"})["title"] == "Renamed"
+        assert [e["event_id"] for e in store.get_many(["evt_0002", "missing", "evt_0000"])] == ["evt_0002", "evt_0000"]
+
+        assert store.delete("evt_0001") is True
+        assert store.delete("evt_0001") is False
+        assert store.stats() == {"total_events": 2, "cases_tracked": 2}
+
+    def test_invalid_cursor(self, store):
+        with pytest.raises(ValueError):
+            store.query(TimelineFilter(case_id="CASE-1"), cursor="not-a-cursor")
+
+
+class TestSQLTimelineStore:
+    """Tests específicos del almacén SQL"""
+
+    def test_case_time_index_exists(self, sql_engine):
+        indexes = {ix["name"]: ix["column_names"] for ix in inspect(sql_engine).get_indexes("timeline_events")}
+        assert indexes["ix_timeline_events_case_time"] == ["case_id", "event_time", "event_id"]
+        assert "ix_timeline_events_source" in indexes
+        assert "ix_timeline_events_type" in indexes
+
+    def test_bulk_insert_batches_statements(self, sql_engine):
+        """add_many emite un INSERT por lote, no uno por evento"""
+        inserts = []
+
+        @event.listens_for(sql_engine, "before_cursor_execute")
+        def count_inserts(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT"):
+                inserts.append(executemany)
+
+        store = SQLTimelineStore(_session_factory(sql_engine), batch_size=100)
+        store.add_many([_event(i) for i in range(250)])
+        assert len(inserts) == 3
+        assert store.count(TimelineFilter(case_id="CASE-1")) == 250
+
+
+class TestTimelineServicePersistence:
+    """Tests del servicio sobre el almacén SQL"""
+
+    @pytest.mark.asyncio
+    async def test_bulk_import_survives_restart(self, sql_engine):
+        """Los eventos importados siguen ahí con una nueva instancia del servicio"""
+        service = TimelineService(store=SQLTimelineStore(_session_factory(sql_engine)))
+        result = await service.bulk_import_events(
+            [
+                {"timestamp": "2024-03-01T12:05:00Z", "type": "login", "title": "B", "severity": "high"},
+                {"timestamp": "2024-03-01T11:00:00+00:00", "type": "login", "title": "A"},
+                {"timestamp": "not a date", "type": "login"},
+            ],
+            case_id="CASE-9",
+            data_source="m365_audit",
+        )
+        assert result == {"imported": 2, "errors": 1, "total": 3}
+
+        restarted = TimelineService(store=SQLTimelineStore(_session_factory(sql_engine)))
+        events = await restarted.get_events(case_id="CASE-9")
+        assert [e["title"] for e in events] == ["A", "B"]
+        assert events[1]["event_time"] == "2024-03-01T12:05:00"
+
+        since = datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+        assert len(await restarted.get_events(case_id="CASE-9", start_time=since)) == 1
+
+    @pytest.mark.asyncio
+    async def test_timeline_cursor_pagination(self):
+        service = TimelineService(store=InMemoryTimelineStore())
+        await service.bulk_add_events("CASE-1", [
+            {"event_time": T0 + timedelta(seconds=i), "event_type": "login", "title": f"E{i}"}
+            for i in range(5)
+        ])
+
+        first = await service.get_timeline("CASE-1", limit=2)
+        second = await service.get_timeline("CASE-1", limit=2, cursor=first["next_cursor"])
+        assert first["total"] == 5
+        assert [e["title"] for e in first["events"] + second["events"]] == ["E0", "E1", "E2", "E3"]
+
+    @pytest.mark.asyncio
+    async def test_correlation_updates_store(self):
+        service = TimelineService(store=InMemoryTimelineStore())
+        a = await service.create_event(T0, "login", "A", case_id="CASE-1")
+        b = await service.create_event(T0 + timedelta(minutes=1), "login", "B", case_id="CASE-1")
+
+        corr = await service.create_correlation([a["event_id"], b["event_id"]], "Pair", case_id="CASE-1")
+        assert corr["duration_seconds"] == 60
+        assert (await service.get_event(b["event_id"]))["correlation_id"] == corr["correlation_id"]
+        assert (await service.get_stats())["total_events"] == 2
+
+
+def _histogram_events():
+    """Eventos repartidos en ~3 días con varias fuentes y severidades"""
+    events = []
+    for i in range(300):
+        events.append(_event(
+            i, minutes=i * 13,
+            severity=["info", "low", "high"][i % 3],
+            data_source=["m365_audit", "endpoint_loki"][i % 2],
+        ))
+    events.append({**_event(999, minutes=5), "severity": None, "data_source": None})
+    return events
+
+
+class TestTimelineHistogram:
+    """Histogramas calculados en el almacén"""
+
+    @pytest.mark.asyncio
+    async def test_sql_and_memory_agree(self, sql_engine):
+        events = _histogram_events()
+        memory = TimelineService(store=InMemoryTimelineStore())
+        sql = TimelineService(store=SQLTimelineStore(_session_factory(sql_engine)))
+        memory.store.add_many(events)
+        sql.store.add_many(events)
+
+        for interval in ("minute", "hour", "day"):
+            expected = await memory.get_histogram("CASE-1", interval=interval)
+            assert await sql.get_histogram("CASE-1", interval=interval) == expected
+            assert expected["total"] == 301
+
+        day = await sql.get_histogram("CASE-1", interval="day")
+        assert [b["count"] for b in day["buckets"]] == [57, 111, 110, 23]
+        assert day["buckets"][0]["by_source"]["unknown"] == 1
+        assert sum(day["buckets"][0]["by_severity"].values()) == 57
+
+    @pytest.mark.asyncio
+    async def test_histogram_is_one_grouped_query(self, sql_engine):
+        """Con rango explícito el histograma es una única consulta agregada"""
+        service = TimelineService(store=SQLTimelineStore(_session_factory(sql_engine)))
+        service.store.add_many(_histogram_events())
+        statements = []
+
+        @event.listens_for(sql_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        await service.get_histogram("CASE-1", interval="hour", start_time=T0, end_time=T0 + timedelta(days=3))
+        assert len(statements) == 1
+        assert "GROUP BY" in statements[0]
+
+    @pytest.mark.asyncio
+    async def test_auto_interval_follows_zoom(self):
+        service = TimelineService(store=InMemoryTimelineStore())
+        service.store.add_many(_histogram_events())
+
+        full = await service.get_histogram("CASE-1", max_buckets=100)
+        assert full["interval"] == "hour"
+        assert len(full["buckets"]) <= 100
+
+        zoomed = await service.get_histogram(
+            "CASE-1", start_time=T0, end_time=T0 + timedelta(minutes=90), max_buckets=100
+        )
+        assert zoomed["interval"] == "minute"
+        assert len(zoomed["buckets"]) == 91  # buckets vacíos incluidos
+        assert zoomed["total"] == 8
+
+    @pytest.mark.asyncio
+    async def test_rebucket_matches_coarser_query(self):
+        service = TimelineService(store=InMemoryTimelineStore())
+        service.store.add_many(_histogram_events())
+
+        hourly = await service.get_histogram("CASE-1", interval="hour", fill_empty=False)
+        daily = await service.get_histogram("CASE-1", interval="day", fill_empty=False)
+        assert rebucket_histogram(hourly, "day")["buckets"] == daily["buckets"]
+
+        with pytest.raises(ValueError):
+            rebucket_histogram(daily, "hour")
+
+    @pytest.mark.asyncio
+    async def test_graph_data_uses_histogram(self):
+        service = TimelineService(store=InMemoryTimelineStore())
+        service.store.add_many([_event(0), _event(1, event_type="network"), _event(70)])
+
+        graph = await service.get_graph_data("CASE-1", resolution="hour")
+        assert graph == {
+            "data_points": 2,
+            "series": [
+                {"timestamp": "2024-03-01T12:00:00", "counts": {"login": 1, "network": 1}},
+                {"timestamp": "2024-03-01T13:00:00", "counts": {"login": 1}},
+            ],
+        }
@@ -0,0 +1,126 @@
+"""
+MCP Kali Forensics - Tests for Usage Tracking v4.7
+Escritura por lotes de registros de uso de la API
+"""
+
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import api.models  # noqa: F401  (registra los modelos antes que el middleware)
+import api.middleware.usage_tracking as usage_tracking
+from api.database import Base
+from api.middleware.usage_tracking import ApiUsage, UsageRecordBuffer, UsageTrackingMiddleware
+
+
+@pytest.fixture
+def usage_db(tmp_path, monkeypatch):
+    """BD SQLite aislada con la tabla api_usage; cuenta las transacciones"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    Base.metadata.create_all(engine, tables=[ApiUsage.__table__])
+    Session = sessionmaker(bind=engine)
+    transactions = []
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+            transactions.append(1)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    monkeypatch.setattr(usage_tracking, "get_db_context", db_context)
+
+    def count_rows():
+        with Session() as db:
+            return db.query(ApiUsage).count()
+
+    return count_rows, transactions
+
+
+def _record(i):
+    return {"method": "GET", "path": f"/api/{i}", "status_code": 200}
+
+
+class TestUsageRecordBuffer:
+    """Tests del buffer de registros"""
+
+    @pytest.mark.asyncio
+    async def test_flushes_in_batches(self, usage_db):
+        """Lotes de batch_size filas; el resto se escribe al vencer flush_ms"""
+        count_rows, transactions = usage_db
+        buffer = UsageRecordBuffer(max_size=100, batch_size=4, flush_ms=50)
+        for i in range(10):
+            buffer.enqueue(_record(i))
+
+        for _ in range(100):
+            if buffer.written == 10:
+                break
+            await asyncio.sleep(0.02)
+
+        assert count_rows() == 10
+        assert len(transactions) == 3
+        await buffer.stop()
+
+    @pytest.mark.asyncio
+    async def test_overflow_drops_and_counts(self, usage_db):
+        """Con la cola llena los registros se descartan sin bloquear"""
+        count_rows, _ = usage_db
+        buffer = UsageRecordBuffer(max_size=3, batch_size=10, flush_ms=1000)
+        accepted = [buffer.enqueue(_record(i)) for i in range(5)]
+
+        assert accepted == [True, True, True, False, False]
+        assert buffer.stats()["dropped"] == 2
+        await buffer.stop()
+        assert count_rows() == 3
+
+    @pytest.mark.asyncio
+    async def test_stop_flushes_pending(self, usage_db):
+        """El apagado escribe lo que queda en cola sin esperar a flush_ms"""
+        count_rows, _ = usage_db
+        buffer = UsageRecordBuffer(max_size=100, batch_size=50, flush_ms=60_000)
+        for i in range(7):
+            buffer.enqueue(_record(i))
+        await asyncio.sleep(0.01)  # El escritor ya tiene un lote a medias
+
+        await buffer.stop()
+        assert count_rows() == 7
+        assert buffer.stats()["pending"] == 0
+
+
+class TestUsageTrackingMiddleware:
+    """Tests del middleware"""
+
+    def test_requests_do_not_write_inline(self, usage_db, monkeypatch):
+        """El middleware sólo encola: no abre sesión durante la petición"""
+        count_rows, transactions = usage_db
+        buffer = UsageRecordBuffer(max_size=100, batch_size=100, flush_ms=60_000)
+        monkeypatch.setattr(usage_tracking, "get_billing_service", lambda: None)
+
+        app = FastAPI()
+        app.add_middleware(UsageTrackingMiddleware, buffer=buffer)
+
+        @app.get("/api/v1/cases/{case_id}")
+        async def read_case(case_id: str):
+            return {"case_id": case_id}
+
+        client = TestClient(app)
+        for _ in range(5):
+            response = client.get("/api/v1/cases/CASE-2024-001", headers={"X-Tenant-ID": "acme"})
+            assert response.headers["X-Billing-Tracked"] == "true"
+
+        assert transactions == []
+        assert buffer.stats()["enqueued"] == 5
+
+        asyncio.run(buffer.stop())
+        assert count_rows() == 5